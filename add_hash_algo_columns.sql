@@ -0,0 +1,44 @@
+-- =====================================================
+-- CULTURAL INTELLIGENCE - PLUGGABLE CONTENT HASH MIGRATION
+-- =====================================================
+-- Run this in Supabase SQL Editor or pgAdmin before enabling
+-- "hashing": {"algorithm": "blake3"} in taxonomy_config.json.
+--
+-- Transition plan:
+--   1. file_hash keeps SHA-256 for every existing row.
+--   2. Scanners compute the configured hash alongside SHA-256 in the same
+--      read pass and backfill content_hash/hash_algo on normal rescans.
+--   3. Lookups match either column (file_hash OR content_hash).
+--   4. Once every row has content_hash, set "dual_hash": false; new rows
+--      then store the configured digest in both columns.
+
+BEGIN;
+
+ALTER TABLE cultural_tracks ADD COLUMN IF NOT EXISTS content_hash VARCHAR(128);
+ALTER TABLE cultural_tracks ADD COLUMN IF NOT EXISTS hash_algo VARCHAR(20) DEFAULT 'sha256';
+
+ALTER TABLE cultural_duplicates ADD COLUMN IF NOT EXISTS content_hash VARCHAR(128);
+ALTER TABLE cultural_duplicates ADD COLUMN IF NOT EXISTS hash_algo VARCHAR(20) DEFAULT 'sha256';
+
+-- Existing rows were hashed with SHA-256 only
+UPDATE cultural_tracks SET hash_algo = 'sha256' WHERE hash_algo IS NULL;
+UPDATE cultural_duplicates SET hash_algo = 'sha256' WHERE hash_algo IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_cultural_tracks_content_hash ON cultural_tracks(content_hash);
+CREATE INDEX IF NOT EXISTS idx_cultural_duplicates_content_hash ON cultural_duplicates(content_hash);
+
+COMMENT ON COLUMN cultural_tracks.content_hash IS 'Content hash using hash_algo (BLAKE3/xxh3/...); NULL until backfilled by a rescan';
+COMMENT ON COLUMN cultural_tracks.hash_algo IS 'Algorithm of content_hash; file_hash stays SHA-256 during the dual-hash transition';
+
+-- Migration progress
+CREATE OR REPLACE VIEW cultural_hash_migration_progress AS
+SELECT hash_algo,
+       COUNT(*) AS tracks,
+       COUNT(content_hash) AS with_content_hash,
+       COUNT(*) - COUNT(content_hash) AS awaiting_rescan
+FROM cultural_tracks
+GROUP BY hash_algo;
+
+NOTIFY pgrst, 'reload schema';
+
+COMMIT;
@@ -0,0 +1,185 @@
+-- =====================================================
+-- CULTURAL INTELLIGENCE - SERVER-SIDE LEARNING FUNCTIONS
+-- =====================================================
+-- Run this in Supabase SQL Editor or pgAdmin.
+-- Exposes pattern learning, confidence updates and batch insights as
+-- PostgREST RPC endpoints (POST /rest/v1/rpc/<function>), so REST-mode
+-- clients do the set-based work in one round trip instead of raw SQL.
+-- The offline SQLite equivalents live in local_intelligence_functions.py.
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_cultural_classifications_classified_at ON cultural_classifications(classified_at);
+CREATE INDEX IF NOT EXISTS idx_cultural_patterns_lookup ON cultural_patterns(pattern_type, pattern_value, genre);
+
+-- -----------------------------------------------------
+-- Learn artist_genre and metadata patterns from recent classifications
+-- Filename and folder hint patterns are not learned here: the cultural_*
+-- schema does not store genre hints, so CulturalIntelligenceScanner learns
+-- them per track when it classifies (_classify_and_learn).
+-- -----------------------------------------------------
+CREATE OR REPLACE FUNCTION cultural_learn_patterns(
+    window_minutes INTEGER DEFAULT 20,
+    min_confidence NUMERIC DEFAULT 0.7,
+    min_occurrences INTEGER DEFAULT 1
+) RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    patterns_learned INTEGER;
+BEGIN
+    WITH recent AS (
+        SELECT cc.artist, cc.genre, cc.subgenre, cc.overall_confidence,
+               NULLIF(ct.raw_metadata->>'genre', '') AS metadata_genre
+        FROM cultural_classifications cc
+        LEFT JOIN cultural_tracks ct ON ct.id = cc.track_id
+        WHERE cc.classified_at > NOW() - make_interval(mins => window_minutes)
+          AND cc.genre IS NOT NULL
+          AND cc.overall_confidence >= min_confidence
+    ),
+    aggregated AS (
+        SELECT 'artist_genre'::VARCHAR AS pattern_type, artist AS pattern_value, genre, subgenre,
+               COUNT(*) AS occurrences, AVG(overall_confidence) AS avg_confidence
+        FROM recent
+        WHERE artist IS NOT NULL
+        GROUP BY artist, genre, subgenre
+        HAVING COUNT(*) >= min_occurrences
+        UNION ALL
+        SELECT 'metadata'::VARCHAR, metadata_genre, genre, NULL,
+               COUNT(*), AVG(overall_confidence)
+        FROM recent
+        WHERE metadata_genre IS NOT NULL
+        GROUP BY metadata_genre, genre
+        HAVING COUNT(*) >= min_occurrences
+    ),
+    updated AS (
+        UPDATE cultural_patterns cp
+        SET confidence = LEAST(ROUND((cp.confidence * 0.9 + a.avg_confidence * 0.1)::NUMERIC, 2), 0.99),
+            sample_size = cp.sample_size + a.occurrences,
+            reinforcement_count = COALESCE(cp.reinforcement_count, 1) + 1,
+            last_updated = NOW()
+        FROM aggregated a
+        WHERE cp.pattern_type = a.pattern_type
+          AND cp.pattern_value = a.pattern_value
+          AND cp.genre = a.genre
+          AND cp.subgenre IS NOT DISTINCT FROM a.subgenre
+        RETURNING cp.pattern_type, cp.pattern_value, cp.genre, cp.subgenre
+    ),
+    inserted AS (
+        INSERT INTO cultural_patterns (pattern_type, pattern_value, genre, subgenre, confidence, sample_size, success_rate)
+        SELECT a.pattern_type, a.pattern_value, a.genre, a.subgenre,
+               LEAST(ROUND(a.avg_confidence::NUMERIC, 2), 0.99), a.occurrences, LEAST(ROUND(a.avg_confidence::NUMERIC, 2), 0.99)
+        FROM aggregated a
+        WHERE NOT EXISTS (
+            SELECT 1 FROM updated u
+            WHERE u.pattern_type = a.pattern_type
+              AND u.pattern_value = a.pattern_value
+              AND u.genre = a.genre
+              AND u.subgenre IS NOT DISTINCT FROM a.subgenre
+        )
+        ON CONFLICT (pattern_type, pattern_value, genre, subgenre) DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM updated) + (SELECT COUNT(*) FROM inserted) INTO patterns_learned;
+
+    RETURN patterns_learned;
+END;
+$$;
+
+-- -----------------------------------------------------
+-- Boost confidence of recent classifications that match strong patterns
+-- -----------------------------------------------------
+CREATE OR REPLACE FUNCTION cultural_update_confidence_scores(
+    window_minutes INTEGER DEFAULT 20,
+    min_pattern_confidence NUMERIC DEFAULT 0.8,
+    genre_boost NUMERIC DEFAULT 1.1,
+    overall_boost NUMERIC DEFAULT 1.05
+) RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated_rows INTEGER;
+BEGIN
+    UPDATE cultural_classifications cc
+    SET genre_confidence = LEAST(cc.genre_confidence * genre_boost, 0.99),
+        overall_confidence = LEAST(cc.overall_confidence * overall_boost, 0.99)
+    FROM (
+        SELECT DISTINCT c.id
+        FROM cultural_classifications c
+        JOIN cultural_patterns cp
+          ON cp.genre = c.genre
+         AND cp.confidence > min_pattern_confidence
+         AND ((cp.pattern_type = 'artist_genre' AND cp.pattern_value = c.artist)
+              OR cp.pattern_type = 'metadata')
+        WHERE c.classified_at > NOW() - make_interval(mins => window_minutes)
+    ) matched
+    WHERE cc.id = matched.id;
+
+    GET DIAGNOSTICS updated_rows = ROW_COUNT;
+    RETURN updated_rows;
+END;
+$$;
+
+-- -----------------------------------------------------
+-- Decay patterns that have not been reinforced recently
+-- -----------------------------------------------------
+CREATE OR REPLACE FUNCTION cultural_age_patterns(
+    stale_hours INTEGER DEFAULT 24,
+    decay NUMERIC DEFAULT 0.99
+) RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated_rows INTEGER;
+BEGIN
+    UPDATE cultural_patterns
+    SET confidence = confidence * decay
+    WHERE last_updated < NOW() - make_interval(hours => stale_hours)
+      AND confidence > 0.1;
+
+    GET DIAGNOSTICS updated_rows = ROW_COUNT;
+    RETURN updated_rows;
+END;
+$$;
+
+-- -----------------------------------------------------
+-- Batch insights: genre mix, top artists and review backlog for recent work
+-- -----------------------------------------------------
+CREATE OR REPLACE FUNCTION cultural_intelligence_insights(
+    window_minutes INTEGER DEFAULT 20,
+    top_n INTEGER DEFAULT 5
+) RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+    WITH recent AS (
+        SELECT artist, genre, overall_confidence, needs_review
+        FROM cultural_classifications
+        WHERE classified_at > NOW() - make_interval(mins => window_minutes)
+    )
+    SELECT jsonb_build_object(
+        'classified', (SELECT COUNT(*) FROM recent),
+        'needs_review', (SELECT COUNT(*) FROM recent WHERE needs_review),
+        'avg_confidence', (SELECT ROUND(AVG(overall_confidence)::NUMERIC, 2) FROM recent),
+        'top_genres', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('genre', genre, 'count', n) ORDER BY n DESC)
+            FROM (SELECT genre, COUNT(*) AS n FROM recent WHERE genre IS NOT NULL
+                  GROUP BY genre ORDER BY n DESC LIMIT top_n) g
+        ), '[]'::jsonb),
+        'top_artists', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('artist', artist, 'count', n) ORDER BY n DESC)
+            FROM (SELECT artist, COUNT(*) AS n FROM recent WHERE artist IS NOT NULL
+                  GROUP BY artist ORDER BY n DESC LIMIT top_n) a
+        ), '[]'::jsonb)
+    );
+$$;
+
+GRANT EXECUTE ON FUNCTION cultural_learn_patterns(INTEGER, NUMERIC, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION cultural_update_confidence_scores(INTEGER, NUMERIC, NUMERIC, NUMERIC) TO service_role;
+GRANT EXECUTE ON FUNCTION cultural_age_patterns(INTEGER, NUMERIC) TO service_role;
+GRANT EXECUTE ON FUNCTION cultural_intelligence_insights(INTEGER, INTEGER) TO service_role;
+
+-- Make the new functions visible to PostgREST immediately
+NOTIFY pgrst, 'reload schema';
+
+COMMIT;
@@ -0,0 +1,42 @@
+-- =====================================================
+-- CULTURAL INTELLIGENCE - PER-STAGE PROCESSING VERSIONS
+-- =====================================================
+-- Run this in Supabase SQL Editor or pgAdmin before deploying the
+-- stage-aware scanner (processing_stages.py).
+--
+-- stage_versions records which version of each stage produced a track:
+--   {"hash": "v1:sha256", "tags": "v1", "analysis": "v1", "classification": "v1.8"}
+-- A processing_version bump then only reruns classification, reusing the
+-- stored hashes and raw_metadata. file_mtime lets the scanner tell an
+-- unchanged file from a modified one without reading it.
+
+BEGIN;
+
+ALTER TABLE cultural_tracks ADD COLUMN IF NOT EXISTS stage_versions JSONB;
+ALTER TABLE cultural_tracks ADD COLUMN IF NOT EXISTS file_mtime DOUBLE PRECISION;
+
+-- Existing rows: hashing, tags and analysis are the v1 code; classification is processing_version
+UPDATE cultural_tracks
+SET stage_versions = jsonb_build_object(
+        'hash', 'v1:' || CASE WHEN content_hash IS NOT NULL THEN COALESCE(hash_algo, 'sha256') ELSE 'sha256' END,
+        'tags', 'v1',
+        'analysis', 'v1',
+        'classification', processing_version
+    )
+WHERE stage_versions IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_cultural_tracks_path ON cultural_tracks(file_path);
+
+COMMENT ON COLUMN cultural_tracks.stage_versions IS 'Version of each processing stage (hash, tags, analysis, classification, fingerprint) that produced this row';
+COMMENT ON COLUMN cultural_tracks.file_mtime IS 'File mtime (epoch seconds) when the row was last hashed';
+
+-- Rescan planning: how many tracks each stage still has to rerun
+CREATE OR REPLACE VIEW cultural_stage_versions_summary AS
+SELECT stage, version, COUNT(*) AS tracks
+FROM cultural_tracks, jsonb_each_text(stage_versions) AS s(stage, version)
+GROUP BY stage, version
+ORDER BY stage, version;
+
+NOTIFY pgrst, 'reload schema';
+
+COMMIT;
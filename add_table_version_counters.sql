@@ -0,0 +1,52 @@
+-- =====================================================
+-- CULTURAL INTELLIGENCE - TABLE VERSION COUNTERS
+-- =====================================================
+-- Run this in Supabase SQL Editor or pgAdmin.
+-- Keeps one monotonically increasing version per table, bumped by a
+-- statement-level trigger on every INSERT/UPDATE/DELETE/TRUNCATE.
+-- The listing endpoints in webhook_training_api.py poll this tiny table
+-- (one request for all tables) and derive strong ETags from it, so an
+-- unchanged dashboard refresh is answered with 304 Not Modified without
+-- reading the data tables.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS cultural_table_versions (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    changed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION cultural_bump_table_version() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO cultural_table_versions (table_name, version, changed_at)
+    VALUES (TG_TABLE_NAME, 1, NOW())
+    ON CONFLICT (table_name)
+    DO UPDATE SET version = cultural_table_versions.version + 1, changed_at = NOW();
+    RETURN NULL;
+END;
+$$;
+
+DO $$
+DECLARE
+    tbl TEXT;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['cultural_tracks', 'cultural_classifications',
+                               'cultural_artist_profiles', 'cultural_label_profiles',
+                               'cultural_patterns']
+    LOOP
+        INSERT INTO cultural_table_versions (table_name) VALUES (tbl) ON CONFLICT DO NOTHING;
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%1$s_version ON %1$I', tbl);
+        EXECUTE format('CREATE TRIGGER trg_%1$s_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %1$I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION cultural_bump_table_version()', tbl);
+    END LOOP;
+END;
+$$;
+
+COMMENT ON TABLE cultural_table_versions IS 'Per-table change counters used for API ETags';
+
+NOTIFY pgrst, 'reload schema';
+
+COMMIT;
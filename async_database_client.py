@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Async Cultural Intelligence Database Client
+Non-blocking access to the cultural_ tables for the ASGI MetaCrate service.
+
+Uses httpx.AsyncClient with a pooled keep-alive connection when httpx is
+installed; otherwise each call runs the synchronous CulturalDatabaseClient
+on a worker thread so the event loop is never blocked.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from cultural_database_client import CONTENT_HASH_COLUMNS, CulturalDatabaseClient
+from metrics import time_db_call
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCulturalDatabaseClient:
+    """Async counterpart of the CulturalDatabaseClient read paths used by the MetaCrate APIs."""
+
+    def __init__(self, config_file: str = "taxonomy_config.json", timeout: float = 10.0,
+                 max_connections: int = 50):
+        self.sync_client = CulturalDatabaseClient(config_file)
+        self.base_url = self.sync_client.base_url
+        self._client = None
+        if HTTPX_AVAILABLE:
+            self._client = httpx.AsyncClient(
+                headers=self.sync_client.headers,
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            )
+        else:
+            logger.warning("httpx not installed - async DB calls will run on worker threads")
+
+    async def resolve_columns(self) -> bool:
+        """Probe optional cultural_tracks columns off the event loop (the probe is a blocking request)."""
+        return await asyncio.to_thread(self.sync_client.supports_content_hash)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def _get(self, endpoint: str, fallback, *args):
+        """GET a PostgREST endpoint, or run the sync fallback method off the event loop."""
+        if self._client is None:
+            return await asyncio.to_thread(fallback, *args)
+        with time_db_call('cultural_async', 'GET', endpoint):
+            response = await self._client.get(f"{self.base_url}/{endpoint}")
+            response.raise_for_status()
+        return response
+
+    async def get_tracks_by_hash(self, file_hash: str, columns: str = '*') -> List[Dict]:
+        """Every track sharing a hash (legacy or content hash)."""
+        try:
+            # Column support is resolved at startup; if that probe failed and its retry is due,
+            # it runs again on a worker thread so the event loop never waits on it
+            if not self.sync_client.column_support_known('cultural_tracks', CONTENT_HASH_COLUMNS):
+                await self.resolve_columns()
+            select = self.sync_client.track_columns(columns)
+            response = await self._get(f'cultural_tracks?select={select}&{self.sync_client._hash_filter(file_hash)}',
+                                       self.sync_client.get_tracks_by_hash, file_hash, columns)
+            return response if isinstance(response, list) else response.json()
+        except Exception as e:
+            logger.error(f"Error getting tracks by hash: {e}")
+            return []
+
+    async def get_classifications_by_track_id(self, track_id: int) -> List[Dict]:
+        """Classifications for one track."""
+        try:
+            response = await self._get(f'cultural_classifications?track_id=eq.{track_id}',
+                                       self.sync_client.get_classifications_by_track_id, track_id)
+            return response if isinstance(response, list) else response.json()
+        except Exception as e:
+            logger.error(f"Error getting classifications for track {track_id}: {e}")
+            return []
+
+    async def get_all_patterns(self) -> List[Dict]:
+        """All learned patterns."""
+        try:
+            response = await self._get('cultural_patterns', self.sync_client.get_all_patterns)
+            return response if isinstance(response, list) else response.json()
+        except Exception as e:
+            logger.error(f"Error getting all patterns: {e}")
+            return []
+
+    async def count_discovered_tracks(self) -> Optional[int]:
+        """Row count from the Content-Range header (no rows transferred)."""
+        if self._client is None:
+            return await asyncio.to_thread(self.sync_client.count_discovered_tracks)
+        try:
+            response = await self._client.get(f"{self.base_url}/cultural_tracks?select=id&limit=1",
+                                              headers={'Prefer': 'count=exact'})
+            response.raise_for_status()
+            count_header = response.headers.get('Content-Range', '0')
+            return int(count_header.split('/')[-1]) if '/' in count_header else 0
+        except Exception as e:
+            logger.error(f"Error counting tracks: {e}")
+            return None
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+BATCH STREAMING
+===============
+Shared fan-out and NDJSON helpers for the MetaCrate batch endpoints.
+
+- A process-wide worker pool does the hashing and tag parsing
+- Each request keeps at most max_in_flight files in the pool, so one big
+  crate cannot starve other callers
+- Results are yielded as each file finishes and written one JSON object
+  per line (application/x-ndjson), ending with a summary line
+- Large batches are paginated server-side with offset / limit
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Tuple
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+DEFAULT_WORKERS = 16
+DEFAULT_MAX_IN_FLIGHT = 8
+MAX_PAGE_SIZE = 5000
+
+_executor = None
+
+
+def get_executor(max_workers: int = DEFAULT_WORKERS) -> ThreadPoolExecutor:
+    """Process-wide pool shared by every batch request."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch')
+    return _executor
+
+
+def paginate(items: List, offset: int = 0, limit: int = MAX_PAGE_SIZE) -> Tuple[List, Dict]:
+    """Slice one page of a batch. Returns (page, pagination info with next_offset or None)."""
+    offset = max(0, int(offset or 0))
+    limit = max(1, min(int(limit or MAX_PAGE_SIZE), MAX_PAGE_SIZE))
+    page = items[offset:offset + limit]
+    next_offset = offset + len(page)
+    return page, {
+        'offset': offset,
+        'limit': limit,
+        'total': len(items),
+        'returned': len(page),
+        'next_offset': next_offset if next_offset < len(items) else None
+    }
+
+
+def iter_concurrent(func: Callable[[Any], Any], items: Iterable,
+                    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                    executor: ThreadPoolExecutor = None) -> Iterator[Tuple[Any, Any]]:
+    """Run func over items on the shared pool, yielding (item, result) in completion order.
+
+    Exceptions are yielded as the result so one bad file never aborts the batch.
+    """
+    executor = executor or get_executor()
+    items = iter(items)
+    in_flight = {}
+
+    def fill():
+        while len(in_flight) < max_in_flight:
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            in_flight[executor.submit(func, item)] = item
+
+    fill()
+    try:
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                yield item, result
+            fill()
+    finally:
+        # Client went away: drop queued work for this request
+        for future in in_flight:
+            future.cancel()
+
+
+async def aiter_concurrent(func: Callable[[Any], Awaitable[Any]], items: Iterable,
+                           max_in_flight: int = DEFAULT_MAX_IN_FLIGHT) -> AsyncIterator[Tuple[Any, Any]]:
+    """Async counterpart of iter_concurrent() for coroutine functions."""
+    items = iter(items)
+    in_flight = {}
+
+    def fill():
+        while len(in_flight) < max_in_flight:
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            in_flight[asyncio.ensure_future(func(item))] = item
+
+    fill()
+    try:
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                item = in_flight.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    result = e
+                yield item, result
+            fill()
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+
+def _ndjson_line(record: Dict) -> str:
+    return json.dumps(record, default=str) + '\n'
+
+
+def _summary_record(count: int, errors: int, start_time: float, summary: Dict = None) -> Dict:
+    return {
+        'type': 'summary',
+        'status': 'success',
+        'processed': count,
+        'errors': errors,
+        'elapsed_ms': int((time.time() - start_time) * 1000),
+        'timestamp': datetime.now().isoformat(),
+        **(summary or {})
+    }
+
+
+def ndjson_stream(results: Iterator[Tuple[Any, Any]], to_record: Callable[[Any, Any], Dict],
+                  summary: Dict = None) -> Iterator[str]:
+    """Serialize (item, result) pairs as NDJSON lines, then a final summary line."""
+    start_time = time.time()
+    count = errors = 0
+    for item, result in results:
+        record = to_record(item, result)
+        count += 1
+        if record.get('status') == 'error':
+            errors += 1
+        yield _ndjson_line(record)
+    yield _ndjson_line(_summary_record(count, errors, start_time, summary))
+
+
+async def andjson_stream(results: AsyncIterator[Tuple[Any, Any]], to_record: Callable[[Any, Any], Dict],
+                         summary: Dict = None) -> AsyncIterator[str]:
+    """Async counterpart of ndjson_stream()."""
+    start_time = time.time()
+    count = errors = 0
+    async for item, result in results:
+        record = to_record(item, result)
+        count += 1
+        if record.get('status') == 'error':
+            errors += 1
+        yield _ndjson_line(record)
+    yield _ndjson_line(_summary_record(count, errors, start_time, summary))
+
+
+def clamp_concurrency(requested, default: int = DEFAULT_MAX_IN_FLIGHT, ceiling: int = DEFAULT_WORKERS) -> int:
+    """Per-request concurrency from the request body, bounded by the pool size."""
+    try:
+        return max(1, min(int(requested), ceiling))
+    except (TypeError, ValueError):
+        return default
@@ -14,6 +14,7 @@ import threading
 from datetime import datetime, timedelta
 from cultural_database_client import CulturalDatabaseClient
 import logging
+from metrics import instrument_flask
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +24,7 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'cultural_intelligence_2025'
 socketio = SocketIO(app, cors_allowed_origins="*")
+instrument_flask(app, 'cultural_dashboard')
 
 # Initialize database client
 db_client = CulturalDatabaseClient()
@@ -7,11 +7,24 @@ Works with existing cultural_ tables in MetaCrate database
 import requests
 import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Any
-from datetime import datetime
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import local_intelligence_functions
+from metrics import time_db_call
 
 logger = logging.getLogger(__name__)
 
+# Columns added by add_hash_algo_columns.sql; older databases only have file_hash
+CONTENT_HASH_COLUMNS = ('content_hash', 'hash_algo')
+# Columns added by add_stage_versions.sql
+STAGE_COLUMNS = ('stage_versions', 'file_mtime')
+# A failed column probe (database unreachable) is retried after this long
+COLUMN_PROBE_RETRY_SECONDS = 30.0
+
 class CulturalDatabaseClient:
     """Database client adapted for existing cultural_ tables."""
     
@@ -25,6 +38,14 @@ class CulturalDatabaseClient:
             "Content-Type": "application/json",
             "Prefer": "return=representation"
         }
+        # Offline mode runs server-side functions against a local SQLite database
+        offline_config = self.config.get('offline', {})
+        self.offline = offline_config.get('enabled', False)
+        self.offline_db_path = offline_config.get('db_path', local_intelligence_functions.OFFLINE_DB_PATH)
+        # (table, columns) -> whether the database has them, probed once per client
+        self._column_support: Dict[tuple, bool] = {}
+        # (table, columns) -> time before which a failed probe is not retried
+        self._column_probe_retry: Dict[tuple, float] = {}
         
     def _load_config(self, config_file: str) -> Dict:
         """Load configuration from JSON file."""
@@ -36,8 +57,9 @@ class CulturalDatabaseClient:
         url = f"{self.base_url}/{endpoint}"
         
         try:
-            response = requests.request(method, url, headers=self.headers, **kwargs)
-            response.raise_for_status()
+            with time_db_call('cultural', method, endpoint):
+                response = requests.request(method, url, headers=self.headers, **kwargs)
+                response.raise_for_status()
             return response
         except requests.exceptions.RequestException as e:
             logger.error(f"Supabase API error: {e}")
@@ -45,16 +67,139 @@ class CulturalDatabaseClient:
                 logger.error(f"Response: {e.response.text}")
             raise
             
+    def has_columns(self, table: str, columns: tuple) -> bool:
+        """True if a table has every column, so optional migrations can be detected at runtime.
+
+        PostgREST answers 400 when a select names a missing column; that answer is cached.
+        While the database is unreachable (timeout, connection error, 5xx) the answer is False
+        and the probe is not retried for COLUMN_PROBE_RETRY_SECONDS.
+        """
+        key = (table, tuple(columns))
+        if key not in self._column_support:
+            if time.time() < self._column_probe_retry.get(key, 0):
+                return False
+            try:
+                with time_db_call('cultural', 'GET', table):
+                    response = requests.request('GET', f"{self.base_url}/{table}", headers=self.headers,
+                                                params={'select': ','.join(columns), 'limit': 0}, timeout=10)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Could not check {table} columns {', '.join(columns)}: {e}")
+                self._column_probe_retry[key] = time.time() + COLUMN_PROBE_RETRY_SECONDS
+                return False
+            if response.status_code not in (200, 206, 400):
+                self._column_probe_retry[key] = time.time() + COLUMN_PROBE_RETRY_SECONDS
+                return False
+            self._column_support[key] = response.status_code != 400
+            if response.status_code == 400:
+                logger.warning(f"{table} has no {', '.join(columns)} column(s) - run the matching migration to enable them")
+        return self._column_support[key]
+
+    def column_support_known(self, table: str, columns: tuple) -> bool:
+        """True if has_columns() would answer without a request (async callers check this first)."""
+        key = (table, tuple(columns))
+        return key in self._column_support or time.time() < self._column_probe_retry.get(key, 0)
+
+    def supports_content_hash(self) -> bool:
+        """True once add_hash_algo_columns.sql has added content_hash / hash_algo."""
+        return self.has_columns('cultural_tracks', CONTENT_HASH_COLUMNS)
+
+    def supports_stage_versions(self) -> bool:
+        """True once add_stage_versions.sql has added stage_versions / file_mtime."""
+        return self.has_columns('cultural_tracks', STAGE_COLUMNS)
+
+    def _supported_track_fields(self, row: Dict) -> Dict:
+        """A cultural_tracks write without the fields of migrations the database has not run."""
+        missing = set()
+        if not self.supports_content_hash():
+            missing.update(CONTENT_HASH_COLUMNS)
+        if not self.supports_stage_versions():
+            missing.update(STAGE_COLUMNS)
+        return {key: value for key, value in row.items() if key not in missing}
+
+    def track_columns(self, columns: str) -> str:
+        """A cultural_tracks select list without the content-hash columns the database lacks."""
+        if columns == '*' or self.supports_content_hash():
+            return columns
+        return ','.join(c for c in columns.split(',') if c not in CONTENT_HASH_COLUMNS)
+
+    # ================================
+    # SERVER-SIDE FUNCTIONS (PostgREST /rpc/)
+    # ================================
+    
+    def call_rpc(self, function_name: str, params: Dict = None) -> Any:
+        """Call a Postgres function through PostgREST (or its SQLite equivalent when offline)."""
+        if self.offline:
+            conn = local_intelligence_functions.connect(self.offline_db_path)
+            try:
+                return local_intelligence_functions.call_local_rpc(conn, function_name, params)
+            finally:
+                conn.close()
+        
+        response = self._make_request('POST', f'rpc/{function_name}', json=params or {})
+        return response.json()
+        
+    def learn_patterns_from_recent(self, window_minutes: int = 20, min_confidence: float = 0.7,
+                                   min_occurrences: int = 1) -> int:
+        """Learn artist/metadata patterns from recent classifications in one round trip."""
+        try:
+            return self.call_rpc('cultural_learn_patterns', {
+                'window_minutes': window_minutes,
+                'min_confidence': min_confidence,
+                'min_occurrences': min_occurrences
+            }) or 0
+        except Exception as e:
+            logger.error(f"Error learning patterns: {e}")
+            return 0
+            
+    def update_confidence_scores(self, window_minutes: int = 20, min_pattern_confidence: float = 0.8,
+                                 genre_boost: float = 1.1, overall_boost: float = 1.05) -> int:
+        """Boost recent classifications that match strong patterns. Returns rows updated."""
+        try:
+            return self.call_rpc('cultural_update_confidence_scores', {
+                'window_minutes': window_minutes,
+                'min_pattern_confidence': min_pattern_confidence,
+                'genre_boost': genre_boost,
+                'overall_boost': overall_boost
+            }) or 0
+        except Exception as e:
+            logger.error(f"Error updating confidence scores: {e}")
+            return 0
+            
+    def age_patterns(self, stale_hours: int = 24, decay: float = 0.99) -> int:
+        """Decay confidence of patterns that have not been reinforced recently."""
+        try:
+            return self.call_rpc('cultural_age_patterns', {'stale_hours': stale_hours, 'decay': decay}) or 0
+        except Exception as e:
+            logger.error(f"Error aging patterns: {e}")
+            return 0
+            
+    def get_intelligence_insights(self, window_minutes: int = 20, top_n: int = 5) -> Dict:
+        """Genre mix, top artists and review backlog for recent classifications."""
+        try:
+            return self.call_rpc('cultural_intelligence_insights', {
+                'window_minutes': window_minutes,
+                'top_n': top_n
+            }) or {}
+        except Exception as e:
+            logger.error(f"Error getting intelligence insights: {e}")
+            return {}
+            
     # ================================
     # DISCOVERED TRACKS (cultural_tracks)
     # ================================
     
+    def _hash_filter(self, file_hash: str) -> str:
+        """Match either the legacy SHA-256 column or the configured content hash."""
+        if not self.supports_content_hash():
+            return f'file_hash=eq.{file_hash}'
+        return f'or=(file_hash.eq.{file_hash},content_hash.eq.{file_hash})'
+    
 
     def create_discovered_track(self, track_data: Dict, session_id: str = None) -> Optional[int]:
         """Create new discovered track record with optional session tracking and version update."""
         try:
             # Use correct version
-            version = 'v1.8'
+            version = track_data.get('processing_version') or 'v1.8'
             file_path = track_data['file_path']
             file_hash = track_data['file_hash']
             # Check if already exists
@@ -64,6 +209,9 @@ class CulturalDatabaseClient:
                 if existing.get('processing_version') == version:
                     logger.info(f"SKIP: {file_path} already scanned with version {version}")
                     return None
+                # Backfill the configured content hash during the dual-hash transition
+                if track_data.get('content_hash') and not existing.get('content_hash') and self.supports_content_hash():
+                    self.backfill_content_hash(existing['id'], track_data['content_hash'], track_data.get('hash_algo'))
                 # If version differs, re-scan and update
                 logger.info(f"RESCAN: {file_path} was scanned with {existing.get('processing_version')}, rescanning with {version}")
                 # Do NOT return here; allow full scan and update below
@@ -79,6 +227,13 @@ class CulturalDatabaseClient:
                 'file_extension': track_data['file_extension'],
                 'processing_version': version
             }
+            if track_data.get('content_hash') and self.supports_content_hash():
+                cultural_track['content_hash'] = track_data['content_hash']
+                cultural_track['hash_algo'] = track_data.get('hash_algo', 'sha256')
+            # Per-stage version stamps (add_stage_versions.sql; unstamped rows are inferred from processing_version)
+            if track_data.get('stage_versions') and self.supports_stage_versions():
+                cultural_track['stage_versions'] = track_data['stage_versions']
+                cultural_track['file_mtime'] = track_data.get('file_mtime')
             if session_id:
                 cultural_track['scan_session_id'] = session_id
             response = self._make_request('POST', 'cultural_tracks', json=cultural_track)
@@ -93,7 +248,7 @@ class CulturalDatabaseClient:
     def get_track_by_hash(self, file_hash: str, exclude_session: str = None) -> Optional[Dict]:
         """Get track by file hash, optionally excluding tracks from current session."""
         try:
-            response = self._make_request('GET', f'cultural_tracks?file_hash=eq.{file_hash}')
+            response = self._make_request('GET', f'cultural_tracks?{self._hash_filter(file_hash)}')
             result = response.json()
             if result and exclude_session:
                 # Filter out tracks from current scan session to prevent self-identification as duplicate
@@ -104,10 +259,40 @@ class CulturalDatabaseClient:
             logger.error(f"Error getting track by hash: {e}")
             return None
     
+    def get_track_by_path(self, file_path: str) -> Optional[Dict]:
+        """Get the track row stored for a file path (stage planning needs no file read)."""
+        try:
+            response = self._make_request('GET', 'cultural_tracks',
+                                          params={'file_path': f'eq.{file_path}', 'limit': 1})
+            result = response.json()
+            return result[0] if result else None
+        except Exception as e:
+            logger.error(f"Error getting track by path: {e}")
+            return None
+    
+    def update_track_stages(self, track_id: int, updates: Dict) -> bool:
+        """Write the outputs and version stamps of the stages rerun on an existing track."""
+        try:
+            self._make_request('PATCH', f'cultural_tracks?id=eq.{track_id}', json=self._supported_track_fields(updates))
+            return True
+        except Exception as e:
+            logger.error(f"Error updating stages for track {track_id}: {e}")
+            return False
+    
+    def backfill_content_hash(self, track_id: int, content_hash: str, hash_algo: str) -> bool:
+        """Store the configured content hash on a row that only has SHA-256."""
+        try:
+            self._make_request('PATCH', f'cultural_tracks?id=eq.{track_id}',
+                               json={'content_hash': content_hash, 'hash_algo': hash_algo})
+            return True
+        except Exception as e:
+            logger.error(f"Error backfilling content hash for track {track_id}: {e}")
+            return False
+    
     def get_track_by_hash_and_version(self, file_hash: str, version: str, exclude_session: str = None) -> Optional[Dict]:
         """Get track by file hash and processing version, optionally excluding tracks from current session."""
         try:
-            response = self._make_request('GET', f'cultural_tracks?file_hash=eq.{file_hash}&processing_version=eq.{version}')
+            response = self._make_request('GET', f'cultural_tracks?{self._hash_filter(file_hash)}&processing_version=eq.{version}')
             result = response.json()
             if result and exclude_session:
                 # Filter out tracks from current scan session to prevent self-identification as duplicate
@@ -121,7 +306,7 @@ class CulturalDatabaseClient:
     def check_for_duplicate(self, file_path: str, file_hash: str, exclude_session: str = None) -> Optional[Dict]:
         """Check if file is a duplicate by comparing path AND hash - same file is NOT a duplicate."""
         try:
-            response = self._make_request('GET', f'cultural_tracks?file_hash=eq.{file_hash}')
+            response = self._make_request('GET', f'cultural_tracks?{self._hash_filter(file_hash)}')
             result = response.json()
             
             if not result:
@@ -160,7 +345,74 @@ class CulturalDatabaseClient:
     def get_all_tracks(self) -> List[Dict]:
         """Alias for get_all_discovered_tracks - compatibility method."""
         return self.get_all_discovered_tracks()
-            
+
+    def get_tracks_by_hash(self, file_hash: str, columns: str = '*') -> List[Dict]:
+        """Get every track sharing a hash (legacy or content hash) - one targeted query."""
+        try:
+            response = self._make_request(
+                'GET', f'cultural_tracks?select={self.track_columns(columns)}&{self._hash_filter(file_hash)}')
+            return response.json()
+        except Exception as e:
+            logger.error(f"Error getting tracks by hash: {e}")
+            return []
+    
+    def get_tracks_page(self, after_id: int = 0, limit: int = 1000, columns: str = '*',
+                        processed_since: str = None) -> List[Dict]:
+        """Keyset-paginated tracks ordered by id, optionally only rows processed after a timestamp."""
+        endpoint = f'cultural_tracks?select={self.track_columns(columns)}&id=gt.{after_id}&order=id.asc&limit={limit}'
+        if processed_since:
+            endpoint += f'&processed_at=gt.{quote(processed_since)}'
+        response = self._make_request('GET', endpoint)
+        return response.json()
+            
+    def get_table_page(self, table: str, after_id: int = 0, limit: int = 100,
+                       columns: str = '*') -> List[Dict]:
+        """Keyset-paginated rows of any cultural_ table ordered by id (raises on error)."""
+        response = self._make_request(
+            'GET', f'{table}?select={columns}&id=gt.{int(after_id)}&order=id.asc&limit={int(limit)}')
+        return response.json()
+
+    def count_rows(self, table: str, filters: str = None, estimated: bool = False) -> int:
+        """Row count from the Content-Range header of a HEAD request (no rows transferred).
+
+        estimated=True lets PostgREST use the planner estimate on large tables.
+        """
+        try:
+            headers = {**self.headers, 'Prefer': 'count=estimated' if estimated else 'count=exact'}
+            url = f"{self.base_url}/{table}?select=id" + (f"&{filters}" if filters else '')
+            with time_db_call('cultural', 'HEAD', table):
+                response = self._get_session().head(url, headers=headers)
+                response.raise_for_status()
+            count_header = response.headers.get('Content-Range', '0')
+            if '/' in count_header and not count_header.endswith('/*'):
+                return int(count_header.split('/')[-1])
+            return 0
+        except Exception as e:
+            logger.error(f"Error counting {table}: {e}")
+            return 0
+
+    def count_rows_many(self, queries: Dict[str, tuple]) -> Dict[str, int]:
+        """Run several counts in parallel. queries maps name -> (table, filters, estimated)."""
+        with ThreadPoolExecutor(max_workers=max(1, len(queries))) as executor:
+            futures = {name: executor.submit(self.count_rows, *query) for name, query in queries.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    def _get_session(self) -> requests.Session:
+        # Keep-alive session for cheap, frequent requests (counts polled by dashboards)
+        session = getattr(self, '_session', None)
+        if session is None:
+            session = self._session = requests.Session()
+        return session
+
+    def get_table_versions(self) -> Optional[Dict[str, int]]:
+        """Change counters from cultural_table_versions (add_table_version_counters.sql), or None if unavailable."""
+        try:
+            response = self._make_request('GET', 'cultural_table_versions?select=table_name,version')
+            return {row['table_name']: int(row['version']) for row in response.json()}
+        except Exception as e:
+            logger.error(f"Error getting table versions: {e}")
+            return None
+
     def count_discovered_tracks(self) -> int:
         """Count total discovered tracks."""
         try:
@@ -257,7 +509,9 @@ class CulturalDatabaseClient:
             }
             
             if existing:
-                # Update existing
+                # Update existing (restamp so incremental readers such as GenreStatsStore see the change;
+                # UTC, since it is compared with timestamptz watermarks)
+                classification['classified_at'] = datetime.now(timezone.utc).isoformat()
                 response = self._make_request('PATCH', f'cultural_classifications?id=eq.{existing[0]["id"]}', json=classification)
                 return existing[0]['id']
             else:
@@ -272,6 +526,15 @@ class CulturalDatabaseClient:
             logger.error(f"Error creating track classification: {e}")
             return None
             
+    def get_classifications_page(self, after_id: int = 0, limit: int = 1000, columns: str = '*',
+                                 classified_since: str = None) -> List[Dict]:
+        """Keyset-paginated classifications ordered by id, optionally only rows (re)classified after a timestamp."""
+        endpoint = f'cultural_classifications?select={columns}&id=gt.{after_id}&order=id.asc&limit={limit}'
+        if classified_since:
+            endpoint += f'&classified_at=gt.{quote(classified_since)}'
+        response = self._make_request('GET', endpoint)
+        return response.json()
+            
     # ================================
     # PATTERNS (cultural_patterns)
     # ================================
@@ -355,6 +618,21 @@ class CulturalDatabaseClient:
         except Exception as e:
             logger.error(f"Error getting all patterns: {e}")
             return []
+    
+    def get_patterns_version(self) -> Optional[str]:
+        """Cheap change marker for cultural_patterns: row count plus latest last_updated (one row transferred)."""
+        try:
+            headers = {**self.headers, 'Prefer': 'count=exact'}
+            response = requests.get(
+                f"{self.base_url}/cultural_patterns?select=last_updated&order=last_updated.desc.nullslast&limit=1",
+                headers=headers)
+            response.raise_for_status()
+            rows = response.json()
+            count = response.headers.get('Content-Range', '0').split('/')[-1]
+            return f"{count}:{rows[0]['last_updated'] if rows else ''}"
+        except Exception as e:
+            logger.error(f"Error getting patterns version: {e}")
+            return None
             
     # ================================
     # ARTIST PROFILES (cultural_artist_profiles)
@@ -987,6 +1265,7 @@ class CulturalDatabaseClient:
             
             if existing:
                 # Update existing classification
+                classification_data['classified_at'] = datetime.now(timezone.utc).isoformat()
                 response = self._make_request('PATCH', f'cultural_classifications?id=eq.{existing[0]["id"]}', json=classification_data)
                 logger.info(f"Updated classification for track {track_id}: {genre}/{subgenre}")
             else:
@@ -10,7 +10,6 @@ and continuously learns patterns for improved accuracy.
 
 import os
 import sys
-import hashlib
 import json
 import re
 import time
@@ -34,6 +33,10 @@ except ImportError:
 
 # Database client
 from cultural_database_client import CulturalDatabaseClient as SupabaseClient
+from parallel_walker import ParallelDirectoryWalker
+from file_hashing import hash_file, identity_hashes
+from track_records import Analysis, Classification, TrackRecord, strip_nul
+from processing_stages import StagePlan, current_stage_versions, full_plan, plan_stages, stored_stage_versions
 
 # Configure logging
 logging.basicConfig(
@@ -87,12 +90,8 @@ class CulturalIntelligenceScanner:
             
     def calculate_file_hash(self, file_path: str) -> str:
         """Calculate SHA-256 hash of file for duplicate detection."""
-        hash_sha256 = hashlib.sha256()
         try:
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_sha256.update(chunk)
-            return hash_sha256.hexdigest()
+            return hash_file(file_path)
         except Exception as e:
             logger.error(f"Error calculating hash for {file_path}: {e}")
             return ""
@@ -318,37 +317,29 @@ class CulturalIntelligenceScanner:
             
     def classify_track(self, track_data: Dict) -> Dict[str, Any]:
         """Classify track using learned patterns and profiles."""
-        classification = {
-            'artist': None,
-            'track_name': None,
-            'remix_info': None,
-            'label': None,
-            'primary_genre': None,
-            'secondary_genre': None,
-            'subgenre': None,
-            'confidence_scores': {},
-            'sources': []
-        }
+        analysis = Analysis.from_analyses(
+            self.analyze_filename(track_data['filename']),
+            self.analyze_folder_structure(track_data['file_path'])
+        )
+        return self.classify(strip_nul(track_data.get('raw_metadata') or {}), analysis).to_dict()
         
-        # Get filename analysis
-        filename_analysis = self.analyze_filename(track_data['filename'])
-        folder_analysis = self.analyze_folder_structure(track_data['file_path'])
+    def classify(self, metadata: Dict, analysis: Analysis) -> Classification:
+        """Classify from a track's tags and its filename/folder analysis."""
+        classification = Classification()
+        scores = classification.confidence_scores
         
         # Extract from metadata first (most reliable)
-        if track_data.get('raw_metadata'):
-            metadata = track_data['raw_metadata']
+        if metadata:
             if metadata.get('artist'):
-                classification['artist'] = metadata['artist']
-                classification['confidence_scores']['artist'] = 0.95
-                classification['sources'].append('metadata_artist')
+                classification.artist = metadata['artist']
+                scores['artist'] = 0.95
+                classification.add_source('metadata_artist')
                 
             if metadata.get('title'):
-                classification['track_name'] = metadata['title']
+                classification.track_name = metadata['title']
                 
             if metadata.get('genre'):
-                classification['primary_genre'] = metadata['genre']
-                classification['confidence_scores']['genre'] = 0.85
-                classification['sources'].append('metadata_genre')
+                classification.set_genre(metadata['genre'], 0.85, 'metadata_genre')
                 
             if metadata.get('comment'):
                 # Look for label info in comments
@@ -356,187 +347,160 @@ class CulturalIntelligenceScanner:
                 labels = self.db.get_all_label_profiles()
                 for label in labels:
                     if label['normalized_name'] in comment:
-                        classification['label'] = label['name']
-                        classification['confidence_scores']['label'] = 0.75
-                        classification['sources'].append('metadata_comment')
+                        classification.label = label['name']
+                        scores['label'] = 0.75
+                        classification.add_source('metadata_comment')
                         break
                         
         # Fallback to filename analysis
-        if not classification['artist'] and filename_analysis['artist']:
-            classification['artist'] = filename_analysis['artist']
-            classification['confidence_scores']['artist'] = 0.70
-            classification['sources'].append('filename_artist')
+        if not classification.artist and analysis.filename_artist:
+            classification.artist = analysis.filename_artist
+            scores['artist'] = 0.70
+            classification.add_source('filename_artist')
             
-        if not classification['track_name'] and filename_analysis['title']:
-            classification['track_name'] = filename_analysis['title']
+        if not classification.track_name and analysis.filename_title:
+            classification.track_name = analysis.filename_title
             
-        if filename_analysis['remix']:
-            classification['remix_info'] = filename_analysis['remix']
+        if analysis.filename_remix:
+            classification.remix_info = analysis.filename_remix
             
         # Genre classification from patterns
-        if not classification['primary_genre']:
+        if not classification.primary_genre:
             # Check folder patterns
-            for genre_hint in folder_analysis['genre_hints']:
+            for genre_hint in analysis.folder_genre_hints:
                 patterns = self.db.get_patterns('folder', genre_hint)
                 if patterns:
                     best_pattern = max(patterns, key=lambda p: p['confidence'])
-                    classification['primary_genre'] = best_pattern['genre']
-                    classification['confidence_scores']['genre'] = best_pattern['confidence']
-                    classification['sources'].append('folder_pattern')
+                    classification.set_genre(best_pattern['genre'], best_pattern['confidence'], 'folder_pattern')
                     break
                     
         # Artist profile lookup for additional context
-        if classification['artist']:
-            artist_profile = self.db.get_artist_profile(classification['artist'])
+        if classification.artist:
+            artist_profile = self.db.get_artist_profile(classification.artist)
             if artist_profile and artist_profile['confidence_score'] > 0.7:
-                if not classification['primary_genre'] and artist_profile['primary_genres']:
+                if not classification.primary_genre and artist_profile['primary_genres']:
                     # Use most likely genre from artist profile
                     genres = json.loads(artist_profile['primary_genres']) if isinstance(artist_profile['primary_genres'], str) else artist_profile['primary_genres']
                     if genres:
                         best_genre = max(genres.keys(), key=lambda g: genres[g])
-                        classification['primary_genre'] = best_genre
-                        classification['confidence_scores']['genre'] = genres[best_genre] * 0.8  # Slightly lower confidence
-                        classification['sources'].append('artist_profile')
+                        # Slightly lower confidence
+                        classification.set_genre(best_genre, genres[best_genre] * 0.8, 'artist_profile')
                         
         # Calculate overall confidence
-        if classification['confidence_scores']:
-            classification['overall_confidence'] = sum(classification['confidence_scores'].values()) / len(classification['confidence_scores'])
-        else:
-            classification['overall_confidence'] = 0.0
-            
-        return classification
+        return classification.finalize()
+        
+    def process_file(self, file_path: str, session_id: int, version: str = 'v1.8'):
+        """Process a single audio file, running only the stages that are out of date.
         
-    def process_file(self, file_path: str, session_id: int, version: str = 'v1.8') -> Optional[Dict]:
-        """Process a single audio file through the full pipeline."""
+        Returns the TrackRecord that was written, the existing track row if every
+        stage is already current, or None on failure.
+        """
         try:
             logger.info(f"Processing: {Path(file_path).name}")
             
-            # Check if file already processed with current version
-            file_hash = self.calculate_file_hash(file_path)
-            if not file_hash:
-                logger.warning(f"ERROR - Could not calculate hash for: {file_path}")
-                return None
-                
-            existing = self.db.get_track_by_hash_and_version(file_hash, version)
-            if existing:
+            # Plan from the stored row and a stat - no file read for unchanged files
+            stat = os.stat(file_path)
+            versions = current_stage_versions(version)
+            existing = self.db.get_track_by_path(file_path)
+            plan = plan_stages(existing, versions, stat.st_size, stat.st_mtime)
+            
+            hashes = None
+            if plan.needs_hash:
+                # (legacy SHA-256 and the configured content hash come from one read pass)
+                try:
+                    hashes = identity_hashes(file_path)
+                except Exception as e:
+                    logger.warning(f"ERROR - Could not calculate hash for: {file_path}: {e}")
+                    return None
+                if existing is None:
+                    # Same content already processed under another path
+                    existing = self.db.get_track_by_hash(hashes['file_hash'])
+                    if existing:
+                        plan = plan_stages(existing, versions, content_verified=True)
+                elif hashes['file_hash'] not in (existing.get('file_hash'), existing.get('content_hash')):
+                    plan = full_plan(versions, 'content changed')
+                        
+            if plan.is_noop:
                 logger.info(f"SKIPPED - Already processed with {version}: {Path(file_path).name}")
                 return existing
                 
-            # File stats
-            stat = os.stat(file_path)
-            file_size = stat.st_size
-            file_modified = datetime.fromtimestamp(stat.st_mtime)
-            
-            # Extract metadata
-            raw_metadata = self.extract_metadata(file_path)
-            
-            # Store discovered track
-            track_data = {
-                'file_path': file_path,
-                'file_hash': file_hash,
-                'file_size': file_size,
-                'file_modified': file_modified.isoformat(),
-                'filename': Path(file_path).name,
-                'folder_path': str(Path(file_path).parent),
-                'file_extension': Path(file_path).suffix.lower(),
-                'raw_metadata': raw_metadata,
-                'processing_status': 'discovered',
-                'processing_version': version
-            }
-            
-            # SANITIZE METADATA: Remove null bytes that PostgreSQL can't handle
-            def sanitize_data(data):
-                """Recursively remove null bytes from strings"""
-                if isinstance(data, str):
-                    return data.replace('\x00', '').replace('\u0000', '')
-                elif isinstance(data, dict):
-                    return {k: sanitize_data(v) for k, v in data.items()}
-                elif isinstance(data, list):
-                    return [sanitize_data(item) for item in data]
-                else:
-                    return data
-            
-            track_data = sanitize_data(track_data)
-            
-            # Insert into database
-            track_id = self.db.create_discovered_track(track_data)
-            if not track_id:
+            if existing is None:
+                track = self._discover_track(file_path, stat, hashes, version, plan)
+            else:
+                track = self._update_track(file_path, stat, hashes, version, plan, existing)
+            if track is None:
                 return None
                 
-            track_data['id'] = track_id
-            
-            # Analyze filename and folder structure
-            filename_analysis = self.analyze_filename(track_data['filename'])
-            folder_analysis = self.analyze_folder_structure(track_data['file_path'])
-            
-            # Store analysis
-            analysis_data = {
-                'track_id': track_id,
-                'filename_artist': filename_analysis.get('artist'),
-                'filename_track': filename_analysis.get('title'),
-                'filename_remix': filename_analysis.get('remix'),
-                'filename_genre_hints': filename_analysis.get('genre_hints', []),
-                'folder_genre_hints': folder_analysis.get('genre_hints', []),
-                'folder_depth': folder_analysis.get('depth'),
-                'folder_structure': folder_analysis.get('structure', []),
-                'metadata_artist': raw_metadata.get('artist'),
-                'metadata_title': raw_metadata.get('title'),
-                'metadata_album': raw_metadata.get('album'),
-                'metadata_genre': raw_metadata.get('genre'),
-                'metadata_comment': raw_metadata.get('comment'),
-                'metadata_year': raw_metadata.get('year'),
-                'metadata_bpm': raw_metadata.get('bpm'),
-                'metadata_duration': raw_metadata.get('duration')
-            }
-            
-            self.db.create_track_analysis(analysis_data)
-            
-            # Classify track
-            classification = self.classify_track(track_data)
-            
-            # Store classification
-            classification_data = {
-                'track_id': track_id,
-                'artist': classification.get('artist'),
-                'track_name': classification.get('track_name'),
-                'remix_info': classification.get('remix_info'),
-                'label': classification.get('label'),
-                'primary_genre': classification.get('primary_genre'),
-                'secondary_genre': classification.get('secondary_genre'),
-                'subgenre': classification.get('subgenre'),
-                'artist_confidence': classification['confidence_scores'].get('artist', 0.0),
-                'genre_confidence': classification['confidence_scores'].get('genre', 0.0),
-                'overall_confidence': classification.get('overall_confidence', 0.0),
-                'classification_sources': classification.get('sources', []),
-                'needs_review': classification.get('overall_confidence', 0.0) < 0.6
-            }
-            
-            self.db.create_track_classification(classification_data)
-            
-            # Learn patterns from successful classifications
-            if classification.get('primary_genre') and classification.get('overall_confidence', 0.0) > 0.7:
-                # Learn filename patterns
-                if filename_analysis.get('genre_hints'):
-                    for hint in filename_analysis['genre_hints']:
-                        self.learn_pattern('filename', hint, classification['primary_genre'], 0.8)
-                        
-                # Learn folder patterns  
-                if folder_analysis.get('genre_hints'):
-                    for hint in folder_analysis['genre_hints']:
-                        self.learn_pattern('folder', hint, classification['primary_genre'], 0.9)
-                        
-                # Learn metadata patterns
-                if raw_metadata.get('genre'):
-                    self.learn_pattern('metadata', raw_metadata['genre'], classification['primary_genre'], 0.85)
+            if plan.runs('analysis') or plan.runs('classification'):
+                # Filename/folder analysis is cheap and path-only, so the classifier recomputes it in memory
+                analysis = Analysis.from_analyses(
+                    self.analyze_filename(track.filename),
+                    self.analyze_folder_structure(track.file_path)
+                )
+                if plan.runs('analysis'):
+                    self.db.create_track_analysis(analysis.to_payload(track.id, track.raw_metadata))
+                if plan.runs('classification'):
+                    self._classify_and_learn(track, analysis)
                     
-            logger.info(f"Processed: {Path(file_path).name} -> {classification.get('artist', 'Unknown')} - {classification.get('primary_genre', 'Unknown')}")
-            return track_data
+            logger.info(f"Processed ({plan.reason}: {', '.join(sorted(plan.stages))}): {track.filename}")
+            return track
             
         except Exception as e:
             logger.error(f"Error processing file {file_path}: {e}")
             self.db.log_processing_error(session_id, f"Error processing {file_path}: {str(e)}")
             return None
             
+    def _discover_track(self, file_path: str, stat: os.stat_result, hashes: Dict, version: str,
+                        plan: StagePlan) -> Optional[TrackRecord]:
+        """Insert a new track with its hashes, tags and stage stamps"""
+        track = TrackRecord.from_path(file_path, hashes, stat=stat, raw_metadata=self.extract_metadata(file_path),
+                                      processing_version=version, stage_versions=plan.stamp())
+        track_id = self.db.create_discovered_track(track.to_payload())
+        if not track_id:
+            return None
+        track.id = track_id
+        return track
+        
+    def _update_track(self, file_path: str, stat: os.stat_result, hashes: Optional[Dict], version: str,
+                      plan: StagePlan, existing: Dict) -> Optional[TrackRecord]:
+        """Rerun hash/tags on an existing track as planned, reusing the stored values otherwise"""
+        if hashes is None:
+            hashes = {'file_hash': existing['file_hash'], 'content_hash': existing.get('content_hash'),
+                      'hash_algo': existing.get('hash_algo')}
+        raw_metadata = self.extract_metadata(file_path) if plan.runs('tags') else (existing.get('raw_metadata') or {})
+        track = TrackRecord.from_path(file_path, hashes, stat=stat, raw_metadata=raw_metadata,
+                                      processing_version=version,
+                                      stage_versions=plan.stamp(stored_stage_versions(existing)))
+        track.id = existing['id']
+        # A row matched by content under another path keeps its own size/mtime
+        same_path = existing.get('file_path') == file_path
+        if not self.db.update_track_stages(track.id, track.to_stage_update(plan.stages, include_stat=same_path)):
+            return None
+        return track
+        
+    def _classify_and_learn(self, track: TrackRecord, analysis: Analysis) -> Classification:
+        """Classify, store the classification and learn from confident results"""
+        raw_metadata = track.raw_metadata
+        classification = self.classify(raw_metadata, analysis)
+        self.db.create_track_classification(classification.to_payload(track.id))
+        
+        # Learn patterns from successful classifications
+        if classification.primary_genre and classification.overall_confidence > 0.7:
+            # Learn filename patterns
+            for hint in analysis.filename_genre_hints:
+                self.learn_pattern('filename', hint, classification.primary_genre, 0.8)
+                    
+            # Learn folder patterns  
+            for hint in analysis.folder_genre_hints:
+                self.learn_pattern('folder', hint, classification.primary_genre, 0.9)
+                    
+            # Learn metadata patterns
+            if raw_metadata.get('genre'):
+                self.learn_pattern('metadata', raw_metadata['genre'], classification.primary_genre, 0.85)
+                
+        logger.info(f"Classified: {track.filename} -> {classification.artist or 'Unknown'} - {classification.primary_genre or 'Unknown'}")
+        return classification
+            
     def scan_directory(self, directory: str) -> Dict[str, int]:
         """Scan directory for audio files and process them."""
         logger.info(f"Starting scan of directory: {directory}")
@@ -559,22 +523,24 @@ class CulturalIntelligenceScanner:
         start_time = time.time()
         
         try:
-            # Walk through all subdirectories
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    if Path(file).suffix.lower() in self.audio_extensions:
-                        stats['files_discovered'] += 1
-                        file_path = os.path.join(root, file)
-                        
-                        result = self.process_file(file_path, session_id, version='v1.8')
-                        if result:
-                            stats['files_processed'] += 1
-                        else:
-                            stats['errors'] += 1
-                            
-                        # Progress logging every 100 files
-                        if stats['files_discovered'] % 100 == 0:
-                            logger.info(f"Processed {stats['files_processed']}/{stats['files_discovered']} files")
+            # Walk all subdirectories in parallel, processing files as they stream in
+            walker = ParallelDirectoryWalker(
+                self.audio_extensions,
+                max_workers=self.config.get('scanning', {}).get('workers', 8),
+                include_stat=False
+            )
+            for file_path in walker.iter_files(directory):
+                stats['files_discovered'] += 1
+                
+                result = self.process_file(file_path, session_id, version='v1.8')
+                if result:
+                    stats['files_processed'] += 1
+                else:
+                    stats['errors'] += 1
+                    
+                # Progress logging every 100 files
+                if stats['files_discovered'] % 100 == 0:
+                    logger.info(f"Processed {stats['files_processed']}/{stats['files_discovered']} files")
                             
             # Detect duplicates
             logger.info("Detecting duplicates...")
@@ -19,7 +19,6 @@ import os
 import sys
 import json
 import time
-import sqlite3
 import hashlib
 from pathlib import Path
 from datetime import datetime, timedelta
@@ -27,6 +26,11 @@ from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, asdict
 from collections import defaultdict, Counter
 
+from notification_dispatcher import DASHBOARD_RATE, TWITCH_RATE, NotificationDispatcher
+from parallel_walker import ParallelDirectoryWalker
+from pattern_correlation import genre_cross_correlations, parse_pattern_key
+from scan_repository import ScanRepository
+
 # Import existing components
 try:
     from cultural_intelligence_scanner import CulturalIntelligenceScanner
@@ -163,20 +167,34 @@ class TwitchChatIntegration:
             self.ws.close()
             self.connected = False
 
-class VersionedScanDatabase:
+# Parameters: pattern_key, pattern_type, weight, session_id, version, learned_at
+PATTERN_ROLLUP_UPSERT = '''
+    INSERT INTO pattern_rollup
+    (pattern_key, pattern_type, first_weight, last_weight, min_weight, max_weight,
+     observations, changes, first_session, last_session, version, updated_at)
+    VALUES (?1, ?2, ?3, ?3, ?3, ?3, 1, 1, ?4, ?4, ?5, ?6)
+    ON CONFLICT(pattern_key) DO UPDATE SET
+        last_weight = excluded.last_weight,
+        min_weight = MIN(min_weight, excluded.last_weight),
+        max_weight = MAX(max_weight, excluded.last_weight),
+        observations = observations + 1,
+        changes = changes + (excluded.last_weight != last_weight),
+        last_session = excluded.last_session,
+        version = excluded.version,
+        updated_at = excluded.updated_at
+'''
+
+class VersionedScanDatabase(ScanRepository):
     """Database for tracking scan sessions and versions"""
     
     def __init__(self, db_path: str = "cultural_intelligence_v17.db"):
-        self.db_path = db_path
+        super().__init__(db_path)
         self.init_database()
         
     def init_database(self):
         """Initialize versioned scan database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # Scan sessions table
-        cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS scan_sessions (
                 session_id TEXT PRIMARY KEY,
                 version TEXT NOT NULL,
@@ -195,7 +213,7 @@ class VersionedScanDatabase:
         ''')
         
         # File processing history
-        cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS file_history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 file_path TEXT NOT NULL,
@@ -209,9 +227,10 @@ class VersionedScanDatabase:
                 FOREIGN KEY (session_id) REFERENCES scan_sessions (session_id)
             )
         ''')
+        self.ensure_file_history_index()
         
         # Pattern evolution tracking
-        cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS pattern_evolution (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 pattern_key TEXT NOT NULL,
@@ -225,8 +244,27 @@ class VersionedScanDatabase:
             )
         ''')
         
+        # Per-pattern rollup, maintained on every save_pattern_evolution
+        self.execute('''
+            CREATE TABLE IF NOT EXISTS pattern_rollup (
+                pattern_key TEXT PRIMARY KEY,
+                pattern_type TEXT NOT NULL,
+                first_weight REAL NOT NULL,
+                last_weight REAL NOT NULL,
+                min_weight REAL NOT NULL,
+                max_weight REAL NOT NULL,
+                observations INTEGER NOT NULL DEFAULT 1,
+                changes INTEGER NOT NULL DEFAULT 1,
+                first_session TEXT,
+                last_session TEXT,
+                version TEXT,
+                updated_at TEXT
+            )
+        ''')
+        self._backfill_pattern_rollup()
+        
         # Version upgrades log
-        cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS version_upgrades (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 from_version TEXT,
@@ -237,32 +275,20 @@ class VersionedScanDatabase:
             )
         ''')
         
-        conn.commit()
-        conn.close()
-        
     def create_scan_session(self, batch_number: int) -> str:
         """Create new scan session"""
         session_id = f"v{VERSION}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_batch{batch_number}"
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self.execute('''
             INSERT INTO scan_sessions 
             (session_id, version, batch_number, start_time, status)
             VALUES (?, ?, ?, ?, 'running')
         ''', (session_id, VERSION, batch_number, datetime.now().isoformat()))
         
-        conn.commit()
-        conn.close()
-        
         return session_id
         
     def update_scan_session(self, session_id: str, updates: Dict):
         """Update scan session with results"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         set_clauses = []
         values = []
         
@@ -275,42 +301,26 @@ class VersionedScanDatabase:
         values.append(session_id)
         
         query = f"UPDATE scan_sessions SET {', '.join(set_clauses)} WHERE session_id = ?"
-        cursor.execute(query, values)
-        
-        conn.commit()
-        conn.close()
+        self.execute(query, values)
         
     def mark_file_processed(self, file_path: str, file_hash: str, session_id: str, 
                           intelligence_score: float, classification_confidence: float,
                           patterns: List[str]):
-        """Mark file as processed with version tracking"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO file_history 
-            (file_path, file_hash, session_id, version, processed_at, 
-             intelligence_score, classification_confidence, patterns_detected)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (file_path, file_hash, session_id, VERSION, datetime.now().isoformat(),
-              intelligence_score, classification_confidence, json.dumps(patterns)))
-        
-        conn.commit()
-        conn.close()
+        """Mark file as processed with version tracking (written when the batch commits)"""
+        self.add_file_history(file_path, file_hash, session_id, VERSION,
+                              intelligence_score, classification_confidence, patterns)
         
     def get_processed_files(self, version: str = None) -> List[Dict]:
         """Get list of processed files, optionally filtered by version"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        self._flush_files()
         if version:
-            cursor.execute('''
+            cursor = self.execute('''
                 SELECT file_path, file_hash, version, processed_at, intelligence_score
                 FROM file_history WHERE version = ?
                 ORDER BY processed_at DESC
             ''', (version,))
         else:
-            cursor.execute('''
+            cursor = self.execute('''
                 SELECT file_path, file_hash, version, processed_at, intelligence_score
                 FROM file_history ORDER BY processed_at DESC
             ''')
@@ -325,25 +335,62 @@ class VersionedScanDatabase:
                 'intelligence_score': row[4]
             })
             
-        conn.close()
         return results
         
     def save_pattern_evolution(self, patterns: Dict, session_id: str):
-        """Save pattern weights for evolution tracking"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        """Save pattern weights for evolution tracking (history rows only for changed weights)"""
+        learned_at = datetime.now().isoformat()
+        rows = []
         for pattern_key, weight in patterns.items():
             pattern_type = pattern_key.split(':')[0] if ':' in pattern_key else 'unknown'
+            rows.append((pattern_key, pattern_type, weight, session_id, VERSION, learned_at))
             
-            cursor.execute('''
+        with self.batch():
+            # Delta-only history: skip weights equal to the pattern's last recorded value
+            self.conn.executemany('''
                 INSERT INTO pattern_evolution 
                 (pattern_key, pattern_type, weight_value, session_id, version, learned_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (pattern_key, pattern_type, weight, session_id, VERSION, datetime.now().isoformat()))
-            
-        conn.commit()
-        conn.close()
+                SELECT ?1, ?2, ?3, ?4, ?5, ?6
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM pattern_rollup WHERE pattern_key = ?1 AND last_weight = ?3
+                )
+            ''', rows)
+            self.conn.executemany(PATTERN_ROLLUP_UPSERT, rows)
+
+    def _backfill_pattern_rollup(self):
+        """Build the rollup once from pattern_evolution history recorded before it existed"""
+        if self.execute('SELECT 1 FROM pattern_rollup LIMIT 1').fetchone():
+            return
+        if not self.execute('SELECT 1 FROM pattern_evolution LIMIT 1').fetchone():
+            return
+        with self.batch():
+            # Replays history in order; the cursor streams, so memory stays flat
+            history = self.conn.execute('''
+                SELECT pattern_key, pattern_type, weight_value, session_id, version, learned_at
+                FROM pattern_evolution ORDER BY learned_at ASC, id ASC
+            ''')
+            self.conn.executemany(PATTERN_ROLLUP_UPSERT, history)
+        print("📈 Pattern rollup built from existing history")
+
+    def get_pattern_rollups(self) -> List[Dict]:
+        """Per-pattern first/last/min/max weight and observation count, in first-seen order"""
+        # Rows are inserted when a pattern is first saved (later saves update in place), so rowid
+        # order is the order patterns first appeared in the history
+        cursor = self.execute('''
+            SELECT pattern_key, pattern_type, first_weight, last_weight, min_weight, max_weight,
+                   observations, changes
+            FROM pattern_rollup ORDER BY rowid
+        ''')
+        return [{
+            'pattern_key': row[0],
+            'pattern_type': row[1],
+            'first_weight': row[2],
+            'last_weight': row[3],
+            'min_weight': row[4],
+            'max_weight': row[5],
+            'observations': row[6],
+            'changes': row[7]
+        } for row in cursor]
 
 class CulturalIntelligenceV17:
     """Enhanced Cultural Intelligence System v1.7 with batch processing and Twitch integration"""
@@ -366,6 +413,12 @@ class CulturalIntelligenceV17:
         self.dashboard_url = "http://172.22.17.37:8081"
         self.dashboard_running = self._check_dashboard_status()
         
+        # Twitch and dashboard messages are sent from a background thread, never inline
+        self.notifications = NotificationDispatcher()
+        if self.twitch:
+            self.notifications.register_channel('twitch', self.twitch.send_message, TWITCH_RATE)
+        self.notifications.register_channel('dashboard', self._post_to_dashboard, DASHBOARD_RATE)
+        
         # Pattern analysis
         self.accumulated_patterns = defaultdict(float)
         self.pattern_confidence = defaultdict(list)
@@ -385,34 +438,37 @@ class CulturalIntelligenceV17:
         if self.twitch:
             success = self.twitch.connect()
             if success:
-                self.twitch.send_message(f"🧠 Cultural Intelligence v{VERSION} is now online! Ready to analyze music collections.")
+                self.notify_twitch(f"🧠 Cultural Intelligence v{VERSION} is now online! Ready to analyze music collections.")
             return success
         return False
         
     def disconnect_twitch(self):
         """Disconnect from Twitch"""
         if self.twitch:
-            self.twitch.send_message(f"📊 Cultural Intelligence v{VERSION} scan complete. See you next time!")
+            self.notify_twitch(f"📊 Cultural Intelligence v{VERSION} scan complete. See you next time!")
+            # Give queued messages a chance to go out (rate limit permitting)
+            if not self.notifications.flush(timeout=15.0):
+                print(f"⚠️ Twitch messages still queued at disconnect: {self.notifications.get_stats()['pending']}")
             self.twitch.disconnect()
             
+    def notify_twitch(self, message: str, coalesce_key: str = None) -> bool:
+        """Queue a Twitch chat message; messages sharing a coalesce_key collapse into the latest"""
+        if not self.twitch:
+            return False
+        return self.notifications.notify('twitch', message, coalesce_key)
+            
     def get_unprocessed_files(self, music_directory: str) -> List[str]:
         """Get files that haven't been processed in current version"""
         
         # Get all audio files
         audio_extensions = {'.mp3', '.flac', '.wav', '.m4a', '.aac', '.ogg', '.wma'}
-        all_files = []
-        
-        music_path = Path(music_directory)
-        for file_path in music_path.rglob('*'):
-            if file_path.suffix.lower() in audio_extensions:
-                all_files.append(str(file_path))
-                
-        # Get already processed files
-        processed_files = self.db.get_processed_files(VERSION)
-        processed_paths = {f['file_path'] for f in processed_files}
+        # Stream files from the parallel walker through an indexed anti-join against file_history
+        walker = ParallelDirectoryWalker(audio_extensions, include_stat=False)
+        unprocessed = list(self.db.filter_unprocessed(walker.iter_files(music_directory), VERSION))
         
-        # Return unprocessed files
-        unprocessed = [f for f in all_files if f not in processed_paths]
+        walk_stats = walker.get_stats()
+        print(f"📁 Walked {walk_stats['directories']} directories "
+              f"({walk_stats['directories_per_second']:.1f} dirs/sec, {walk_stats['entries_per_second']:.1f} entries/sec)")
         
         return unprocessed
         
@@ -421,30 +477,11 @@ class CulturalIntelligenceV17:
         
         print("🔍 Analyzing accumulated pattern intelligence...")
         
-        # Load all historical patterns
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT pattern_key, pattern_type, weight_value, confidence_level, session_id, version
-            FROM pattern_evolution ORDER BY learned_at ASC
-        ''')
-        
-        pattern_history = []
-        for row in cursor.fetchall():
-            pattern_history.append({
-                'pattern_key': row[0],
-                'pattern_type': row[1],
-                'weight_value': row[2],
-                'confidence_level': row[3],
-                'session_id': row[4],
-                'version': row[5]
-            })
-            
-        conn.close()
+        # One indexed scan of the per-pattern rollup instead of replaying the history
+        rollups = self.db.get_pattern_rollups()
         
         analysis = {
-            'total_patterns': len(pattern_history),
+            'total_patterns': sum(r['observations'] for r in rollups),
             'pattern_evolution': {},
             'cross_correlations': {},
             'confidence_trends': {},
@@ -452,39 +489,24 @@ class CulturalIntelligenceV17:
             'predictive_weights': {}
         }
         
-        # Analyze pattern evolution over time
-        pattern_evolution = defaultdict(list)
-        for entry in pattern_history:
-            pattern_evolution[entry['pattern_key']].append({
-                'weight': entry['weight_value'],
-                'version': entry['version'],
-                'session': entry['session_id']
-            })
-            
         # Calculate growth rates and confidence trends
-        for pattern_key, evolution in pattern_evolution.items():
-            if len(evolution) > 1:
-                weights = [e['weight'] for e in evolution]
-                growth_rate = (weights[-1] - weights[0]) / len(weights)
-                analysis['pattern_evolution'][pattern_key] = {
+        for rollup in rollups:
+            if rollup['observations'] > 1:
+                growth_rate = (rollup['last_weight'] - rollup['first_weight']) / rollup['observations']
+                analysis['pattern_evolution'][rollup['pattern_key']] = {
                     'growth_rate': growth_rate,
-                    'current_weight': weights[-1],
-                    'stability': 1.0 - (max(weights) - min(weights)) / max(weights, 0.001),
-                    'sessions_reinforced': len(evolution)
+                    'current_weight': rollup['last_weight'],
+                    'stability': 1.0 - (rollup['max_weight'] - rollup['min_weight']) / max(rollup['max_weight'], 0.001),
+                    'sessions_reinforced': rollup['observations']
                 }
                 
-        # Identify cross-pattern correlations
-        filename_patterns = [p for p in pattern_evolution.keys() if p.startswith('filename:')]
-        folder_patterns = [p for p in pattern_evolution.keys() if p.startswith('folder:')]
-        
-        for fp in filename_patterns:
-            for fop in folder_patterns:
-                genre_fp = fp.split(':')[-1]
-                genre_fop = fop.split(':')[-1]
-                if genre_fp == genre_fop:
-                    correlation = min(pattern_evolution[fp][-1]['weight'], 
-                                    pattern_evolution[fop][-1]['weight'])
-                    analysis['cross_correlations'][f"{genre_fp}_combined"] = correlation
+        # Identify cross-pattern correlations (filename and folder patterns grouped by genre)
+        correlations = genre_cross_correlations({r['pattern_key']: r['last_weight'] for r in rollups})
+        # Reported in the first-seen order of each genre's filename pattern
+        for rollup in rollups:
+            key = parse_pattern_key(rollup['pattern_key'])
+            if key.source == 'filename' and key.genre in correlations:
+                analysis['cross_correlations'].setdefault(f"{key.genre}_combined", correlations[key.genre])
                     
         # Predict new pattern weights based on trends
         for pattern_key, evolution_data in analysis['pattern_evolution'].items():
@@ -504,7 +526,7 @@ class CulturalIntelligenceV17:
         print(f"📊 Session ID: {session_id}")
         
         if self.twitch:
-            self.twitch.send_message(
+            self.notify_twitch(
                 f"🔄 Starting Batch {batch_number}: Analyzing {len(files)} tracks with Cultural Intelligence v{VERSION}"
             )
             
@@ -515,55 +537,58 @@ class CulturalIntelligenceV17:
         patterns_learned = 0
         new_artists = set()
         
-        for i, file_path in enumerate(files, 1):
-            try:
-                # Progress reporting
-                if i % 50 == 0 or i == len(files):
-                    progress = (i / len(files)) * 100
-                    print(f"   📈 Batch {batch_number} Progress: {i}/{len(files)} ({progress:.1f}%)")
+        # One transaction for the whole batch: file history is written with executemany on commit
+        with self.db.batch():
+            for i, file_path in enumerate(files, 1):
+                try:
+                    # Progress reporting
+                    if i % 50 == 0 or i == len(files):
+                        progress = (i / len(files)) * 100
+                        print(f"   📈 Batch {batch_number} Progress: {i}/{len(files)} ({progress:.1f}%)")
                     
-                    if self.twitch and i % 100 == 0:  # Twitch updates every 100 files
-                        self.twitch.send_message(
-                            f"📈 Batch {batch_number}: {i}/{len(files)} files processed ({progress:.1f}%)"
-                        )
+                        if self.twitch and i % 100 == 0:  # Twitch updates every 100 files
+                            self.notify_twitch(
+                                f"📈 Batch {batch_number}: {i}/{len(files)} files processed ({progress:.1f}%)",
+                                coalesce_key='progress'
+                            )
                         
-                # Process single file
-                analysis = self.scanner.process_single_file(file_path)
+                    # Process single file
+                    analysis = self.scanner.process_single_file(file_path)
                 
-                if not analysis.get('error'):
-                    successful += 1
+                    if not analysis.get('error'):
+                        successful += 1
                     
-                    # Track new patterns
-                    filename_intelligence = analysis.get('filename_intelligence', {})
-                    folder_intelligence = analysis.get('folder_intelligence', {})
+                        # Track new patterns
+                        filename_intelligence = analysis.get('filename_intelligence', {})
+                        folder_intelligence = analysis.get('folder_intelligence', {})
                     
-                    patterns_detected = []
-                    patterns_detected.extend(filename_intelligence.get('genre_hints', []))
-                    patterns_detected.extend(folder_intelligence.get('genre_hints', []))
+                        patterns_detected = []
+                        patterns_detected.extend(filename_intelligence.get('genre_hints', []))
+                        patterns_detected.extend(folder_intelligence.get('genre_hints', []))
                     
-                    if patterns_detected:
-                        patterns_learned += len(patterns_detected)
+                        if patterns_detected:
+                            patterns_learned += len(patterns_detected)
                         
-                    # Track new artists
-                    artist_intelligence = analysis.get('artist_intelligence', {})
-                    if artist_intelligence.get('artist_name'):
-                        new_artists.add(artist_intelligence['artist_name'])
+                        # Track new artists
+                        artist_intelligence = analysis.get('artist_intelligence', {})
+                        if artist_intelligence.get('artist_name'):
+                            new_artists.add(artist_intelligence['artist_name'])
                         
-                    # Mark as processed
-                    file_hash = hashlib.sha256(str(file_path).encode()).hexdigest()
-                    intelligence_score = analysis.get('intelligence_summary', {}).get('overall_intelligence_score', 0.0)
-                    classification_confidence = analysis.get('intelligence_summary', {}).get('classification_confidence', 0.0)
+                        # Mark as processed
+                        file_hash = hashlib.sha256(str(file_path).encode()).hexdigest()
+                        intelligence_score = analysis.get('intelligence_summary', {}).get('overall_intelligence_score', 0.0)
+                        classification_confidence = analysis.get('intelligence_summary', {}).get('classification_confidence', 0.0)
                     
-                    self.db.mark_file_processed(
-                        file_path, file_hash, session_id, 
-                        intelligence_score, classification_confidence, patterns_detected
-                    )
+                        self.db.mark_file_processed(
+                            file_path, file_hash, session_id, 
+                            intelligence_score, classification_confidence, patterns_detected
+                        )
                     
-                results.append(analysis)
+                    results.append(analysis)
                 
-            except Exception as e:
-                print(f"   ❌ Error processing {Path(file_path).name}: {e}")
-                results.append({'file_path': file_path, 'error': str(e)})
+                except Exception as e:
+                    print(f"   ❌ Error processing {Path(file_path).name}: {e}")
+                    results.append({'file_path': file_path, 'error': str(e)})
                 
         # Calculate session metrics
         processing_time = time.time() - start_time
@@ -604,7 +629,7 @@ class CulturalIntelligenceV17:
         
         # Report to Twitch
         if self.twitch:
-            self.twitch.send_message(
+            self.notify_twitch(
                 f"✅ Batch {batch_number} Complete! Processed {successful}/{len(files)} files "
                 f"({success_rate:.1%} success) in {processing_time:.1f}s. "
                 f"Found {patterns_learned} new patterns, {len(new_artists)} new artists!"
@@ -632,7 +657,7 @@ class CulturalIntelligenceV17:
         if not unprocessed_files:
             print("✅ All files already processed in current version!")
             if self.twitch:
-                self.twitch.send_message(f"✅ Collection already fully analyzed with v{VERSION}!")
+                self.notify_twitch(f"✅ Collection already fully analyzed with v{VERSION}!")
                 self.disconnect_twitch()
             return []
             
@@ -641,7 +666,7 @@ class CulturalIntelligenceV17:
         print(f"📦 Will process in {total_batches} batches of {self.batch_size} files each")
         
         if self.twitch:
-            self.twitch.send_message(
+            self.notify_twitch(
                 f"🎵 Starting full scan: {len(unprocessed_files)} files in {total_batches} batches. "
                 f"Cultural Intelligence v{VERSION} is learning!"
             )
@@ -662,7 +687,7 @@ class CulturalIntelligenceV17:
                 pattern_analysis = self.analyze_accumulated_patterns()
                 if self.twitch:
                     total_patterns = pattern_analysis['total_patterns']
-                    self.twitch.send_message(
+                    self.notify_twitch(
                         f"🧠 Pattern Analysis: {total_patterns} total patterns learned! "
                         f"Intelligence is evolving..."
                     )
@@ -673,7 +698,7 @@ class CulturalIntelligenceV17:
         final_analysis = self.analyze_accumulated_patterns()
         
         if self.twitch:
-            self.twitch.send_message(
+            self.notify_twitch(
                 f"🎉 SCAN COMPLETE! Cultural Intelligence v{VERSION} has analyzed your entire collection. "
                 f"Total patterns learned: {final_analysis['total_patterns']}. "
                 f"Your music database is now supercharged! 🚀"
@@ -741,14 +766,17 @@ class CulturalIntelligenceV17:
             return False
             
     def send_to_dashboard(self, message_type: str, data: dict):
-        """Send updates to dashboard if available"""
+        """Queue an update for the dashboard if available (latest update per type wins)"""
         if not self.dashboard_running:
             return False
-            
+        return self.notifications.notify('dashboard', {'type': message_type, 'data': data},
+                                         coalesce_key=message_type)
+        
+    def _post_to_dashboard(self, update: dict) -> bool:
         try:
             import requests
             requests.post(f"{self.dashboard_url}/api/v17_update", 
-                         json={'type': message_type, 'data': data}, 
+                         json=update, 
                          timeout=1)
             return True
         except:
@@ -796,13 +824,13 @@ def main():
     except KeyboardInterrupt:
         print(f"\n⏹️ Scan interrupted by user")
         if system.twitch:
-            system.twitch.send_message("⏹️ Scan interrupted. Cultural Intelligence will resume later!")
+            system.notify_twitch("⏹️ Scan interrupted. Cultural Intelligence will resume later!")
             system.disconnect_twitch()
         
     except Exception as e:
         print(f"\n❌ Scan failed: {e}")
         if system.twitch:
-            system.twitch.send_message(f"❌ Scan encountered an error: {str(e)}")
+            system.notify_twitch(f"❌ Scan encountered an error: {str(e)}")
             system.disconnect_twitch()
 
 if __name__ == "__main__":
@@ -25,7 +25,6 @@ import os
 import sys
 import json
 import time
-import sqlite3
 import hashlib
 from pathlib import Path
 from datetime import datetime, timedelta
@@ -37,6 +36,10 @@ from collections import defaultdict, Counter
 from cultural_intelligence_scanner import CulturalIntelligenceScanner
 from cultural_database_client import CulturalDatabaseClient
 from comprehensive_intelligence_scan import ComprehensiveIntelligenceScan
+from notification_dispatcher import TWITCH_RATE, NotificationDispatcher
+from parallel_walker import ParallelDirectoryWalker
+from pattern_correlation import count_ratio, genre_cross_correlations, result_observations, source_genre_cooccurrence
+from scan_repository import ScanRepository
 
 # Twitch integration
 try:
@@ -157,20 +160,18 @@ class TwitchChatIntegration:
             print(f"❌ Twitch message failed: {e}")
             return False
 
-class EnhancedVersionDatabase:
+class EnhancedVersionDatabase(ScanRepository):
     """Enhanced database with full Cultural Intelligence history tracking"""
     
     def __init__(self, db_path: str = "cultural_intelligence_v17_enhanced.db"):
-        self.db_path = db_path
+        super().__init__(db_path)
         self.init_enhanced_database()
         
     def init_enhanced_database(self):
         """Initialize enhanced database with full intelligence tracking"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         
         # Enhanced scan sessions with full intelligence data
-        cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS enhanced_scan_sessions (
                 session_id TEXT PRIMARY KEY,
                 version TEXT NOT NULL,
@@ -193,7 +194,7 @@ class EnhancedVersionDatabase:
         ''')
         
         # Pattern evolution with exponential weight tracking
-        cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS pattern_evolution_enhanced (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 pattern_key TEXT NOT NULL,
@@ -211,7 +212,7 @@ class EnhancedVersionDatabase:
         ''')
         
         # Artist intelligence tracking
-        cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS artist_intelligence (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 artist_name TEXT NOT NULL,
@@ -226,7 +227,7 @@ class EnhancedVersionDatabase:
         ''')
         
         # File processing history (compatibility with existing system)
-        cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS file_history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 file_path TEXT NOT NULL,
@@ -239,9 +240,30 @@ class EnhancedVersionDatabase:
                 patterns_detected TEXT
             )
         ''')
+        self.ensure_file_history_index()
+
+    def create_session(self, session_id: str, batch_number: int):
+        """Record a batch session as running"""
+        self.execute('''
+            INSERT INTO enhanced_scan_sessions 
+            (session_id, version, batch_number, start_time, status)
+            VALUES (?, ?, ?, ?, 'running')
+        ''', (session_id, VERSION, batch_number, datetime.now().isoformat()))
         
-        conn.commit()
-        conn.close()
+    def complete_session(self, session: 'EnhancedScanSession', full_results: Dict):
+        """Save final metrics for a batch session"""
+        self.execute('''
+            UPDATE enhanced_scan_sessions SET 
+            end_time = ?, files_processed = ?, success_rate = ?, patterns_learned = ?,
+            pattern_weights = ?, artists_profiled = ?, duplicates_found = ?, 
+            duplicate_size_mb = ?, intelligence_score = ?, classification_confidence = ?,
+            cross_correlations = ?, status = 'completed', full_results = ?
+            WHERE session_id = ?
+        ''', (session.end_time.isoformat(), session.files_processed, session.success_rate,
+              session.patterns_learned, json.dumps(session.pattern_weights), session.artists_profiled,
+              session.duplicates_found, session.duplicate_size_mb, session.intelligence_score,
+              session.classification_confidence, json.dumps(session.cross_correlations),
+              json.dumps(full_results), session.session_id))
 
 class CulturalIntelligenceV17Enhanced:
     """ENHANCED Cultural Intelligence System v1.7 - Preserving ALL existing capabilities"""
@@ -278,6 +300,13 @@ class CulturalIntelligenceV17Enhanced:
         self.dashboard_url = "http://172.22.17.37:8081"
         self.dashboard_running = self._check_dashboard_status()
         
+        # Twitch messages are sent from a background thread, never inline
+        self.notifications = NotificationDispatcher()
+        if self.twitch:
+            self.notifications.register_channel(
+                'twitch', lambda update: self.twitch.send_intelligence_update(*update), TWITCH_RATE
+            )
+        
         if self.twitch:
             print(f"📺 Twitch integration: Enabled ({twitch_channel})")
         else:
@@ -301,7 +330,7 @@ class CulturalIntelligenceV17Enhanced:
         if self.twitch:
             success = self.twitch.connect()
             if success:
-                self.twitch.send_intelligence_update(
+                self.notify_twitch(
                     f"Cultural Intelligence v{VERSION} ONLINE! 🧠✨ Enhanced masterpiece ready to analyze collections with full pattern learning, artist profiling, and duplicate detection!"
                 )
             return success
@@ -310,13 +339,21 @@ class CulturalIntelligenceV17Enhanced:
     def disconnect_twitch(self):
         """Disconnect from Twitch"""
         if self.twitch:
-            self.twitch.send_intelligence_update(
+            self.notify_twitch(
                 f"Cultural Intelligence v{VERSION} scan COMPLETE! 📊 Your collection has been analyzed with maximum intelligence. Thank you for witnessing AI evolution! 🚀"
             )
-            time.sleep(1)
+            # Give queued messages a chance to go out (rate limit permitting)
+            if not self.notifications.flush(timeout=15.0):
+                print(f"⚠️ Twitch messages still queued at disconnect: {self.notifications.get_stats()['pending']}")
             if self.twitch.ws:
                 self.twitch.ws.close()
                 
+    def notify_twitch(self, message: str, intelligence_data: Dict = None, coalesce_key: str = None) -> bool:
+        """Queue a Twitch update; updates sharing a coalesce_key collapse into the latest"""
+        if not self.twitch:
+            return False
+        return self.notifications.notify('twitch', (message, intelligence_data), coalesce_key)
+                
     def get_unprocessed_files(self, music_directory: str) -> List[str]:
         """Get files not processed in current version - NEVER SCAN TWICE! RESPECT THE MASTERPIECE!"""
         
@@ -325,27 +362,17 @@ class CulturalIntelligenceV17Enhanced:
         print("🚀 NEVER SCANNING THE SAME FILE TWICE - YOUR MASTERPIECE IS SACRED!")
         
         audio_extensions = {'.mp3', '.flac', '.wav', '.m4a', '.aac', '.ogg', '.wma', '.aiff', '.au'}
-        all_files = []
-        
-        music_path = Path(music_directory)
-        for file_path in music_path.rglob('*'):
-            if file_path.suffix.lower() in audio_extensions:
-                all_files.append(str(file_path))
-                
-        print(f"📊 Found {len(all_files)} total audio files")
+        walker = ParallelDirectoryWalker(audio_extensions, include_stat=False)
         
-        # Get already processed files FOR THIS EXACT VERSION ONLY
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT DISTINCT file_path FROM file_history WHERE version = ?', (VERSION,))
-        processed_paths = {row[0] for row in cursor.fetchall()}
-        conn.close()
+        # Stream walked files through an indexed anti-join against file_history FOR THIS EXACT VERSION ONLY
+        unprocessed = list(self.db.filter_unprocessed(walker.iter_files(music_directory), VERSION))
         
-        print(f"✅ Already processed in v{VERSION}: {len(processed_paths)} files")
+        walk_stats = walker.get_stats()
+        print(f"📊 Found {walk_stats['files_matched']} total audio files "
+              f"({walk_stats['directories_per_second']:.1f} dirs/sec, {walk_stats['entries_per_second']:.1f} entries/sec)")
+        print(f"✅ Already processed in v{VERSION}: {self.db.count_processed(VERSION)} files")
         print("🎯 RESPECTING your masterpiece - these files are SACRED and NEVER touched again!")
         
-        unprocessed = [f for f in all_files if f not in processed_paths]
-        
         print(f"🚀 Files requiring v{VERSION} processing: {len(unprocessed)}")
         print("💎 Only processing NEW files or VERSION UPGRADES - your intelligence is PRESERVED!")
         
@@ -380,17 +407,16 @@ class CulturalIntelligenceV17Enhanced:
             if artist_intel.get('artist_name'):
                 artist_patterns[artist_intel['artist_name']] += 1
                 
-        # Calculate cross-correlations
-        cross_correlations = {}
-        
-        # Filename-Folder correlations
-        for fp_key, fp_count in filename_patterns.items():
-            genre = fp_key.split(':')[1]
-            folder_key = f"folder:{genre}"
-            if folder_key in folder_patterns:
-                correlation = min(fp_count, folder_patterns[folder_key]) / max(fp_count, folder_patterns[folder_key])
-                cross_correlations[f"{genre}_correlation"] = correlation
-                
+        # Calculate cross-correlations: filename/folder agreement per genre (grouped, linear)
+        cross_correlations = {
+            f"{genre}_correlation": correlation
+            for genre, correlation in genre_cross_correlations({**filename_patterns, **folder_patterns},
+                                                               combine=count_ratio).items()
+        }
+        
+        # Artist and label genre affinity from the batch's co-occurrence matrix
+        source_correlations = source_genre_cooccurrence(result_observations(r) for r in results)
+        
         # Calculate pattern stability
         pattern_stability = {}
         for pattern, count in {**filename_patterns, **folder_patterns}.items():
@@ -402,6 +428,7 @@ class CulturalIntelligenceV17Enhanced:
             'folder_patterns': dict(folder_patterns),
             'artist_patterns': dict(artist_patterns),
             'cross_correlations': cross_correlations,
+            'source_correlations': source_correlations,
             'pattern_stability': pattern_stability,
             'total_patterns_discovered': len(filename_patterns) + len(folder_patterns),
             'correlation_strength': sum(cross_correlations.values()) / max(len(cross_correlations), 1)
@@ -418,21 +445,13 @@ class CulturalIntelligenceV17Enhanced:
         print("🧠 FULL Cultural Intelligence Analysis Active")
         
         if self.twitch:
-            self.twitch.send_intelligence_update(
+            self.notify_twitch(
                 f"Batch {batch_number} STARTING: {len(files)} tracks entering Cultural Intelligence analysis",
                 {'batch_size': len(files), 'intelligence_level': 'MAXIMUM'}
             )
             
         # Save session start
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO enhanced_scan_sessions 
-            (session_id, version, batch_number, start_time, status)
-            VALUES (?, ?, ?, ?, 'running')
-        ''', (session_id, VERSION, batch_number, datetime.now().isoformat()))
-        conn.commit()
-        conn.close()
+        self.db.create_session(session_id, batch_number)
         
         # Process files using FULL MASTERPIECE SYSTEM
         self.scanner.music_directory = Path(files[0]).parent if files else Path(".")
@@ -442,56 +461,59 @@ class CulturalIntelligenceV17Enhanced:
         new_artists = set()
         duplicate_size = 0.0
         
-        for i, file_path in enumerate(files, 1):
-            try:
-                # Progress reporting
-                if i % 25 == 0 or i == len(files):
-                    progress = (i / len(files)) * 100
-                    print(f"   📈 Batch {batch_number}: {i}/{len(files)} ({progress:.1f}%) - Intelligence Active")
+        # One transaction for the whole batch: file history is written with executemany on commit
+        with self.db.batch():
+            for i, file_path in enumerate(files, 1):
+                try:
+                    # Progress reporting
+                    if i % 25 == 0 or i == len(files):
+                        progress = (i / len(files)) * 100
+                        print(f"   📈 Batch {batch_number}: {i}/{len(files)} ({progress:.1f}%) - Intelligence Active")
                     
-                    if self.twitch and i % 50 == 0:
-                        self.twitch.send_intelligence_update(
-                            f"Batch {batch_number}: {i}/{len(files)} analyzed ({progress:.1f}%)",
-                            {'progress': progress, 'intelligence_active': True}
-                        )
+                        if self.twitch and i % 50 == 0:
+                            self.notify_twitch(
+                                f"Batch {batch_number}: {i}/{len(files)} analyzed ({progress:.1f}%)",
+                                {'progress': progress, 'intelligence_active': True},
+                                coalesce_key='progress'
+                            )
                         
-                # Process with FULL Cultural Intelligence
-                analysis = self.scanner.process_single_file(file_path)
+                    # Process with FULL Cultural Intelligence
+                    analysis = self.scanner.process_single_file(file_path)
                 
-                if not analysis.get('error'):
-                    successful += 1
+                    if not analysis.get('error'):
+                        successful += 1
                     
-                    # Track patterns (PRESERVING EXISTING LOGIC)
-                    filename_intel = analysis.get('filename_intelligence', {})
-                    folder_intel = analysis.get('folder_intelligence', {})
-                    patterns_detected = []
-                    patterns_detected.extend(filename_intel.get('genre_hints', []))
-                    patterns_detected.extend(folder_intel.get('genre_hints', []))
+                        # Track patterns (PRESERVING EXISTING LOGIC)
+                        filename_intel = analysis.get('filename_intelligence', {})
+                        folder_intel = analysis.get('folder_intelligence', {})
+                        patterns_detected = []
+                        patterns_detected.extend(filename_intel.get('genre_hints', []))
+                        patterns_detected.extend(folder_intel.get('genre_hints', []))
                     
-                    if patterns_detected:
-                        patterns_learned += len(patterns_detected)
+                        if patterns_detected:
+                            patterns_learned += len(patterns_detected)
                         
-                    # Track artists (PRESERVING EXISTING LOGIC)
-                    artist_intel = analysis.get('artist_intelligence', {})
-                    if artist_intel.get('artist_name'):
-                        new_artists.add(artist_intel['artist_name'])
+                        # Track artists (PRESERVING EXISTING LOGIC)
+                        artist_intel = analysis.get('artist_intelligence', {})
+                        if artist_intel.get('artist_name'):
+                            new_artists.add(artist_intel['artist_name'])
                         
-                    # Track duplicates (PRESERVING EXISTING LOGIC)
-                    if analysis.get('duplicate_detection'):
-                        duplicate_info = analysis['duplicate_detection']
-                        if duplicate_info.get('is_duplicate'):
-                            duplicate_size += duplicate_info.get('file_size_mb', 0)
+                        # Track duplicates (PRESERVING EXISTING LOGIC)
+                        if analysis.get('duplicate_detection'):
+                            duplicate_info = analysis['duplicate_detection']
+                            if duplicate_info.get('is_duplicate'):
+                                duplicate_size += duplicate_info.get('file_size_mb', 0)
                     
-                    # Mark file as processed
-                    intelligence_score = analysis.get('intelligence_summary', {}).get('overall_intelligence_score', 0.0)
-                    classification_confidence = analysis.get('intelligence_summary', {}).get('classification_confidence', 0.0)
-                    self.mark_file_processed(file_path, session_id, intelligence_score, classification_confidence, patterns_detected)
+                        # Mark file as processed
+                        intelligence_score = analysis.get('intelligence_summary', {}).get('overall_intelligence_score', 0.0)
+                        classification_confidence = analysis.get('intelligence_summary', {}).get('classification_confidence', 0.0)
+                        self.mark_file_processed(file_path, session_id, intelligence_score, classification_confidence, patterns_detected)
                             
-                results.append(analysis)
+                    results.append(analysis)
                 
-            except Exception as e:
-                print(f"   ❌ Error processing {Path(file_path).name}: {e}")
-                results.append({'file_path': file_path, 'error': str(e)})
+                except Exception as e:
+                    print(f"   ❌ Error processing {Path(file_path).name}: {e}")
+                    results.append({'file_path': file_path, 'error': str(e)})
                 
         # Enhanced analysis - NEW v1.7 CAPABILITY
         cross_pattern_analysis = self.analyze_cross_pattern_intelligence(results)
@@ -535,27 +557,11 @@ class CulturalIntelligenceV17Enhanced:
         )
         
         # Save enhanced session
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE enhanced_scan_sessions SET 
-            end_time = ?, files_processed = ?, success_rate = ?, patterns_learned = ?,
-            pattern_weights = ?, artists_profiled = ?, duplicates_found = ?, 
-            duplicate_size_mb = ?, intelligence_score = ?, classification_confidence = ?,
-            cross_correlations = ?, status = 'completed', full_results = ?
-            WHERE session_id = ?
-        ''', (session.end_time.isoformat(), session.files_processed, session.success_rate,
-              session.patterns_learned, json.dumps(pattern_weights), session.artists_profiled,
-              session.duplicates_found, session.duplicate_size_mb, session.intelligence_score,
-              session.classification_confidence, json.dumps(session.cross_correlations),
-              json.dumps({'processing_time': processing_time, 'cross_analysis': cross_pattern_analysis}),
-              session_id))
-        conn.commit()
-        conn.close()
+        self.db.complete_session(session, {'processing_time': processing_time, 'cross_analysis': cross_pattern_analysis})
         
         # Enhanced Twitch reporting
         if self.twitch:
-            self.twitch.send_intelligence_update(
+            self.notify_twitch(
                 f"Batch {batch_number} COMPLETE! {successful}/{len(files)} files ({success_rate:.1%}) "
                 f"in {processing_time:.1f}s. Patterns: {patterns_learned}, Artists: {len(new_artists)}, "
                 f"Intelligence: {avg_intelligence:.2f}, Confidence: {avg_confidence:.1%}",
@@ -595,7 +601,7 @@ class CulturalIntelligenceV17Enhanced:
         if not unprocessed_files:
             print("✅ All files already processed with maximum intelligence!")
             if self.twitch:
-                self.twitch.send_intelligence_update(f"Collection fully analyzed with Cultural Intelligence v{VERSION}! 🧠✨")
+                self.notify_twitch(f"Collection fully analyzed with Cultural Intelligence v{VERSION}! 🧠✨")
                 self.disconnect_twitch()
             return []
             
@@ -605,7 +611,7 @@ class CulturalIntelligenceV17Enhanced:
         print("🧠 FULL Cultural Intelligence Active: Pattern Learning + Artist Profiling + Duplicate Detection")
         
         if self.twitch:
-            self.twitch.send_intelligence_update(
+            self.notify_twitch(
                 f"ENHANCED FULL SCAN STARTING: {len(unprocessed_files)} files in {total_batches} batches. "
                 f"Cultural Intelligence v{VERSION} with MAXIMUM capabilities!",
                 {'total_files': len(unprocessed_files), 'batches': total_batches, 'intelligence_level': 'MAXIMUM'}
@@ -629,7 +635,7 @@ class CulturalIntelligenceV17Enhanced:
                 avg_intelligence = sum(s.intelligence_score for s in completed_sessions) / len(completed_sessions)
                 
                 if self.twitch:
-                    self.twitch.send_intelligence_update(
+                    self.notify_twitch(
                         f"INTELLIGENCE UPDATE: {total_patterns} patterns learned, {total_artists} artists profiled! "
                         f"Average intelligence: {avg_intelligence:.2f}. System evolving! 🧠📈",
                         {'patterns': total_patterns, 'artists': total_artists, 'intelligence': avg_intelligence}
@@ -648,7 +654,7 @@ class CulturalIntelligenceV17Enhanced:
         avg_confidence = sum(s.classification_confidence for s in completed_sessions) / len(completed_sessions)
         
         if self.twitch:
-            self.twitch.send_intelligence_update(
+            self.notify_twitch(
                 f"🎉 SCAN COMPLETE! Cultural Intelligence v{VERSION} analyzed {total_files} files. "
                 f"Learned {total_patterns} patterns, profiled {total_artists} artists, "
                 f"found {total_duplicates} duplicates ({total_duplicate_size:.1f}MB saved). "
@@ -665,29 +671,16 @@ class CulturalIntelligenceV17Enhanced:
                 }
             )
             
-            time.sleep(3)  # Let final message send
             self.disconnect_twitch()
             
         return completed_sessions
     
     def mark_file_processed(self, file_path: str, session_id: str, intelligence_score: float, 
                           classification_confidence: float, patterns: List[str]):
-        """Mark file as processed in database"""
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        
+        """Mark file as processed in database (written when the batch commits)"""
         file_hash = hashlib.sha256(str(file_path).encode()).hexdigest()
-        
-        cursor.execute('''
-            INSERT INTO file_history 
-            (file_path, file_hash, session_id, version, processed_at, 
-             intelligence_score, classification_confidence, patterns_detected)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (file_path, file_hash, session_id, VERSION, datetime.now().isoformat(),
-              intelligence_score, classification_confidence, json.dumps(patterns)))
-        
-        conn.commit()
-        conn.close()
+        self.db.add_file_history(file_path, file_hash, session_id, VERSION,
+                                 intelligence_score, classification_confidence, patterns)
 
 def main():
     """Main execution with FULL Cultural Intelligence preservation"""
@@ -740,13 +733,13 @@ def main():
     except KeyboardInterrupt:
         print(f"\n⏹️ Enhanced scan interrupted")
         if system.twitch:
-            system.twitch.send_intelligence_update("⏹️ Enhanced scan interrupted. Cultural Intelligence will resume with full power!")
+            system.notify_twitch("⏹️ Enhanced scan interrupted. Cultural Intelligence will resume with full power!")
             system.disconnect_twitch()
         
     except Exception as e:
         print(f"\n❌ Enhanced scan failed: {e}")
         if system.twitch:
-            system.twitch.send_intelligence_update(f"❌ Enhanced scan error: {str(e)}. Full intelligence capabilities preserved.")
+            system.notify_twitch(f"❌ Enhanced scan error: {str(e)}. Full intelligence capabilities preserved.")
             system.disconnect_twitch()
 
 if __name__ == "__main__":
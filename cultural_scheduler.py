@@ -21,6 +21,7 @@ sys.path.insert(0, str(Path(__file__).parent))
 try:
     from taxonomy_v32 import TaxonomyConfig
     from taxonomy_scanner import TaxonomyScanner
+    from cultural_database_client import CulturalDatabaseClient
     import psycopg2
     from psycopg2.extras import RealDictCursor
 except ImportError as e:
@@ -46,6 +47,13 @@ class CulturalIntelligenceScheduler:
         
         self.log_file = Path("scheduler.log")
         
+        # REST client for server-side learning functions (PostgREST /rpc/)
+        try:
+            self.db_client = CulturalDatabaseClient()
+        except Exception as e:
+            self.log(f"REST client unavailable: {e}")
+            self.db_client = None
+        
         # Initialize database connection
         try:
             db_url = self.config.config["supabase"]["url"]
@@ -153,117 +161,48 @@ class CulturalIntelligenceScheduler:
         """Update classification patterns based on new data"""
         self.log("🧠 Starting pattern learning...")
         
-        if not self.conn:
-            self.log("❌ No database connection for pattern learning")
+        if not self.db_client:
+            self.log("❌ No database client for pattern learning")
             return
         
-        try:
-            cursor = self.conn.cursor(cursor_factory=RealDictCursor)
-            
-            # Analyze recent classifications for new patterns
-            cursor.execute("""
-                SELECT 
-                    artist, genre, subgenre, label,
-                    COUNT(*) as occurrence_count,
-                    AVG(overall_confidence) as avg_confidence
-                FROM cultural_classifications 
-                WHERE classified_at > NOW() - INTERVAL %s
-                    AND overall_confidence > %s
-                GROUP BY artist, genre, subgenre, label
-                HAVING COUNT(*) >= %s
-            """, [
-                f"{self.classification_config['pattern_update_interval_hours']} hours",
-                self.classification_config['confidence_threshold'],
-                self.classification_config['min_pattern_occurrences']
-            ])
-            
-            new_patterns = cursor.fetchall()
-            patterns_updated = 0
-            
-            for pattern in new_patterns:
-                # Update or create pattern
-                cursor.execute("""
-                    INSERT INTO cultural_patterns 
-                    (pattern_type, pattern_value, genre, subgenre, confidence, sample_size, success_rate)
-                    VALUES ('artist_genre', %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (pattern_type, pattern_value, genre, subgenre) 
-                    DO UPDATE SET
-                        confidence = EXCLUDED.confidence,
-                        sample_size = cultural_patterns.sample_size + EXCLUDED.sample_size,
-                        last_updated = NOW()
-                """, [
-                    pattern['artist'],
-                    pattern['genre'], 
-                    pattern['subgenre'],
-                    pattern['avg_confidence'],
-                    pattern['occurrence_count'],
-                    pattern['avg_confidence']
-                ])
-                patterns_updated += 1
-            
-            self.last_pattern_update = datetime.now()
-            self.log(f"✅ Pattern learning complete: {patterns_updated} patterns updated")
-            
-        except Exception as e:
-            self.log(f"❌ Pattern learning failed: {e}")
+        # Set-based GROUP BY + UPSERT runs server-side in one round trip
+        patterns_updated = self.db_client.learn_patterns_from_recent(
+            window_minutes=self.classification_config['pattern_update_interval_hours'] * 60,
+            min_confidence=self.classification_config['confidence_threshold'],
+            min_occurrences=self.classification_config['min_pattern_occurrences']
+        )
+        
+        self.last_pattern_update = datetime.now()
+        self.log(f"✅ Pattern learning complete: {patterns_updated} patterns updated")
     
     def pattern_analysis_job(self):
         """Analyze existing patterns and update confidences"""
         self.log("📊 Starting pattern analysis...")
         
-        if not self.conn:
+        if not self.db_client:
             return
-            
-        try:
-            cursor = self.conn.cursor(cursor_factory=RealDictCursor)
-            
-            # Find patterns that need confidence updates
-            cursor.execute("""
-                UPDATE cultural_patterns 
-                SET confidence = confidence * 0.99
-                WHERE last_updated < NOW() - INTERVAL %s
-                    AND confidence > 0.1
-            """, [f"{self.intelligence_config['confidence_recalculation_hours']} hours"])
-            
-            updated_rows = cursor.rowcount
-            self.log(f"✅ Pattern analysis complete: {updated_rows} patterns aged")
-            
-        except Exception as e:
-            self.log(f"❌ Pattern analysis failed: {e}")
+        
+        updated_rows = self.db_client.age_patterns(
+            stale_hours=self.intelligence_config['confidence_recalculation_hours'],
+            decay=0.99
+        )
+        self.log(f"✅ Pattern analysis complete: {updated_rows} patterns aged")
     
     def confidence_update_job(self):
         """Recalculate classification confidences based on new patterns"""
         self.log("🎯 Starting confidence recalculation...")
         
-        if not self.conn:
+        if not self.db_client:
             return
-            
-        try:
-            cursor = self.conn.cursor(cursor_factory=RealDictCursor)
-            
-            # Update confidences for recent classifications
-            cursor.execute("""
-                UPDATE cultural_classifications cc
-                SET 
-                    genre_confidence = LEAST(cc.genre_confidence * 1.05, 0.99),
-                    overall_confidence = LEAST(cc.overall_confidence * 1.02, 0.99)
-                FROM cultural_patterns cp
-                WHERE cc.artist = cp.pattern_value 
-                    AND cc.genre = cp.genre
-                    AND cp.pattern_type = 'artist_genre'
-                    AND cp.confidence > %s
-                    AND cc.classified_at > NOW() - INTERVAL %s
-            """, [
-                self.classification_config['confidence_threshold'],
-                f"{self.intelligence_config['confidence_recalculation_hours']} hours"
-            ])
-            
-            updated_rows = cursor.rowcount
-            self.last_confidence_update = datetime.now()
-            self.log(f"✅ Confidence update complete: {updated_rows} classifications updated")
-            
-        except Exception as e:
-            self.log(f"❌ Confidence update failed: {e}")
+        
+        updated_rows = self.db_client.update_confidence_scores(
+            window_minutes=self.intelligence_config['confidence_recalculation_hours'] * 60,
+            min_pattern_confidence=self.classification_config['confidence_threshold'],
+            genre_boost=1.05,
+            overall_boost=1.02
+        )
+        self.last_confidence_update = datetime.now()
+        self.log(f"✅ Confidence update complete: {updated_rows} classifications updated")
     
     def duplicate_check_job(self):
         """Check for new duplicates in recent additions"""
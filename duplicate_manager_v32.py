@@ -11,13 +11,14 @@ IMPACT: Clean up duplicates, save 15+ GB storage, organize your collection TODAY
 
 import os
 import json
-import hashlib
 import shutil
 from pathlib import Path
 from datetime import datetime
 from collections import defaultdict
 import time
 
+from file_hashing import hash_files
+
 class SmartDuplicateManager:
     def __init__(self):
         self.supported_formats = {'.mp3', '.flac', '.wav', '.m4a', '.aac', '.ogg'}
@@ -72,11 +73,11 @@ class SmartDuplicateManager:
         processed = 0
         start_time = time.time()
         
-        for file_path in files:
+        # Hash on a thread pool (streamed, large blocks - never whole files in memory)
+        for file_path, file_hash in hash_files(files):
             try:
-                # Fast file hash (validated approach)
-                with open(file_path, 'rb') as f:
-                    file_hash = hashlib.sha256(f.read()).hexdigest()
+                if file_hash is None:
+                    raise OSError("could not read file")
                 
                 if file_hash not in file_hashes:
                     file_hashes[file_hash] = []
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+FILE HASHING
+============
+Shared single-pass content hashing for every scanner and API.
+
+- One configurable block size (raid0_config.json -> raid0_optimizations.io_buffer_size)
+- posix_fadvise(SEQUENTIAL) readahead hint and drop-behind (DONTNEED) so a
+  library scan does not evict everything else from the page cache
+- Large files are hashed straight from an mmap (no copy into Python buffers)
+- hash_files() fans out over a thread pool; hashlib releases the GIL while
+  digesting, so threads overlap I/O and hashing
+- Pluggable algorithms (sha256, blake2b, blake3, xxh3_128). During the
+  migration away from SHA-256 both digests come out of the same read pass
+
+Run this module directly to benchmark block sizes on a given storage type:
+    python file_hashing.py "X:\\Music\\Sample" --storage-type raid0
+or to compare algorithm throughput:
+    python file_hashing.py "X:\\Music\\Sample" --algorithms
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Optional fast hash libraries
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    blake3 = None
+    BLAKE3_AVAILABLE = False
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    xxhash = None
+    XXHASH_AVAILABLE = False
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 64 * 1024 * 1024
+DROP_BEHIND_BYTES = 8 * 1024 * 1024
+DEFAULT_HASH_WORKERS = 8
+CONFIG_FILE = Path(__file__).parent / "raid0_config.json"
+HASH_SETTINGS_FILE = Path(__file__).parent / "taxonomy_config.json"
+LEGACY_ALGORITHM = 'sha256'
+
+_FADVISE = hasattr(os, 'posix_fadvise')
+_block_size: Optional[int] = None
+_hash_settings: Optional[Dict] = None
+
+HASH_ALGORITHMS: Dict[str, Callable] = {
+    'sha256': hashlib.sha256,
+    'blake2b': lambda: hashlib.blake2b(digest_size=32),
+}
+if BLAKE3_AVAILABLE:
+    HASH_ALGORITHMS['blake3'] = lambda: blake3.blake3()
+if XXHASH_AVAILABLE:
+    HASH_ALGORITHMS['xxh3_128'] = lambda: xxhash.xxh3_128()
+
+
+def new_hasher(algorithm: str):
+    """Create a hasher for a registered algorithm."""
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Hash algorithm not available: {algorithm} (available: {', '.join(HASH_ALGORITHMS)})")
+    return HASH_ALGORITHMS[algorithm]()
+
+
+def get_hash_settings() -> Dict:
+    """Identity hash configuration from taxonomy_config.json -> hashing.
+
+    algorithm: identity hash for new rows (content_hash column)
+    dual_hash: also compute legacy SHA-256 (file_hash column) during the migration
+    """
+    global _hash_settings
+    if _hash_settings is None:
+        settings = {'algorithm': LEGACY_ALGORITHM, 'dual_hash': True}
+        try:
+            with open(HASH_SETTINGS_FILE, 'r') as f:
+                settings.update(json.load(f).get('hashing', {}))
+        except (OSError, ValueError):
+            pass
+        if settings['algorithm'] not in HASH_ALGORITHMS:
+            # Never silently substitute another algorithm - hashes must match across machines
+            print(f"⚠️ Hash algorithm '{settings['algorithm']}' not installed - using {LEGACY_ALGORITHM} only")
+            settings['algorithm'] = LEGACY_ALGORITHM
+        _hash_settings = settings
+    return _hash_settings
+
+
+def parse_size(value) -> int:
+    """Parse '64KB', '1MB', '4096' or an int into bytes."""
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r'\s*(\d+)\s*([KMG]?)I?B?\s*', str(value).upper())
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    number, unit = match.groups()
+    return int(number) * {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[unit]
+
+
+def get_block_size() -> int:
+    """Configured I/O block size (read once from raid0_config.json)."""
+    global _block_size
+    if _block_size is None:
+        _block_size = DEFAULT_BLOCK_SIZE
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                config = json.load(f)
+            configured = config.get('raid0_optimizations', {}).get('io_buffer_size')
+            if configured:
+                _block_size = parse_size(configured)
+        except (OSError, ValueError):
+            pass
+    return _block_size
+
+
+def set_block_size(block_size) -> None:
+    """Override the block size for this process."""
+    global _block_size
+    _block_size = parse_size(block_size)
+
+
+def _advise(fd: int, offset: int, length: int, advice_name: str) -> None:
+    if _FADVISE:
+        try:
+            os.posix_fadvise(fd, offset, length, getattr(os, advice_name))
+        except OSError:
+            pass
+
+
+def hash_file_multi(file_path: str, algorithms: Iterable[str], block_size: Optional[int] = None,
+                    mmap_threshold: int = MMAP_THRESHOLD) -> Dict[str, str]:
+    """Hash a file with several algorithms in a single sequential pass. Raises OSError on I/O failure."""
+    block_size = block_size or get_block_size()
+    hashers = {algorithm: new_hasher(algorithm) for algorithm in algorithms}
+
+    def update(data):
+        for hasher in hashers.values():
+            hasher.update(data)
+
+    with open(file_path, 'rb', buffering=0) as f:
+        fd = f.fileno()
+        size = os.fstat(fd).st_size
+        _advise(fd, 0, 0, 'POSIX_FADV_SEQUENTIAL')
+
+        if size >= mmap_threshold:
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for offset in range(0, size, DROP_BEHIND_BYTES):
+                        update(view[offset:offset + DROP_BEHIND_BYTES])
+                        _advise(fd, offset, DROP_BEHIND_BYTES, 'POSIX_FADV_DONTNEED')
+                finally:
+                    view.release()
+        elif size > 0:
+            buffer = bytearray(block_size)
+            view = memoryview(buffer)
+            dropped = 0
+            total = 0
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                update(view[:read])
+                total += read
+                if total - dropped >= DROP_BEHIND_BYTES:
+                    _advise(fd, dropped, total - dropped, 'POSIX_FADV_DONTNEED')
+                    dropped = total
+
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+
+
+def hash_file(file_path: str, algorithm: str = LEGACY_ALGORITHM, block_size: Optional[int] = None,
+              mmap_threshold: int = MMAP_THRESHOLD) -> str:
+    """Hash a file's contents in a single sequential pass. Raises OSError on I/O failure."""
+    return hash_file_multi(file_path, [algorithm], block_size, mmap_threshold)[algorithm]
+
+
+def identity_hashes(file_path: str) -> Dict[str, Optional[str]]:
+    """Legacy and configured identity hashes from one read pass.
+
+    Returns file_hash (SHA-256 while dual hashing is on, otherwise the configured
+    digest), content_hash (configured algorithm) and hash_algo.
+    """
+    settings = get_hash_settings()
+    algorithm = settings['algorithm']
+    algorithms = [algorithm]
+    if settings['dual_hash'] and algorithm != LEGACY_ALGORITHM:
+        algorithms.append(LEGACY_ALGORITHM)
+    digests = hash_file_multi(file_path, algorithms)
+    return {
+        'file_hash': digests.get(LEGACY_ALGORITHM, digests[algorithm]),
+        'content_hash': digests[algorithm],
+        'hash_algo': algorithm
+    }
+
+
+def hash_file_safe(file_path: str, algorithm: str = LEGACY_ALGORITHM) -> Optional[str]:
+    """hash_file() that returns None instead of raising."""
+    try:
+        return hash_file(file_path, algorithm)
+    except (OSError, ValueError):
+        return None
+
+
+def hash_files(file_paths: Iterable[str], algorithm: str = LEGACY_ALGORITHM,
+               max_workers: int = DEFAULT_HASH_WORKERS) -> Iterator[Tuple[str, Optional[str]]]:
+    """Hash many files on a thread pool, yielding (path, hash or None) in input order."""
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hasher') as executor:
+        paths = list(file_paths)
+        for file_path, file_hash in zip(paths, executor.map(lambda p: hash_file_safe(p, algorithm), paths)):
+            yield file_path, file_hash
+
+
+def identity_hashes_many(file_paths: Iterable[str],
+                         max_workers: int = DEFAULT_HASH_WORKERS) -> Iterator[Tuple[str, Optional[Dict]]]:
+    """identity_hashes() on a thread pool, yielding (path, hashes or None) in input order."""
+    def safe(file_path):
+        try:
+            return identity_hashes(file_path)
+        except (OSError, ValueError):
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hasher') as executor:
+        paths = list(file_paths)
+        for file_path, hashes in zip(paths, executor.map(safe, paths)):
+            yield file_path, hashes
+
+
+def _drop_cache(file_path: str) -> None:
+    # Evict the file from the page cache so each benchmark run hits storage
+    if not _FADVISE:
+        return
+    try:
+        with open(file_path, 'rb') as f:
+            _advise(f.fileno(), 0, 0, 'POSIX_FADV_DONTNEED')
+    except OSError:
+        pass
+
+
+def benchmark_block_sizes(file_paths: List[str], block_sizes: List[int],
+                          workers: int = 1) -> Dict[int, float]:
+    """Return MB/s for each block size over the given files."""
+    total_bytes = sum(os.path.getsize(p) for p in file_paths)
+    results = {}
+    for block_size in block_sizes:
+        for file_path in file_paths:
+            _drop_cache(file_path)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda p: hash_file(p, block_size=block_size, mmap_threshold=2 ** 62), file_paths))
+        elapsed = time.perf_counter() - start
+        results[block_size] = (total_bytes / (1024 * 1024)) / elapsed if elapsed > 0 else 0.0
+    return results
+
+
+def benchmark_algorithms(file_paths: List[str], algorithms: Optional[List[str]] = None,
+                         repeats: int = 3) -> Dict[str, float]:
+    """Return MB/s per algorithm over the given files' contents (held in memory, so only CPU is measured)."""
+    algorithms = algorithms or list(HASH_ALGORITHMS)
+    contents = []
+    for file_path in file_paths:
+        with open(file_path, 'rb') as f:
+            contents.append(f.read())
+    total_mb = sum(len(c) for c in contents) / (1024 * 1024)
+
+    results = {}
+    for algorithm in algorithms:
+        best = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for data in contents:
+                hasher = new_hasher(algorithm)
+                hasher.update(data)
+                hasher.hexdigest()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[algorithm] = total_mb / best if best else 0.0
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark hashing block sizes for a storage type')
+    parser.add_argument('directory', help='Directory with sample audio files on the target storage')
+    parser.add_argument('--storage-type', default='unknown', help='Label for the storage (raid0, nvme, network, ...)')
+    parser.add_argument('--files', type=int, default=50, help='Number of sample files (default: 50)')
+    parser.add_argument('--workers', type=int, default=1, help='Concurrent hashing threads (default: 1)')
+    parser.add_argument('--save', action='store_true', help='Write the best size to raid0_config.json')
+    parser.add_argument('--algorithms', action='store_true', help='Compare hash algorithm throughput instead of block sizes')
+    args = parser.parse_args()
+
+    from parallel_walker import ParallelDirectoryWalker
+
+    sample = []
+    for file_path in ParallelDirectoryWalker(include_stat=False).iter_files(args.directory):
+        sample.append(file_path)
+        if len(sample) >= args.files:
+            break
+    if not sample:
+        print(f"No audio files found in {args.directory}")
+        return
+
+    if args.algorithms:
+        print(f"🔐 Hash algorithm benchmark: {len(sample)} files (in memory, CPU only)")
+        results = benchmark_algorithms(sample)
+        for algorithm, mb_per_sec in sorted(results.items(), key=lambda x: x[1], reverse=True):
+            print(f"   {algorithm:>9}: {mb_per_sec:8.1f} MB/s")
+        missing = [name for name, ok in (('blake3', BLAKE3_AVAILABLE), ('xxh3_128', XXHASH_AVAILABLE)) if not ok]
+        if missing:
+            print(f"   Not installed: {', '.join(missing)} (pip install blake3 xxhash)")
+        return
+
+    block_sizes = [4 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+    print(f"💾 Hash benchmark: {len(sample)} files, storage={args.storage_type}, workers={args.workers}")
+    if not _FADVISE:
+        print("   (page cache cannot be dropped on this platform - later runs may be cached)")
+    results = benchmark_block_sizes(sample, block_sizes, workers=args.workers)
+    for block_size, mb_per_sec in results.items():
+        print(f"   {block_size // 1024:>5} KB blocks: {mb_per_sec:8.1f} MB/s")
+
+    best = max(results, key=results.get)
+    print(f"✅ Best block size for {args.storage_type}: {best // 1024}KB")
+
+    if args.save:
+        config = {}
+        if CONFIG_FILE.exists():
+            with open(CONFIG_FILE, 'r') as f:
+                config = json.load(f)
+        config.setdefault('raid0_optimizations', {})['io_buffer_size'] = f"{best // 1024}KB"
+        with open(CONFIG_FILE, 'w') as f:
+            json.dump(config, f, indent=2)
+        print(f"💾 Saved io_buffer_size to {CONFIG_FILE.name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+GENRE STATISTICS STORE
+======================
+Materialized per-genre statistics for /api/genres and the dashboards.
+
+Instead of re-reading every track per request, each genre keeps:
+- A track count
+- HyperLogLog sketches of distinct artists and labels (~3% error, 1 KB each)
+- A running BPM mean / variance (Welford), which can also un-apply a value
+- A small reservoir of sample tracks
+
+GenreStatsStore is fed classification rows: it warms once with keyset
+pagination over cultural_classifications, then polls new ids and rows with a
+newer classified_at, moving a reclassified track between genres. Reads are
+O(number of genres). A periodic rebuild drops deleted rows.
+"""
+
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATS_COLUMNS = 'id,track_id,genre,artist,label,track_name,bpm,classified_at'
+SAMPLE_SIZE = 5
+
+
+class HyperLogLog:
+    """Distinct-count sketch with 2^precision one-byte registers."""
+
+    def __init__(self, precision: int = 10):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+        self._alpha = 0.7213 / (1 + 1.079 / self.size)
+
+    def add(self, value: str) -> None:
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+        x = int.from_bytes(digest, 'big')
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        for i, rank in enumerate(other.registers):
+            if rank > self.registers[i]:
+                self.registers[i] = rank
+
+    def count(self) -> int:
+        zeros = self.registers.count(0)
+        if zeros == self.size:
+            return 0
+        estimate = self._alpha * self.size * self.size / sum(2.0 ** -r for r in self.registers)
+        if estimate <= 2.5 * self.size and zeros:
+            # Small-range correction: linear counting
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+
+class RunningStats:
+    """Welford running mean / variance with removal support."""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x: float) -> None:
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        old_mean = self.mean
+        self.count -= 1
+        self.mean = (old_mean * (self.count + 1) - x) / self.count
+        self.m2 = max(0.0, self.m2 - (x - old_mean) * (x - self.mean))
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count > 1 else 0.0
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class Reservoir:
+    """Uniform sample of up to k items from a stream (Algorithm R)."""
+
+    def __init__(self, k: int = SAMPLE_SIZE, rng: random.Random = None):
+        self.k = k
+        self.seen = 0
+        self.items: List[Tuple[int, str]] = []
+        self._rng = rng or random.Random()
+
+    def add(self, key: int, value: str) -> None:
+        self.seen += 1
+        if len(self.items) < self.k:
+            self.items.append((key, value))
+        else:
+            slot = self._rng.randrange(self.seen)
+            if slot < self.k:
+                self.items[slot] = (key, value)
+
+    def discard(self, key: int) -> None:
+        self.items = [item for item in self.items if item[0] != key]
+
+
+class GenreStats:
+    __slots__ = ('count', 'artists', 'labels', 'bpm', 'samples')
+
+    def __init__(self, rng: random.Random):
+        self.count = 0
+        self.artists = HyperLogLog()
+        self.labels = HyperLogLog()
+        self.bpm = RunningStats()
+        self.samples = Reservoir(rng=rng)
+
+
+def _bpm(value) -> Optional[float]:
+    try:
+        bpm = float(value)
+    except (TypeError, ValueError):
+        return None
+    return bpm if bpm > 0 else None
+
+
+class GenreStatsStore:
+    """Per-genre aggregates kept current by incremental polling of cultural_classifications."""
+
+    def __init__(self, db_client=None, poll_interval: float = 30.0, page_size: int = 1000,
+                 rebuild_interval: float = 3600.0, seed: Optional[int] = None):
+        self.db = db_client
+        self.poll_interval = poll_interval
+        self.page_size = page_size
+        self.rebuild_interval = rebuild_interval
+        self._rng = random.Random(seed)
+
+        self._lock = threading.Lock()
+        # Serializes refresh/rebuild between the poller and request threads
+        self._refresh_lock = threading.Lock()
+        self._genres: Dict[str, GenreStats] = {}
+        # track_id -> (genre, bpm) so a reclassification can be moved out of its old genre
+        self._tracks: Dict[int, Tuple[str, Optional[float]]] = {}
+        self._max_id = 0
+        self._last_classified_at: Optional[str] = None
+        self._last_rebuild = 0.0
+        self._last_poll = 0.0
+        self._warm = False
+        self.version = 0  # bumped on every change, used for ETags
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'polls': 0, 'rebuilds': 0, 'rows_applied': 0, 'reclassified': 0, 'poll_errors': 0}
+
+    # ================================
+    # MAINTENANCE
+    # ================================
+
+    def _apply(self, row: Dict) -> None:
+        # Caller holds the lock
+        track_id = row.get('track_id') or row.get('id')
+        genre = row.get('genre') or 'Unknown'
+        bpm = _bpm(row.get('bpm'))
+
+        previous = self._tracks.get(track_id)
+        if previous is not None:
+            old_genre, old_bpm = previous
+            if old_genre == genre and old_bpm == bpm:
+                return
+            self.stats['reclassified'] += 1
+            old = self._genres.get(old_genre)
+            if old is not None:
+                old.count -= 1
+                if old_bpm is not None:
+                    old.bpm.remove(old_bpm)
+                old.samples.discard(track_id)
+                if old.count <= 0:
+                    del self._genres[old_genre]
+            # Sketches cannot un-count, so distinct artists/labels may include a moved track
+
+        stats = self._genres.get(genre)
+        if stats is None:
+            stats = self._genres[genre] = GenreStats(self._rng)
+        stats.count += 1
+        if row.get('artist'):
+            stats.artists.add(row['artist'])
+        if row.get('label'):
+            stats.labels.add(row['label'])
+        if bpm is not None:
+            stats.bpm.add(bpm)
+        stats.samples.add(track_id, row.get('track_name') or 'Unknown')
+        self._tracks[track_id] = (genre, bpm)
+        self.stats['rows_applied'] += 1
+        self.version += 1
+
+    def _advance(self, row: Dict) -> None:
+        self._max_id = max(self._max_id, row.get('id') or 0)
+        classified_at = row.get('classified_at')
+        if classified_at and (self._last_classified_at is None or classified_at > self._last_classified_at):
+            self._last_classified_at = classified_at
+
+    def apply_rows(self, rows: Iterable[Dict]) -> int:
+        """Fold classification rows (new or updated) into the aggregates."""
+        count = 0
+        with self._lock:
+            for row in rows:
+                self._apply(row)
+                self._advance(row)
+                count += 1
+        return count
+
+    def _fetch_all(self, classified_since: Optional[str] = None, after_id: int = 0) -> Iterable[List[Dict]]:
+        while True:
+            page = self.db.get_classifications_page(after_id=after_id, limit=self.page_size,
+                                                    columns=STATS_COLUMNS, classified_since=classified_since)
+            yield page
+            if len(page) < self.page_size:
+                return
+            after_id = page[-1]['id']
+
+    def rebuild(self) -> int:
+        """Recompute every genre from the table, one page at a time. Returns rows applied."""
+        start = time.time()
+        fresh = GenreStatsStore(seed=self._rng.random())
+        rows = sum(fresh.apply_rows(page) for page in self._fetch_all())
+        with self._lock:
+            self._genres, self._tracks = fresh._genres, fresh._tracks
+            self._max_id, self._last_classified_at = fresh._max_id, fresh._last_classified_at
+            self._warm = True
+            self._last_rebuild = time.time()
+            self.version += 1
+            self.stats['rebuilds'] += 1
+        logger.info(f"Genre stats built: {rows} classifications, {len(fresh._genres)} genres "
+                    f"in {time.time() - start:.1f}s")
+        return rows
+
+    def refresh(self) -> int:
+        """Apply classifications added or re-stamped since the last poll. Returns rows applied."""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        # Caller holds _refresh_lock
+        self._last_poll = time.time()
+        if not self._warm or time.time() - self._last_rebuild >= self.rebuild_interval:
+            return self.rebuild()
+        with self._lock:
+            max_id, last_classified_at = self._max_id, self._last_classified_at
+        rows = sum(self.apply_rows(page) for page in self._fetch_all(after_id=max_id))
+        if last_classified_at:
+            rows += sum(self.apply_rows(page) for page in self._fetch_all(classified_since=last_classified_at))
+        self.stats['polls'] += 1
+        return rows
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.stats['poll_errors'] += 1
+                logger.warning(f"Genre stats poll failed: {e}")
+
+    def start(self) -> None:
+        """Build the aggregates and start the background poller."""
+        if self._thread and self._thread.is_alive():
+            return
+        try:
+            with self._refresh_lock:
+                self.rebuild()
+        except Exception as e:
+            logger.warning(f"Genre stats warm-up failed: {e}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll_loop, name='genre-stats', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def ensure_fresh(self) -> None:
+        """Without a background poller (e.g. under a WSGI server), refresh inline at most once per interval."""
+        if self._thread and self._thread.is_alive():
+            return
+        if self._warm and time.time() - self._last_poll < self.poll_interval:
+            return
+        # One request thread refreshes; the others serve the current aggregates (or wait for the first build)
+        if not self._refresh_lock.acquire(blocking=not self._warm):
+            return
+        try:
+            if not self._warm or time.time() - self._last_poll >= self.poll_interval:
+                self._refresh()
+        finally:
+            self._refresh_lock.release()
+
+    # ================================
+    # READS
+    # ================================
+
+    def snapshot(self) -> Dict:
+        """Genre distribution in the /api/genres shape - O(number of genres)."""
+        with self._lock:
+            total = sum(stats.count for stats in self._genres.values())
+            genres = {}
+            for genre, stats in self._genres.items():
+                genres[genre] = {
+                    'count': stats.count,
+                    'percentage': round(stats.count / total * 100, 2) if total > 0 else 0,
+                    'unique_artists': stats.artists.count(),
+                    'unique_labels': stats.labels.count(),
+                    'avg_bpm': round(stats.bpm.mean, 1) if stats.bpm.count else None,
+                    'bpm_stddev': round(stats.bpm.stddev, 1) if stats.bpm.count > 1 else None,
+                    'sample_tracks': [title for _, title in stats.samples.items]
+                }
+        return {
+            'total_genres': len(genres),
+            'total_tracks': total,
+            'genres': genres
+        }
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                'version': self.version,
+                'genres': len(self._genres),
+                'tracks': len(self._tracks),
+                'warm': self._warm
+            }
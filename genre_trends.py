@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+LIVE GENRE TRENDS
+=================
+In-process rolling genre trends for live streams, pushed to subscribers.
+
+Every webhook event updates, in O(1) (plus its characteristics):
+- A sliding window over the last N minutes across all sessions
+- A sliding window and whole-session totals for the event's session
+
+Windows are rings of fixed-width buckets; a bucket's tallies are subtracted
+from the running totals when it falls out of the window, so reads never
+rescan events. Each change is published to subscriber queues as the
+absolute, updated tally of the one genre it touched. A subscriber that
+falls behind has its backlog replaced by a single RESYNC marker.
+
+State lives in memory and is rebuilt from live events only; the SQLite
+analytics endpoints remain the source for history. The aggregator is meant
+to be used from a single event loop and does no locking.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+GenreKey = Tuple[str, Optional[str]]
+
+TOP_CHARACTERISTICS = 10
+
+# Put on a subscriber queue in place of updates it was too slow to take: re-read snapshot()
+RESYNC = {"resync": True}
+
+
+class GenreTally:
+    __slots__ = ('events', 'plays', 'engagement', 'confidence_sum', 'characteristics')
+
+    def __init__(self):
+        self.events = 0
+        self.plays = 0
+        self.engagement = 0
+        self.confidence_sum = 0.0
+        self.characteristics = Counter()
+
+    def subtract(self, other: 'GenreTally') -> None:
+        self.events -= other.events
+        self.plays -= other.plays
+        self.engagement -= other.engagement
+        self.confidence_sum -= other.confidence_sum
+        for name, count in other.characteristics.items():
+            remaining = self.characteristics[name] - count
+            if remaining > 0:
+                self.characteristics[name] = remaining
+            else:
+                del self.characteristics[name]
+
+    def to_dict(self, key: GenreKey) -> Dict:
+        return {
+            "main_genre": key[0],
+            "subgenre": key[1],
+            "total_plays": self.plays,
+            "total_engagement": self.engagement,
+            "average_confidence": round(self.confidence_sum / self.plays, 4) if self.plays else None,
+            "popular_characteristics": dict(heapq.nlargest(TOP_CHARACTERISTICS, self.characteristics.items(),
+                                                           key=lambda item: item[1]))
+        }
+
+
+class TrendTable:
+    """Per-genre tallies, either for all time (window_seconds=None) or a sliding window."""
+
+    def __init__(self, window_seconds: Optional[float] = None, bucket_seconds: float = 15.0):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.totals: Dict[GenreKey, GenreTally] = {}
+        self._buckets: Deque[Tuple[int, Dict[GenreKey, GenreTally]]] = deque()
+
+    def advance(self, now: float) -> List[GenreKey]:
+        """Drop buckets that fell out of the window. Returns genres that left the table."""
+        if self.window_seconds is None:
+            return []
+        oldest = int(now // self.bucket_seconds) - int(self.window_seconds // self.bucket_seconds)
+        expired = []
+        while self._buckets and self._buckets[0][0] <= oldest:
+            _, tallies = self._buckets.popleft()
+            for key, tally in tallies.items():
+                total = self.totals[key]
+                total.subtract(tally)
+                if total.events <= 0:
+                    del self.totals[key]
+                    expired.append(key)
+        return expired
+
+    def _tallies(self, key: GenreKey, now: float) -> List[GenreTally]:
+        total = self.totals.get(key)
+        if total is None:
+            total = self.totals[key] = GenreTally()
+        if self.window_seconds is None:
+            return [total]
+        bucket_id = int(now // self.bucket_seconds)
+        if not self._buckets or self._buckets[-1][0] != bucket_id:
+            self._buckets.append((bucket_id, {}))
+        bucket = self._buckets[-1][1]
+        tally = bucket.get(key)
+        if tally is None:
+            tally = bucket[key] = GenreTally()
+        return [total, tally]
+
+    def add_play(self, key: GenreKey, confidence: float, characteristics: List[str], now: float) -> GenreTally:
+        for tally in self._tallies(key, now):
+            tally.events += 1
+            tally.plays += 1
+            tally.confidence_sum += confidence
+            tally.characteristics.update(characteristics)
+        return self.totals[key]
+
+    def add_engagement(self, key: GenreKey, score: int, now: float) -> GenreTally:
+        for tally in self._tallies(key, now):
+            tally.events += 1
+            tally.engagement += score
+        return self.totals[key]
+
+    def top(self, limit: int) -> List[Dict]:
+        """Genres by plays + engagement, like /api/analytics/genre-trends."""
+        ranked = heapq.nlargest(limit, self.totals.items(), key=lambda item: item[1].plays + item[1].engagement)
+        return [tally.to_dict(key) for key, tally in ranked]
+
+
+class SessionTrends:
+    __slots__ = ('totals', 'window', 'current', 'last_event')
+
+    def __init__(self, window_seconds: float, bucket_seconds: float):
+        self.totals = TrendTable()
+        self.window = TrendTable(window_seconds, bucket_seconds)
+        self.current: Optional[GenreKey] = None  # genre of the track playing now
+        self.last_event = 0.0
+
+
+class GenreTrendAggregator:
+    """Rolling and whole-session genre trends, maintained per webhook event."""
+
+    def __init__(self, window_seconds: float = 900.0, bucket_seconds: float = 15.0, max_sessions: int = 50,
+                 subscriber_queue_size: int = 100, clock: Callable[[], float] = time.time):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.max_sessions = max_sessions
+        self.subscriber_queue_size = subscriber_queue_size
+        self._clock = clock
+
+        self.window = TrendTable(window_seconds, bucket_seconds)
+        self._sessions: 'OrderedDict[str, SessionTrends]' = OrderedDict()
+        # session_id (None = all sessions) -> subscriber queues
+        self._subscribers: Dict[Optional[str], Set[asyncio.Queue]] = {}
+        self.stats = {'events': 0, 'published': 0, 'dropped': 0}
+
+    def _session(self, session_id: str, now: float) -> SessionTrends:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = SessionTrends(self.window_seconds, self.bucket_seconds)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        session.last_event = now
+        return session
+
+    # ================================
+    # EVENTS
+    # ================================
+
+    def record_track(self, session_id: str, main_genre: str, subgenre: Optional[str], confidence: float,
+                     characteristics: List[str]) -> None:
+        now = self._clock()
+        key = (main_genre, subgenre)
+        session = self._session(session_id, now)
+        session.current = key
+        self._record(session_id, session, key, now,
+                     lambda table: table.add_play(key, confidence, characteristics, now))
+
+    def record_chat(self, session_id: str, engagement_score: int) -> None:
+        """Credit engagement to the genre currently playing in the session."""
+        now = self._clock()
+        session = self._session(session_id, now)
+        key = session.current
+        if key is None:
+            return
+        self._record(session_id, session, key, now, lambda table: table.add_engagement(key, engagement_score, now))
+
+    def _record(self, session_id: str, session: SessionTrends, key: GenreKey, now: float,
+                update: Callable[[TrendTable], GenreTally]) -> None:
+        self.stats['events'] += 1
+        window_expired = self.window.advance(now)
+        session_expired = session.window.advance(now)
+        window = update(self.window)
+        session_window = update(session.window)
+        session_total = update(session.totals)
+
+        self._publish(None, {
+            "session_id": session_id,
+            "window": window.to_dict(key),
+            "window_expired": [list(k) for k in window_expired]
+        })
+        self._publish(session_id, {
+            "session_id": session_id,
+            "window": session_window.to_dict(key),
+            "window_expired": [list(k) for k in session_expired],
+            "session": session_total.to_dict(key)
+        })
+
+    # ================================
+    # READS
+    # ================================
+
+    def snapshot(self, session_id: Optional[str] = None, limit: int = 20) -> Optional[Dict]:
+        """Current trends for one session (window + whole session) or across sessions. None if unknown."""
+        now = self._clock()
+        if session_id is None:
+            self.window.advance(now)
+            return {
+                "window_minutes": self.window_seconds / 60,
+                "active_sessions": sum(1 for s in self._sessions.values()
+                                       if now - s.last_event < self.window_seconds),
+                "window": self.window.top(limit)
+            }
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        session.window.advance(now)
+        return {
+            "session_id": session_id,
+            "window_minutes": self.window_seconds / 60,
+            "current": {"main_genre": session.current[0], "subgenre": session.current[1]}
+            if session.current else None,
+            "window": session.window.top(limit),
+            "session": session.totals.top(limit)
+        }
+
+    # ================================
+    # SUBSCRIPTIONS
+    # ================================
+
+    def subscribe(self, session_id: Optional[str] = None) -> asyncio.Queue:
+        """Queue receiving one update per event for the session (or all sessions)."""
+        queue = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        self._subscribers.setdefault(session_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue, session_id: Optional[str] = None) -> None:
+        subscribers = self._subscribers.get(session_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[session_id]
+
+    def _publish(self, session_id: Optional[str], update: Dict) -> None:
+        for queue in self._subscribers.get(session_id, ()):
+            if queue.full():
+                # Slow consumer: drop its backlog and let it re-read the snapshot instead
+                while not queue.empty():
+                    queue.get_nowait()
+                    self.stats['dropped'] += 1
+                queue.put_nowait(RESYNC)
+                continue
+            queue.put_nowait(update)
+            self.stats['published'] += 1
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'sessions': len(self._sessions),
+            'subscribers': sum(len(s) for s in self._subscribers.values()),
+            'window_genres': len(self.window.totals)
+        }
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+HTTP CACHING HELPERS
+====================
+Conditional-request and compression helpers for the dashboard listing endpoints.
+
+- TableVersionTracker polls cultural_table_versions in the background, so a
+  request can compute its ETag from memory without touching the database
+- Strong ETags combine the route, the normalized query string and the
+  versions of the tables the response is built from
+- If-None-Match is answered with 304 before any data is loaded
+- Rendered bodies are cached per (ETag, encoding) and compressed with
+  brotli (if installed) or gzip according to Accept-Encoding
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MIN_COMPRESS_BYTES = 1024
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class TableVersionTracker:
+    """In-memory copy of the per-table change counters, refreshed off the request path."""
+
+    def __init__(self, load_versions: Callable[[], Optional[Dict[str, int]]], poll_interval: float = 5.0):
+        self.load_versions = load_versions
+        self.poll_interval = poll_interval
+        self._versions: Dict[str, int] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'polls': 0, 'changes': 0, 'errors': 0, 'last_poll': None}
+
+    def refresh(self) -> bool:
+        """Reload the counters. Returns True if any table changed."""
+        with self._lock:
+            self.stats['polls'] += 1
+            versions = self.load_versions()
+            self.stats['last_poll'] = time.time()
+            if versions is None:
+                # Counter table missing or unreachable: stop issuing ETags until it answers
+                self.stats['errors'] += 1
+                self._versions = {}
+                self._loaded = True
+                return False
+            changed = versions != self._versions
+            if changed and self._loaded:
+                self.stats['changes'] += 1
+            self._versions = versions
+            self._loaded = True
+            return changed
+
+    def snapshot(self, tables: Sequence[str]) -> Optional[Tuple[Tuple[str, int], ...]]:
+        """Versions of the given tables, or None if any of them is unknown."""
+        polling = self._thread is not None and self._thread.is_alive()
+        if not self._loaded or (not polling and time.time() - self.stats['last_poll'] >= self.poll_interval):
+            # No background poller (e.g. imported by a WSGI server): refresh inline at most once per interval
+            self.refresh()
+        versions = self._versions
+        if not all(table in versions for table in tables):
+            return None
+        return tuple((table, versions[table]) for table in tables)
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.warning(f"Table version poll failed: {e}")
+
+    def start(self) -> None:
+        """Load the counters and start the background poller."""
+        if self._thread and self._thread.is_alive():
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Table version load failed: {e}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll_loop, name='table-versions', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, 'versions': dict(self._versions)}
+
+
+def make_etag(route: str, params: Iterable[Tuple[str, str]], versions: Sequence[Tuple[str, int]]) -> str:
+    """Opaque ETag base for one representation of a route at the given table versions."""
+    key = json.dumps([route, sorted(params), list(versions)], separators=(',', ':'))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:32]
+
+
+def format_etag(base: str, encoding: Optional[str] = None) -> str:
+    """Quoted strong ETag; each content-coding is a distinct representation."""
+    return f'"{base}-{encoding}"' if encoding else f'"{base}"'
+
+
+def etag_matches(if_none_match: Optional[str], base: str) -> bool:
+    """True if an If-None-Match header names any encoding variant of base."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]  # If-None-Match uses weak comparison
+        tag = tag.strip('"')
+        if tag == base or tag.startswith(base + '-'):
+            return True
+    return False
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick 'br' or 'gzip' from an Accept-Encoding header (None = identity)."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    candidates = (['br'] if BROTLI_AVAILABLE else []) + ['gzip']
+    for encoding in candidates:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """Compress body with the negotiated encoding. Small bodies are sent as-is."""
+    if not encoding or len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    if encoding == 'br' and BROTLI_AVAILABLE:
+        return brotli.compress(body, quality=5), 'br'
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    return body, None
+
+
+def parse_page_args(args, default_limit: int = DEFAULT_PAGE_SIZE,
+                    max_limit: int = MAX_PAGE_SIZE) -> Tuple[int, int]:
+    """Keyset cursor (?after=<last id>) and page size (?limit=) from query args."""
+    try:
+        after = max(0, int(args.get('after') or 0))
+        limit = int(args.get('limit') or default_limit)
+    except (TypeError, ValueError):
+        raise ValueError("'after' and 'limit' must be integers")
+    return after, max(1, min(limit, max_limit))
+
+
+def parse_fields(raw: Optional[str], allowed: Sequence[str]) -> Optional[List[str]]:
+    """Requested ?fields=a,b,c (validated against allowed), or None for all fields."""
+    if not raw:
+        return None
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(allowed)})")
+    # 'id' always comes back - it is the pagination cursor
+    return ['id'] + [f for f in fields if f != 'id']
+
+
+def select_columns(fields: Optional[List[str]], column_map: Optional[Dict[str, str]] = None) -> str:
+    """PostgREST select= list for the requested output fields ('*' when every field is wanted).
+
+    column_map renames output fields whose DB column differs; 'id' is always
+    selected because it is the pagination cursor.
+    """
+    if fields is None:
+        return '*'
+    column_map = column_map or {}
+    columns = ['id']
+    for field in fields:
+        column = column_map.get(field, field)
+        if column not in columns:
+            columns.append(column)
+    return ','.join(columns)
+
+
+def project(rows: Iterable[Dict], fields: Optional[List[str]]) -> List[Dict]:
+    """Keep only the requested fields of each row."""
+    if fields is None:
+        return list(rows)
+    return [{field: row.get(field) for field in fields} for row in rows]
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+LOCAL INTELLIGENCE FUNCTIONS
+============================
+SQLite equivalents of the server-side RPC functions in add_intelligence_rpc_functions.sql.
+Used in offline mode, when the Supabase REST API is not reachable.
+
+Each function is a handful of set-based statements (GROUP BY, UPSERT, UPDATE ... WHERE id IN)
+run inside a single transaction, mirroring the Postgres versions.
+"""
+
+import json
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict
+
+OFFLINE_DB_PATH = "cultural_intelligence_offline.db"
+
+OFFLINE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cultural_tracks (
+    id INTEGER PRIMARY KEY,
+    file_path TEXT NOT NULL UNIQUE,
+    file_hash TEXT,
+    raw_metadata TEXT,
+    processed_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS cultural_classifications (
+    id INTEGER PRIMARY KEY,
+    track_id INTEGER REFERENCES cultural_tracks(id),
+    artist TEXT,
+    genre TEXT,
+    subgenre TEXT,
+    genre_confidence REAL,
+    overall_confidence REAL,
+    needs_review INTEGER DEFAULT 0,
+    classified_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS cultural_patterns (
+    id INTEGER PRIMARY KEY,
+    pattern_type TEXT NOT NULL,
+    pattern_value TEXT NOT NULL,
+    genre TEXT,
+    subgenre TEXT NOT NULL DEFAULT '',
+    confidence REAL NOT NULL,
+    sample_size INTEGER NOT NULL,
+    success_rate REAL,
+    reinforcement_count INTEGER DEFAULT 1,
+    first_seen TEXT DEFAULT CURRENT_TIMESTAMP,
+    last_updated TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(pattern_type, pattern_value, genre, subgenre)
+);
+CREATE INDEX IF NOT EXISTS idx_cultural_classifications_classified_at ON cultural_classifications(classified_at);
+"""
+
+
+def connect(db_path: str = OFFLINE_DB_PATH) -> sqlite3.Connection:
+    """Open the offline database, creating the tables the functions need."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(OFFLINE_SCHEMA)
+    return conn
+
+
+def _since(minutes: int) -> str:
+    # SQLite CURRENT_TIMESTAMP is UTC 'YYYY-MM-DD HH:MM:SS'
+    return (datetime.utcnow() - timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def learn_patterns(conn: sqlite3.Connection, window_minutes: int = 20,
+                   min_confidence: float = 0.7, min_occurrences: int = 1) -> int:
+    """Equivalent of cultural_learn_patterns(): aggregate recent classifications and upsert patterns.
+
+    Like the RPC, this learns artist_genre and metadata patterns only; filename and folder hints
+    are learned per track by the scanner, since they are not stored with the classifications.
+    """
+    since = _since(window_minutes)
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS temp._learned")
+        conn.execute("""
+            CREATE TEMP TABLE _learned AS
+            SELECT 'artist_genre' AS pattern_type, cc.artist AS pattern_value, cc.genre,
+                   COALESCE(cc.subgenre, '') AS subgenre,
+                   COUNT(*) AS occurrences, AVG(cc.overall_confidence) AS avg_confidence
+            FROM cultural_classifications cc
+            WHERE cc.classified_at > ? AND cc.genre IS NOT NULL AND cc.artist IS NOT NULL
+              AND cc.overall_confidence >= ?
+            GROUP BY cc.artist, cc.genre, COALESCE(cc.subgenre, '')
+            HAVING COUNT(*) >= ?
+            UNION ALL
+            SELECT 'metadata', json_extract(ct.raw_metadata, '$.genre'), cc.genre, '',
+                   COUNT(*), AVG(cc.overall_confidence)
+            FROM cultural_classifications cc
+            JOIN cultural_tracks ct ON ct.id = cc.track_id
+            WHERE cc.classified_at > ? AND cc.genre IS NOT NULL
+              AND cc.overall_confidence >= ?
+              AND json_valid(ct.raw_metadata)
+              AND COALESCE(json_extract(ct.raw_metadata, '$.genre'), '') != ''
+            GROUP BY json_extract(ct.raw_metadata, '$.genre'), cc.genre
+            HAVING COUNT(*) >= ?
+        """, [since, min_confidence, min_occurrences, since, min_confidence, min_occurrences])
+
+        conn.execute("""
+            INSERT INTO cultural_patterns (pattern_type, pattern_value, genre, subgenre, confidence, sample_size, success_rate)
+            SELECT pattern_type, pattern_value, genre, subgenre,
+                   MIN(ROUND(avg_confidence, 2), 0.99), occurrences, MIN(ROUND(avg_confidence, 2), 0.99)
+            FROM _learned WHERE true
+            ON CONFLICT (pattern_type, pattern_value, genre, subgenre) DO UPDATE SET
+                confidence = MIN(ROUND(cultural_patterns.confidence * 0.9 + excluded.confidence * 0.1, 2), 0.99),
+                sample_size = cultural_patterns.sample_size + excluded.sample_size,
+                reinforcement_count = COALESCE(cultural_patterns.reinforcement_count, 1) + 1,
+                last_updated = CURRENT_TIMESTAMP
+        """)
+        patterns_learned = conn.execute("SELECT COUNT(*) FROM _learned").fetchone()[0]
+        conn.execute("DROP TABLE temp._learned")
+    return patterns_learned
+
+
+def update_confidence_scores(conn: sqlite3.Connection, window_minutes: int = 20,
+                             min_pattern_confidence: float = 0.8,
+                             genre_boost: float = 1.1, overall_boost: float = 1.05) -> int:
+    """Equivalent of cultural_update_confidence_scores()."""
+    with conn:
+        cursor = conn.execute("""
+            UPDATE cultural_classifications
+            SET genre_confidence = MIN(genre_confidence * ?, 0.99),
+                overall_confidence = MIN(overall_confidence * ?, 0.99)
+            WHERE id IN (
+                SELECT DISTINCT c.id
+                FROM cultural_classifications c
+                JOIN cultural_patterns cp
+                  ON cp.genre = c.genre
+                 AND cp.confidence > ?
+                 AND ((cp.pattern_type = 'artist_genre' AND cp.pattern_value = c.artist)
+                      OR cp.pattern_type = 'metadata')
+                WHERE c.classified_at > ?
+            )
+        """, [genre_boost, overall_boost, min_pattern_confidence, _since(window_minutes)])
+    return cursor.rowcount
+
+
+def age_patterns(conn: sqlite3.Connection, stale_hours: int = 24, decay: float = 0.99) -> int:
+    """Equivalent of cultural_age_patterns()."""
+    with conn:
+        cursor = conn.execute("""
+            UPDATE cultural_patterns
+            SET confidence = confidence * ?
+            WHERE last_updated < ? AND confidence > 0.1
+        """, [decay, _since(stale_hours * 60)])
+    return cursor.rowcount
+
+
+def intelligence_insights(conn: sqlite3.Connection, window_minutes: int = 20, top_n: int = 5) -> Dict:
+    """Equivalent of cultural_intelligence_insights()."""
+    since = _since(window_minutes)
+    row = conn.execute("""
+        SELECT COUNT(*), SUM(CASE WHEN needs_review THEN 1 ELSE 0 END), ROUND(AVG(overall_confidence), 2)
+        FROM cultural_classifications WHERE classified_at > ?
+    """, [since]).fetchone()
+    top_genres = conn.execute("""
+        SELECT genre, COUNT(*) AS n FROM cultural_classifications
+        WHERE classified_at > ? AND genre IS NOT NULL
+        GROUP BY genre ORDER BY n DESC LIMIT ?
+    """, [since, top_n]).fetchall()
+    top_artists = conn.execute("""
+        SELECT artist, COUNT(*) AS n FROM cultural_classifications
+        WHERE classified_at > ? AND artist IS NOT NULL
+        GROUP BY artist ORDER BY n DESC LIMIT ?
+    """, [since, top_n]).fetchall()
+    return {
+        'classified': row[0],
+        'needs_review': row[1] or 0,
+        'avg_confidence': row[2],
+        'top_genres': [{'genre': g, 'count': n} for g, n in top_genres],
+        'top_artists': [{'artist': a, 'count': n} for a, n in top_artists]
+    }
+
+
+# RPC name -> local implementation, so callers can dispatch the same way in both modes
+LOCAL_RPC_FUNCTIONS = {
+    'cultural_learn_patterns': learn_patterns,
+    'cultural_update_confidence_scores': update_confidence_scores,
+    'cultural_age_patterns': age_patterns,
+    'cultural_intelligence_insights': intelligence_insights,
+}
+
+
+def call_local_rpc(conn: sqlite3.Connection, function_name: str, params: Dict = None):
+    """Run the SQLite equivalent of a server-side RPC function."""
+    if function_name not in LOCAL_RPC_FUNCTIONS:
+        raise ValueError(f"No offline implementation for RPC function: {function_name}")
+    return LOCAL_RPC_FUNCTIONS[function_name](conn, **(params or {}))
+
+
+if __name__ == '__main__':
+    conn = connect()
+    print(json.dumps(intelligence_insights(conn, window_minutes=24 * 60), indent=2))
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+BOUNDED LRU CACHE
+=================
+Size-bounded, optionally expiring cache for API lookups, with warm-start snapshots.
+
+- LRU eviction once max_entries is reached
+- Optional TTL per cache (entries expire lazily on read)
+- Hit / miss / eviction / expiration counters for the stats endpoints
+- Periodic snapshot to a compressed JSON file (owner-only) so a restart comes back warm
+
+SharedSQLiteCache puts a small per-process LRUCache in front of a WAL-mode
+SQLite file, so several API worker processes share one cache.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+SNAPSHOT_VERSION = 2
+
+_MISSING = object()
+
+
+def _hashable(key: Any) -> Hashable:
+    """Undo JSON's tuple -> list conversion so snapshot keys can be dict keys again."""
+    if isinstance(key, list):
+        return tuple(_hashable(part) for part in key)
+    return key
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional TTL and snapshot persistence."""
+
+    def __init__(self, max_entries: int = 100000, ttl_seconds: Optional[float] = None,
+                 snapshot_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.snapshot_path = snapshot_path
+
+        # key -> (value, expires_at or None); order is least -> most recently used
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'snapshots_saved': 0,
+            'snapshot_entries_loaded': 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self.set(key, value)
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        """Return a cached value (refreshing its recency) or default."""
+        if key is None:
+            return default
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is not None and expires_at <= time.time():
+                    del self._entries[key]
+                    self.stats['expirations'] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    if count:
+                        self.stats['hits'] += 1
+                    return value
+            if count:
+                self.stats['misses'] += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Insert or replace a value, evicting least recently used entries over the limit."""
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Counters plus size and hit rate."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl_seconds
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    # ================================
+    # SNAPSHOTS
+    # ================================
+
+    def save_snapshot(self, path: Optional[str] = None) -> int:
+        """Write live entries (LRU order preserved) to a compressed JSON file. Returns entries written.
+
+        Keys and values must be JSON-serializable (tuple keys come back as tuples).
+        """
+        path = path or self.snapshot_path
+        if not path:
+            return 0
+        now = time.time()
+        with self._lock:
+            entries = [(key, value, expires_at) for key, (value, expires_at) in self._entries.items()
+                       if expires_at is None or expires_at > now]
+        snapshot = {'version': SNAPSHOT_VERSION, 'saved_at': now, 'entries': entries}
+        payload = zlib.compress(json.dumps(snapshot, default=str).encode('utf-8'))
+        # Write-then-rename so a crash mid-save never leaves a truncated snapshot;
+        # cached classifications are private to the service, so owner read/write only
+        temp_path = f"{path}.tmp"
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(temp_path, path)
+        self.stats['snapshots_saved'] += 1
+        return len(entries)
+
+    def load_snapshot(self, path: Optional[str] = None) -> int:
+        """Load a snapshot written by save_snapshot(). Returns entries loaded (0 if missing or unreadable)."""
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'rb') as f:
+                snapshot = json.loads(zlib.decompress(f.read()))
+            if snapshot.get('version') != SNAPSHOT_VERSION:
+                return 0
+            entries = [(_hashable(key), value, expires_at) for key, value, expires_at in snapshot['entries']]
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable cache snapshot {path}: {e}")
+            return 0
+        now = time.time()
+        loaded = 0
+        with self._lock:
+            for key, value, expires_at in entries:
+                if expires_at is not None and expires_at <= now:
+                    continue
+                self._entries[key] = (value, expires_at)
+                self._entries.move_to_end(key)
+                loaded += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self.stats['snapshot_entries_loaded'] += loaded
+        return loaded
+
+    def start_snapshots(self, interval_seconds: float = 300.0) -> None:
+        """Save a snapshot every interval_seconds on a daemon thread."""
+        if not self.snapshot_path or (self._snapshot_thread and self._snapshot_thread.is_alive()):
+            return
+
+        def loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.save_snapshot()
+                except Exception as e:
+                    print(f"⚠️ Cache snapshot failed: {e}")
+
+        self._stop.clear()
+        self._snapshot_thread = threading.Thread(target=loop, name='cache-snapshot', daemon=True)
+        self._snapshot_thread.start()
+
+    def stop_snapshots(self, save: bool = True) -> None:
+        """Stop the snapshot thread, optionally writing one final snapshot."""
+        self._stop.set()
+        if save and self.snapshot_path:
+            self.save_snapshot()
+
+
+class SharedSQLiteCache:
+    """Cross-process cache: per-process LRU in front of a shared SQLite table.
+
+    Values must be JSON-serializable. Eviction is approximate LRU by last access,
+    pruned every prune_interval writes.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 200000, ttl_seconds: Optional[float] = None,
+                 local_entries: int = 10000, prune_interval: int = 1000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.prune_interval = prune_interval
+        self.local = LRUCache(max_entries=local_entries, ttl_seconds=ttl_seconds)
+
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries(accessed_at)")
+        self.stats = {'hits': 0, 'misses': 0, 'shared_hits': 0, 'evictions': 0, 'expirations': 0}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.set(key, value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key is None:
+            return default
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            self.stats['hits'] += 1
+            return value
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+            if row and row[1] is not None and row[1] <= now:
+                self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                self.stats['expirations'] += 1
+                row = None
+            if row:
+                self._conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+        if not row:
+            self.stats['misses'] += 1
+            return default
+        value = json.loads(row[0])
+        self.local.set(key, value, ttl_seconds=row[1] - now if row[1] else None)
+        self.stats['hits'] += 1
+        self.stats['shared_hits'] += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        now = time.time()
+        self.local.set(key, value, ttl_seconds=ttl)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, default=str), now + ttl if ttl else None, now))
+            self._writes += 1
+            if self._writes % self.prune_interval == 0:
+                self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        # Caller holds the lock
+        cursor = self._conn.execute("DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        self.stats['expirations'] += cursor.rowcount
+        cursor = self._conn.execute("""
+            DELETE FROM cache_entries WHERE key IN (
+                SELECT key FROM cache_entries ORDER BY accessed_at
+                LIMIT MAX((SELECT COUNT(*) FROM cache_entries) - ?, 0)
+            )
+        """, (self.max_entries,))
+        self.stats['evictions'] += cursor.rowcount
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['entries'] = len(self)
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl_seconds
+        stats['local'] = self.local.get_stats()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    # Snapshots are unnecessary - the SQLite file already survives restarts
+    def load_snapshot(self, path: Optional[str] = None) -> int:
+        return 0
+
+    def start_snapshots(self, interval_seconds: float = 300.0) -> None:
+        pass
+
+    def stop_snapshots(self, save: bool = True) -> None:
+        pass
+
@@ -10,22 +10,29 @@ Delivers instant classification, duplicate detection, and metadata intelligence.
 import os
 import json
 import time
-import hashlib
+import atexit
+import threading
 from datetime import datetime
 from typing import Dict, List, Optional
 from pathlib import Path
 
 try:
-    from flask import Flask, jsonify, request
+    from flask import Flask, Response, jsonify, request
     from flask_cors import CORS
 except ImportError:
     print("⚠️  Installing Flask for API service...")
     os.system("pip install flask flask-cors")
-    from flask import Flask, jsonify, request
+    from flask import Flask, Response, jsonify, request
     from flask_cors import CORS
 
 from taxonomy_v32 import TaxonomyConfig
 from taxonomy_scanner import MetadataExtractor, PatternAnalyzer
+from file_hashing import identity_hashes
+from lru_cache import LRUCache, SharedSQLiteCache
+from single_flight import SingleFlight
+from metrics import instrument_flask, register_stats
+from batch_streaming import (NDJSON_MIMETYPE, MAX_PAGE_SIZE, clamp_concurrency,
+                             iter_concurrent, ndjson_stream, paginate)
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -36,9 +43,32 @@ config = TaxonomyConfig()
 metadata_extractor = MetadataExtractor()
 pattern_analyzer = PatternAnalyzer()
 
-# In-memory cache for fast lookups (production would use Redis/database)
-classification_cache = {}
-duplicate_cache = {}
+# Bounded in-memory caches for fast lookups, snapshotted to disk for warm restarts.
+# With api.shared_cache_path set (multi-worker ASGI deployment) every worker shares one SQLite-backed cache.
+CACHE_SNAPSHOT_DIR = config.get('api.cache_snapshot_dir', '.')
+SHARED_CACHE_PATH = config.get('api.shared_cache_path')
+if SHARED_CACHE_PATH:
+    classification_cache = SharedSQLiteCache(
+        SHARED_CACHE_PATH,
+        max_entries=config.get('api.cache_max_entries', 200000),
+        ttl_seconds=config.get('api.cache_ttl_seconds')
+    )
+    duplicate_cache = SharedSQLiteCache(
+        f"{os.path.splitext(SHARED_CACHE_PATH)[0]}_duplicates.db",
+        max_entries=config.get('api.duplicate_cache_max_entries', 50000),
+        ttl_seconds=config.get('api.cache_ttl_seconds')
+    )
+else:
+    classification_cache = LRUCache(
+        max_entries=config.get('api.cache_max_entries', 200000),
+        ttl_seconds=config.get('api.cache_ttl_seconds'),
+        snapshot_path=os.path.join(CACHE_SNAPSHOT_DIR, 'metacrate_classification_cache.json.z')
+    )
+    duplicate_cache = LRUCache(
+        max_entries=config.get('api.duplicate_cache_max_entries', 50000),
+        ttl_seconds=config.get('api.cache_ttl_seconds'),
+        snapshot_path=os.path.join(CACHE_SNAPSHOT_DIR, 'metacrate_duplicate_cache.json.z')
+    )
 
 class MetaCrateAPI:
     """MetaCrate integration API for real-time taxonomy intelligence"""
@@ -46,14 +76,20 @@ class MetaCrateAPI:
     def __init__(self):
         self.request_count = 0
         self.start_time = time.time()
+        # Identical concurrent lookups share one hash + analysis
+        self.flight = SingleFlight(negative_ttl=5.0)
         
         # Load any existing classification data
         self._load_cached_data()
     
     def _load_cached_data(self):
         """Load existing classification data for fast lookups"""
-        # In production, this would load from Supabase
-        # For now, try to load from recent scan results
+        # Warm start from the last snapshot; fall back to the newest scan results
+        loaded = classification_cache.load_snapshot()
+        duplicate_cache.load_snapshot()
+        if loaded or len(classification_cache):
+            print(f"Loaded {len(classification_cache)} classifications from cache snapshot")
+            return
         try:
             # Look for recent scan files
             scan_files = [f for f in os.listdir('.') if f.startswith('taxonomy_scan_') and f.endswith('.json')]
@@ -62,11 +98,11 @@ class MetaCrateAPI:
                 with open(latest_scan, 'r') as f:
                     data = json.load(f)
                 
-                # Cache classifications by hash
+                # Cache classifications by hash (legacy SHA-256 and content hash both resolve)
                 for classification in data.get('classifications', []):
-                    file_hash = classification.get('file_hash')
-                    if file_hash:
-                        classification_cache[file_hash] = classification
+                    for key in ('file_hash', 'content_hash'):
+                        if classification.get(key):
+                            classification_cache[classification[key]] = classification
                 
                 # Cache duplicate information
                 for group in data.get('duplicate_groups', []):
@@ -79,7 +115,11 @@ class MetaCrateAPI:
             print(f"Could not load cached data: {e}")
     
     def get_file_intelligence(self, file_path: str = None, file_hash: str = None) -> Dict:
-        """Get comprehensive intelligence for a file"""
+        """Get comprehensive intelligence for a file (coalesced with identical in-flight requests)"""
+        key = (os.path.normcase(os.path.abspath(file_path)) if file_path else None, file_hash)
+        return self.flight.do(key, lambda: self._get_file_intelligence(file_path, file_hash))
+    
+    def _get_file_intelligence(self, file_path: str = None, file_hash: str = None) -> Dict:
         start_time = time.time()
         
         try:
@@ -147,8 +187,7 @@ class MetaCrateAPI:
     def _generate_hash(self, file_path: str) -> str:
         """Generate file hash for lookup"""
         try:
-            with open(file_path, 'rb') as f:
-                return hashlib.sha256(f.read()).hexdigest()
+            return identity_hashes(file_path)['file_hash']
         except Exception:
             return None
     
@@ -246,6 +285,33 @@ class MetaCrateAPI:
 # Initialize API instance
 metacrate_api = MetaCrateAPI()
 
+# /metrics: per-route latency plus cache hit rates and single-flight counters
+instrument_flask(app, 'metacrate_api')
+register_stats('lru_cache', classification_cache.get_stats, cache='classification', service='metacrate_api')
+register_stats('lru_cache', duplicate_cache.get_stats, cache='duplicate', service='metacrate_api')
+register_stats('single_flight', metacrate_api.flight.get_stats, service='metacrate_api')
+
+_snapshots_lock = threading.Lock()
+_snapshots_started = False
+
+@app.before_request
+def start_cache_snapshots():
+    """Start periodic cache snapshots plus a final one on shutdown, once per process.
+
+    WSGI servers import the app without running main() and forked workers do not
+    inherit threads, so this runs on each worker's first request.
+    """
+    global _snapshots_started
+    if _snapshots_started:
+        return
+    with _snapshots_lock:
+        if not _snapshots_started:
+            snapshot_interval = config.get('api.cache_snapshot_interval', 300)
+            for cache in (classification_cache, duplicate_cache):
+                cache.start_snapshots(snapshot_interval)
+                atexit.register(cache.stop_snapshots)
+            _snapshots_started = True
+
 # =====================================================
 # FLASK API ENDPOINTS
 # =====================================================
@@ -328,49 +394,88 @@ def get_api_stats():
         },
         "cache_stats": {
             "classifications_cached": len(classification_cache),
-            "duplicates_cached": len(duplicate_cache)
+            "duplicates_cached": len(duplicate_cache),
+            "classification_cache": classification_cache.get_stats(),
+            "duplicate_cache": duplicate_cache.get_stats(),
+            "single_flight": metacrate_api.flight.get_stats()
         },
         "supported_operations": [
             "GET /api/v3.2/file/hash/<hash>",
             "POST /api/v3.2/file/analyze", 
             "GET /api/v3.2/file/path?path=<path>",
+            "POST /api/v3.2/batch",
+            "POST /api/v3.2/batch/stream",
             "GET /api/v3.2/health",
             "GET /api/v3.2/stats"
         ]
     })
 
-@app.route('/api/v3.2/batch', methods=['POST'])
-def batch_analyze():
-    """Batch file analysis for MetaCrate efficiency"""
-    metacrate_api.request_count += 1
-    
+def _parse_batch_request():
+    """Validate a batch body. Returns (page, pagination, concurrency) or an error response."""
     data = request.json
     file_paths = data.get('file_paths', []) if data else []
     
     if not file_paths or not isinstance(file_paths, list):
-        return jsonify({
+        return None, (jsonify({
             "status": "error",
             "error": "file_paths array required in JSON body"
-        }), 400
+        }), 400)
+    
+    page, pagination = paginate(file_paths, data.get('offset', 0), data.get('limit', MAX_PAGE_SIZE))
+    return (page, pagination, clamp_concurrency(data.get('concurrency'))), None
+
+@app.route('/api/v3.2/batch', methods=['POST'])
+def batch_analyze():
+    """Batch file analysis for MetaCrate efficiency"""
+    metacrate_api.request_count += 1
     
-    results = []
-    for file_path in file_paths[:50]:  # Limit batch size
-        result = metacrate_api.get_file_intelligence(file_path=file_path)
-        results.append({
+    parsed, error = _parse_batch_request()
+    if error:
+        return error
+    page, pagination, concurrency = parsed
+    
+    # Files are analysed concurrently; the response keeps request order
+    results = [None] * len(page)
+    for (index, file_path), result in iter_concurrent(
+            lambda item: metacrate_api.get_file_intelligence(file_path=item[1]),
+            enumerate(page), max_in_flight=concurrency):
+        results[index] = {
             "file_path": file_path,
-            "result": result
-        })
+            "result": result if not isinstance(result, Exception) else {"status": "error", "error": str(result)}
+        }
     
     return jsonify({
         "status": "success",
         "batch_size": len(results),
         "results": results,
+        "pagination": pagination,
         "api_info": {
             "timestamp": datetime.now().isoformat(),
-            "batch_limit": 50
+            "batch_limit": MAX_PAGE_SIZE,
+            "concurrency": concurrency
         }
     })
 
+@app.route('/api/v3.2/batch/stream', methods=['POST'])
+def batch_analyze_stream():
+    """Batch analysis streamed as NDJSON - one line per file as it finishes, then a summary line"""
+    metacrate_api.request_count += 1
+    
+    parsed, error = _parse_batch_request()
+    if error:
+        return error
+    page, pagination, concurrency = parsed
+    
+    def to_record(file_path, result):
+        if isinstance(result, Exception):
+            result = {"status": "error", "error": str(result)}
+        return {"type": "result", "file_path": file_path, "status": result.get('status'), "result": result}
+    
+    results = iter_concurrent(lambda path: metacrate_api.get_file_intelligence(file_path=path),
+                              page, max_in_flight=concurrency)
+    return Response(ndjson_stream(results, to_record, {"pagination": pagination, "concurrency": concurrency}),
+                    mimetype=NDJSON_MIMETYPE)
+
 # =====================================================
 # MetaCrate SDK/Client Library
 # =====================================================
@@ -413,6 +518,26 @@ class MetaCrateClient:
         response = requests.post(url, json={"file_paths": file_paths})
         return response.json()
     
+    def batch_analyze_stream(self, file_paths: List[str], concurrency: int = None):
+        """Stream batch results as they finish - yields one dict per file, then the summary"""
+        import requests
+        
+        url = f"{self.api_url}{self.base_path}/batch/stream"
+        offset = 0
+        while offset is not None:
+            body = {"file_paths": file_paths, "offset": offset}
+            if concurrency:
+                body["concurrency"] = concurrency
+            offset = None  # Stops unless the summary line points at another page
+            with requests.post(url, json=body, stream=True) as response:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    yield record
+                    if record.get('type') == 'summary':
+                        offset = record.get('pagination', {}).get('next_offset')
+    
     def health_check(self) -> Dict:
         """Check API health"""
         import requests
@@ -438,6 +563,7 @@ def main():
     print(f"   File Path:    http://{host}:{port}/api/v3.2/file/path?path=<path>")
     print(f"   Analyze:      POST http://{host}:{port}/api/v3.2/file/analyze")
     print(f"   Batch:        POST http://{host}:{port}/api/v3.2/batch")
+    print(f"   Batch stream: POST http://{host}:{port}/api/v3.2/batch/stream (NDJSON)")
     print()
     print(f"Cached Data:")
     print(f"   Classifications: {len(classification_cache)}")
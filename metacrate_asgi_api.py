@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+MetaCrate ASGI API - async service for /api/track/* and /api/v3.2/*
+===================================================================
+
+Serves the same routes as metacrate_integration_api.py and metacrate_api.py
+from one FastAPI app under uvicorn:
+- Database reads go through AsyncCulturalDatabaseClient, so a slow Supabase
+  call only delays the request that made it
+- Hashing and tag parsing run on worker executors; patterns come from the compiled index
+- Run several worker processes with --workers; set api.shared_cache_path in
+  taxonomy_config.json so they share one classification cache
+
+Usage:
+    python metacrate_asgi_api.py --workers 4
+    uvicorn metacrate_asgi_api:app --host 0.0.0.0 --port 5000 --workers 4
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+import metacrate_api as v32
+import metacrate_integration_api as integration
+from async_database_client import AsyncCulturalDatabaseClient
+from batch_streaming import (NDJSON_MIMETYPE, MAX_PAGE_SIZE, aiter_concurrent, andjson_stream,
+                             clamp_concurrency, paginate)
+from single_flight import AsyncSingleFlight
+from metrics import instrument_asgi, register_stats
+from track_hash_index import INDEX_COLUMNS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="MetaCrate Integration API (ASGI)", version="3.2")
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+# File and CPU work never runs on the event loop
+io_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='metacrate-io')
+
+db: Optional[AsyncCulturalDatabaseClient] = None
+track_index = integration.track_index
+pattern_manager = integration.pattern_manager
+analysis_flight = AsyncSingleFlight(negative_ttl=5.0)
+
+stats = {
+    'start_time': time.time(),
+    'total_requests': 0,
+    'cache_hits': 0,
+    'new_analyses': 0,
+    'errors': 0
+}
+
+# /metrics: per-route latency plus the shared index and single-flight counters
+instrument_asgi(app, 'metacrate_asgi_api')
+register_stats('metacrate_asgi_api', lambda: stats)
+register_stats('track_hash_index', track_index.get_stats, service='metacrate_asgi_api')
+register_stats('pattern_index', pattern_manager.get_stats, service='metacrate_asgi_api')
+register_stats('single_flight', analysis_flight.get_stats, service='metacrate_asgi_api')
+
+
+class AnalyzeRequest(BaseModel):
+    file_path: Optional[str] = None
+    file_hash: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    file_paths: Optional[List[str]] = None
+    offset: int = 0
+    limit: int = MAX_PAGE_SIZE
+    concurrency: Optional[int] = None
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the I/O executor."""
+    return await asyncio.get_running_loop().run_in_executor(io_executor, func, *args)
+
+
+def error_json(message: str, status_code: int = 400, **extra) -> JSONResponse:
+    return JSONResponse({'status': 'error', 'error': message, **extra}, status_code=status_code)
+
+
+@app.on_event("startup")
+async def startup_event():
+    global db
+    db = AsyncCulturalDatabaseClient()
+    await db.resolve_columns()
+    # Warm the hash index without blocking the loop; it polls on its own thread afterwards
+    await run_blocking(track_index.start)
+    await run_blocking(pattern_manager.start)
+    logger.info(f"MetaCrate ASGI worker {os.getpid()} ready - hash index: {len(track_index)} tracks")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    track_index.stop()
+    pattern_manager.stop()
+    if db is not None:
+        await db.close()
+
+
+# =====================================================
+# /api/track/* (metacrate_integration_api)
+# =====================================================
+
+async def get_duplicate_group(file_hash: str) -> List:
+    group = track_index.peek(file_hash)
+    if group is None:
+        group = track_index.remember(await db.get_tracks_by_hash(file_hash, columns=INDEX_COLUMNS))
+    return group
+
+
+async def analyze_track_intelligence(file_path: str, file_hash: Optional[str]) -> dict:
+    """Async version of integration.analyze_track_intelligence (same responses)."""
+    try:
+        duplicate_tracks = await get_duplicate_group(file_hash) if file_hash else []
+        existing_track = duplicate_tracks[0] if duplicate_tracks else None
+        duplicate_info = integration.check_duplicate_status(file_hash, file_path, duplicate_tracks) if file_hash else {
+            **integration.NO_HASH_DUPLICATE_INFO, 'primary_file': file_path
+        }
+
+        if duplicate_info['is_duplicate'] and not duplicate_info['is_best_version']:
+            return integration.duplicate_skip_response(duplicate_info, known_track=existing_track is not None)
+
+        if existing_track:
+            classifications = await db.get_classifications_by_track_id(existing_track['id'])
+            if classifications:
+                return integration.database_lookup_response(file_path, file_hash, existing_track,
+                                                            duplicate_info, classifications[0])
+
+        metadata = await run_blocking(integration.extract_basic_metadata, file_path)
+        return integration.live_analysis_response(file_path, file_hash, duplicate_info, metadata,
+                                                  pattern_manager.index)
+    except Exception as e:
+        return integration.error_response(file_path, file_hash, e)
+
+
+async def analyze_file(file_path: str, file_hash: Optional[str] = None) -> Optional[dict]:
+    """Hash (if needed) and analyze once per burst of identical requests. None if it can't be hashed."""
+    async def compute():
+        resolved_hash = file_hash or await run_blocking(integration.calculate_file_hash, file_path)
+        if not resolved_hash:
+            return None
+        return await analyze_track_intelligence(file_path, resolved_hash)
+    return await analysis_flight.do(integration.analysis_key(file_path, file_hash), compute)
+
+
+async def analyze_path(file_path: str) -> dict:
+    result = await analyze_file(file_path)
+    return result if result is not None else await analyze_track_intelligence(file_path, None)
+
+
+@app.get("/api/health")
+async def health_check():
+    track_count = await db.count_discovered_tracks()
+    return {
+        'status': 'healthy',
+        'service': 'MetaCrate Integration API',
+        'version': '3.2',
+        'server': 'asgi',
+        'worker_pid': os.getpid(),
+        'database': 'connected' if track_count is not None else 'error',
+        'statistics': {
+            'uptime_seconds': int(time.time() - stats['start_time']),
+            'total_requests': stats['total_requests'],
+            'cache_hits': stats['cache_hits'],
+            'new_analyses': stats['new_analyses'],
+            'errors': stats['errors'],
+            'tracks_in_database': track_count or 0
+        },
+        'hash_index': track_index.get_stats(),
+        'pattern_index': pattern_manager.get_stats(),
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+@app.post("/api/track/analyze")
+async def analyze_track(body: AnalyzeRequest):
+    stats['total_requests'] += 1
+    start_time = time.time()
+
+    if not body.file_path:
+        stats['errors'] += 1
+        return error_json('file_path required')
+
+    result = await analyze_file(body.file_path, body.file_hash)
+    if result is None:
+        stats['errors'] += 1
+        return error_json('Could not calculate file hash', track={
+            'artist': 'Unknown Artist',
+            'track_name': Path(body.file_path).stem,
+            'remix_info': 'Original Mix',
+            'genre': 'Electronic',
+            'subgenre': None,
+            'confidence': 0.0
+        })
+
+    if result.get('metadata', {}).get('source') == 'database_lookup':
+        stats['cache_hits'] += 1
+    else:
+        stats['new_analyses'] += 1
+
+    result['api_info'] = {
+        'response_time_ms': int((time.time() - start_time) * 1000),
+        'timestamp': datetime.now().isoformat()
+    }
+    return result
+
+
+def _track_record(file_path, result):
+    if isinstance(result, Exception):
+        stats['errors'] += 1
+        result = {'status': 'error', 'error': str(result)}
+    return {'type': 'result', 'file_path': file_path, 'status': result.get('status'), 'result': result}
+
+
+@app.post("/api/track/batch")
+async def batch_analyze(body: BatchRequest):
+    stats['total_requests'] += 1
+    if not body.file_paths:
+        return JSONResponse({'error': 'file_paths array required'}, status_code=400)
+    page, pagination = paginate(body.file_paths, body.offset, body.limit)
+    concurrency = clamp_concurrency(body.concurrency)
+
+    results = [None] * len(page)
+    async for (index, file_path), result in aiter_concurrent(lambda item: analyze_path(item[1]),
+                                                             enumerate(page), max_in_flight=concurrency):
+        record = _track_record(file_path, result)
+        results[index] = {'file_path': file_path, 'result': record['result']}
+
+    return {'status': 'success', 'batch_size': len(results), 'results': results, 'pagination': pagination}
+
+
+@app.post("/api/track/batch/stream")
+async def batch_analyze_stream(body: BatchRequest):
+    stats['total_requests'] += 1
+    if not body.file_paths:
+        stats['errors'] += 1
+        return JSONResponse({'error': 'file_paths array required'}, status_code=400)
+    page, pagination = paginate(body.file_paths, body.offset, body.limit)
+    concurrency = clamp_concurrency(body.concurrency)
+
+    results = aiter_concurrent(analyze_path, page, max_in_flight=concurrency)
+    return StreamingResponse(andjson_stream(results, _track_record,
+                                            {'pagination': pagination, 'concurrency': concurrency}),
+                             media_type=NDJSON_MIMETYPE)
+
+
+@app.get("/api/stats")
+async def get_statistics():
+    uptime = time.time() - stats['start_time']
+    total = stats['total_requests']
+    return {
+        'api_statistics': stats,
+        'uptime_seconds': int(uptime),
+        'requests_per_minute': total / (uptime / 60) if uptime > 0 else 0,
+        'cache_hit_rate': stats['cache_hits'] / total if total > 0 else 0,
+        'error_rate': stats['errors'] / total if total > 0 else 0,
+        'hash_index': track_index.get_stats(),
+        'single_flight': analysis_flight.get_stats()
+    }
+
+
+# =====================================================
+# /api/v3.2/* (metacrate_api)
+# =====================================================
+
+async def file_intelligence(file_path: str = None, file_hash: str = None) -> dict:
+    v32.metacrate_api.request_count += 1
+    return await run_blocking(lambda: v32.metacrate_api.get_file_intelligence(file_path=file_path, file_hash=file_hash))
+
+
+@app.get("/api/v3.2/health")
+async def v32_health_check():
+    return {
+        "status": "healthy",
+        "service": "Cultural Intelligence System v3.2",
+        "purpose": "MetaCrate Integration API",
+        "server": "asgi",
+        "worker_pid": os.getpid(),
+        "uptime_seconds": int(time.time() - v32.metacrate_api.start_time),
+        "cached_classifications": await run_blocking(len, v32.classification_cache),
+        "cached_duplicates": await run_blocking(len, v32.duplicate_cache),
+        "total_requests": v32.metacrate_api.request_count,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@app.get("/api/v3.2/file/hash/{file_hash}")
+async def v32_get_file_by_hash(file_hash: str):
+    return await file_intelligence(file_hash=file_hash)
+
+
+@app.post("/api/v3.2/file/analyze")
+async def v32_analyze_file(body: AnalyzeRequest):
+    if not body.file_path:
+        return error_json("file_path required in JSON body")
+    return await file_intelligence(file_path=body.file_path)
+
+
+@app.get("/api/v3.2/file/path")
+async def v32_get_file_by_path(path: Optional[str] = None):
+    if not path:
+        return error_json("path parameter required")
+    return await file_intelligence(file_path=path)
+
+
+@app.get("/api/v3.2/stats")
+async def v32_get_api_stats():
+    uptime = time.time() - v32.metacrate_api.start_time
+    return {
+        "service_stats": {
+            "uptime_seconds": int(uptime),
+            "total_requests": v32.metacrate_api.request_count,
+            "requests_per_minute": v32.metacrate_api.request_count / (uptime / 60) if uptime > 0 else 0,
+            "worker_pid": os.getpid()
+        },
+        "cache_stats": {
+            "classification_cache": await run_blocking(v32.classification_cache.get_stats),
+            "duplicate_cache": await run_blocking(v32.duplicate_cache.get_stats),
+            "single_flight": v32.metacrate_api.flight.get_stats()
+        }
+    }
+
+
+def _v32_record(file_path, result):
+    if isinstance(result, Exception):
+        result = {"status": "error", "error": str(result)}
+    return {"type": "result", "file_path": file_path, "status": result.get('status'), "result": result}
+
+
+@app.post("/api/v3.2/batch")
+async def v32_batch_analyze(body: BatchRequest):
+    if not body.file_paths:
+        return error_json("file_paths array required in JSON body")
+    page, pagination = paginate(body.file_paths, body.offset, body.limit)
+    concurrency = clamp_concurrency(body.concurrency)
+
+    results = [None] * len(page)
+    async for (index, file_path), result in aiter_concurrent(lambda item: file_intelligence(file_path=item[1]),
+                                                             enumerate(page), max_in_flight=concurrency):
+        results[index] = {"file_path": file_path, "result": _v32_record(file_path, result)['result']}
+
+    return {
+        "status": "success",
+        "batch_size": len(results),
+        "results": results,
+        "pagination": pagination,
+        "api_info": {"timestamp": datetime.now().isoformat(), "batch_limit": MAX_PAGE_SIZE,
+                     "concurrency": concurrency}
+    }
+
+
+@app.post("/api/v3.2/batch/stream")
+async def v32_batch_analyze_stream(body: BatchRequest):
+    if not body.file_paths:
+        return error_json("file_paths array required in JSON body")
+    page, pagination = paginate(body.file_paths, body.offset, body.limit)
+    concurrency = clamp_concurrency(body.concurrency)
+
+    results = aiter_concurrent(lambda path: file_intelligence(file_path=path), page, max_in_flight=concurrency)
+    return StreamingResponse(andjson_stream(results, _v32_record,
+                                            {"pagination": pagination, "concurrency": concurrency}),
+                             media_type=NDJSON_MIMETYPE)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='MetaCrate ASGI API')
+    parser.add_argument('--host', default=v32.config.get('api.host', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=v32.config.get('api.port', 5000))
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes (default: 4)')
+    args = parser.parse_args()
+
+    if args.workers > 1 and not v32.SHARED_CACHE_PATH:
+        print("⚠️ api.shared_cache_path not set - each worker keeps its own classification cache")
+
+    uvicorn.run("metacrate_asgi_api:app", host=args.host, port=args.port, workers=args.workers)
@@ -15,18 +15,20 @@ import os
 import sys
 import logging
 import argparse
-import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any
 import signal
 import json
 import socket
-import hashlib
 from datetime import datetime, timedelta
 from pathlib import Path
-import random
 from threading import Event
 from cultural_database_client import CulturalDatabaseClient
 from cultural_intelligence_scanner import CulturalIntelligenceScanner
+from work_queue import PriorityWorkQueue
+from parallel_walker import ParallelDirectoryWalker
+from file_hashing import identity_hashes
+from notification_dispatcher import TWITCH_RATE, NotificationDispatcher
+from metrics import FILES_PER_SECOND, FILES_PROCESSED, QUEUE_DEPTH, REGISTRY
 def setup_early_exit_handler():
     early_exit = {'triggered': False}
     def handle_early_exit(signum, frame):
@@ -53,6 +55,10 @@ class TwitchBot:
         
         self.logger = logging.getLogger(__name__)
         
+        # Reports are queued and sent by a background thread within Twitch's rate limit
+        self.notifications = NotificationDispatcher(name='twitch-bot')
+        self.notifications.register_channel('twitch', self.send_message, TWITCH_RATE)
+        
         if self.enabled:
             self.logger.info(f"[TWITCH] Bot configured for #{self.channel}")
         else:
@@ -118,26 +124,25 @@ class TwitchBot:
         # Main completion message
         # Use plain text for Windows console compatibility
         main_msg = f"[MUSIC] BATCH {batch_num} COMPLETE! [DONE] {files_processed} tracks processed in {processing_time:.1f}s [FAST] {rate:.1f} tracks/sec"
-        self.send_message(main_msg)
-        time.sleep(1.5)  # Rate limiting
+        self.notifications.notify('twitch', main_msg)
         
         # AI insights if available
         if insights and len(insights) > 0:
             insight_msg = f"[AI] DISCOVERIES: {' | '.join(insights[:2])}"  # Top 2 insights
-            self.send_message(insight_msg)
-            time.sleep(1.5)
+            self.notifications.notify('twitch', insight_msg)
         
         # Error report if any
         if errors > 0:
             error_msg = f"[WARN] ISSUES: {errors} files had processing errors"
-            self.send_message(error_msg)
-            time.sleep(1.5)
+            self.notifications.notify('twitch', error_msg)
         else:
             success_msg = f"[OK] PERFECT RUN: All {files_processed} tracks processed successfully!"
-            self.send_message(success_msg)
+            self.notifications.notify('twitch', success_msg)
     
     def disconnect(self):
-    # Disconnect from Twitch IRC
+    # Disconnect from Twitch IRC (after queued reports go out)
+        if not self.notifications.flush(timeout=15.0):
+            self.logger.warning(f"[TWITCH] {self.notifications.get_stats()['pending']} messages still queued at disconnect")
         if self.socket:
             try:
                 self.socket.close()
@@ -160,7 +165,8 @@ class MetaCrateBatchOrchestrator:
     - Integration with Cultural Intelligence System v1.7
     """
     
-    def __init__(self, batch_size: int = 250, analysis_interval: int = 15, twitch_bot: TwitchBot = None):
+    def __init__(self, batch_size: int = 250, analysis_interval: int = 15, twitch_bot: TwitchBot = None,
+                 newest_first: bool = True, fair_share: bool = True, walker_threads: int = 16):
         self.db_client = CulturalDatabaseClient()
         self.ai_scanner = CulturalIntelligenceScanner()
         self.running = True
@@ -174,6 +180,18 @@ class MetaCrateBatchOrchestrator:
         # Version management
         self.processing_version = 'v1.7'
         
+        # Priority work queue (persists across batches so new drops jump ahead of the archive)
+        self.work_queue = PriorityWorkQueue(
+            users_root=self.metacrate_users_path,
+            newest_first=newest_first,
+            fair_share=fair_share
+        )
+        self.priority_requests_file = Path(__file__).parent / "metacrate_priority_requests.txt"
+        self.walker = ParallelDirectoryWalker(
+            {'.mp3', '.flac', '.wav', '.m4a', '.aac', '.aif', '.aiff', '.ogg'},
+            max_workers=walker_threads
+        )
+        
         # Twitch integration
         self.twitch_bot = twitch_bot
         
@@ -182,9 +200,6 @@ class MetaCrateBatchOrchestrator:
         self.current_batch = 0
         self.session_start = datetime.now()
         
-        # Database connection (using REST API client, not direct PostgreSQL)
-        self.conn = None
-        
         # Setup logging with UTF-8 support
         import sys
         import io
@@ -215,18 +230,14 @@ class MetaCrateBatchOrchestrator:
         self.logger.info(f"MetaCrate USERS path validated: {self.metacrate_users_path}")
         return True
     
-    def _calculate_file_hash(self, file_path: str) -> Optional[str]:
-        """Calculate SHA256 hash of a file for duplicate detection"""
+    def _calculate_file_hashes(self, file_path: str) -> List[str]:
+        """Calculate identity hashes (SHA256 and the configured content hash) for duplicate detection"""
         try:
-            hash_sha256 = hashlib.sha256()
-            with open(file_path, 'rb') as f:
-                # Read file in chunks to handle large files efficiently
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_sha256.update(chunk)
-            return hash_sha256.hexdigest()
+            hashes = identity_hashes(file_path)
+            return list({hashes['file_hash'], hashes['content_hash']})
         except (OSError, IOError) as e:
             self.logger.warning(f"Could not calculate hash for {file_path}: {e}")
-            return None
+            return []
 
     # Utility for safe text file reading
     def safe_read_text(self, file_path):
@@ -245,21 +256,42 @@ class MetaCrateBatchOrchestrator:
         except Exception as e:
             self.logger.warning(f"Could not write text file {file_path}: {e}")
     
+    def request_priority(self, file_paths: List[str]) -> None:
+        """Move files MetaCrate asked for to the front of the work queue"""
+        for file_path in file_paths:
+            self.work_queue.request(file_path)
+    
+    def _load_priority_requests(self):
+        """Consume paths MetaCrate dropped into the priority requests file (one per line)"""
+        if not self.priority_requests_file.exists():
+            return
+        text = self.safe_read_text(self.priority_requests_file)
+        if text is None:
+            return
+        requested = [line.strip() for line in text.splitlines() if line.strip()]
+        if requested:
+            self.request_priority(requested)
+            self.logger.info(f"Prioritized {len(requested)} MetaCrate-requested files")
+        self.safe_write_text(self.priority_requests_file, '')
+    
     def get_unprocessed_files_batch(self) -> List[str]:
         """Get next batch of unprocessed audio files from MetaCrate USERS directory (v1.7 version-based)"""
-        audio_extensions = {'.mp3', '.flac', '.wav', '.m4a', '.aac', '.aif', '.aiff', '.ogg'}
         unprocessed_files = []
         
         # Get list of already processed file paths from database (VERSION-BASED RESCANNING)
         # Only skip files that have been processed with the current version (v1.7)
         processed_paths = set()
         processed_hashes = set()
+        # Tracks stored with an older version: the scanner reruns only their stale stages
+        # (processing_stages.py) from the stored hash and tags, so they skip the hash check below
+        stale_paths = set()
         
         # Use REST API client instead of direct database connection
         try:
             # Query for tracks with current processing version using REST API
             # Build query to get file_path and file_hash where processing_version matches
-            endpoint = f'cultural_tracks?processing_version=eq.{self.processing_version}&file_hash=not.is.null&select=file_path,file_hash'
+            columns = self.db_client.track_columns('file_path,file_hash,content_hash')
+            endpoint = f'cultural_tracks?processing_version=eq.{self.processing_version}&file_hash=not.is.null&select={columns}'
             response = self.db_client._make_request('GET', endpoint)
             tracks = response.json()
             
@@ -270,77 +302,92 @@ class MetaCrateBatchOrchestrator:
                         processed_paths.add(track['file_path'])
                 if track.get('file_hash'):
                     processed_hashes.add(track['file_hash'])
+                if track.get('content_hash'):
+                    processed_hashes.add(track['content_hash'])
             
             self.logger.info(f"Found {len(processed_paths)} file paths already processed with {self.processing_version}")
             self.logger.info(f"Found {len(processed_hashes)} file hashes already processed with {self.processing_version}")
             
             # Also check for files that need rescanning (different version or NULL)
-            old_version_endpoint = f'cultural_tracks?processing_version=not.eq.{self.processing_version}&select=id'
+            old_version_endpoint = f'cultural_tracks?processing_version=not.eq.{self.processing_version}&select=file_path'
             old_response = self.db_client._make_request('GET', old_version_endpoint)
             old_tracks = old_response.json()
             
             if old_tracks and len(old_tracks) > 0:
                 self.logger.info(f"Found {len(old_tracks)} files that need rescanning (older versions)")
+                stale_paths = {t['file_path'] for t in old_tracks
+                               if t.get('file_path') and t['file_path'].startswith(self.metacrate_users_path)}
             
         except Exception as e:
             self.logger.warning(f"Could not check processed files via REST API: {e}")
             self.logger.info("Continuing with filesystem scan (all files will be considered unprocessed)")
         
-        # Find audio files, checking against processed list
+        # Discover audio files and queue any whose path has not been processed yet
         files_found = 0
         files_skipped_path = 0
         files_skipped_hash = 0
+        files_stale = 0
+        
+        for file_path in processed_paths:
+            self.work_queue.discard(file_path)
+        self._load_priority_requests()
         
-        for root, dirs, files in os.walk(self.metacrate_users_path):
-            for file in files:
-                if Path(file).suffix.lower() in audio_extensions:
-                    file_path = os.path.join(root, file)
-                    files_found += 1
-                    
-                    # First check if file path is already processed (fastest check)
-                    if file_path in processed_paths:
-                        files_skipped_path += 1
-                        self.logger.debug(f"SKIPPED (path): {file_path}")
-                        continue
-                    
-                    # Calculate file hash to check for duplicates (slower but thorough)
-                    try:
-                        file_hash = self._calculate_file_hash(file_path)
-                        
-                        # Skip if hash matches already processed file
-                        if file_hash and file_hash in processed_hashes:
-                            files_skipped_hash += 1
-                            self.logger.debug(f"SKIPPED (hash): {file_path}")
-                            continue
-                            
-                        # Add to unprocessed list
-                        unprocessed_files.append(file_path)
-                        self.logger.debug(f"QUEUED: {file_path}")
-                        
-                        if len(unprocessed_files) >= self.batch_size:
-                            break
-                    except OSError:
-                        continue
+        # Parallel, per-user sharded listing (directory latency dominates on the network share)
+        for entry in self.walker.walk(self.metacrate_users_path):
+            file_path = entry.path
+            files_found += 1
+            
+            # First check if file path is already processed (fastest check)
+            if file_path in processed_paths:
+                files_skipped_path += 1
+                self.logger.debug(f"SKIPPED (path): {file_path}")
+                continue
             
-            if len(unprocessed_files) >= self.batch_size:
+            self.work_queue.push(file_path, entry.mtime)
+        
+        walk_stats = self.walker.get_stats()
+        self.logger.info(f"Directory walk: {walk_stats['directories_per_second']:.1f} dirs/sec, "
+                         f"{walk_stats['entries_per_second']:.1f} entries/sec")
+        
+        # Dequeue in priority order (requested, per-user fair share, newest first)
+        while len(unprocessed_files) < self.batch_size:
+            file_path = self.work_queue.pop()
+            if file_path is None:
                 break
+            
+            # Known track at an older version: no need to read the file here
+            if file_path in stale_paths:
+                files_stale += 1
+                unprocessed_files.append(file_path)
+                continue
+            
+            # Calculate file hash to check for duplicates (slower but thorough)
+            file_hashes = self._calculate_file_hashes(file_path)
+            
+            # Skip if either hash matches an already processed file
+            if any(h in processed_hashes for h in file_hashes):
+                files_skipped_hash += 1
+                self.logger.debug(f"SKIPPED (hash): {file_path}")
+                continue
+            
+            # Add to unprocessed list
+            unprocessed_files.append(file_path)
+            self.logger.debug(f"QUEUED: {file_path}")
         
         # Log detailed skip statistics
         self.logger.info(f"FILE DISCOVERY SUMMARY:")
         self.logger.info(f"   Total audio files found: {files_found}")
         self.logger.info(f"   Skipped (path match): {files_skipped_path}")
         self.logger.info(f"   Skipped (hash match): {files_skipped_hash}")
+        self.logger.info(f"   Stale stages only (no rehash): {files_stale}")
         self.logger.info(f"   Available for processing: {len(unprocessed_files)}")
+        self.logger.info(f"   Still queued: {len(self.work_queue)}")
         
         # If we found files but they're all skipped, that's good!
         if files_found > 0 and len(unprocessed_files) == 0:
             self.logger.info("ALL FILES ALREADY PROCESSED - Version 1.7 skip logic working perfectly!")
         
-        # Shuffle for variety across different users/directories
-        random.shuffle(unprocessed_files)
-        
-        # Limit to batch size
-        batch = unprocessed_files[:self.batch_size]
+        batch = unprocessed_files
         
         self.logger.info(f"Selected {len(batch)} files for next batch")
         return batch
@@ -417,6 +464,9 @@ class MetaCrateBatchOrchestrator:
                 self.logger.warning(f"Could not update session: {e}")
         
         self.total_processed += results['files_processed']
+        FILES_PROCESSED.inc(results['files_processed'], job='metacrate_orchestrator')
+        FILES_PER_SECOND.set(rate, job='metacrate_orchestrator')
+        QUEUE_DEPTH.set(len(self.work_queue), queue='metacrate_work_queue')
         
         # Log batch completion
         self.logger.info(f"BATCH {self.current_batch} completed:")
@@ -474,104 +524,39 @@ class MetaCrateBatchOrchestrator:
             return []
     
     def _learn_patterns_from_recent_data(self) -> int:
-        """Learn new patterns from recently classified tracks"""
-        if not self.conn:
-            return 0
-        
-        patterns_learned = 0
-        
-        try:
-            # Pattern learning disabled for REST API mode
-            # TODO: Convert PostgreSQL queries to REST API calls
-            self.logger.info("[DISABLED] Pattern learning temporarily disabled (REST API mode)")
-            recent_classifications = []
-            
-            for classification in recent_classifications:
-                # Learn artist-genre patterns
-                if classification['artist'] and classification['genre']:
-                    self.ai_scanner.learn_pattern(
-                        'artist_genre', 
-                        classification['artist'], 
-                        classification['genre'], 
-                        classification['overall_confidence']
-                    )
-                    patterns_learned += 1
-                
-                # Learn filename patterns
-                if classification['filename_genre_hints'] and classification['genre']:
-                    for hint in classification['filename_genre_hints']:
-                        self.ai_scanner.learn_pattern(
-                            'filename', hint, classification['genre'], 0.8
-                        )
-                        patterns_learned += 1
-                
-                # Learn folder patterns
-                if classification['folder_genre_hints'] and classification['genre']:
-                    for hint in classification['folder_genre_hints']:
-                        self.ai_scanner.learn_pattern(
-                            'folder', hint, classification['genre'], 0.9
-                        )
-                        patterns_learned += 1
-                
-                # Learn metadata patterns
-                if classification['metadata_genre'] and classification['genre']:
-                    self.ai_scanner.learn_pattern(
-                        'metadata', 
-                        classification['metadata_genre'], 
-                        classification['genre'], 
-                        0.85
-                    )
-                    patterns_learned += 1
-        
-        except Exception as e:
-            self.logger.error(f"Error learning patterns: {e}")
-        
+        """Learn new patterns from recently classified tracks (server-side RPC)"""
+        window_minutes = self.analysis_interval_minutes + 5
+        patterns_learned = self.db_client.learn_patterns_from_recent(window_minutes=window_minutes)
+        self.logger.info(f"   Learned/reinforced {patterns_learned} patterns")
         return patterns_learned
     
     def _update_confidence_scores(self):
-        """Update confidence scores based on learned patterns"""
-        if not self.conn:
-            return
-        
-        try:
-            cursor = self.conn.cursor()
-            
-            # Boost confidence for classifications that match learned patterns
-            cursor.execute("""
-                UPDATE cultural_classifications cc
-                SET 
-                    genre_confidence = LEAST(cc.genre_confidence * 1.1, 0.99),
-                    overall_confidence = LEAST(cc.overall_confidence * 1.05, 0.99)
-                FROM cultural_patterns cp
-                WHERE (
-                    (cp.pattern_type = 'artist_genre' AND cc.artist = cp.pattern_value AND cc.genre = cp.genre) OR
-                    (cp.pattern_type = 'metadata' AND cc.genre = cp.genre)
-                )
-                AND cp.confidence > 0.8
-                AND cc.classified_at > NOW() - INTERVAL '20 minutes'
-            """)
-            
-            updated_rows = cursor.rowcount
-            self.logger.info(f"   Updated confidence for {updated_rows} classifications")
-            
-        except Exception as e:
-            self.logger.error(f"Error updating confidence scores: {e}")
+        """Update confidence scores based on learned patterns (server-side RPC)"""
+        window_minutes = self.analysis_interval_minutes + 5
+        updated_rows = self.db_client.update_confidence_scores(window_minutes=window_minutes)
+        self.logger.info(f"   Updated confidence for {updated_rows} classifications")
     
     def _generate_intelligence_insights(self) -> List[str]:
         """Generate intelligence insights from recent analysis"""
         insights = []
         
-        if not self.conn:
-            return insights
-        
         try:
-            # Batch insights disabled for REST API mode
-            # TODO: Convert PostgreSQL queries to REST API calls
-            self.logger.info("[DISABLED] Batch insights temporarily disabled (REST API mode)")
+            stats = self.db_client.get_intelligence_insights(window_minutes=self.analysis_interval_minutes + 5)
+            if not stats:
+                insights.append("Batch analysis completed")
+                return insights
             
-            # Simple fallback insights
-            insights.append(f"Batch analysis completed")
-            insights.append(f"System working normally")
+            insights.append(f"{stats.get('classified', 0)} tracks classified")
+            if stats.get('avg_confidence') is not None:
+                insights.append(f"Average confidence {float(stats['avg_confidence']):.0%}")
+            if stats.get('top_genres'):
+                top = ', '.join(f"{g['genre']} ({g['count']})" for g in stats['top_genres'][:3])
+                insights.append(f"Top genres: {top}")
+            if stats.get('top_artists'):
+                top = ', '.join(a['artist'] for a in stats['top_artists'][:3])
+                insights.append(f"Top artists: {top}")
+            if stats.get('needs_review'):
+                insights.append(f"{stats['needs_review']} tracks need review")
             
         except Exception as e:
             self.logger.error(f"Error generating insights: {e}")
@@ -674,7 +659,8 @@ class MetaCrateBatchOrchestrator:
             'average_per_batch': self.total_processed / max(self.current_batch, 1),
             'scan_path': self.metacrate_users_path,
             'batch_size': self.batch_size,
-            'interval_minutes': self.analysis_interval_minutes
+            'interval_minutes': self.analysis_interval_minutes,
+            'work_queue': self.work_queue.get_stats()
         }
 
 def main():
@@ -688,6 +674,10 @@ def main():
     parser.add_argument('--batch-size', type=int, default=250, help='Number of tracks per batch (default: 250, testing: 100)')
     parser.add_argument('--interval', type=int, default=15, help='Analysis interval in minutes (default: 15)')
     parser.add_argument('--test', action='store_true', help='Test mode: 100 tracks, 5-minute intervals')
+    parser.add_argument('--oldest-first', action='store_true', help='Process oldest files first instead of newest')
+    parser.add_argument('--no-fair-share', action='store_true', help='Disable per-user fair share across USERS subfolders')
+    parser.add_argument('--walker-threads', type=int, default=16, help='Parallel directory listing threads (default: 16)')
+    parser.add_argument('--metrics-file', type=str, help='Write metrics in text exposition format to this file (textfile collector)')
     
     # Twitch integration options
     parser.add_argument('--twitch-username', type=str, help='Twitch bot username (for batch reports)')
@@ -716,7 +706,15 @@ def main():
 
     early_exit = setup_early_exit_handler()
 
-    orchestrator = MetaCrateBatchOrchestrator(batch_size=batch_size, analysis_interval=interval, twitch_bot=twitch_bot)
+    orchestrator = MetaCrateBatchOrchestrator(batch_size=batch_size, analysis_interval=interval, twitch_bot=twitch_bot,
+                                              newest_first=not args.oldest_first, fair_share=not args.no_fair_share,
+                                              walker_threads=args.walker_threads)
+
+    if args.metrics_file:
+        REGISTRY.register_stats('work_queue', orchestrator.work_queue.get_stats)
+        if twitch_bot:
+            REGISTRY.register_stats('twitch_notifications', twitch_bot.notifications.get_stats)
+        REGISTRY.start_textfile_push(args.metrics_file)
 
     if args.start:
         print(f">> Starting MetaCrate Batch Orchestrator v1.7")
@@ -726,6 +724,11 @@ def main():
             orchestrator.run_continuous_batches(early_exit=early_exit)
         except KeyboardInterrupt:
             orchestrator.stop()
+        finally:
+            if twitch_bot:
+                twitch_bot.disconnect()
+            if args.metrics_file:
+                REGISTRY.stop_textfile_push(args.metrics_file)
     elif args.status:
         status = orchestrator.get_status()
         print(json.dumps(status, indent=2, ensure_ascii=False))
@@ -35,13 +35,20 @@ Response:
 """
 
 import os
+import threading
 import time
-import hashlib
 from pathlib import Path
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from cultural_database_client import CulturalDatabaseClient
+from file_hashing import hash_file
+from track_hash_index import TrackHashIndex
+from pattern_index import PatternIndexManager
+from single_flight import SingleFlight
+from metrics import instrument_flask, register_stats
+from batch_streaming import (NDJSON_MIMETYPE, MAX_PAGE_SIZE, clamp_concurrency,
+                             iter_concurrent, ndjson_stream, paginate)
 
 app = Flask(__name__)
 CORS(app)
@@ -49,6 +56,15 @@ CORS(app)
 # Initialize database client
 db = CulturalDatabaseClient()
 
+# Hash -> track / duplicate group index, warmed at startup and kept fresh by polling
+track_index = TrackHashIndex(db)
+
+# Compiled pattern matcher, rebuilt in the background when cultural_patterns changes
+pattern_manager = PatternIndexManager(db.get_all_patterns, db.get_patterns_version)
+
+# Concurrent requests for the same file share one hash + analysis; failures are remembered for 5s
+analysis_flight = SingleFlight(negative_ttl=5.0)
+
 # API Statistics
 stats = {
     'start_time': time.time(),
@@ -58,26 +74,48 @@ stats = {
     'errors': 0
 }
 
+# /metrics: per-route latency plus the index, cache and single-flight counters
+instrument_flask(app, 'metacrate_integration_api')
+register_stats('metacrate_integration_api', lambda: stats)
+register_stats('track_hash_index', track_index.get_stats, service='metacrate_integration_api')
+register_stats('pattern_index', pattern_manager.get_stats, service='metacrate_integration_api')
+register_stats('single_flight', analysis_flight.get_stats, service='metacrate_integration_api')
+
+_background_lock = threading.Lock()
+_background_started = False
+
+@app.before_request
+def start_background_indexes():
+    """Warm the hash and pattern indexes and start their pollers, once per process.
+
+    WSGI servers (gunicorn, waitress) import the app without running __main__ and
+    forked workers do not inherit threads, so this runs on each worker's first request.
+    """
+    global _background_started
+    if _background_started:
+        return
+    with _background_lock:
+        if not _background_started:
+            track_index.start()
+            pattern_manager.start()
+            _background_started = True
+
 def calculate_file_hash(file_path):
     """Calculate SHA-256 hash for audio file."""
     try:
         if not os.path.exists(file_path):
             return None
         
-        hasher = hashlib.sha256()
-        with open(file_path, 'rb') as f:
-            while chunk := f.read(8192):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return hash_file(file_path)
     except Exception:
         return None
 
-def check_duplicate_status(file_hash, file_path):
+def check_duplicate_status(file_hash, file_path, duplicate_tracks=None):
     """Check if file is a duplicate and determine if it's the best version for MetaCrate."""
     try:
         # Get all tracks with same hash (duplicates)
-        tracks = db.get_all_tracks()
-        duplicate_tracks = [track for track in tracks if track.get('file_hash') == file_hash]
+        if duplicate_tracks is None:
+            duplicate_tracks = track_index.get_group(file_hash)
         
         if len(duplicate_tracks) <= 1:
             # Not a duplicate
@@ -226,166 +264,167 @@ def parse_filename_for_track_info(filename):
     
     return result
 
+NO_HASH_DUPLICATE_INFO = {
+    'is_duplicate': False, 'is_best_version': True, 'duplicate_count': 1, 'reason': 'no_hash'
+}
+
+def duplicate_skip_response(duplicate_info, known_track=False):
+    """Response telling MetaCrate to skip a duplicate that is not the best version."""
+    if known_track:
+        duplicate_info = {
+            'is_duplicate': True,
+            'is_best_version': False,
+            'primary_file': duplicate_info['primary_file'],
+            'duplicate_count': duplicate_info['duplicate_count'],
+            'reason': duplicate_info['reason']
+        }
+    return {
+        'status': 'duplicate_skip',
+        'message': 'This is a duplicate track. MetaCrate should skip processing.',
+        'duplicate_info': duplicate_info,
+        'track': None  # No track data for duplicates to skip
+    }
+
+def database_lookup_response(file_path, file_hash, existing_track, duplicate_info, classification):
+    """Response built from a stored classification."""
+    return {
+        'status': 'success',
+        'track': {
+            'artist': classification.get('artist', 'Unknown Artist'),
+            'track_name': classification.get('track_name', Path(file_path).stem),
+            'remix_info': classification.get('remix_info') or 'Original Mix',
+            'genre': classification.get('genre', 'Electronic'),
+            'subgenre': classification.get('subgenre'),
+            'confidence': float(classification.get('overall_confidence', 0.5))
+        },
+        'duplicate_info': {
+            'is_duplicate': duplicate_info['is_duplicate'],
+            'is_best_version': duplicate_info['is_best_version'],
+            'duplicate_count': duplicate_info['duplicate_count']
+        },
+        'metadata': {
+            'file_hash': file_hash,
+            'source': 'database_lookup',
+            'track_id': existing_track['id']
+        }
+    }
+
+def live_analysis_response(file_path, file_hash, duplicate_info, metadata, pattern_index):
+    """Classify an unknown track from its tags, filename and learned patterns (no I/O)."""
+    filename_info = parse_filename_for_track_info(Path(file_path).name)
+    
+    # Determine best values
+    artist = (metadata.get('artist') or 
+             filename_info.get('artist') or 
+             'Unknown Artist')
+    
+    track_name = (metadata.get('title') or 
+                 filename_info.get('track_name') or 
+                 Path(file_path).stem)
+    
+    remix_info = filename_info.get('remix_info', 'Original Mix')
+    
+    # Determine genre using patterns
+    genre = 'Electronic'
+    subgenre = None
+    confidence = 0.3
+    
+    # Best folder, filename and metadata hits from the compiled index; highest confidence wins
+    hits = [hit for hit in (
+        pattern_index.best('folder', str(Path(file_path).parent)),
+        pattern_index.best('filename', Path(file_path).name),
+        pattern_index.best('metadata', metadata.get('genre') or '')
+    ) if hit]
+    if hits:
+        pattern = max(hits, key=lambda p: float(p.get('confidence') or 0))
+        genre = pattern.get('genre', genre)
+        subgenre = pattern.get('subgenre', subgenre)
+        confidence = float(pattern.get('confidence', confidence))
+    
+    # Use metadata genre if no pattern match and available
+    if confidence < 0.5 and metadata.get('genre'):
+        genre = metadata.get('genre')
+        confidence = 0.7
+    
+    return {
+        'status': 'success',
+        'track': {
+            'artist': artist,
+            'track_name': track_name,
+            'remix_info': remix_info,
+            'genre': genre,
+            'subgenre': subgenre,
+            'confidence': confidence
+        },
+        'duplicate_info': duplicate_info,
+        'metadata': {
+            'file_hash': file_hash,
+            'source': 'live_analysis',
+            'raw_metadata': metadata
+        }
+    }
+
+def error_response(file_path, file_hash, error):
+    """Fallback response that still carries a usable track shape."""
+    return {
+        'status': 'error',
+        'error': str(error),
+        'track': {
+            'artist': 'Unknown Artist',
+            'track_name': Path(file_path).stem if file_path else 'Unknown Track',
+            'remix_info': 'Original Mix',
+            'genre': 'Electronic',
+            'subgenre': None,
+            'confidence': 0.0
+        },
+        'metadata': {
+            'file_hash': file_hash,
+            'is_duplicate': False,
+            'source': 'error_fallback'
+        }
+    }
+
+def analysis_key(file_path, file_hash=None):
+    """Single-flight key: the result depends on the path (best-version check) as well as the hash."""
+    return (os.path.normcase(os.path.abspath(file_path)), file_hash)
+
+def analyze_file(file_path, file_hash=None):
+    """Hash (if needed) and analyze a file once per burst of identical requests. None if it can't be hashed."""
+    def compute():
+        resolved_hash = file_hash or calculate_file_hash(file_path)
+        if not resolved_hash:
+            return None
+        return analyze_track_intelligence(file_path, resolved_hash)
+    return analysis_flight.do(analysis_key(file_path, file_hash), compute)
+
 def analyze_track_intelligence(file_path, file_hash):
     """Analyze track and return complete intelligence with duplicate handling for MetaCrate."""
     try:
-        # Check if track exists in database
-        existing_track = None
-        if file_hash:
-            tracks = db.get_all_tracks()
-            for track in tracks:
-                if track.get('file_hash') == file_hash:
-                    existing_track = track
-                    break
+        # Check if track exists in database (the index answers both questions in one lookup)
+        duplicate_tracks = track_index.get_group(file_hash) if file_hash else []
+        existing_track = duplicate_tracks[0] if duplicate_tracks else None
+        duplicate_info = check_duplicate_status(file_hash, file_path, duplicate_tracks) if file_hash else {
+            **NO_HASH_DUPLICATE_INFO, 'primary_file': file_path
+        }
+        
+        if duplicate_info['is_duplicate'] and not duplicate_info['is_best_version']:
+            # This is a duplicate, tell MetaCrate to skip it
+            return duplicate_skip_response(duplicate_info, known_track=existing_track is not None)
         
         if existing_track:
-            # Check if this is a duplicate and if it's the best version
-            duplicate_info = check_duplicate_status(file_hash, file_path)
-            
-            if duplicate_info['is_duplicate'] and not duplicate_info['is_best_version']:
-                # This is a duplicate, tell MetaCrate to skip it
-                return {
-                    'status': 'duplicate_skip',
-                    'message': 'This is a duplicate track. MetaCrate should skip processing.',
-                    'duplicate_info': {
-                        'is_duplicate': True,
-                        'is_best_version': False,
-                        'primary_file': duplicate_info['primary_file'],
-                        'duplicate_count': duplicate_info['duplicate_count'],
-                        'reason': duplicate_info['reason']
-                    },
-                    'track': None  # No track data for duplicates to skip
-                }
-            
             # This is either not a duplicate OR it's the best version of duplicates
             # Get classification for existing track
             classifications = db.get_classifications_by_track_id(existing_track['id'])
             if classifications:
-                classification = classifications[0]  # Use first classification
-                
-                return {
-                    'status': 'success',
-                    'track': {
-                        'artist': classification.get('artist', 'Unknown Artist'),
-                        'track_name': classification.get('track_name', Path(file_path).stem),
-                        'remix_info': classification.get('remix_info') or 'Original Mix',
-                        'genre': classification.get('genre', 'Electronic'),
-                        'subgenre': classification.get('subgenre'),
-                        'confidence': float(classification.get('overall_confidence', 0.5))
-                    },
-                    'duplicate_info': {
-                        'is_duplicate': duplicate_info['is_duplicate'],
-                        'is_best_version': duplicate_info['is_best_version'],
-                        'duplicate_count': duplicate_info['duplicate_count']
-                    },
-                    'metadata': {
-                        'file_hash': file_hash,
-                        'source': 'database_lookup',
-                        'track_id': existing_track['id']
-                    }
-                }
-        
-        # New track - perform analysis
-        # First check if this might be a duplicate of an unknown track
-        duplicate_info = check_duplicate_status(file_hash, file_path) if file_hash else {
-            'is_duplicate': False, 'is_best_version': True, 'duplicate_count': 1, 'primary_file': file_path, 'reason': 'no_hash'
-        }
+                return database_lookup_response(file_path, file_hash, existing_track, duplicate_info,
+                                                classifications[0])  # Use first classification
         
-        if duplicate_info['is_duplicate'] and not duplicate_info['is_best_version']:
-            # This is a duplicate, tell MetaCrate to skip it
-            return {
-                'status': 'duplicate_skip',
-                'message': 'This is a duplicate track. MetaCrate should skip processing.',
-                'duplicate_info': duplicate_info,
-                'track': None  # No track data for duplicates to skip
-            }
-        
-        # Continue with analysis for unique files or best versions
+        # New track - analysis for unique files or best versions
         metadata = extract_basic_metadata(file_path)
-        filename_info = parse_filename_for_track_info(Path(file_path).name)
-        
-        # Determine best values
-        artist = (metadata.get('artist') or 
-                 filename_info.get('artist') or 
-                 'Unknown Artist')
-        
-        track_name = (metadata.get('title') or 
-                     filename_info.get('track_name') or 
-                     Path(file_path).stem)
-        
-        remix_info = filename_info.get('remix_info', 'Original Mix')
-        
-        # Determine genre using patterns
-        genre = 'Electronic'
-        subgenre = None
-        confidence = 0.3
-        
-        # Check folder patterns
-        folder_path = str(Path(file_path).parent).lower()
-        patterns = db.get_all_patterns()
-        
-        for pattern in patterns:
-            pattern_value = pattern.get('pattern_value', '').lower()
-            pattern_type = pattern.get('pattern_type', '')
-            
-            if pattern_type == 'folder' and pattern_value in folder_path:
-                genre = pattern.get('genre', genre)
-                subgenre = pattern.get('subgenre', subgenre)
-                confidence = float(pattern.get('confidence', confidence))
-                break
-            elif pattern_type == 'filename' and pattern_value in Path(file_path).name.lower():
-                genre = pattern.get('genre', genre)
-                subgenre = pattern.get('subgenre', subgenre)
-                confidence = float(pattern.get('confidence', confidence))
-                break
-            elif pattern_type == 'metadata' and metadata.get('genre'):
-                if pattern_value in metadata.get('genre', '').lower():
-                    genre = pattern.get('genre', genre)
-                    subgenre = pattern.get('subgenre', subgenre)
-                    confidence = float(pattern.get('confidence', confidence))
-                    break
-        
-        # Use metadata genre if no pattern match and available
-        if confidence < 0.5 and metadata.get('genre'):
-            genre = metadata.get('genre')
-            confidence = 0.7
-        
-        return {
-            'status': 'success',
-            'track': {
-                'artist': artist,
-                'track_name': track_name,
-                'remix_info': remix_info,
-                'genre': genre,
-                'subgenre': subgenre,
-                'confidence': confidence
-            },
-            'duplicate_info': duplicate_info,
-            'metadata': {
-                'file_hash': file_hash,
-                'source': 'live_analysis',
-                'raw_metadata': metadata
-            }
-        }
+        return live_analysis_response(file_path, file_hash, duplicate_info, metadata, pattern_manager.index)
         
     except Exception as e:
-        return {
-            'status': 'error',
-            'error': str(e),
-            'track': {
-                'artist': 'Unknown Artist',
-                'track_name': Path(file_path).stem if file_path else 'Unknown Track',
-                'remix_info': 'Original Mix',
-                'genre': 'Electronic',
-                'subgenre': None,
-                'confidence': 0.0
-            },
-            'metadata': {
-                'file_hash': file_hash,
-                'is_duplicate': False,
-                'source': 'error_fallback'
-            }
-        }
+        return error_response(file_path, file_hash, e)
 
 # =====================================================
 # API ENDPOINTS
@@ -398,9 +437,8 @@ def health_check():
     
     try:
         # Test database connection
-        tracks = db.get_all_tracks()
+        track_count = db.count_discovered_tracks()
         db_status = 'connected'
-        track_count = len(tracks)
     except Exception as e:
         db_status = f'error: {str(e)}'
         track_count = 0
@@ -418,6 +456,9 @@ def health_check():
             'errors': stats['errors'],
             'tracks_in_database': track_count
         },
+        'hash_index': track_index.get_stats(),
+        'pattern_index': pattern_manager.get_stats(),
+        'single_flight': analysis_flight.get_stats(),
         'timestamp': datetime.now().isoformat()
     })
 
@@ -483,26 +524,22 @@ def analyze_track():
                 'error': 'file_path required'
             }), 400
         
-        # Calculate hash if not provided
-        if not file_hash:
-            file_hash = calculate_file_hash(file_path)
-            if not file_hash:
-                stats['errors'] += 1
-                return jsonify({
-                    'status': 'error',
-                    'error': 'Could not calculate file hash',
-                    'track': {
-                        'artist': 'Unknown Artist',
-                        'track_name': Path(file_path).stem,
-                        'remix_info': 'Original Mix',
-                        'genre': 'Electronic',
-                        'subgenre': None,
-                        'confidence': 0.0
-                    }
-                }), 400
-        
-        # Analyze the track
-        result = analyze_track_intelligence(file_path, file_hash)
+        # Hash (if not provided) and analyze, coalesced with identical in-flight requests
+        result = analyze_file(file_path, file_hash)
+        if result is None:
+            stats['errors'] += 1
+            return jsonify({
+                'status': 'error',
+                'error': 'Could not calculate file hash',
+                'track': {
+                    'artist': 'Unknown Artist',
+                    'track_name': Path(file_path).stem,
+                    'remix_info': 'Original Mix',
+                    'genre': 'Electronic',
+                    'subgenre': None,
+                    'confidence': 0.0
+                }
+            }), 400
         
         # Update statistics
         if result['metadata']['source'] == 'database_lookup':
@@ -533,37 +570,73 @@ def analyze_track():
             }
         }), 500
 
+def analyze_path(file_path):
+    """Hash and analyze one file (runs on the batch worker pool)."""
+    result = analyze_file(file_path)
+    return result if result is not None else analyze_track_intelligence(file_path, None)
+
+def batch_page(data):
+    """Pull (page, pagination, concurrency) out of a batch request body."""
+    file_paths = data.get('file_paths', []) if data else []
+    if not file_paths or not isinstance(file_paths, list):
+        return None
+    page, pagination = paginate(file_paths, data.get('offset', 0), data.get('limit', MAX_PAGE_SIZE))
+    return page, pagination, clamp_concurrency(data.get('concurrency'))
+
 @app.route('/api/track/batch', methods=['POST'])
 def batch_analyze():
     """Batch analysis for multiple tracks."""
     stats['total_requests'] += 1
     
     try:
-        data = request.get_json()
-        file_paths = data.get('file_paths', [])
-        
-        if not file_paths:
+        parsed = batch_page(request.get_json())
+        if not parsed:
             return jsonify({'error': 'file_paths array required'}), 400
-        
-        results = []
-        for file_path in file_paths[:50]:  # Limit batch size
-            file_hash = calculate_file_hash(file_path)
-            result = analyze_track_intelligence(file_path, file_hash)
-            results.append({
+        page, pagination, concurrency = parsed
+        
+        # Analysed concurrently, returned in request order
+        results = [None] * len(page)
+        for (index, file_path), result in iter_concurrent(lambda item: analyze_path(item[1]),
+                                                          enumerate(page), max_in_flight=concurrency):
+            if isinstance(result, Exception):
+                result = {'status': 'error', 'error': str(result)}
+            results[index] = {
                 'file_path': file_path,
                 'result': result
-            })
+            }
         
         return jsonify({
             'status': 'success',
             'batch_size': len(results),
-            'results': results
+            'results': results,
+            'pagination': pagination
         })
         
     except Exception as e:
         stats['errors'] += 1
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/track/batch/stream', methods=['POST'])
+def batch_analyze_stream():
+    """Batch analysis streamed as NDJSON, one line per track as it finishes plus a summary line."""
+    stats['total_requests'] += 1
+    
+    parsed = batch_page(request.get_json(silent=True))
+    if not parsed:
+        stats['errors'] += 1
+        return jsonify({'error': 'file_paths array required'}), 400
+    page, pagination, concurrency = parsed
+    
+    def to_record(file_path, result):
+        if isinstance(result, Exception):
+            stats['errors'] += 1
+            result = {'status': 'error', 'error': str(result)}
+        return {'type': 'result', 'file_path': file_path, 'status': result.get('status'), 'result': result}
+    
+    results = iter_concurrent(analyze_path, page, max_in_flight=concurrency)
+    return Response(ndjson_stream(results, to_record, {'pagination': pagination, 'concurrency': concurrency}),
+                    mimetype=NDJSON_MIMETYPE)
+
 @app.route('/api/stats', methods=['GET'])
 def get_statistics():
     """Get API usage statistics."""
@@ -574,7 +647,9 @@ def get_statistics():
         'uptime_seconds': int(uptime),
         'requests_per_minute': stats['total_requests'] / (uptime / 60) if uptime > 0 else 0,
         'cache_hit_rate': stats['cache_hits'] / stats['total_requests'] if stats['total_requests'] > 0 else 0,
-        'error_rate': stats['errors'] / stats['total_requests'] if stats['total_requests'] > 0 else 0
+        'error_rate': stats['errors'] / stats['total_requests'] if stats['total_requests'] > 0 else 0,
+        'hash_index': track_index.get_stats(),
+        'single_flight': analysis_flight.get_stats()
     })
 
 if __name__ == '__main__':
@@ -584,9 +659,13 @@ if __name__ == '__main__':
     print(f"Main endpoint: POST http://172.22.17.37:5000/api/track/analyze")
     print(f"Health check:  GET  http://172.22.17.37:5000/api/health")
     print(f"Batch process: POST http://172.22.17.37:5000/api/track/batch")
+    print("Batch stream:  POST http://172.22.17.37:5000/api/track/batch/stream (NDJSON)")
     print()
     print("Perfect for MetaCrate integration!")
     print("Returns: artist, track_name, remix_info, genre, subgenre")
     print("=" * 65)
     
+    start_background_indexes()
+    print(f"Hash index warm: {len(track_index)} tracks")
+    
     app.run(host='172.22.17.37', port=5000, debug=False)
\ No newline at end of file
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+MetaCrate API load test
+=======================
+Fires concurrent requests at one or more running MetaCrate API servers and
+reports throughput and latency, so the Flask app and the ASGI app can be
+compared on the same files.
+
+Usage:
+    python metacrate_load_test.py --files "D:/Crates/Test" --url http://localhost:5000 --url http://localhost:5001
+    python metacrate_load_test.py --files tracks.txt --endpoint v32 --concurrency 64 --requests 2000
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from typing import Dict, List
+
+import requests
+
+from parallel_walker import ParallelDirectoryWalker
+
+ENDPOINTS = {
+    'track': '/api/track/analyze',
+    'v32': '/api/v3.2/file/analyze',
+}
+
+
+def load_file_list(source: str, limit: int = 500) -> List[str]:
+    """Audio files from a directory tree, or one path per line from a text file."""
+    if os.path.isdir(source):
+        files = []
+        for file_path in ParallelDirectoryWalker(include_stat=False).iter_files(source):
+            files.append(file_path)
+            if len(files) >= limit:
+                break
+        return files
+    with open(source, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()][:limit]
+
+
+def run_load_test(base_url: str, endpoint: str, files: List[str], total_requests: int,
+                  concurrency: int, timeout: float = 30.0) -> Dict:
+    """Send total_requests POSTs with `concurrency` clients. Returns throughput and latency stats."""
+    url = base_url.rstrip('/') + ENDPOINTS[endpoint]
+    local = threading.local()
+    paths = cycle(files)
+    paths_lock = threading.Lock()
+
+    def one_request(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        with paths_lock:
+            file_path = next(paths)
+        start = time.perf_counter()
+        try:
+            response = session.post(url, json={'file_path': file_path}, timeout=timeout)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one_request, range(total_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        'url': url,
+        'requests': total_requests,
+        'errors': errors,
+        'elapsed_seconds': elapsed,
+        'requests_per_second': total_requests / elapsed if elapsed > 0 else 0,
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MetaCrate API load test')
+    parser.add_argument('--url', action='append', required=True,
+                        help='Server base URL (repeat to compare servers)')
+    parser.add_argument('--files', required=True, help='Directory of audio files or a text file of paths')
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='track')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--warmup', type=int, default=50, help='Untimed requests per server first')
+    args = parser.parse_args()
+
+    files = load_file_list(args.files)
+    if not files:
+        print("No files to test with")
+        return
+    print(f"Load test: {args.requests} requests x {args.concurrency} clients over {len(files)} files")
+    print("=" * 100)
+    print(f"{'Server':<45} {'req/s':>9} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+
+    for base_url in args.url:
+        if args.warmup:
+            run_load_test(base_url, args.endpoint, files, args.warmup, min(args.concurrency, args.warmup))
+        r = run_load_test(base_url, args.endpoint, files, args.requests, args.concurrency)
+        print(f"{r['url']:<45} {r['requests_per_second']:>9.1f} {r['mean_ms']:>9.1f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+SHARED METRICS
+==============
+One instrumentation surface for every service and batch job.
+
+- Counters, gauges and histograms with labels, in a process-wide registry
+- Text exposition format (Prometheus 0.0.4) served at /metrics by
+  instrument_flask() / instrument_asgi(), which also time every request per route
+- Existing ad-hoc stats dicts (caches, indexes, single-flight groups) are
+  exported at scrape time through register_stats()
+- Batch jobs without an HTTP server use push-to-file mode: the registry is
+  rewritten atomically every few seconds for a textfile collector to pick up
+
+The standard instruments below are shared so every service reports the same names.
+"""
+
+import bisect
+import logging
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_:]')
+
+
+def sanitize_name(name: str) -> str:
+    name = _INVALID_NAME_CHARS.sub('_', name)
+    return name if not name[:1].isdigit() else '_' + name
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = sanitize_name(name)
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    metric_type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    metric_type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Bucketed distribution (cumulative buckets, sum and count)."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        for key, (counts, total, count) in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', {**labels, 'le': _format_value(float(bound))}, cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class MetricsRegistry:
+    """Process-wide set of metrics plus scrape-time stats collectors."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Tuple[str, Callable[[], Dict], Dict[str, str]]] = []
+        self._push_thread: Optional[threading.Thread] = None
+        self._push_stop = threading.Event()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        name = sanitize_name(name)
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_stats(self, prefix: str, get_stats: Callable[[], Dict], **labels) -> None:
+        """Export the numeric entries of a stats dict (one level of nesting) as gauges at scrape time."""
+        with self._lock:
+            self._collectors.append((sanitize_name(prefix), get_stats, labels))
+
+    def _collected(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            collectors = list(self._collectors)
+        for prefix, get_stats, labels in collectors:
+            try:
+                stats = get_stats() or {}
+            except Exception as e:
+                logger.warning(f"Metrics collector {prefix} failed: {e}")
+                continue
+            for key, value in stats.items():
+                if isinstance(value, dict):
+                    for sub_key, sub_value in value.items():
+                        if isinstance(sub_value, (int, float)):
+                            yield sanitize_name(f'{prefix}_{key}_{sub_key}'), labels, sub_value
+                elif isinstance(value, (int, float)):
+                    yield sanitize_name(f'{prefix}_{key}'), labels, value
+
+    def render(self) -> str:
+        """All metrics in text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {_escape(metric.documentation)}')
+            lines.append(f'# TYPE {metric.name} {metric.metric_type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        seen = set()
+        for name, labels, value in sorted(self._collected(), key=lambda sample: sample[0]):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(float(value))}')
+        return '\n'.join(lines) + '\n'
+
+    # ================================
+    # PUSH-TO-FILE MODE (batch jobs)
+    # ================================
+
+    def write_textfile(self, path: str) -> None:
+        """Atomically write the current metrics to path (textfile collector format)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_textfile_push(self, path: str, interval_seconds: float = 15.0) -> None:
+        """Rewrite path every interval until stop_textfile_push()."""
+        if self._push_thread and self._push_thread.is_alive():
+            return
+        self._push_stop.clear()
+
+        def loop():
+            while not self._push_stop.wait(interval_seconds):
+                try:
+                    self.write_textfile(path)
+                except Exception as e:
+                    logger.warning(f"Metrics textfile push failed: {e}")
+
+        self._push_thread = threading.Thread(target=loop, name='metrics-push', daemon=True)
+        self._push_thread.start()
+
+    def stop_textfile_push(self, path: Optional[str] = None) -> None:
+        """Stop pushing; write one final snapshot if a path is given."""
+        self._push_stop.set()
+        if path:
+            try:
+                self.write_textfile(path)
+            except Exception as e:
+                logger.warning(f"Metrics textfile push failed: {e}")
+
+
+REGISTRY = MetricsRegistry()
+
+# ================================
+# STANDARD INSTRUMENTS
+# ================================
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('service', 'method', 'route', 'status'))
+DB_REQUEST_SECONDS = REGISTRY.histogram(
+    'db_request_duration_seconds', 'Database/REST call latency by endpoint', ('client', 'method', 'endpoint'))
+DB_REQUEST_ERRORS = REGISTRY.counter(
+    'db_request_errors_total', 'Failed database/REST calls by endpoint', ('client', 'method', 'endpoint'))
+FILES_PROCESSED = REGISTRY.counter(
+    'files_processed_total', 'Audio files processed', ('job',))
+FILES_PER_SECOND = REGISTRY.gauge(
+    'files_per_second', 'Processing rate of the most recent batch', ('job',))
+QUEUE_DEPTH = REGISTRY.gauge(
+    'queue_depth', 'Items waiting in a work queue', ('queue',))
+JOURNAL_BACKLOG = REGISTRY.gauge(
+    'journal_backlog', 'Entries written to a journal but not yet flushed to the database', ('journal',))
+
+
+def register_stats(prefix: str, get_stats: Callable[[], Dict], **labels) -> None:
+    REGISTRY.register_stats(prefix, get_stats, **labels)
+
+
+def db_endpoint(endpoint: str) -> str:
+    """Low-cardinality endpoint label: the table or rpc path without the query string."""
+    return endpoint.split('?', 1)[0].strip('/') or '/'
+
+
+@contextmanager
+def time_db_call(client: str, method: str, endpoint: str):
+    """Time one database call; failures are also counted."""
+    labels = {'client': client, 'method': method.upper(), 'endpoint': db_endpoint(endpoint)}
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DB_REQUEST_ERRORS.inc(**labels)
+        raise
+    finally:
+        DB_REQUEST_SECONDS.observe(time.perf_counter() - start, **labels)
+
+
+# ================================
+# WEB FRAMEWORK INTEGRATION
+# ================================
+
+def instrument_flask(app, service: str, registry: MetricsRegistry = REGISTRY):
+    """Time every request per route template and serve /metrics on a Flask app."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _metrics_start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe(response):
+        start = getattr(g, '_metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, service=service, method=request.method,
+                                         route=route, status=str(response.status_code))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        return Response(registry.render(), mimetype=CONTENT_TYPE)
+
+    return app
+
+
+def instrument_asgi(app, service: str, registry: MetricsRegistry = REGISTRY):
+    """Time every request per route template and serve /metrics on a FastAPI app."""
+    from fastapi import Response
+
+    @app.middleware('http')
+    async def _metrics_middleware(request, call_next):
+        start = time.perf_counter()
+        status = '500'
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            route = request.scope.get('route')
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, service=service, method=request.method,
+                                         route=getattr(route, 'path', 'unmatched'), status=status)
+
+    @app.get('/metrics')
+    async def metrics_endpoint():
+        return Response(registry.render(), media_type=CONTENT_TYPE)
+
+    return app
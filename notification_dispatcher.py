@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+NOTIFICATION DISPATCHER
+=======================
+Background delivery of Twitch chat and dashboard updates, so a slow socket
+or HTTP call never stalls file processing.
+
+- notify() only enqueues and returns; a single worker thread does the sends
+- Each channel has its own token-bucket rate limit (Twitch: 20 messages per
+  30 seconds for a regular account) and its own FIFO of pending messages
+- Messages with a coalesce key replace the pending message with the same key,
+  so progress spam collapses into the latest state
+- The pending queue is bounded; when it is full new messages are dropped
+  (and counted) instead of blocking the caller
+"""
+
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Twitch IRC limit for accounts that are not channel moderators
+TWITCH_RATE = (20, 30.0)
+DASHBOARD_RATE = (10, 1.0)
+
+
+class _Channel:
+    __slots__ = ('name', 'send', 'capacity', 'refill_per_second', 'tokens', 'updated', 'pending')
+
+    def __init__(self, name: str, send: Callable[[Any], Any], messages: int, per_seconds: float):
+        self.name = name
+        self.send = send
+        self.capacity = float(messages)
+        self.refill_per_second = messages / per_seconds
+        self.tokens = float(messages)
+        self.updated = time.monotonic()
+        self.pending: 'OrderedDict[Hashable, Any]' = OrderedDict()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.refill_per_second
+
+
+class NotificationDispatcher:
+    """Non-blocking, rate-limited, coalescing sender for outbound notifications."""
+
+    def __init__(self, max_pending: int = 100, name: str = 'notifications'):
+        self.max_pending = max_pending
+        self.name = name
+        self._channels: Dict[str, _Channel] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._sending = 0
+        self._ids = itertools.count()
+        self.stats = {'queued': 0, 'coalesced': 0, 'dropped': 0, 'sent': 0, 'failed': 0}
+
+    def register_channel(self, channel: str, send: Callable[[Any], Any], rate=TWITCH_RATE) -> None:
+        """Route a channel's messages to send(payload), at most rate = (messages, per_seconds)."""
+        messages, per_seconds = rate
+        with self._cond:
+            self._channels[channel] = _Channel(channel, send, messages, per_seconds)
+
+    # ================================
+    # PRODUCER SIDE
+    # ================================
+
+    def _pending_count(self) -> int:
+        return sum(len(c.pending) for c in self._channels.values())
+
+    def notify(self, channel: str, payload: Any, coalesce_key: Optional[Hashable] = None) -> bool:
+        """Queue a message without blocking. Returns False if it was dropped."""
+        with self._cond:
+            target = self._channels.get(channel)
+            if target is None or self._stopping:
+                self.stats['dropped'] += 1
+                return False
+            if coalesce_key is not None and coalesce_key in target.pending:
+                target.pending[coalesce_key] = payload  # keeps its place in line, carries the latest state
+                self.stats['coalesced'] += 1
+                return True
+            if self._pending_count() >= self.max_pending:
+                self.stats['dropped'] += 1
+                return False
+            key = coalesce_key if coalesce_key is not None else ('_', next(self._ids))
+            target.pending[key] = payload
+            self.stats['queued'] += 1
+            self._cond.notify_all()
+        self._ensure_worker()
+        return True
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            with self._cond:
+                if self._thread is not None and self._thread.is_alive():
+                    return
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    # ================================
+    # WORKER
+    # ================================
+
+    def _next_message(self):
+        """Pop the next sendable message, or return the time to wait. Caller holds the lock."""
+        now = time.monotonic()
+        wait = None
+        for channel in self._channels.values():
+            if not channel.pending:
+                continue
+            channel.refill(now)
+            channel_wait = channel.wait_time()
+            if channel_wait == 0.0:
+                channel.tokens -= 1.0
+                _, payload = channel.pending.popitem(last=False)
+                # Rotate so a busy channel does not starve the others
+                self._channels[channel.name] = self._channels.pop(channel.name)
+                return channel, payload, None
+            wait = channel_wait if wait is None else min(wait, channel_wait)
+        return None, None, wait
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                channel, payload, wait = self._next_message()
+                while channel is None:
+                    if self._stopping and wait is None:
+                        return
+                    self._cond.wait(wait)
+                    channel, payload, wait = self._next_message()
+                self._sending += 1
+            outcome = 'failed'
+            try:
+                if channel.send(payload) is not False:
+                    outcome = 'sent'
+            except Exception as e:
+                logger.warning(f"Notification to {channel.name} failed: {e}")
+            finally:
+                with self._cond:
+                    self.stats[outcome] += 1
+                    self._sending -= 1
+                    self._cond.notify_all()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait (up to timeout) for pending messages to be sent. Returns True if all went out."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending_count() or self._sending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush what can be sent within timeout, then drop the rest and stop the worker."""
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            for channel in self._channels.values():
+                self.stats['dropped'] += len(channel.pending)
+                channel.pending.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            return {**self.stats, 'pending': self._pending_count()}
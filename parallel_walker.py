@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+PARALLEL DIRECTORY WALKER
+=========================
+Concurrent os.scandir enumerator for large music trees on network shares.
+
+On a mapped Dropbox/SMB drive each directory listing is a round trip, so a
+single os.walk spends most of its time waiting. This walker:
+- Lists directories on a thread pool (one task per subdirectory)
+- Shards work by top-level subfolder (one shard per MetaCrate USERS user)
+- Streams matching files through a bounded queue, so memory stays flat
+  and a slow consumer applies backpressure to the listers
+- Reports directories/sec and entries/sec while it runs
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = {'.mp3', '.flac', '.wav', '.m4a', '.aac', '.aif', '.aiff', '.ogg', '.wma'}
+
+_DONE = object()
+
+
+class WalkEntry(NamedTuple):
+    """A file found by the walker (size/mtime are None when stat is disabled)."""
+    path: str
+    size: Optional[int]
+    mtime: Optional[float]
+    shard: str
+
+
+class ParallelDirectoryWalker:
+    """Thread-pooled, sharded directory enumerator consumed as a generator."""
+
+    def __init__(self, extensions: Optional[Iterable[str]] = None, max_workers: int = 8,
+                 queue_size: int = 10000, include_stat: bool = True,
+                 report_interval: float = 30.0):
+        self.extensions = {e.lower() for e in extensions} if extensions is not None else set(AUDIO_EXTENSIONS)
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.include_stat = include_stat
+        self.report_interval = report_interval
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.stats = {
+            'directories': 0,
+            'entries': 0,
+            'files_matched': 0,
+            'errors': 0,
+            'elapsed_seconds': 0.0,
+            'directories_per_second': 0.0,
+            'entries_per_second': 0.0,
+            'files_per_shard': defaultdict(int)
+        }
+
+    def get_stats(self) -> Dict:
+        """Current walk statistics (rates are updated as the walk progresses)."""
+        stats = dict(self.stats)
+        stats['files_per_shard'] = dict(self.stats['files_per_shard'])
+        return stats
+
+    def _update_rates(self, start_time: float):
+        elapsed = time.time() - start_time
+        self.stats['elapsed_seconds'] = elapsed
+        if elapsed > 0:
+            self.stats['directories_per_second'] = self.stats['directories'] / elapsed
+            self.stats['entries_per_second'] = self.stats['entries'] / elapsed
+
+    def iter_files(self, root: str) -> Iterator[str]:
+        """Yield matching file paths only."""
+        for entry in self.walk(root):
+            yield entry.path
+
+    def walk(self, root: str) -> Iterator[WalkEntry]:
+        """Yield WalkEntry records for every matching file under root."""
+        self._reset_stats()
+        start_time = time.time()
+        results: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        lock = threading.Lock()
+        pending = [0]
+
+        def put(item) -> bool:
+            # Bounded put that gives up when the consumer has gone away
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def submit(directory: str, shard: str):
+            with lock:
+                pending[0] += 1
+            try:
+                executor.submit(scan, directory, shard)
+            except RuntimeError:
+                # Executor shut down after the consumer stopped early
+                finish()
+
+        def finish():
+            with lock:
+                pending[0] -= 1
+                done = pending[0] == 0
+            if done:
+                put(_DONE)
+
+        def scan(directory: str, shard: str):
+            try:
+                if stop.is_set():
+                    return
+                subdirectories = []
+                try:
+                    with os.scandir(directory) as it:
+                        for dir_entry in it:
+                            with lock:
+                                self.stats['entries'] += 1
+                            try:
+                                if dir_entry.is_dir(follow_symlinks=False):
+                                    subdirectories.append(dir_entry)
+                                    continue
+                                if os.path.splitext(dir_entry.name)[1].lower() not in self.extensions:
+                                    continue
+                                size = mtime = None
+                                if self.include_stat:
+                                    # Free on Windows (cached from the directory listing)
+                                    st = dir_entry.stat()
+                                    size, mtime = st.st_size, st.st_mtime
+                            except OSError:
+                                with lock:
+                                    self.stats['errors'] += 1
+                                continue
+                            if not put(WalkEntry(dir_entry.path, size, mtime, shard)):
+                                return
+                except OSError as e:
+                    logger.warning(f"Could not list {directory}: {e}")
+                    with lock:
+                        self.stats['errors'] += 1
+                    return
+                with lock:
+                    self.stats['directories'] += 1
+                for sub in subdirectories:
+                    # Directly under root each subfolder becomes its own shard (one per user)
+                    submit(sub.path, shard if directory != root else sub.name)
+            finally:
+                finish()
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='walker')
+        last_report = start_time
+        try:
+            submit(root, '')
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                self.stats['files_matched'] += 1
+                self.stats['files_per_shard'][item.shard] += 1
+                now = time.time()
+                if self.report_interval and now - last_report >= self.report_interval:
+                    last_report = now
+                    self._update_rates(start_time)
+                    logger.info(f"Walking {root}: {self.stats['directories']} dirs "
+                                f"({self.stats['directories_per_second']:.1f}/s), "
+                                f"{self.stats['entries']} entries ({self.stats['entries_per_second']:.1f}/s)")
+                yield item
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._update_rates(start_time)
+            logger.info(f"Walk of {root} finished: {self.stats['directories']} dirs, "
+                        f"{self.stats['entries']} entries, {self.stats['files_matched']} files in "
+                        f"{self.stats['elapsed_seconds']:.1f}s "
+                        f"({self.stats['directories_per_second']:.1f} dirs/s, "
+                        f"{self.stats['entries_per_second']:.1f} entries/s)")
+
+
+def walk_audio_files(root: str, extensions: Optional[Iterable[str]] = None,
+                     max_workers: int = 8, include_stat: bool = True) -> Iterator[WalkEntry]:
+    """Convenience generator over audio files under root."""
+    return ParallelDirectoryWalker(extensions, max_workers=max_workers, include_stat=include_stat).walk(root)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Parallel directory walker benchmark')
+    parser.add_argument('root', help='Directory to enumerate')
+    parser.add_argument('--workers', type=int, default=8, help='Listing threads (default: 8)')
+    parser.add_argument('--no-stat', action='store_true', help='Skip per-file stat')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    walker = ParallelDirectoryWalker(max_workers=args.workers, include_stat=not args.no_stat)
+    for _ in walker.walk(args.root):
+        pass
+    stats = walker.get_stats()
+    print(f"Directories: {stats['directories']} ({stats['directories_per_second']:.1f}/s)")
+    print(f"Entries:     {stats['entries']} ({stats['entries_per_second']:.1f}/s)")
+    print(f"Audio files: {stats['files_matched']}")
+    for shard, count in sorted(stats['files_per_shard'].items()):
+        print(f"   {shard or '(root)'}: {count}")
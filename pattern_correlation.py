@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+PATTERN CORRELATION
+===================
+Genre-grouped pattern correlation for the v1.7 intelligence systems.
+
+Pattern keys ("filename:deep house", "folder:techno") are parsed once into
+(source, hint, genre) tuples and grouped by genre, so matching filename and
+folder evidence for the same genre is a dict lookup instead of a nested loop
+over every filename x folder pair.
+
+Per-batch results also feed a co-occurrence matrix between artists/labels
+and the genres hinted for their tracks. With NumPy the matrix is one
+product of 0/1 indicator matrices; without it the same counts are built
+with plain dicts.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+class PatternKey(NamedTuple):
+    source: str   # filename, folder, artist, label, ...
+    hint: str     # everything after the source prefix
+    genre: str    # last segment of the hint
+
+
+def parse_pattern_key(key: str) -> PatternKey:
+    """Split "source:hint" into its parts; keys without a prefix get source 'unknown'"""
+    if ':' not in key:
+        return PatternKey('unknown', key, key)
+    source, hint = key.split(':', 1)
+    return PatternKey(source, hint, hint.rsplit(':', 1)[-1])
+
+
+def group_by_genre(values: Dict[str, float]) -> Dict[str, Dict[str, float]]:
+    """{pattern_key: value} -> {genre: {source: value}}"""
+    grouped = defaultdict(dict)
+    for key, value in values.items():
+        parsed = parse_pattern_key(key)
+        grouped[parsed.genre][parsed.source] = value
+    return grouped
+
+
+def genre_cross_correlations(values: Dict[str, float], combine=min,
+                             sources=('filename', 'folder')) -> Dict[str, float]:
+    """combine() the values of genres seen in every one of sources - linear in the number of keys"""
+    correlations = {}
+    for genre, by_source in group_by_genre(values).items():
+        if all(source in by_source for source in sources):
+            correlations[genre] = combine(*(by_source[source] for source in sources))
+    return correlations
+
+
+def count_ratio(a: float, b: float) -> float:
+    """Agreement of two counts (1.0 when equal)"""
+    return min(a, b) / max(a, b) if max(a, b) else 0.0
+
+
+def result_observations(result: Dict) -> Optional[Dict]:
+    """Artist, label and hinted genres of one process_single_file result"""
+    if result.get('error'):
+        return None
+    genres = set(result.get('filename_intelligence', {}).get('genre_hints', []))
+    genres.update(result.get('folder_intelligence', {}).get('genre_hints', []))
+    classification = result.get('classification_intelligence', {}).get('basic_classification', {}) or {}
+    return {
+        'artist': result.get('artist_intelligence', {}).get('artist_name'),
+        'label': classification.get('label'),
+        'genres': genres
+    }
+
+
+def source_genre_cooccurrence(observations: Iterable[Dict], min_tracks: int = 1) -> Dict[str, Dict]:
+    """
+    Genre affinity of each artist and label: co-occurrence counts of entity x genre,
+    normalized by the entity's track count. Returns {"artist:<name>" | "label:<name>":
+    {'tracks', 'top_genre', 'affinity', 'genres': {genre: affinity}}}.
+    """
+    entity_index: Dict[str, int] = {}
+    genre_index: Dict[str, int] = {}
+    rows: List[tuple] = []
+    for obs in observations:
+        if not obs:
+            continue
+        entities = [f"{source}:{obs[source]}" for source in ('artist', 'label') if obs.get(source)]
+        if not entities:
+            continue
+        entity_ids = [entity_index.setdefault(e, len(entity_index)) for e in entities]
+        genre_ids = [genre_index.setdefault(g, len(genre_index)) for g in obs['genres']]
+        rows.append((entity_ids, genre_ids))
+
+    if not rows:
+        return {}
+    entities = list(entity_index)
+    genres = list(genre_index)
+
+    if NUMPY_AVAILABLE:
+        entity_matrix = np.zeros((len(rows), len(entities)), dtype=np.float32)
+        genre_matrix = np.zeros((len(rows), len(genres)), dtype=np.float32)
+        for r, (entity_ids, genre_ids) in enumerate(rows):
+            entity_matrix[r, entity_ids] = 1.0
+            genre_matrix[r, genre_ids] = 1.0
+        tracks = entity_matrix.sum(axis=0)
+        affinity = (entity_matrix.T @ genre_matrix) / tracks[:, None]
+        top = affinity.argmax(axis=1) if genres else None
+        results = {}
+        for e, entity in enumerate(entities):
+            if tracks[e] < min_tracks:
+                continue
+            nonzero = np.nonzero(affinity[e])[0]
+            results[entity] = {
+                'tracks': int(tracks[e]),
+                'top_genre': genres[top[e]] if len(nonzero) else None,
+                'affinity': round(float(affinity[e, top[e]]), 4) if len(nonzero) else 0.0,
+                'genres': {genres[g]: round(float(affinity[e, g]), 4) for g in nonzero}
+            }
+        return results
+
+    counts = defaultdict(lambda: defaultdict(int))
+    tracks = defaultdict(int)
+    for entity_ids, genre_ids in rows:
+        for e in entity_ids:
+            tracks[e] += 1
+            for g in genre_ids:
+                counts[e][g] += 1
+    results = {}
+    for e, entity in enumerate(entities):
+        if tracks[e] < min_tracks:
+            continue
+        by_genre = {genres[g]: round(count / tracks[e], 4) for g, count in counts[e].items()}
+        # Ties go to the first-seen genre, matching numpy's argmax
+        top = max(sorted(counts[e]), key=counts[e].get, default=None)
+        results[entity] = {
+            'tracks': tracks[e],
+            'top_genre': genres[top] if top is not None else None,
+            'affinity': by_genre[genres[top]] if top is not None else 0.0,
+            'genres': by_genre
+        }
+    return results
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+PATTERN INDEX
+=============
+Precompiled matcher over cultural_patterns for the realtime classification endpoints.
+
+- One Aho-Corasick keyword automaton per pattern_type (folder, filename, metadata, ...)
+  finds every pattern_value contained in a string in a single pass over the text
+- Hits come back ranked by pattern confidence
+- PatternIndexManager polls a cheap table version (row count + latest update) and
+  compiles a fresh index in the background when it changes; requests read the
+  current index reference, so they never query the database or loop over patterns
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton answering 'which keywords occur in this text'."""
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for keyword in keywords:
+            if keyword:
+                self._insert(keyword)
+        self._link()
+
+    def _insert(self, keyword: str) -> None:
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        if keyword not in self._out[state]:
+            self._out[state].append(keyword)
+
+    def _link(self) -> None:
+        # Breadth-first failure links; outputs inherit from the failure state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def search(self, text: str) -> List[str]:
+        """Distinct keywords occurring in text, in order of first match end."""
+        found = []
+        seen = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword in self._out[state]:
+                if keyword not in seen:
+                    seen.add(keyword)
+                    found.append(keyword)
+        return found
+
+
+class PatternIndex:
+    """Immutable, compiled view of the pattern table."""
+
+    def __init__(self, patterns: Iterable[Dict], version: Optional[str] = None):
+        self.version = version
+        self.built_at = time.time()
+        by_type: Dict[str, Dict[str, List[Dict]]] = defaultdict(lambda: defaultdict(list))
+        count = 0
+        for pattern in patterns:
+            keyword = (pattern.get('pattern_value') or '').lower()
+            if not keyword:
+                continue  # An empty value would match every string
+            by_type[pattern.get('pattern_type', '')][keyword].append(pattern)
+            count += 1
+        self.pattern_count = count
+
+        self._keywords: Dict[str, Dict[str, List[Dict]]] = {}
+        self._automata: Dict[str, KeywordAutomaton] = {}
+        for pattern_type, keywords in by_type.items():
+            for hits in keywords.values():
+                hits.sort(key=lambda p: float(p.get('confidence') or 0), reverse=True)
+            self._keywords[pattern_type] = dict(keywords)
+            self._automata[pattern_type] = KeywordAutomaton(keywords)
+
+    def match(self, pattern_type: str, text: str) -> List[Dict]:
+        """Patterns of this type whose value occurs in text, highest confidence first."""
+        automaton = self._automata.get(pattern_type)
+        if automaton is None or not text:
+            return []
+        keywords = self._keywords[pattern_type]
+        hits = [pattern for keyword in automaton.search(text.lower()) for pattern in keywords[keyword]]
+        hits.sort(key=lambda p: float(p.get('confidence') or 0), reverse=True)
+        return hits
+
+    def best(self, pattern_type: str, text: str) -> Optional[Dict]:
+        """Highest-confidence pattern of this type contained in text, or None."""
+        hits = self.match(pattern_type, text)
+        return hits[0] if hits else None
+
+    def get_stats(self) -> Dict:
+        return {
+            'version': self.version,
+            'patterns': self.pattern_count,
+            'types': {t: len(k) for t, k in self._keywords.items()},
+            'built_at': self.built_at
+        }
+
+
+class PatternIndexManager:
+    """Keeps a current PatternIndex, rebuilding it off the request path when the table changes."""
+
+    def __init__(self, load_patterns: Callable[[], List[Dict]],
+                 load_version: Optional[Callable[[], Optional[str]]] = None,
+                 poll_interval: float = 30.0, max_age: float = 900.0):
+        self.load_patterns = load_patterns
+        self.load_version = load_version
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+
+        self._index = PatternIndex([])
+        self._loaded = False
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'rebuilds': 0, 'version_checks': 0, 'errors': 0, 'last_build_ms': 0}
+
+    @property
+    def index(self) -> PatternIndex:
+        """Current index (loaded synchronously the first time if the poller has not run yet)."""
+        if not self._loaded:
+            self.refresh()
+        return self._index
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild if the table version changed (or the index is older than max_age). Returns True if rebuilt."""
+        with self._refresh_lock:
+            version = None
+            if self.load_version is not None:
+                self.stats['version_checks'] += 1
+                version = self.load_version()
+            stale = time.time() - self._index.built_at >= self.max_age
+            # No version source (or it failed): rely on max_age alone
+            unchanged = version is None or version == self._index.version
+            if self._loaded and not force and not stale and unchanged:
+                return False
+
+            start = time.time()
+            index = PatternIndex(self.load_patterns(), version)
+            # Single reference swap - readers see either the old or the new index, never a mix
+            self._index = index
+            self._loaded = True
+            self.stats['rebuilds'] += 1
+            self.stats['last_build_ms'] = int((time.time() - start) * 1000)
+            logger.info(f"Pattern index rebuilt: {index.pattern_count} patterns (version {version}) "
+                        f"in {self.stats['last_build_ms']}ms")
+            return True
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.warning(f"Pattern index refresh failed: {e}")
+
+    def start(self) -> None:
+        """Build the first index and start the background poller."""
+        if self._thread and self._thread.is_alive():
+            return
+        try:
+            self.refresh(force=True)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Pattern index build failed: {e}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll_loop, name='pattern-index', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, **self._index.get_stats()}
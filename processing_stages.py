@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+PROCESSING STAGES
+=================
+Per-stage version stamps for cultural_tracks, so a version bump only reruns
+the stages whose code changed.
+
+A track goes through these stages:
+    hash            identity hashes (the version includes the configured algorithm)
+    tags            mutagen tag extraction (raw_metadata)
+    analysis        filename / folder analysis (cultural_track_analysis)
+    classification  classifier + pattern learning (cultural_classifications)
+    fingerprint     audio fingerprint (not run by the scanners yet: version None)
+
+Each track row stores the version of every stage that produced it
+(stage_versions JSONB, see add_stage_versions.sql). plan_stages() compares a
+row with the current versions and the file's size/mtime:
+- new file                 -> every stage
+- unchanged file           -> only stages whose version changed, plus the
+                              stages that consume their output
+- size/mtime changed       -> rehash; if the content differs, full rerun
+A reclassify-only upgrade (processing_version v1.7 -> v1.8) therefore reuses
+the stored hashes and tags and never rereads the file.
+
+Until add_stage_versions.sql has run, CulturalDatabaseClient leaves the new
+columns out of its writes and every row is planned from its inferred versions.
+
+Bump STAGE_CODE_VERSIONS when a stage's logic changes. The classification
+stage follows the scanner's processing_version.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, FrozenSet, Optional
+
+from file_hashing import LEGACY_ALGORITHM, get_hash_settings
+
+STAGES = ('hash', 'tags', 'analysis', 'classification', 'fingerprint')
+
+STAGE_CODE_VERSIONS = {
+    'hash': 'v1',
+    'tags': 'v1',
+    'analysis': 'v1',
+    'fingerprint': None
+}
+
+# Stages that consume another stage's output and must rerun with it
+DOWNSTREAM = {
+    'tags': ('classification',),
+    'analysis': ('classification',)
+}
+
+# Versions assumed for rows written before stages were stamped
+LEGACY_CODE_VERSION = 'v1'
+
+MTIME_TOLERANCE = 1.0
+
+
+def current_stage_versions(processing_version: str, hash_algo: Optional[str] = None) -> Dict[str, Optional[str]]:
+    """Versions the scanner would stamp now"""
+    versions = dict(STAGE_CODE_VERSIONS)
+    versions['hash'] = f"{versions['hash']}:{hash_algo or get_hash_settings()['algorithm']}"
+    versions['classification'] = processing_version
+    return versions
+
+
+def stored_stage_versions(row: Dict) -> Dict[str, Optional[str]]:
+    """Stage versions of a track row; unstamped rows are inferred from processing_version"""
+    if row.get('stage_versions'):
+        return dict(row['stage_versions'])
+    hash_algo = row.get('hash_algo') if row.get('content_hash') else LEGACY_ALGORITHM
+    return {
+        'hash': f"{LEGACY_CODE_VERSION}:{hash_algo or LEGACY_ALGORITHM}",
+        'tags': LEGACY_CODE_VERSION,
+        'analysis': LEGACY_CODE_VERSION,
+        'classification': row.get('processing_version')
+    }
+
+
+def same_file(row: Dict, size: int, mtime: float) -> bool:
+    """True if size and mtime match what the row recorded (no need to rehash)"""
+    if row.get('file_size') != size:
+        return False
+    if row.get('file_mtime') is not None:
+        return abs(float(row['file_mtime']) - mtime) < MTIME_TOLERANCE
+    if not row.get('file_modified'):
+        return False
+    try:
+        # Older rows only have file_modified, written as a naive local isoformat
+        stored = datetime.fromisoformat(str(row['file_modified'])).replace(tzinfo=None)
+    except ValueError:
+        return False
+    return abs((stored - datetime.fromtimestamp(mtime)).total_seconds()) < MTIME_TOLERANCE
+
+
+@dataclass(slots=True)
+class StagePlan:
+    stages: FrozenSet[str]
+    reason: str
+    versions: Dict[str, Optional[str]]
+
+    @property
+    def is_noop(self) -> bool:
+        return not self.stages
+
+    @property
+    def needs_hash(self) -> bool:
+        return 'hash' in self.stages
+
+    def runs(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def stamp(self, stored: Optional[Dict] = None) -> Dict[str, str]:
+        """Stage versions after this plan has run"""
+        stamped = dict(stored or {})
+        stamped.update({stage: self.versions[stage] for stage in self.stages})
+        return stamped
+
+
+def enabled_stages(versions: Dict[str, Optional[str]]) -> FrozenSet[str]:
+    return frozenset(stage for stage in STAGES if versions.get(stage) is not None)
+
+
+def full_plan(versions: Dict[str, Optional[str]], reason: str) -> StagePlan:
+    return StagePlan(enabled_stages(versions), reason, versions)
+
+
+def plan_stages(row: Optional[Dict], versions: Dict[str, Optional[str]], size: Optional[int] = None,
+                mtime: Optional[float] = None, content_verified: bool = False) -> StagePlan:
+    """Stages to run for a file, given its existing track row (None if new).
+
+    content_verified: the caller already hashed the file and matched the row.
+    """
+    if row is None:
+        return full_plan(versions, 'new')
+    enabled = enabled_stages(versions)
+    stored = stored_stage_versions(row)
+    stages = {stage for stage in enabled if stored.get(stage) != versions[stage]}
+    for stage in list(stages):
+        stages.update(DOWNSTREAM.get(stage, ()))
+    reason = 'stage versions changed' if stages else 'current'
+    if not content_verified and not same_file(row, size, mtime):
+        # Size or mtime moved: rehash, and the caller escalates to a full run if the content differs
+        stages.add('hash')
+        reason = 'file changed'
+    return StagePlan(frozenset(stages & enabled), reason, versions)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+SCAN REPOSITORY
+===============
+Shared SQLite plumbing for the v1.7 scan history databases
+(VersionedScanDatabase, EnhancedVersionDatabase).
+
+- One connection per database object, opened once (WAL, synchronous=NORMAL)
+- Statement SQL is constant, so sqlite3's per-connection statement cache
+  reuses the prepared statements across calls
+- batch(): one transaction per scan batch; file_history rows are buffered and
+  written with a single executemany when the batch commits, so a 250-file
+  batch costs one fsync instead of one per file
+- file_history is unique on (version, file_path); reprocessing a file in the
+  same version updates its row instead of adding a duplicate
+- filter_unprocessed(): streams candidate paths through a temp table and
+  anti-joins them against that index chunk by chunk, so memory stays flat
+  however large the library or the history
+
+Outside batch() every write commits on its own, as before.
+"""
+
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+CANDIDATE_CHUNK_SIZE = 5000
+
+FILE_HISTORY_INSERT = '''
+    INSERT INTO file_history
+    (file_path, file_hash, session_id, version, processed_at,
+     intelligence_score, classification_confidence, patterns_detected)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(version, file_path) DO UPDATE SET
+        file_hash = excluded.file_hash,
+        session_id = excluded.session_id,
+        processed_at = excluded.processed_at,
+        intelligence_score = excluded.intelligence_score,
+        classification_confidence = excluded.classification_confidence,
+        patterns_detected = excluded.patterns_detected
+'''
+
+
+class ScanRepository:
+    """SQLite connection holder with batched, single-commit file history writes"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # Autocommit mode; transactions are explicit (BEGIN/COMMIT) in batch()
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, cached_statements=256)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self._in_batch = False
+        self._pending_files: List[tuple] = []
+
+    @contextmanager
+    def batch(self):
+        """Run the block in one transaction; buffered file rows are flushed on exit"""
+        if self._in_batch:
+            yield self
+            return
+        self.conn.execute("BEGIN")
+        self._in_batch = True
+        try:
+            yield self
+            self._flush_files()
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self._pending_files.clear()
+            self.conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._in_batch = False
+
+    def _flush_files(self):
+        if self._pending_files:
+            self.conn.executemany(FILE_HISTORY_INSERT, self._pending_files)
+            self._pending_files.clear()
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        """Execute a statement (commits immediately unless inside batch())"""
+        return self.conn.execute(sql, params)
+
+    def add_file_history(self, file_path: str, file_hash: str, session_id: str, version: str,
+                         intelligence_score: float, classification_confidence: float,
+                         patterns: List[str]):
+        """Record a processed file; buffered until the surrounding batch commits"""
+        row = (file_path, file_hash, session_id, version, datetime.now().isoformat(),
+               intelligence_score, classification_confidence, json.dumps(patterns))
+        if self._in_batch:
+            self._pending_files.append(row)
+        else:
+            self.conn.execute(FILE_HISTORY_INSERT, row)
+
+    def ensure_file_history_index(self):
+        """Drop duplicate (version, file_path) rows, keeping the latest, and add the unique index"""
+        with self.batch():
+            removed = self.execute('''
+                DELETE FROM file_history WHERE id NOT IN (
+                    SELECT MAX(id) FROM file_history GROUP BY version, file_path
+                )
+            ''').rowcount
+            self.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_file_history_version_path
+                ON file_history (version, file_path)
+            ''')
+        if removed > 0:
+            print(f"🧹 Removed {removed} duplicate file_history rows")
+
+    def count_processed(self, version: str) -> int:
+        """Number of files processed in a version (index-only count)"""
+        self._flush_files()
+        return self.execute('SELECT COUNT(*) FROM file_history WHERE version = ?', (version,)).fetchone()[0]
+
+    def filter_unprocessed(self, paths: Iterable[str], version: str,
+                           chunk_size: int = CANDIDATE_CHUNK_SIZE) -> Iterator[str]:
+        """Yield the paths with no file_history row for version, in input order"""
+        self._flush_files()
+        self.execute('CREATE TEMP TABLE IF NOT EXISTS candidate_paths (seq INTEGER PRIMARY KEY, file_path TEXT)')
+        paths = iter(paths)
+        while True:
+            chunk = list(islice(paths, chunk_size))
+            if not chunk:
+                return
+            with self.batch():
+                self.execute('DELETE FROM candidate_paths')
+                self.conn.executemany('INSERT INTO candidate_paths (file_path) VALUES (?)',
+                                      ((path,) for path in chunk))
+            rows = self.execute('''
+                SELECT c.file_path FROM candidate_paths c
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM file_history f WHERE f.version = ? AND f.file_path = c.file_path
+                )
+                ORDER BY c.seq
+            ''', (version,)).fetchall()
+            for (path,) in rows:
+                yield path
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+SCAN RESULT SINK
+================
+Streaming output for TaxonomyScanner, so a scan's memory use does not grow
+with the size of the collection.
+
+- ScanResult records (track_records.py) are handed to a ResultSink one
+  batch at a time and serialized there, at the writer boundary: JSONL file,
+  local SQLite database, or bulk upserts into cultural_tracks
+- ScanAggregates keeps the running counts the report is built from
+  (genres, artists, labels, confidence) instead of the records themselves;
+  artists and labels are HeavyHitters summaries, so they stay bounded too
+- HashLedger records (file_hash, file_path) pairs in a temporary SQLite file;
+  duplicate groups are read back with one GROUP BY at the end of the scan
+  and streamed to the sink
+
+Pick a sink in taxonomy_config.json:
+    "output": {"sink": "jsonl" | "sqlite" | "supabase", "path": "..."}
+"""
+
+import abc
+import heapq
+import json
+import os
+import sqlite3
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from track_records import ScanResult
+
+TOP_DISTRIBUTION = 20
+# Distinct artists/labels counted exactly before HeavyHitters starts trimming
+HEAVY_HITTERS_CAPACITY = 5000
+
+
+def _json(value) -> str:
+    return json.dumps(value, default=str)
+
+
+class ResultSink(abc.ABC):
+    """Destination for per-batch scan results"""
+
+    kind = 'none'
+
+    @abc.abstractmethod
+    def write_batch(self, records: List[ScanResult]) -> None:
+        """Write one batch of results"""
+
+    def write_duplicate_groups(self, groups: List[Dict]) -> None:
+        """Store duplicate groups (sinks without a place for them ignore them)"""
+
+    def close(self) -> None:
+        pass
+
+    def describe(self) -> Dict:
+        """Where the results went, for the scan report"""
+        return {'sink': self.kind}
+
+
+class JsonlResultSink(ResultSink):
+    """One JSON object per line; duplicate groups go to <name>.duplicates.jsonl"""
+
+    kind = 'jsonl'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.duplicates_path = str(Path(path).with_suffix('.duplicates.jsonl'))
+        self._file = open(path, 'w', encoding='utf-8')
+        self._duplicates_file = None
+        self.records_written = 0
+
+    def write_batch(self, records: List[ScanResult]) -> None:
+        self._file.writelines(_json(record.to_dict()) + '\n' for record in records)
+        self._file.flush()
+        self.records_written += len(records)
+
+    def write_duplicate_groups(self, groups: List[Dict]) -> None:
+        if self._duplicates_file is None:
+            self._duplicates_file = open(self.duplicates_path, 'w', encoding='utf-8')
+        self._duplicates_file.writelines(_json(group) + '\n' for group in groups)
+        self._duplicates_file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+        if self._duplicates_file is not None:
+            self._duplicates_file.close()
+
+    def describe(self) -> Dict:
+        return {
+            'sink': self.kind,
+            'path': self.path,
+            'duplicates_path': self.duplicates_path if self._duplicates_file is not None else None,
+            'records_written': self.records_written
+        }
+
+
+class SqliteResultSink(ResultSink):
+    """Local SQLite database; one transaction and executemany per batch"""
+
+    kind = 'sqlite'
+
+    INSERT = '''
+        INSERT INTO scan_classifications
+        (run_id, file_path, file_hash, content_hash, artist, track_name, label, bpm,
+         genre, genre_confidence, processed_at, record)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(run_id, file_path) DO UPDATE SET
+            file_hash = excluded.file_hash,
+            content_hash = excluded.content_hash,
+            artist = excluded.artist,
+            track_name = excluded.track_name,
+            label = excluded.label,
+            bpm = excluded.bpm,
+            genre = excluded.genre,
+            genre_confidence = excluded.genre_confidence,
+            processed_at = excluded.processed_at,
+            record = excluded.record
+    '''
+
+    def __init__(self, db_path: str, run_id: str):
+        self.db_path = db_path
+        self.run_id = run_id
+        self.records_written = 0
+        self.conn = sqlite3.connect(db_path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS scan_classifications (
+                run_id TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                content_hash TEXT,
+                artist TEXT,
+                track_name TEXT,
+                label TEXT,
+                bpm TEXT,
+                genre TEXT,
+                genre_confidence REAL,
+                processed_at TEXT,
+                record TEXT NOT NULL,
+                PRIMARY KEY (run_id, file_path)
+            );
+            CREATE INDEX IF NOT EXISTS idx_scan_classifications_hash ON scan_classifications (file_hash);
+            CREATE TABLE IF NOT EXISTS scan_duplicate_groups (
+                run_id TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                file_count INTEGER NOT NULL,
+                files TEXT NOT NULL,
+                PRIMARY KEY (run_id, file_hash)
+            );
+        ''')
+
+    def _write(self, sql: str, rows: List[tuple]) -> None:
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany(sql, rows)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def write_batch(self, records: List[ScanResult]) -> None:
+        rows = []
+        for record in records:
+            row = record.to_dict()
+            rows.append((self.run_id, row['file_path'], row['file_hash'], row.get('content_hash'), row['artist'],
+                         row['track_name'], row['label'], None if row['bpm'] is None else str(row['bpm']),
+                         row['genre'], row['genre_confidence'], row['processed_at'], _json(row)))
+        self._write(self.INSERT, rows)
+        self.records_written += len(records)
+
+    def write_duplicate_groups(self, groups: List[Dict]) -> None:
+        self._write('INSERT OR REPLACE INTO scan_duplicate_groups VALUES (?, ?, ?, ?)', [
+            (self.run_id, g['hash'], g['count'], _json(g['files'])) for g in groups
+        ])
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def describe(self) -> Dict:
+        return {'sink': self.kind, 'path': self.db_path, 'run_id': self.run_id,
+                'records_written': self.records_written}
+
+
+class SupabaseResultSink(ResultSink):
+    """Bulk upsert into cultural_tracks, one request per batch.
+
+    cultural_tracks.file_hash is UNIQUE, so each hash is written once: later copies in the
+    batch, and files whose hash is already stored under another path, are skipped (they are
+    still reported as duplicate groups).
+    """
+
+    kind = 'supabase'
+
+    def __init__(self, client):
+        self.client = client
+        self.records_written = 0
+        self.duplicates_skipped = 0
+
+    def write_batch(self, records: List[ScanResult]) -> None:
+        rows: Dict[str, Dict] = {}
+        for record in records:
+            row = record.track.to_track_row()
+            rows.setdefault(row['file_hash'], row)
+        stored = self.client.get_track_paths_by_hash(list(rows))
+        fresh = [row for file_hash, row in rows.items() if stored.get(file_hash, row['file_path']) == row['file_path']]
+        self.client.upsert_tracks(fresh)
+        self.records_written += len(fresh)
+        self.duplicates_skipped += len(records) - len(fresh)
+
+    def describe(self) -> Dict:
+        return {'sink': self.kind, 'table': 'cultural_tracks', 'records_written': self.records_written,
+                'duplicates_skipped': self.duplicates_skipped}
+
+
+def make_result_sink(config, run_id: str) -> ResultSink:
+    """Build the sink named by output.sink (default: JSONL next to the report)"""
+    kind = config.get('output.sink', 'jsonl')
+    path = config.get('output.path')
+    if kind == 'sqlite':
+        return SqliteResultSink(path or 'taxonomy_scan_results.db', run_id)
+    if kind == 'supabase':
+        from supabase_client import SupabaseClient, SupabaseConfig
+        return SupabaseResultSink(SupabaseClient(SupabaseConfig(
+            url=config.get('supabase.url'),
+            service_role_key=config.get('supabase.service_role_key') or config.get('supabase.key')
+        )))
+    if kind != 'jsonl':
+        raise ValueError(f"Unknown output.sink: {kind}")
+    return JsonlResultSink(path or f"taxonomy_scan_{run_id[:8]}.jsonl")
+
+
+class HeavyHitters:
+    """Approximate top-k counter in bounded memory (Misra-Gries summary).
+
+    Exact until more than 2 * capacity distinct keys have been seen. After that,
+    the smallest counters are trimmed. Counts are then underestimated by at most
+    n / (capacity + 1), and every key with more than that share of the stream is kept.
+    """
+
+    def __init__(self, capacity: int = HEAVY_HITTERS_CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.total = 0
+
+    def add(self, key: str, count: int = 1) -> None:
+        self.total += count
+        self.counts[key] = self.counts.get(key, 0) + count
+        if len(self.counts) > 2 * self.capacity:
+            # Subtract the (capacity + 1)-th largest count from every counter; amortized O(1) per add
+            floor = heapq.nlargest(self.capacity + 1, self.counts.values())[-1]
+            self.counts = {k: c - floor for k, c in self.counts.items() if c > floor}
+
+    def most_common(self, n: int) -> List[Tuple[str, int]]:
+        return heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+
+class ScanAggregates:
+    """Running totals for the scan report"""
+
+    def __init__(self, capacity: int = HEAVY_HITTERS_CAPACITY):
+        self.genres = Counter()
+        self.artists = HeavyHitters(capacity)
+        self.labels = HeavyHitters(capacity)
+        self.confidence_sum = 0.0
+        self.records = 0
+
+    def add(self, record: ScanResult) -> None:
+        classification = record.classification
+        self.records += 1
+        self.genres[classification.primary_genre] += 1
+        self.artists.add(classification.artist)
+        if classification.label:
+            self.labels.add(classification.label)
+        self.confidence_sum += record.genre_confidence
+
+    def report(self, top: int = TOP_DISTRIBUTION) -> Dict:
+        return {
+            'genre_distribution': dict(self.genres),
+            'artist_distribution': dict(self.artists.most_common(top)),
+            'label_distribution': dict(self.labels.most_common(top)),
+            'average_genre_confidence': self.confidence_sum / self.records if self.records else 0
+        }
+
+
+class HashLedger:
+    """Disk-backed (file_hash, file_path) log for duplicate detection"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self._owns_file = db_path is None
+        if db_path is None:
+            fd, db_path = tempfile.mkstemp(prefix='taxonomy_hashes_', suffix='.db')
+            os.close(fd)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS file_hashes (file_hash TEXT NOT NULL, file_path TEXT NOT NULL)")
+
+    def add_many(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        self.conn.execute("BEGIN")
+        self.conn.executemany("INSERT INTO file_hashes VALUES (?, ?)", pairs)
+        self.conn.execute("COMMIT")
+
+    def duplicate_groups(self) -> Iterator[Dict]:
+        """Yield {'hash', 'files', 'count'} for every hash seen more than once"""
+        # Indexing once after the inserts is cheaper than maintaining the index per row
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_file_hashes_hash ON file_hashes (file_hash)")
+        cursor = self.conn.execute('''
+            SELECT file_hash, json_group_array(file_path), COUNT(*) FROM file_hashes
+            GROUP BY file_hash HAVING COUNT(*) > 1
+        ''')
+        for file_hash, files, count in cursor:
+            yield {'hash': file_hash, 'files': json.loads(files), 'count': count}
+
+    def close(self) -> None:
+        self.conn.close()
+        if self._owns_file:
+            os.remove(self.db_path)
+
+
+def largest_groups(groups: Iterable[Dict], sink: ResultSink, chunk_size: int = 500,
+                   top: int = TOP_DISTRIBUTION) -> Tuple[List[Dict], int, int]:
+    """Stream groups to the sink in chunks. Returns (largest groups, group count, duplicate file count)"""
+    largest: List[Tuple[int, int, Dict]] = []
+    chunk: List[Dict] = []
+    group_count = duplicate_files = 0
+    for group in groups:
+        group_count += 1
+        duplicate_files += group['count'] - 1
+        entry = (group['count'], group_count, group)
+        if len(largest) < top:
+            heapq.heappush(largest, entry)
+        else:
+            heapq.heappushpop(largest, entry)
+        chunk.append(group)
+        if len(chunk) >= chunk_size:
+            sink.write_duplicate_groups(chunk)
+            chunk = []
+    if chunk:
+        sink.write_duplicate_groups(chunk)
+    return [group for _, _, group in sorted(largest, reverse=True)], group_count, duplicate_files
@@ -5,34 +5,52 @@ Minimal working version for immediate MetaCrate integration
 """
 
 from flask import Flask, request, jsonify
-import hashlib
 import os
+import threading
 import time
 from pathlib import Path
 from supabase_client import create_supabase_client
+from file_hashing import hash_file
+from pattern_index import PatternIndexManager
+from metrics import instrument_flask, register_stats
 
 app = Flask(__name__)
 
 # Initialize Supabase client
 supabase_client = create_supabase_client()
 
+# Compiled folder/filename pattern matcher, rebuilt when cultural_patterns changes
+pattern_manager = PatternIndexManager(supabase_client.get_patterns, supabase_client.get_patterns_version)
+
 # Statistics
 start_time = time.time()
 request_count = 0
 
+# /metrics: per-route latency plus pattern index counters
+instrument_flask(app, 'simple_rest_api')
+register_stats('pattern_index', pattern_manager.get_stats, service='simple_rest_api')
+
+_pattern_lock = threading.Lock()
+_pattern_started = False
+
+@app.before_request
+def start_pattern_index():
+    """Build the pattern index and start its poller once per process (WSGI workers never run __main__)"""
+    global _pattern_started
+    if _pattern_started:
+        return
+    with _pattern_lock:
+        if not _pattern_started:
+            pattern_manager.start()
+            _pattern_started = True
+
 def calculate_file_hash(file_path):
     """Calculate FILE_HASH for audio file"""
     try:
         if not os.path.exists(file_path):
             return None
         
-        hasher = hashlib.sha256()
-        with open(file_path, 'rb') as f:
-            # Read in chunks for large files
-            while chunk := f.read(8192):
-                hasher.update(chunk)
-        
-        return hasher.hexdigest()
+        return hash_file(file_path)
     except Exception as e:
         print(f"Hash calculation error: {e}")
         return None
@@ -41,10 +59,7 @@ def classify_file(file_path):
     """Basic file classification using patterns and filename analysis"""
     
     file_path = Path(file_path)
-    
-    # Get patterns from database
-    folder_patterns = supabase_client.get_patterns(pattern_type="folder")
-    filename_patterns = supabase_client.get_patterns(pattern_type="filename")
+    pattern_index = pattern_manager.index
     
     classification = {
         "genre": None,
@@ -54,27 +69,25 @@ def classify_file(file_path):
     }
     
     # Check folder patterns
-    for pattern in folder_patterns:
-        if pattern['pattern_value'].lower() in str(file_path.parent).lower():
+    pattern = pattern_index.best('folder', str(file_path.parent))
+    if pattern:
+        classification.update({
+            "genre": pattern['genre'],
+            "subgenre": pattern['subgenre'],
+            "confidence": float(pattern['confidence']),
+            "classification_source": f"folder_pattern: {pattern['pattern_value']}"
+        })
+    
+    # Check filename patterns
+    if classification["confidence"] < 0.8:  # Only override if low confidence
+        pattern = pattern_index.best('filename', file_path.name)
+        if pattern:
             classification.update({
                 "genre": pattern['genre'],
-                "subgenre": pattern['subgenre'],
+                "subgenre": pattern['subgenre'], 
                 "confidence": float(pattern['confidence']),
-                "classification_source": f"folder_pattern: {pattern['pattern_value']}"
+                "classification_source": f"filename_pattern: {pattern['pattern_value']}"
             })
-            break
-    
-    # Check filename patterns
-    if classification["confidence"] < 0.8:  # Only override if low confidence
-        for pattern in filename_patterns:
-            if pattern['pattern_value'].lower() in file_path.name.lower():
-                classification.update({
-                    "genre": pattern['genre'],
-                    "subgenre": pattern['subgenre'], 
-                    "confidence": float(pattern['confidence']),
-                    "classification_source": f"filename_pattern: {pattern['pattern_value']}"
-                })
-                break
     
     return classification
 
@@ -258,4 +271,5 @@ if __name__ == '__main__':
     print(f"Health check: http://172.22.17.37:5000/health")
     print(f"Ready for MetaCrate integration!")
     
+    start_pattern_index()
     app.run(host='172.22.17.37', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+SINGLE-FLIGHT REQUEST COALESCING
+================================
+When MetaCrate opens a crate it fires several analyze requests for the same
+file at once. Instead of hashing and analysing the file once per request:
+- The first caller for a key runs the computation
+- Concurrent callers for the same key wait for it and share its result
+  (or its exception)
+- Negative results (missing file, hash failure, error responses) are cached
+  for a few seconds so retry storms do not hammer the disk
+- Counters show how much work coalescing saves
+
+SingleFlight is for threaded servers (Flask); AsyncSingleFlight is for the ASGI app.
+"""
+
+import asyncio
+import copy
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+def is_negative_result(result: Any) -> bool:
+    """Default negative check: None or an API response with status 'error'."""
+    return result is None or (isinstance(result, dict) and result.get('status') == 'error')
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _SingleFlightBase:
+    def __init__(self, negative_ttl: float = 5.0,
+                 is_negative: Callable[[Any], bool] = is_negative_result, max_negative: int = 10000):
+        self.negative_ttl = negative_ttl
+        self.is_negative = is_negative
+        self.max_negative = max_negative
+        self._negative: Dict[Hashable, tuple] = {}
+        self.stats = {
+            'calls': 0,
+            'executions': 0,
+            'coalesced': 0,
+            'negative_cache_hits': 0,
+            'negative_cached': 0,
+            'in_flight': 0,
+            'max_waiters': 0
+        }
+
+    @staticmethod
+    def _copy(result: Any) -> Any:
+        # Callers decorate responses (api_info), so each gets its own top-level dict
+        return copy.copy(result) if isinstance(result, dict) else result
+
+    def _cached_negative(self, key: Hashable, now: float) -> tuple:
+        entry = self._negative.get(key)
+        if entry is None:
+            return False, None
+        expires_at, result = entry
+        if expires_at <= now:
+            self._negative.pop(key, None)
+            return False, None
+        self.stats['negative_cache_hits'] += 1
+        return True, result
+
+    def _remember_negative(self, key: Hashable, result: Any, now: float) -> None:
+        if not self.negative_ttl or not self.is_negative(result):
+            return
+        if len(self._negative) >= self.max_negative:
+            # Drop expired entries first, then the oldest if still full
+            self._negative = {k: v for k, v in self._negative.items() if v[0] > now}
+            if len(self._negative) >= self.max_negative:
+                self._negative.pop(next(iter(self._negative)))
+        self._negative[key] = (now + self.negative_ttl, result)
+        self.stats['negative_cached'] += 1
+
+    def forget(self, key: Hashable) -> None:
+        """Drop a cached negative result (e.g. after the file has been created)."""
+        self._negative.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['negative_entries'] = len(self._negative)
+        stats['coalesce_rate'] = stats['coalesced'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
+
+
+class SingleFlight(_SingleFlightBase):
+    """Thread-based single-flight group."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Return fn() for key, sharing one execution among concurrent callers."""
+        now = time.time()
+        with self._lock:
+            self.stats['calls'] += 1
+            hit, result = self._cached_negative(key, now)
+            if hit:
+                return self._copy(result)
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats['coalesced'] += 1
+                self.stats['max_waiters'] = max(self.stats['max_waiters'], call.waiters)
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats['executions'] += 1
+                self.stats['in_flight'] += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return self._copy(call.result)
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                self.stats['in_flight'] -= 1
+                if call.error is None:
+                    self._remember_negative(key, call.result, time.time())
+            call.event.set()
+
+        if call.error is not None:
+            raise call.error
+        return self._copy(call.result)
+
+
+class AsyncSingleFlight(_SingleFlightBase):
+    """asyncio single-flight group (one event loop)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() for key, sharing one execution among concurrent callers."""
+        self.stats['calls'] += 1
+        hit, result = self._cached_negative(key, time.time())
+        if hit:
+            return self._copy(result)
+
+        future = self._calls.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            # shield: a cancelled waiter must not cancel the shared computation
+            return self._copy(await asyncio.shield(future))
+
+        future = asyncio.ensure_future(fn())
+        self._calls[key] = future
+        self.stats['executions'] += 1
+        self.stats['in_flight'] += 1
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._calls.pop(key, None)
+                self.stats['in_flight'] -= 1
+            else:
+                # Leader cancelled: let the computation finish for the waiters, then clean up
+                future.add_done_callback(lambda _: self._finish(key))
+        self._remember_negative(key, result, time.time())
+        return self._copy(result)
+
+    def _finish(self, key: Hashable) -> None:
+        self._calls.pop(key, None)
+        self.stats['in_flight'] -= 1
@@ -5,14 +5,19 @@ Receives real-time track classification and chat interaction data
 from the live stream assistant and integrates with main taxonomy database
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+import asyncio
 import sqlite3
 import json
 from datetime import datetime
 import logging
 
+from genre_trends import RESYNC, GenreTrendAggregator
+from stream_event_writer import CHAT_EVENT, DB_PATH, STATS_EVENT, TRACK_EVENT, StreamEventWriter
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -60,181 +65,60 @@ class StreamWebhookPayload(BaseModel):
     session_id: str
     event_type: str  # track_start, track_end, chat_message, etc.
 
-# Database functions
-def init_webhook_database():
-    """Initialize webhook tracking database"""
-    conn = sqlite3.connect('stream_assistant_data.db')
-    cursor = conn.cursor()
-    
-    # Create tables for webhook data
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS stream_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT UNIQUE,
-            dj_username TEXT,
-            stream_title TEXT,
-            start_time TIMESTAMP,
-            end_time TIMESTAMP,
-            total_tracks INTEGER DEFAULT 0,
-            total_interactions INTEGER DEFAULT 0,
-            peak_viewers INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS track_plays (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT,
-            artist TEXT,
-            title TEXT,
-            main_genre TEXT,
-            subgenre TEXT,
-            bpm INTEGER,
-            key_signature TEXT,
-            classification_confidence REAL,
-            characteristics TEXT,  -- JSON array
-            play_timestamp TIMESTAMP,
-            viewer_count INTEGER,
-            chat_engagement INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES stream_sessions (session_id)
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_interactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT,
-            track_id INTEGER,
-            message_content TEXT,
-            engagement_type TEXT,
-            audience_reaction TEXT,
-            response_count INTEGER,
-            emoji_reactions TEXT,  -- JSON
-            timestamp TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES stream_sessions (session_id),
-            FOREIGN KEY (track_id) REFERENCES track_plays (id)
-        )
-    ''')
-    
-    # Genre analytics table for taxonomy insights
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS genre_analytics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            main_genre TEXT,
-            subgenre TEXT,
-            total_plays INTEGER DEFAULT 1,
-            total_engagement INTEGER DEFAULT 0,
-            average_confidence REAL,
-            popular_characteristics TEXT,  -- JSON
-            last_played TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+# Database writes go through a single writer task (see stream_event_writer.py)
+writer = StreamEventWriter(DB_PATH)
+
+# Live trends are kept in memory and pushed to overlays / chat bots
+live_trends = GenreTrendAggregator(window_seconds=15 * 60)
+SSE_HEARTBEAT_SECONDS = 30
+
+
+def _ts(value: datetime) -> str:
+    # Same text sqlite3's default datetime adapter stored
+    return value.isoformat(' ')
 
-def update_genre_analytics(track_data: TrackData, engagement_score: int = 0):
-    """Update genre analytics based on track play data"""
-    conn = sqlite3.connect('stream_assistant_data.db')
-    cursor = conn.cursor()
-    
-    # Check if genre combo exists
-    cursor.execute('''
-        SELECT id, total_plays, total_engagement, average_confidence, popular_characteristics
-        FROM genre_analytics 
-        WHERE main_genre = ? AND subgenre = ?
-    ''', (track_data.classification.main_genre, track_data.classification.subgenre))
-    
-    existing = cursor.fetchone()
-    
-    if existing:
-        # Update existing record
-        new_total_plays = existing[1] + 1
-        new_total_engagement = existing[2] + engagement_score
-        new_avg_confidence = (existing[3] * existing[1] + track_data.classification.confidence) / new_total_plays
-        
-        # Merge characteristics
-        existing_chars = json.loads(existing[4]) if existing[4] else {}
-        for char in track_data.classification.characteristics:
-            existing_chars[char] = existing_chars.get(char, 0) + 1
-        
-        cursor.execute('''
-            UPDATE genre_analytics 
-            SET total_plays = ?, total_engagement = ?, average_confidence = ?, 
-                popular_characteristics = ?, last_played = ?, updated_at = ?
-            WHERE id = ?
-        ''', (new_total_plays, new_total_engagement, new_avg_confidence,
-              json.dumps(existing_chars), datetime.now(), datetime.now(), existing[0]))
-    else:
-        # Create new record
-        chars_dict = {char: 1 for char in track_data.classification.characteristics}
-        cursor.execute('''
-            INSERT INTO genre_analytics 
-            (main_genre, subgenre, total_plays, total_engagement, average_confidence, 
-             popular_characteristics, last_played)
-            VALUES (?, ?, 1, ?, ?, ?, ?)
-        ''', (track_data.classification.main_genre, track_data.classification.subgenre,
-              engagement_score, track_data.classification.confidence,
-              json.dumps(chars_dict), datetime.now()))
-    
-    conn.commit()
-    conn.close()
+
+def engagement_score(chat: ChatInteraction) -> int:
+    """Engagement score for analytics"""
+    score = chat.response_count
+    if chat.audience_reaction == "positive":
+        score += 5
+    elif chat.audience_reaction == "negative":
+        score -= 2
+    return score
 
 # Webhook endpoints
 @app.post("/api/webhook/track-classified")
-async def track_classified(payload: StreamWebhookPayload, background_tasks: BackgroundTasks):
+async def track_classified(payload: StreamWebhookPayload):
     """
     Receive track classification data from live stream assistant
     """
     try:
         logger.info(f"Track classified: {payload.track_data.artist} - {payload.track_data.title}")
         
-        # Store track play data
-        conn = sqlite3.connect('stream_assistant_data.db')
-        cursor = conn.cursor()
-        
-        # Ensure session exists
-        cursor.execute('''
-            INSERT OR IGNORE INTO stream_sessions 
-            (session_id, dj_username, stream_title, start_time)
-            VALUES (?, ?, ?, ?)
-        ''', (payload.session_id, payload.dj_stream.twitch_username,
-              payload.dj_stream.stream_title, payload.timestamp))
-        
-        # Insert track play
-        cursor.execute('''
-            INSERT INTO track_plays 
-            (session_id, artist, title, main_genre, subgenre, bpm, key_signature,
-             classification_confidence, characteristics, play_timestamp, viewer_count)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (payload.session_id, payload.track_data.artist, payload.track_data.title,
-              payload.track_data.classification.main_genre, 
-              payload.track_data.classification.subgenre,
-              payload.track_data.bpm, payload.track_data.key,
-              payload.track_data.classification.confidence,
-              json.dumps(payload.track_data.classification.characteristics),
-              payload.timestamp, payload.dj_stream.viewer_count))
-        
-        # Update session stats
-        cursor.execute('''
-            UPDATE stream_sessions 
-            SET total_tracks = total_tracks + 1,
-                peak_viewers = MAX(peak_viewers, ?)
-            WHERE session_id = ?
-        ''', (payload.dj_stream.viewer_count, payload.session_id))
-        
-        conn.commit()
-        conn.close()
-        
-        # Update analytics in background
-        background_tasks.add_task(update_genre_analytics, payload.track_data)
+        await writer.enqueue(TRACK_EVENT, {
+            'session_id': payload.session_id,
+            'dj_username': payload.dj_stream.twitch_username,
+            'stream_title': payload.dj_stream.stream_title,
+            'viewer_count': payload.dj_stream.viewer_count,
+            'artist': payload.track_data.artist,
+            'title': payload.track_data.title,
+            'main_genre': payload.track_data.classification.main_genre,
+            'subgenre': payload.track_data.classification.subgenre,
+            'bpm': payload.track_data.bpm,
+            'key': payload.track_data.key,
+            'confidence': payload.track_data.classification.confidence,
+            'characteristics': payload.track_data.classification.characteristics,
+            'timestamp': _ts(payload.timestamp),
+            'received_at': _ts(datetime.now())
+        })
+        live_trends.record_track(payload.session_id,
+                                 payload.track_data.classification.main_genre,
+                                 payload.track_data.classification.subgenre,
+                                 payload.track_data.classification.confidence,
+                                 payload.track_data.classification.characteristics)
         
-        return {"status": "success", "message": "Track classification recorded"}
+        return {"status": "success", "message": "Track classification queued"}
         
     except Exception as e:
         logger.error(f"Error processing track classification: {str(e)}")
@@ -245,69 +129,26 @@ async def chat_interaction(payload: StreamWebhookPayload):
     """
     Receive chat interaction data from Twitch bot
     """
+    if not payload.chat_interaction:
+        raise HTTPException(status_code=400, detail="Chat interaction data required")
+    
     try:
-        if not payload.chat_interaction:
-            raise HTTPException(status_code=400, detail="Chat interaction data required")
-        
         logger.info(f"Chat interaction: {payload.chat_interaction.engagement_type}")
         
-        conn = sqlite3.connect('stream_assistant_data.db')
-        cursor = conn.cursor()
-        
-        # Get latest track for this session
-        cursor.execute('''
-            SELECT id FROM track_plays 
-            WHERE session_id = ? 
-            ORDER BY play_timestamp DESC LIMIT 1
-        ''', (payload.session_id,))
-        
-        track_result = cursor.fetchone()
-        track_id = track_result[0] if track_result else None
-        
-        # Insert chat interaction
-        cursor.execute('''
-            INSERT INTO chat_interactions 
-            (session_id, track_id, message_content, engagement_type, audience_reaction,
-             response_count, emoji_reactions, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (payload.session_id, track_id, payload.chat_interaction.message_sent,
-              payload.chat_interaction.engagement_type, 
-              payload.chat_interaction.audience_reaction,
-              payload.chat_interaction.response_count,
-              json.dumps(payload.chat_interaction.emoji_reactions),
-              payload.timestamp))
-        
-        # Update session interaction count
-        cursor.execute('''
-            UPDATE stream_sessions 
-            SET total_interactions = total_interactions + 1
-            WHERE session_id = ?
-        ''', (payload.session_id,))
-        
-        # Calculate engagement score for analytics
-        engagement_score = payload.chat_interaction.response_count
-        if payload.chat_interaction.audience_reaction == "positive":
-            engagement_score += 5
-        elif payload.chat_interaction.audience_reaction == "negative":
-            engagement_score -= 2
-        
-        # Update genre analytics with engagement
-        if track_id:
-            cursor.execute('''
-                SELECT main_genre, subgenre FROM track_plays WHERE id = ?
-            ''', (track_id,))
-            genre_data = cursor.fetchone()
-            if genre_data:
-                cursor.execute('''
-                    UPDATE genre_analytics 
-                    SET total_engagement = total_engagement + ?
-                    WHERE main_genre = ? AND subgenre = ?
-                ''', (engagement_score, genre_data[0], genre_data[1]))
-        
-        conn.commit()
-        conn.close()
+        score = engagement_score(payload.chat_interaction)
+        await writer.enqueue(CHAT_EVENT, {
+            'session_id': payload.session_id,
+            'message': payload.chat_interaction.message_sent,
+            'engagement_type': payload.chat_interaction.engagement_type,
+            'audience_reaction': payload.chat_interaction.audience_reaction,
+            'response_count': payload.chat_interaction.response_count,
+            'emoji_reactions': payload.chat_interaction.emoji_reactions,
+            'engagement_score': score,
+            'timestamp': _ts(payload.timestamp)
+        })
+        live_trends.record_chat(payload.session_id, score)
         
-        return {"status": "success", "message": "Chat interaction recorded"}
+        return {"status": "success", "message": "Chat interaction queued"}
         
     except Exception as e:
         logger.error(f"Error processing chat interaction: {str(e)}")
@@ -321,41 +162,76 @@ async def stream_stats(payload: StreamWebhookPayload):
     try:
         logger.info(f"Stream stats update for session: {payload.session_id}")
         
-        conn = sqlite3.connect('stream_assistant_data.db')
-        cursor = conn.cursor()
-        
-        # Update session with latest stats
-        cursor.execute('''
-            UPDATE stream_sessions 
-            SET peak_viewers = MAX(peak_viewers, ?),
-                stream_title = ?
-            WHERE session_id = ?
-        ''', (payload.dj_stream.viewer_count, payload.dj_stream.stream_title, payload.session_id))
-        
-        # If this is a session end event
-        if payload.event_type == "stream_end":
-            cursor.execute('''
-                UPDATE stream_sessions 
-                SET end_time = ?
-                WHERE session_id = ?
-            ''', (payload.timestamp, payload.session_id))
-        
-        conn.commit()
-        conn.close()
+        await writer.enqueue(STATS_EVENT, {
+            'session_id': payload.session_id,
+            'viewer_count': payload.dj_stream.viewer_count,
+            'stream_title': payload.dj_stream.stream_title,
+            # If this is a session end event
+            'end_time': _ts(payload.timestamp) if payload.event_type == "stream_end" else None
+        })
         
-        return {"status": "success", "message": "Stream stats updated"}
+        return {"status": "success", "message": "Stream stats queued"}
         
     except Exception as e:
         logger.error(f"Error processing stream stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/webhook/writer-stats")
+async def writer_stats():
+    """Queue depth and batch sizes of the event writer, and live trend subscribers"""
+    return {**writer.get_stats(), "live_trends": live_trends.get_stats()}
+
+# Live trend endpoints (in-memory, no database reads)
+@app.get("/api/live/genre-trends")
+async def get_live_genre_trends(session_id: Optional[str] = None, limit: int = 20):
+    """
+    Genre trends over the rolling window, across sessions or for one session (plus its totals)
+    """
+    snapshot = live_trends.snapshot(session_id, limit)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No live data for session")
+    return snapshot
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/api/live/genre-trends/stream")
+async def stream_live_genre_trends(request: Request, session_id: Optional[str] = None, limit: int = 20):
+    """
+    Server-Sent Events: a snapshot on connect, then one update per event.
+    Idle streams get a fresh snapshot every SSE_HEARTBEAT_SECONDS (also covers window expiry).
+    """
+    queue = live_trends.subscribe(session_id)
+
+    async def events():
+        try:
+            yield _sse("snapshot", live_trends.snapshot(session_id, limit) or {})
+            while not await request.is_disconnected():
+                try:
+                    update = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield _sse("snapshot", live_trends.snapshot(session_id, limit) or {})
+                    continue
+                if update is RESYNC:
+                    yield _sse("snapshot", live_trends.snapshot(session_id, limit) or {})
+                else:
+                    yield _sse("update", update)
+        finally:
+            live_trends.unsubscribe(queue, session_id)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # Analytics endpoints
 @app.get("/api/analytics/genre-trends")
 async def get_genre_trends(limit: int = 20):
     """
     Get trending genres based on play count and engagement
     """
-    conn = sqlite3.connect('stream_assistant_data.db')
+    return await asyncio.to_thread(_genre_trends, limit)
+
+def _genre_trends(limit: int) -> Dict:
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -388,7 +264,13 @@ async def get_session_summary(session_id: str):
     """
     Get comprehensive summary of a stream session
     """
-    conn = sqlite3.connect('stream_assistant_data.db')
+    summary = await asyncio.to_thread(_session_summary, session_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return summary
+
+def _session_summary(session_id: str) -> Optional[Dict]:
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
     # Get session info
@@ -398,7 +280,8 @@ async def get_session_summary(session_id: str):
     session = cursor.fetchone()
     
     if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
+        conn.close()
+        return None
     
     # Get track breakdown
     cursor.execute('''
@@ -444,9 +327,15 @@ async def get_session_summary(session_id: str):
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
-    init_webhook_database()
+    await writer.start()
     logger.info("Webhook database initialized")
 
+# Flush queued events before exit
+@app.on_event("shutdown")
+async def shutdown_event():
+    await writer.stop()
+    logger.info(f"Event writer stopped: {writer.get_stats()}")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+STREAM EVENT WRITER
+===================
+Single-writer SQLite persistence for the live stream assistant webhooks.
+
+Webhook handlers only enqueue an event and return. One long-lived writer task:
+- Owns the only write connection (WAL mode) on its own thread, so SQLite work
+  never runs on the event loop
+- Drains the asyncio queue in micro-batches (up to max_batch events, or
+  whatever arrived within max_delay) and commits each batch once
+- Keeps arrival order by writing consecutive events of the same kind as one
+  run with executemany, so a chat message still links to the track that was
+  playing when it arrived
+- Folds plays into genre_analytics with a pre-aggregated UPSERT per batch
+
+The queue is bounded: when the writer falls behind, handlers wait for space
+instead of growing memory without limit. Events still queued when the
+process dies are lost; stop() flushes everything that was accepted.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from metrics import JOURNAL_BACKLOG
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'stream_assistant_data.db'
+
+TRACK_EVENT = 'track'
+CHAT_EVENT = 'chat'
+STATS_EVENT = 'stream_stats'
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS stream_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT UNIQUE,
+        dj_username TEXT,
+        stream_title TEXT,
+        start_time TIMESTAMP,
+        end_time TIMESTAMP,
+        total_tracks INTEGER DEFAULT 0,
+        total_interactions INTEGER DEFAULT 0,
+        peak_viewers INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS track_plays (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT,
+        artist TEXT,
+        title TEXT,
+        main_genre TEXT,
+        subgenre TEXT,
+        bpm INTEGER,
+        key_signature TEXT,
+        classification_confidence REAL,
+        characteristics TEXT,  -- JSON array
+        play_timestamp TIMESTAMP,
+        viewer_count INTEGER,
+        chat_engagement INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (session_id) REFERENCES stream_sessions (session_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chat_interactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT,
+        track_id INTEGER,
+        message_content TEXT,
+        engagement_type TEXT,
+        audience_reaction TEXT,
+        response_count INTEGER,
+        emoji_reactions TEXT,  -- JSON
+        timestamp TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (session_id) REFERENCES stream_sessions (session_id),
+        FOREIGN KEY (track_id) REFERENCES track_plays (id)
+    )
+    ''',
+    # Genre analytics table for taxonomy insights
+    '''
+    CREATE TABLE IF NOT EXISTS genre_analytics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        main_genre TEXT,
+        subgenre TEXT,
+        total_plays INTEGER DEFAULT 1,
+        total_engagement INTEGER DEFAULT 0,
+        average_confidence REAL,
+        popular_characteristics TEXT,  -- JSON
+        last_played TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_track_plays_session ON track_plays(session_id, play_timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_chat_interactions_session ON chat_interactions(session_id)',
+]
+
+# One row per (genre, subgenre); a NULL subgenre is its own key
+GENRE_KEY_INDEX = ('CREATE UNIQUE INDEX IF NOT EXISTS idx_genre_analytics_key '
+                   "ON genre_analytics(main_genre, IFNULL(subgenre, ''))")
+
+GENRE_UPSERT = '''
+    INSERT INTO genre_analytics
+    (main_genre, subgenre, total_plays, total_engagement, average_confidence,
+     popular_characteristics, last_played, updated_at)
+    VALUES (?, ?, ?, 0, ?, ?, ?, ?)
+    ON CONFLICT(main_genre, IFNULL(subgenre, '')) DO UPDATE SET
+        total_plays = total_plays + excluded.total_plays,
+        average_confidence = (IFNULL(average_confidence, 0) * total_plays
+                              + excluded.average_confidence * excluded.total_plays)
+                             / (total_plays + excluded.total_plays),
+        popular_characteristics = merge_counts(popular_characteristics, excluded.popular_characteristics),
+        last_played = excluded.last_played,
+        updated_at = excluded.updated_at
+'''
+
+
+def merge_counts(existing: Optional[str], new: Optional[str]) -> str:
+    """SQL function: add two JSON {characteristic: count} objects."""
+    merged = Counter(json.loads(existing) if existing else {})
+    merged.update(json.loads(new) if new else {})
+    return json.dumps(dict(merged))
+
+
+def connect(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """Connection in WAL mode (readers never block the writer) with merge_counts registered."""
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.create_function('merge_counts', 2, merge_counts)
+    return conn
+
+
+def _dedupe_genre_analytics(conn: sqlite3.Connection) -> int:
+    """Merge duplicate (genre, subgenre) rows left by older versions so the unique key can be created."""
+    groups = conn.execute('''
+        SELECT main_genre, IFNULL(subgenre, '') FROM genre_analytics
+        GROUP BY main_genre, IFNULL(subgenre, '') HAVING COUNT(*) > 1
+    ''').fetchall()
+    for main_genre, subgenre in groups:
+        rows = conn.execute('''
+            SELECT id, total_plays, total_engagement, average_confidence, popular_characteristics, last_played
+            FROM genre_analytics WHERE main_genre IS ? AND IFNULL(subgenre, '') = ? ORDER BY id
+        ''', (main_genre, subgenre)).fetchall()
+        plays = sum(r[1] or 0 for r in rows)
+        engagement = sum(r[2] or 0 for r in rows)
+        confidence = sum((r[3] or 0) * (r[1] or 0) for r in rows) / plays if plays else None
+        characteristics = '{}'
+        for r in rows:
+            characteristics = merge_counts(characteristics, r[4])
+        last_played = max((r[5] for r in rows if r[5]), default=None)
+        keep = rows[0][0]
+        conn.execute('''
+            UPDATE genre_analytics SET total_plays = ?, total_engagement = ?, average_confidence = ?,
+                   popular_characteristics = ?, last_played = ? WHERE id = ?
+        ''', (plays, engagement, confidence, characteristics, last_played, keep))
+        conn.executemany('DELETE FROM genre_analytics WHERE id = ?', [(r[0],) for r in rows[1:]])
+    return len(groups)
+
+
+def init_webhook_database(db_path: str = DB_PATH):
+    """Initialize webhook tracking database"""
+    conn = connect(db_path)
+    try:
+        for statement in SCHEMA:
+            conn.execute(statement)
+        merged = _dedupe_genre_analytics(conn)
+        if merged:
+            logger.info(f"Merged {merged} duplicate genre_analytics groups")
+        conn.execute(GENRE_KEY_INDEX)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class StreamEventWriter:
+    """Owns the write connection and persists queued webhook events in micro-batches."""
+
+    def __init__(self, db_path: str = DB_PATH, max_batch: int = 500, max_delay: float = 0.05,
+                 queue_size: int = 10000):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # One thread = one connection; sqlite3 connections stay on the thread that made them
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stream-writer')
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats = {'enqueued': 0, 'written': 0, 'batches': 0, 'errors': 0, 'max_batch_seen': 0,
+                      'last_batch_ms': 0}
+
+    # ================================
+    # LIFECYCLE
+    # ================================
+
+    async def start(self) -> None:
+        """Create the schema, open the connection and start the writer task."""
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._open)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run(), name='stream-event-writer')
+
+    def _open(self) -> None:
+        init_webhook_database(self.db_path)
+        self._conn = connect(self.db_path)
+
+    async def stop(self) -> None:
+        """Flush every accepted event, then close the connection."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close)
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def enqueue(self, kind: str, event: Dict) -> None:
+        """Queue an event for the writer (waits only if the queue is full)."""
+        await self._queue.put((kind, event))
+        self.stats['enqueued'] += 1
+        JOURNAL_BACKLOG.set(self._queue.qsize(), journal='stream_events')
+
+    def backlog(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def flush(self) -> None:
+        """Wait until everything enqueued so far is committed."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    # ================================
+    # WRITER TASK
+    # ================================
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    # Give a burst a moment to fill the batch, but never hold events longer than max_delay
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            try:
+                await loop.run_in_executor(self._executor, self.write_batch, batch)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Stream event batch of {len(batch)} failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                JOURNAL_BACKLOG.set(self._queue.qsize(), journal='stream_events')
+
+    def write_batch(self, batch: List[Tuple[str, Dict]]) -> None:
+        """Persist a batch in one transaction (runs on the writer thread)."""
+        start = time.time()
+        conn = self._conn
+        with conn:
+            for kind, events in self._runs(batch):
+                if kind == TRACK_EVENT:
+                    self._write_tracks(conn, events)
+                elif kind == CHAT_EVENT:
+                    self._write_chats(conn, events)
+                elif kind == STATS_EVENT:
+                    self._write_stream_stats(conn, events)
+                else:
+                    logger.warning(f"Unknown stream event kind: {kind}")
+        self.stats['written'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['max_batch_seen'] = max(self.stats['max_batch_seen'], len(batch))
+        self.stats['last_batch_ms'] = int((time.time() - start) * 1000)
+
+    @staticmethod
+    def _runs(batch: List[Tuple[str, Dict]]):
+        """Split a batch into consecutive runs of the same event kind, preserving arrival order."""
+        run_kind, run = None, []
+        for kind, event in batch:
+            if kind != run_kind and run:
+                yield run_kind, run
+                run = []
+            run_kind = kind
+            run.append(event)
+        if run:
+            yield run_kind, run
+
+    @staticmethod
+    def _write_tracks(conn: sqlite3.Connection, events: List[Dict]) -> None:
+        conn.executemany('''
+            INSERT OR IGNORE INTO stream_sessions
+            (session_id, dj_username, stream_title, start_time)
+            VALUES (?, ?, ?, ?)
+        ''', [(e['session_id'], e['dj_username'], e['stream_title'], e['timestamp']) for e in events])
+
+        conn.executemany('''
+            INSERT INTO track_plays
+            (session_id, artist, title, main_genre, subgenre, bpm, key_signature,
+             classification_confidence, characteristics, play_timestamp, viewer_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(e['session_id'], e['artist'], e['title'], e['main_genre'], e['subgenre'], e['bpm'], e['key'],
+               e['confidence'], json.dumps(e['characteristics']), e['timestamp'], e['viewer_count'])
+              for e in events])
+
+        # Session counters: one UPDATE per session per run
+        sessions: Dict[str, List[int]] = {}
+        for e in events:
+            tracks, peak = sessions.get(e['session_id'], (0, 0))
+            sessions[e['session_id']] = [tracks + 1, max(peak, e['viewer_count'] or 0)]
+        conn.executemany('''
+            UPDATE stream_sessions
+            SET total_tracks = total_tracks + ?,
+                peak_viewers = MAX(peak_viewers, ?)
+            WHERE session_id = ?
+        ''', [(tracks, peak, session_id) for session_id, (tracks, peak) in sessions.items()])
+
+        # Genre analytics: aggregate the run, then one UPSERT per (genre, subgenre)
+        genres = defaultdict(lambda: {'plays': 0, 'confidence': 0.0, 'characteristics': Counter(), 'last': None})
+        for e in events:
+            g = genres[(e['main_genre'], e['subgenre'])]
+            g['plays'] += 1
+            g['confidence'] += e['confidence']
+            g['characteristics'].update(e['characteristics'])
+            g['last'] = e['received_at']
+        conn.executemany(GENRE_UPSERT, [
+            (main_genre, subgenre, g['plays'], g['confidence'] / g['plays'],
+             json.dumps(dict(g['characteristics'])), g['last'], g['last'])
+            for (main_genre, subgenre), g in genres.items()
+        ])
+
+    @staticmethod
+    def _write_chats(conn: sqlite3.Connection, events: List[Dict]) -> None:
+        # Latest track per session (fixed for the whole run - no track events inside it)
+        latest = {}
+        for session_id in {e['session_id'] for e in events}:
+            latest[session_id] = conn.execute('''
+                SELECT id, main_genre, subgenre FROM track_plays
+                WHERE session_id = ?
+                ORDER BY play_timestamp DESC LIMIT 1
+            ''', (session_id,)).fetchone()
+
+        conn.executemany('''
+            INSERT INTO chat_interactions
+            (session_id, track_id, message_content, engagement_type, audience_reaction,
+             response_count, emoji_reactions, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(e['session_id'], latest[e['session_id']][0] if latest[e['session_id']] else None,
+               e['message'], e['engagement_type'], e['audience_reaction'], e['response_count'],
+               json.dumps(e['emoji_reactions']), e['timestamp']) for e in events])
+
+        interactions = Counter(e['session_id'] for e in events)
+        conn.executemany('''
+            UPDATE stream_sessions
+            SET total_interactions = total_interactions + ?
+            WHERE session_id = ?
+        ''', [(count, session_id) for session_id, count in interactions.items()])
+
+        engagement = Counter()
+        for e in events:
+            track = latest[e['session_id']]
+            if track:
+                engagement[(track[1], track[2])] += e['engagement_score']
+        conn.executemany('''
+            UPDATE genre_analytics
+            SET total_engagement = total_engagement + ?
+            WHERE main_genre = ? AND IFNULL(subgenre, '') = IFNULL(?, '')
+        ''', [(score, main_genre, subgenre) for (main_genre, subgenre), score in engagement.items()])
+
+    @staticmethod
+    def _write_stream_stats(conn: sqlite3.Connection, events: List[Dict]) -> None:
+        conn.executemany('''
+            UPDATE stream_sessions
+            SET peak_viewers = MAX(peak_viewers, ?),
+                stream_title = ?
+            WHERE session_id = ?
+        ''', [(e['viewer_count'], e['stream_title'], e['session_id']) for e in events])
+        conn.executemany('''
+            UPDATE stream_sessions
+            SET end_time = ?
+            WHERE session_id = ?
+        ''', [(e['end_time'], e['session_id']) for e in events if e.get('end_time')])
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, 'backlog': self.backlog()}
@@ -10,6 +10,8 @@ import time
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 
+from metrics import time_db_call
+
 @dataclass
 class SupabaseConfig:
     """Supabase configuration"""
@@ -39,8 +41,9 @@ class SupabaseClient:
         url = f"{self.base_url}/{endpoint}"
         
         try:
-            response = self.session.request(method, url, **kwargs)
-            response.raise_for_status()
+            with time_db_call('supabase', method, endpoint):
+                response = self.session.request(method, url, **kwargs)
+                response.raise_for_status()
             return response
         except requests.exceptions.RequestException as e:
             print(f"❌ Supabase API error: {e}")
@@ -53,6 +56,31 @@ class SupabaseClient:
         response = self._make_request("POST", "cultural_tracks", json=track_data)
         return response.json()[0] if response.json() else {}
     
+    def upsert_tracks(self, tracks: List[Dict[str, Any]], on_conflict: str = "file_path") -> int:
+        """Bulk insert-or-update cultural_tracks rows in one request"""
+        if not tracks:
+            return 0
+        self._make_request(
+            "POST",
+            f"cultural_tracks?on_conflict={on_conflict}",
+            json=tracks,
+            headers={"Prefer": "resolution=merge-duplicates,return=minimal"}
+        )
+        return len(tracks)
+
+    def get_track_paths_by_hash(self, file_hashes: List[str], chunk_size: int = 100) -> Dict[str, str]:
+        """file_hash -> stored file_path for the hashes already in cultural_tracks"""
+        paths = {}
+        for start in range(0, len(file_hashes), chunk_size):
+            chunk = file_hashes[start:start + chunk_size]
+            response = self._make_request(
+                "GET",
+                "cultural_tracks",
+                params={"select": "file_hash,file_path", "file_hash": f"in.({','.join(chunk)})"}
+            )
+            paths.update({row["file_hash"]: row["file_path"] for row in response.json()})
+        return paths
+
     def get_track_by_hash(self, file_hash: str) -> Optional[Dict[str, Any]]:
         """Get track by file hash"""
         response = self._make_request(
@@ -109,6 +137,24 @@ class SupabaseClient:
         response = self._make_request("GET", endpoint)
         return response.json()
     
+    def get_patterns_version(self) -> Optional[str]:
+        """Cheap change marker for cultural_patterns: row count plus latest last_updated.
+
+        Returns None when the request fails, so the pattern poller falls back to its max age.
+        """
+        try:
+            response = self._make_request(
+                "GET",
+                "cultural_patterns?select=last_updated&order=last_updated.desc.nullslast&limit=1",
+                headers={"Prefer": "count=exact"}
+            )
+            rows = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"❌ Could not read patterns version: {e}")
+            return None
+        count = response.headers.get('Content-Range', '0').split('/')[-1]
+        return f"{count}:{rows[0]['last_updated'] if rows else ''}"
+    
     def get_artist_profile(self, name: str) -> Optional[Dict[str, Any]]:
         """Get artist profile"""
         response = self._make_request(
@@ -8,8 +8,8 @@ Processes files, extracts metadata, detects duplicates, and classifies genres.
 """
 
 import os
+import sys
 import json
-import hashlib
 import time
 import re
 from pathlib import Path
@@ -27,6 +27,11 @@ except ImportError:
     from mutagen import File as MutagenFile
 
 from taxonomy_v32 import TaxonomyConfig, DatabaseSchema
+from parallel_walker import ParallelDirectoryWalker
+from file_hashing import hash_file, identity_hashes_many
+from metrics import FILES_PER_SECOND, FILES_PROCESSED, REGISTRY
+from track_records import Classification, ScanResult, TrackRecord
+from scan_result_sink import HashLedger, ResultSink, ScanAggregates, largest_groups, make_result_sink
 
 class MetadataExtractor:
     """Extract comprehensive metadata from audio files"""
@@ -262,7 +267,7 @@ class PatternAnalyzer:
 class TaxonomyScanner:
     """Main scanning engine for the Cultural Intelligence System"""
     
-    def __init__(self, config: TaxonomyConfig):
+    def __init__(self, config: TaxonomyConfig, sink: Optional[ResultSink] = None):
         self.config = config
         self.metadata_extractor = MetadataExtractor()
         self.pattern_analyzer = PatternAnalyzer()
@@ -275,21 +280,23 @@ class TaxonomyScanner:
             'files_processed': 0,
             'errors': 0,
             'duplicates_found': 0,
-            'classifications_made': 0
+            'classifications_made': 0,
+            'sink_errors': 0,
+            'records_not_written': 0
         }
         
-        # Duplicate tracking
-        self.file_hashes = {}
-        self.duplicate_groups = []
+        # Duplicate tracking (on disk, read back once the walk is done)
+        self.hash_ledger = None
+        self.duplicate_groups = []  # largest groups only; all groups go to the sink
         
-        # Classification results
-        self.classifications = []
+        # Classification results are streamed to the sink per batch; the report uses running totals
+        self.sink = sink
+        self.aggregates = ScanAggregates()
         
     def generate_file_hash(self, file_path: str) -> Optional[str]:
         """Generate SHA-256 hash for file (validated FILE_HASH algorithm)"""
         try:
-            with open(file_path, 'rb') as f:
-                return hashlib.sha256(f.read()).hexdigest()
+            return hash_file(file_path)
         except Exception as e:
             print(f"⚠️  Hash generation failed for {file_path}: {e}")
             return None
@@ -301,24 +308,41 @@ class TaxonomyScanner:
         print(f"🆔 Run ID: {self.stats['run_id']}")
         print()
         
-        # Find all audio files
-        audio_files = []
+        if self.sink is None:
+            self.sink = make_result_sink(self.config, self.stats['run_id'])
+        self.hash_ledger = HashLedger()
+        try:
+            return self._scan(directory)
+        finally:
+            self.hash_ledger.close()
+            self.sink.close()
+    
+    def _scan(self, directory: str) -> Dict:
+        # Stream audio files from the parallel walker and process them in batches
         supported_formats = set(self.config.get('scanning.supported_formats'))
-        
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if Path(file).suffix.lower() in supported_formats:
-                    audio_files.append(os.path.join(root, file))
-        
-        print(f"📊 Found {len(audio_files)} audio files")
-        self.stats['files_scanned'] = len(audio_files)
-        
-        # Process files in batches
         batch_size = self.config.get('scanning.batch_size', 400)
+        walker = ParallelDirectoryWalker(
+            supported_formats,
+            max_workers=self.config.get('scanning.workers', 8),
+            include_stat=False
+        )
         
-        for i in range(0, len(audio_files), batch_size):
-            batch = audio_files[i:i + batch_size]
-            self._process_batch(batch, i // batch_size + 1, len(audio_files) // batch_size + 1)
+        batch = []
+        batch_num = 0
+        for file_path in walker.iter_files(directory):
+            self.stats['files_scanned'] += 1
+            batch.append(file_path)
+            if len(batch) >= batch_size:
+                batch_num += 1
+                self._process_batch(batch, batch_num)
+                batch = []
+        if batch:
+            batch_num += 1
+            self._process_batch(batch, batch_num)
+        
+        walk_stats = walker.get_stats()
+        print(f"📊 Found {self.stats['files_scanned']} audio files "
+              f"({walk_stats['directories_per_second']:.1f} dirs/sec, {walk_stats['entries_per_second']:.1f} entries/sec)")
         
         # Analyze duplicates
         self._analyze_duplicates()
@@ -326,58 +350,75 @@ class TaxonomyScanner:
         # Generate final report
         return self._generate_report()
     
-    def _process_batch(self, batch: List[str], batch_num: int, total_batches: int):
+    def _process_batch(self, batch: List[str], batch_num: int, total_batches: Optional[int] = None):
         """Process a batch of files"""
-        print(f"⚙️  Processing batch {batch_num}/{total_batches} ({len(batch)} files)")
+        progress = f"{batch_num}/{total_batches}" if total_batches else f"{batch_num}"
+        print(f"⚙️  Processing batch {progress} ({len(batch)} files)")
         
         start_time = time.time()
         
+        # Hash the whole batch on the thread pool before the per-file analysis
+        batch_hashes = dict(identity_hashes_many(batch))
+        
+        processed = 0
+        results = []
         for file_path in batch:
             try:
-                self._process_single_file(file_path)
+                classification = self._process_single_file(file_path, batch_hashes.get(file_path))
+                if classification:
+                    results.append(classification)
                 self.stats['files_processed'] += 1
+                processed += 1
                 
             except Exception as e:
                 print(f"❌ Error processing {file_path}: {e}")
                 self.stats['errors'] += 1
         
+        # Hand the batch to the sink and keep only the running totals
+        try:
+            self.sink.write_batch(results)
+        except Exception as e:
+            # A failed write loses this batch's records only; the scan and its totals carry on
+            print(f"❌ Result sink failed for batch {batch_num}: {e}")
+            self.stats['sink_errors'] += 1
+            self.stats['records_not_written'] += len(results)
+        self.hash_ledger.add_many((r.track.file_hash, r.track.file_path) for r in results)
+        for result in results:
+            self.aggregates.add(result)
+        
         elapsed = time.time() - start_time
         rate = len(batch) / elapsed if elapsed > 0 else 0
+        FILES_PROCESSED.inc(processed, job='taxonomy_scanner')
+        FILES_PER_SECOND.set(rate, job='taxonomy_scanner')
         
         print(f"✅ Batch {batch_num} complete | {rate:.1f} files/sec")
     
-    def _process_single_file(self, file_path: str):
-        """Process individual audio file"""
+    def _process_single_file(self, file_path: str, hashes: Optional[Dict] = None) -> Optional[ScanResult]:
+        """Process individual audio file; returns its result (None if it could not be hashed)"""
         # Generate file hash (duplicate detection)
-        file_hash = self.generate_file_hash(file_path)
-        if not file_hash:
-            return
-        
-        # Track for duplicate detection
-        if file_hash not in self.file_hashes:
-            self.file_hashes[file_hash] = []
-        self.file_hashes[file_hash].append(file_path)
+        if not hashes:
+            file_hash = self.generate_file_hash(file_path)
+            if not file_hash:
+                return None
+            hashes = {'file_hash': file_hash}
         
         # Extract metadata
         metadata = self.metadata_extractor.extract_metadata(file_path)
+        track = TrackRecord.from_path(file_path, hashes, raw_metadata=metadata, processing_version='v3.2')
         
         # Analyze patterns
-        filename_analysis = self.pattern_analyzer.analyze_filename(Path(file_path).name)
-        folder_analysis = self.pattern_analyzer.analyze_folder_path(str(Path(file_path).parent))
-        metadata_analysis = self.pattern_analyzer.analyze_metadata_fields(metadata)
+        filename_analysis = self.pattern_analyzer.analyze_filename(track.filename)
+        folder_analysis = self.pattern_analyzer.analyze_folder_path(track.folder_path)
+        metadata_analysis = self.pattern_analyzer.analyze_metadata_fields(track.raw_metadata)
         
         # Combine analysis results
-        classification = self._combine_analysis_results(
-            file_path, file_hash, metadata, 
-            filename_analysis, folder_analysis, metadata_analysis
-        )
+        result = self._combine_analysis_results(track, filename_analysis, folder_analysis, metadata_analysis)
         
-        self.classifications.append(classification)
         self.stats['classifications_made'] += 1
+        return result
     
-    def _combine_analysis_results(self, file_path: str, file_hash: str, metadata: Dict, 
-                                filename_analysis: Dict, folder_analysis: Dict, 
-                                metadata_analysis: Dict) -> Dict:
+    def _combine_analysis_results(self, track: TrackRecord, filename_analysis: Dict, folder_analysis: Dict,
+                                  metadata_analysis: Dict) -> ScanResult:
         """Combine all analysis results into final classification"""
         
         # Collect all genre hints with sources
@@ -406,67 +447,43 @@ class TaxonomyScanner:
             final_genre = 'Electronic'  # Default fallback
             genre_confidence = 0.1
         
-        # Extract artist information (prefer metadata > filename)
-        artist = (metadata_analysis.get('artist') or 
-                 filename_analysis.get('artist') or 
-                 'Unknown Artist')
-        
-        # Extract track information
-        track = (metadata_analysis.get('track') or 
-                filename_analysis.get('track') or 
-                Path(file_path).stem)
-        
-        # File information
-        stat = os.stat(file_path)
-        
-        classification = {
-            # File information
-            'file_path': file_path,
-            'file_hash': file_hash,
-            'filename': Path(file_path).name,
-            'folder_path': str(Path(file_path).parent),
-            'file_size': stat.st_size,
-            'file_modified': datetime.fromtimestamp(stat.st_mtime),
-            
-            # Extracted information
-            'artist': artist,
-            'track_name': track,
-            'remix_info': filename_analysis.get('remix_type'),
-            'label': metadata_analysis.get('label'),
-            'bpm': metadata_analysis.get('bpm'),
-            
-            # Classification results
-            'genre': final_genre,
-            'genre_confidence': genre_confidence,
-            'classification_sources': genre_hints,
-            
-            # Raw data
-            'metadata': metadata,
-            'filename_analysis': filename_analysis,
-            'folder_analysis': folder_analysis,
-            'metadata_analysis': metadata_analysis,
-            
-            # Processing metadata
-            'processed_at': datetime.now(),
-            'processing_version': 'v3.2'
-        }
-        
-        return classification
+        classification = Classification(
+            # Extract artist information (prefer metadata > filename)
+            artist=(metadata_analysis.get('artist') or 
+                    filename_analysis.get('artist') or 
+                    'Unknown Artist'),
+            # Extract track information
+            track_name=(metadata_analysis.get('track') or 
+                        filename_analysis.get('track') or 
+                        os.path.splitext(track.filename)[0]),
+            remix_info=filename_analysis.get('remix_type'),
+            label=metadata_analysis.get('label'),
+            bpm=metadata_analysis.get('bpm'),
+            confidence_scores={'genre': genre_confidence},
+            sources=genre_hints
+        )
+        classification.primary_genre = sys.intern(final_genre)
+        
+        return ScanResult(
+            track=track,
+            classification=classification.finalize(),
+            filename_analysis=filename_analysis,
+            folder_analysis=folder_analysis,
+            metadata_analysis=metadata_analysis,
+            processed_at=time.time()
+        )
     
     def _analyze_duplicates(self):
         """Analyze file hashes for duplicate detection"""
         print("🔍 Analyzing duplicates...")
         
-        for file_hash, file_paths in self.file_hashes.items():
-            if len(file_paths) > 1:
-                self.duplicate_groups.append({
-                    'hash': file_hash,
-                    'files': file_paths,
-                    'count': len(file_paths)
-                })
-                self.stats['duplicates_found'] += len(file_paths) - 1
+        self.duplicate_groups, group_count, duplicate_files = largest_groups(
+            self.hash_ledger.duplicate_groups(), self.sink
+        )
+        self.stats['duplicate_groups'] = group_count
+        self.stats['duplicates_found'] += duplicate_files
         
-        print(f"📊 Found {len(self.duplicate_groups)} duplicate groups")
+        print(f"📊 Found {group_count} duplicate groups")
         print(f"📁 {self.stats['duplicates_found']} duplicate files identified")
     
     def _generate_report(self) -> Dict:
@@ -474,22 +491,6 @@ class TaxonomyScanner:
         elapsed_time = time.time() - self.stats['start_time']
         files_per_second = self.stats['files_processed'] / elapsed_time if elapsed_time > 0 else 0
         
-        # Genre distribution
-        genre_counts = defaultdict(int)
-        for classification in self.classifications:
-            genre_counts[classification['genre']] += 1
-        
-        # Artist counts  
-        artist_counts = defaultdict(int)
-        for classification in self.classifications:
-            artist_counts[classification['artist']] += 1
-        
-        # Label counts
-        label_counts = defaultdict(int)
-        for classification in self.classifications:
-            if classification['label']:
-                label_counts[classification['label']] += 1
-        
         report = {
             'scan_info': {
                 'run_id': self.stats['run_id'],
@@ -499,15 +500,13 @@ class TaxonomyScanner:
             },
             'statistics': self.stats,
             'duplicate_analysis': {
-                'duplicate_groups': len(self.duplicate_groups),
+                'duplicate_groups': self.stats.get('duplicate_groups', 0),
                 'duplicate_files': self.stats['duplicates_found'],
                 'unique_files': self.stats['files_processed'] - self.stats['duplicates_found'],
                 'duplication_rate': self.stats['duplicates_found'] / self.stats['files_processed'] if self.stats['files_processed'] > 0 else 0
             },
-            'genre_distribution': dict(genre_counts),
-            'artist_distribution': dict(sorted(artist_counts.items(), key=lambda x: x[1], reverse=True)[:20]),
-            'label_distribution': dict(sorted(label_counts.items(), key=lambda x: x[1], reverse=True)[:20]),
-            'classifications': self.classifications,
+            **self.aggregates.report(),
+            'results': self.sink.describe(),
             'duplicate_groups': self.duplicate_groups
         }
         
@@ -534,8 +533,18 @@ def main():
     # Initialize scanner
     scanner = TaxonomyScanner(config)
     
+    # Push-to-file metrics for a textfile collector (no HTTP server in a batch job)
+    metrics_file = config.get('metrics.textfile')
+    if metrics_file:
+        REGISTRY.register_stats('taxonomy_scanner', lambda: scanner.stats)
+        REGISTRY.start_textfile_push(metrics_file, config.get('metrics.push_interval', 15))
+    
     # Run scan
-    report = scanner.scan_directory(scan_path)
+    try:
+        report = scanner.scan_directory(scan_path)
+    finally:
+        if metrics_file:
+            REGISTRY.stop_textfile_push(metrics_file)
     
     # Save report
     report_file = f"taxonomy_scan_{report['scan_info']['run_id'][:8]}.json"
@@ -550,6 +559,7 @@ def main():
     print(f"📀 Labels identified: {len(report['label_distribution'])}")
     print(f"⚡ Performance: {report['scan_info']['files_per_second']:.1f} files/sec")
     print(f"💾 Report saved: {report_file}")
+    print(f"🗂️  Classifications: {report['results']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test the concurrent batch helpers behind the NDJSON batch endpoints
+"""
+
+import json
+import threading
+import time
+
+from batch_streaming import iter_concurrent, ndjson_stream, paginate
+
+
+def test_paginate_reports_next_offset():
+    items = list(range(12))
+    page, info = paginate(items, offset=5, limit=5)
+    assert page == [5, 6, 7, 8, 9]
+    assert info['next_offset'] == 10
+    page, info = paginate(items, offset=10, limit=5)
+    assert page == [10, 11] and info['next_offset'] is None
+
+
+def test_iter_concurrent_respects_in_flight_limit_and_isolates_errors():
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def work(n):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        if n == 3:
+            raise ValueError('bad file')
+        return n * 2
+
+    results = dict(iter_concurrent(work, range(10), max_in_flight=3))
+    assert peak[0] <= 3
+    assert isinstance(results.pop(3), ValueError)
+    assert results == {n: n * 2 for n in range(10) if n != 3}
+
+
+def test_ndjson_stream_ends_with_summary():
+    lines = list(ndjson_stream(iter([('a', 1), ('b', 2)]),
+                               lambda item, result: {'file_path': item, 'value': result},
+                               {'pagination': {'next_offset': None}}))
+    records = [json.loads(line) for line in lines]
+    assert [r.get('file_path') for r in records[:2]] == ['a', 'b']
+    assert records[-1]['type'] == 'summary' and records[-1]['processed'] == 2
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test CulturalDatabaseClient against databases with and without the optional migrations
+"""
+
+import json
+
+import pytest
+
+import cultural_database_client
+from cultural_database_client import CulturalDatabaseClient
+from processing_stages import current_stage_versions, full_plan
+from track_records import TrackRecord
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self._body = body if body is not None else []
+        self.text = json.dumps(self._body)
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise cultural_database_client.requests.exceptions.HTTPError(self.text, response=self)
+
+
+class FakePostgrest:
+    """Answers like PostgREST: 400 for any column the table does not have."""
+
+    def __init__(self, columns):
+        self.columns = set(columns)
+        self.calls = []
+
+    def __call__(self, method, url, headers=None, params=None, json=None, **kwargs):
+        self.calls.append((method, url, params, json))
+        named = set((params or {}).get('select', '').split(',')) | set(json or {})
+        select = url.partition('select=')[2].split('&')[0]
+        named |= set(select.split(',')) if select else set()
+        if 'content_hash.eq.' in url:
+            named.add('content_hash')
+        if named - self.columns - {'', '*'}:
+            return FakeResponse(400, {'code': '42703'})
+        if method == 'POST':
+            return FakeResponse(201, [{'id': 1, **json}])
+        return FakeResponse(200, [])
+
+
+@pytest.fixture
+def client(tmp_path):
+    config = tmp_path / 'taxonomy_config.json'
+    config.write_text(json.dumps({'supabase': {'url': 'http://db', 'service_role_key': 'key'}}))
+    return CulturalDatabaseClient(str(config))
+
+
+LEGACY_COLUMNS = {'id', 'file_path', 'file_hash', 'file_size', 'file_modified', 'raw_metadata', 'filename',
+                  'folder_path', 'file_extension', 'processing_version', 'processed_at'}
+
+TRACK = {'file_path': '/m/a.mp3', 'file_hash': 'abc', 'content_hash': 'abc', 'hash_algo': 'sha256',
+         'file_size': 1, 'file_modified': '2026-01-01T00:00:00', 'filename': 'a.mp3', 'folder_path': '/m',
+         'file_extension': '.mp3', 'processing_version': 'v1.8'}
+
+
+def test_unmigrated_database_falls_back_to_file_hash(client, monkeypatch):
+    db = FakePostgrest(LEGACY_COLUMNS)
+    monkeypatch.setattr(cultural_database_client.requests, 'request', db)
+
+    assert client.create_discovered_track(dict(TRACK)) == 1
+    assert client.get_tracks_by_hash('abc', columns='id,file_hash,content_hash') == []
+    assert client.get_tracks_page(columns='id,file_path,file_hash,content_hash') == []
+
+    post = next(call for call in db.calls if call[0] == 'POST')
+    assert 'content_hash' not in post[3] and 'hash_algo' not in post[3]
+    assert all(call[0] != 'GET' or 'content_hash' not in call[1] for call in db.calls)
+    # The column probe ran once
+    assert sum(1 for call in db.calls if call[2] and call[2].get('limit') == 0) == 1
+
+
+def test_migrated_database_uses_content_hash(client, monkeypatch):
+    db = FakePostgrest(LEGACY_COLUMNS | {'content_hash', 'hash_algo'})
+    monkeypatch.setattr(cultural_database_client.requests, 'request', db)
+
+    assert client.create_discovered_track(dict(TRACK)) == 1
+    post = next(call for call in db.calls if call[0] == 'POST')
+    assert post[3]['hash_algo'] == 'sha256'
+    assert client._hash_filter('abc') == 'or=(file_hash.eq.abc,content_hash.eq.abc)'
+
+
+def test_unmigrated_database_skips_stage_columns(client, monkeypatch, tmp_path):
+    db = FakePostgrest(LEGACY_COLUMNS | {'content_hash', 'hash_algo'})
+    monkeypatch.setattr(cultural_database_client.requests, 'request', db)
+    path = tmp_path / 'a.mp3'
+    path.write_bytes(b'x')
+    plan = full_plan(current_stage_versions('v1.8', 'sha256'), 'new')
+    track = TrackRecord.from_path(str(path), {'file_hash': 'abc', 'content_hash': 'abc', 'hash_algo': 'sha256'},
+                                  raw_metadata={}, processing_version='v1.8', stage_versions=plan.stamp())
+
+    assert client.create_discovered_track(track.to_payload()) == 1
+    assert client.update_track_stages(1, track.to_stage_update(plan.stages)) is True
+
+    writes = [call[3] for call in db.calls if call[0] in ('POST', 'PATCH')]
+    assert len(writes) == 2
+    assert all('stage_versions' not in body and 'file_mtime' not in body for body in writes)
+    assert writes[1]['processing_version'] == 'v1.8' and writes[1]['content_hash'] == 'abc'
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test the v1.7 pattern rollup, delta-only pattern history and accumulated pattern analysis
+"""
+
+from types import SimpleNamespace
+
+from cultural_intelligence_v17 import CulturalIntelligenceV17, VersionedScanDatabase
+
+
+def _history(db):
+    return db.execute('SELECT pattern_key, weight_value, session_id FROM pattern_evolution ORDER BY id').fetchall()
+
+
+def test_rollup_upsert_and_delta_only_history(tmp_path):
+    db = VersionedScanDatabase(str(tmp_path / 'v17.db'))
+    db.save_pattern_evolution({'filename:techno': 1.0, 'folder:techno': 2.0}, 's1')
+    db.save_pattern_evolution({'filename:techno': 1.0, 'folder:techno': 3.0}, 's2')
+    db.save_pattern_evolution({'filename:techno': 2.0}, 's3')
+
+    # Unchanged weights are not written again
+    assert _history(db) == [('filename:techno', 1.0, 's1'), ('folder:techno', 2.0, 's1'),
+                            ('folder:techno', 3.0, 's2'), ('filename:techno', 2.0, 's3')]
+
+    rollups = {r['pattern_key']: r for r in db.get_pattern_rollups()}
+    assert rollups['filename:techno'] == {
+        'pattern_key': 'filename:techno', 'pattern_type': 'filename', 'first_weight': 1.0, 'last_weight': 2.0,
+        'min_weight': 1.0, 'max_weight': 2.0, 'observations': 3, 'changes': 2}
+    assert rollups['folder:techno']['observations'] == 2
+    assert rollups['folder:techno']['last_weight'] == 3.0
+
+
+def test_rollup_is_backfilled_from_existing_history(tmp_path):
+    path = str(tmp_path / 'v17.db')
+    db = VersionedScanDatabase(path)
+    db.save_pattern_evolution({'folder:house': 0.5, 'filename:house': 0.4}, 's1')
+    db.save_pattern_evolution({'folder:house': 0.9}, 's2')
+    expected = db.get_pattern_rollups()
+
+    # A database written before the rollup existed: history only
+    db.execute('DELETE FROM pattern_rollup')
+    db.conn.close()
+
+    assert VersionedScanDatabase(path).get_pattern_rollups() == expected
+
+
+def test_analysis_reads_the_rollup_in_first_seen_order(tmp_path):
+    db = VersionedScanDatabase(str(tmp_path / 'v17.db'))
+    db.save_pattern_evolution({'folder:house': 1.0, 'filename:techno': 1.0,
+                               'folder:techno': 2.0, 'filename:house': 1.5}, 's1')
+    db.save_pattern_evolution({'folder:house': 1.0, 'filename:techno': 1.5,
+                               'folder:techno': 2.0, 'filename:house': 1.5}, 's2')
+
+    analysis = CulturalIntelligenceV17.analyze_accumulated_patterns(SimpleNamespace(db=db))
+
+    assert analysis['total_patterns'] == 8
+    assert list(analysis['pattern_evolution']) == ['folder:house', 'filename:techno', 'folder:techno',
+                                                   'filename:house']
+    assert analysis['pattern_evolution']['filename:techno']['growth_rate'] == 0.25
+    assert analysis['pattern_evolution']['filename:techno']['stability'] == 1.0 - 0.5 / 1.5
+    # Filename-pattern order, as the nested filename x folder loop produced
+    assert list(analysis['cross_correlations'].items()) == [('techno_combined', 1.5), ('house_combined', 1.0)]
+    assert analysis['predictive_weights'] == {'filename:techno': 1.5 * 1.25}
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test the shared file hashing module
+"""
+
+import hashlib
+
+import pytest
+
+import file_hashing
+from file_hashing import (hash_file, hash_file_multi, hash_file_safe, hash_files,
+                          identity_hashes, parse_size)
+
+
+def test_hash_matches_hashlib_for_buffered_and_mmap_paths(tmp_path):
+    data = bytes(range(256)) * 5000
+    path = tmp_path / 'track.mp3'
+    path.write_bytes(data)
+    expected = hashlib.sha256(data).hexdigest()
+
+    assert hash_file(str(path), block_size=4096) == expected
+    assert hash_file(str(path), mmap_threshold=1) == expected
+
+
+def test_empty_and_missing_files(tmp_path):
+    empty = tmp_path / 'empty.wav'
+    empty.write_bytes(b'')
+    assert hash_file(str(empty)) == hashlib.sha256(b'').hexdigest()
+    assert hash_file_safe(str(tmp_path / 'missing.mp3')) is None
+    with pytest.raises(OSError):
+        hash_file(str(tmp_path / 'missing.mp3'))
+
+
+def test_hash_files_preserves_order(tmp_path):
+    paths = []
+    for i in range(5):
+        path = tmp_path / f'{i}.mp3'
+        path.write_bytes(str(i).encode() * 100)
+        paths.append(str(path))
+
+    results = list(hash_files(paths + [str(tmp_path / 'missing.mp3')], max_workers=3))
+    assert [p for p, _ in results][:5] == paths
+    assert results[-1][1] is None
+    assert results[2][1] == hashlib.sha256(b'2' * 100).hexdigest()
+
+
+def test_parse_size():
+    assert parse_size('64KB') == 64 * 1024
+    assert parse_size('1MB') == 1024 * 1024
+    assert parse_size(4096) == 4096
+
+
+def test_multi_hash_single_pass_and_dual_identity(tmp_path, monkeypatch):
+    data = b'track' * 5000
+    path = tmp_path / 'track.flac'
+    path.write_bytes(data)
+
+    digests = hash_file_multi(str(path), ['sha256', 'blake2b'])
+    assert digests['sha256'] == hashlib.sha256(data).hexdigest()
+    assert digests['blake2b'] == hashlib.blake2b(data, digest_size=32).hexdigest()
+
+    monkeypatch.setattr(file_hashing, '_hash_settings', {'algorithm': 'blake2b', 'dual_hash': True})
+    hashes = identity_hashes(str(path))
+    assert hashes == {'file_hash': digests['sha256'], 'content_hash': digests['blake2b'], 'hash_algo': 'blake2b'}
+
+    monkeypatch.setattr(file_hashing, '_hash_settings', {'algorithm': 'blake2b', 'dual_hash': False})
+    assert identity_hashes(str(path))['file_hash'] == digests['blake2b']
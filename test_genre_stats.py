@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test the materialized genre statistics behind /api/genres
+"""
+
+import statistics
+import threading
+import time
+
+from genre_stats import GenreStatsStore, HyperLogLog, RunningStats
+
+
+class FakeClassificationTable:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_classifications_page(self, after_id=0, limit=1000, columns='*', classified_since=None):
+        rows = [r for r in self.rows if r['id'] > after_id]
+        if classified_since:
+            rows = [r for r in rows if r['classified_at'] > classified_since]
+        return sorted(rows, key=lambda r: r['id'])[:limit]
+
+
+def test_sketches_and_running_stats():
+    hll = HyperLogLog()
+    for i in range(5000):
+        hll.add(f"artist-{i % 2000}")
+    assert abs(hll.count() - 2000) < 2000 * 0.08
+    assert HyperLogLog().count() == 0
+
+    values = [120.0, 124.0, 128.0, 174.0, 140.0]
+    running = RunningStats()
+    for v in values:
+        running.add(v)
+    assert abs(running.mean - statistics.mean(values)) < 1e-9
+    assert abs(running.variance - statistics.pvariance(values)) < 1e-6
+    running.remove(174.0)
+    assert abs(running.mean - statistics.mean(values[:3] + [140.0])) < 1e-9
+    assert abs(running.variance - statistics.pvariance(values[:3] + [140.0])) < 1e-6
+
+
+def test_store_warms_and_applies_new_and_reclassified_rows():
+    rows = [
+        {'id': 1, 'track_id': 10, 'genre': 'Techno', 'artist': 'A', 'label': 'L1', 'track_name': 'One',
+         'bpm': 130, 'classified_at': '2024-01-01T00:00:01'},
+        {'id': 2, 'track_id': 11, 'genre': 'Techno', 'artist': 'B', 'label': 'L1', 'track_name': 'Two',
+         'bpm': 134, 'classified_at': '2024-01-01T00:00:02'},
+        {'id': 3, 'track_id': 12, 'genre': 'House', 'artist': 'A', 'label': None, 'track_name': 'Three',
+         'bpm': None, 'classified_at': '2024-01-01T00:00:03'},
+    ]
+    table = FakeClassificationTable(rows)
+    store = GenreStatsStore(table, page_size=2, seed=1)
+    assert store.refresh() == 3
+
+    snapshot = store.snapshot()
+    techno = snapshot['genres']['Techno']
+    assert snapshot['total_tracks'] == 3 and snapshot['total_genres'] == 2
+    assert techno['count'] == 2 and techno['unique_artists'] == 2 and techno['unique_labels'] == 1
+    assert techno['avg_bpm'] == 132.0 and sorted(techno['sample_tracks']) == ['One', 'Two']
+    assert snapshot['genres']['House']['avg_bpm'] is None
+
+    # A new classification and a re-stamped one (track 11 moved to House)
+    version = store.version
+    rows.append({'id': 4, 'track_id': 13, 'genre': 'Techno', 'artist': 'C', 'label': 'L2', 'track_name': 'Four',
+                 'bpm': 126, 'classified_at': '2024-01-01T00:00:04'})
+    rows[1] = dict(rows[1], genre='House', classified_at='2024-01-01T00:00:05')
+    store.refresh()
+
+    snapshot = store.snapshot()
+    assert store.version > version
+    assert snapshot['total_tracks'] == 4
+    assert snapshot['genres']['Techno']['count'] == 2
+    assert snapshot['genres']['Techno']['avg_bpm'] == 128.0
+    assert 'Two' not in snapshot['genres']['Techno']['sample_tracks']
+    assert snapshot['genres']['House']['count'] == 2
+    assert snapshot['genres']['House']['avg_bpm'] == 134.0
+    assert store.get_stats()['reclassified'] == 1
+
+
+def test_concurrent_requests_share_one_refresh():
+    class SlowTable(FakeClassificationTable):
+        pages = 0
+
+        def get_classifications_page(self, **kwargs):
+            SlowTable.pages += 1
+            time.sleep(0.05)
+            return super().get_classifications_page(**kwargs)
+
+    table = SlowTable([{'id': 1, 'track_id': 10, 'genre': 'Techno', 'bpm': 130,
+                        'classified_at': '2024-01-01T00:00:01'}])
+    store = GenreStatsStore(table, poll_interval=60)
+    threads = [threading.Thread(target=store.ensure_fresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Cold callers wait for the single build instead of each rebuilding
+    assert store.get_stats()['rebuilds'] == 1 and store.get_stats()['polls'] == 0
+    assert store.snapshot()['total_tracks'] == 1
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test the rolling genre trend aggregator behind the stream SSE feed
+"""
+
+import asyncio
+
+from genre_trends import RESYNC, GenreTrendAggregator
+
+
+def test_window_expires_and_session_totals_remain():
+    clock = [1000.0]
+    trends = GenreTrendAggregator(window_seconds=60, bucket_seconds=10, clock=lambda: clock[0])
+
+    trends.record_track('s1', 'Techno', None, 0.8, ['dark', 'driving'])
+    trends.record_chat('s1', 5)
+    clock[0] += 30
+    trends.record_track('s1', 'House', 'Deep', 0.6, ['warm'])
+    trends.record_chat('s1', 2)
+    trends.record_chat('s2', 9)  # no track yet in s2: nothing to credit
+
+    window = {t['main_genre']: t for t in trends.snapshot()['window']}
+    assert window['Techno']['total_plays'] == 1 and window['Techno']['total_engagement'] == 5
+    assert window['Techno']['popular_characteristics'] == {'dark': 1, 'driving': 1}
+
+    # Techno's bucket falls out of the 60s window; House's does not
+    clock[0] += 40
+    trends.record_track('s1', 'House', 'Deep', 0.8, ['warm', 'jazzy'])
+    snapshot = trends.snapshot('s1')
+    assert [t['main_genre'] for t in snapshot['window']] == ['House']
+    house = snapshot['window'][0]
+    assert house['total_plays'] == 2 and house['total_engagement'] == 2
+    assert abs(house['average_confidence'] - 0.7) < 1e-9
+    assert house['popular_characteristics'] == {'warm': 2, 'jazzy': 1}
+    assert {t['main_genre'] for t in snapshot['session']} == {'Techno', 'House'}
+    assert snapshot['current'] == {'main_genre': 'House', 'subgenre': 'Deep'}
+    assert trends.snapshot('unknown') is None
+
+
+def test_subscribers_get_updates_and_resync_when_behind():
+    async def run():
+        trends = GenreTrendAggregator(subscriber_queue_size=2)
+        everyone = trends.subscribe()
+        session = trends.subscribe('s1')
+
+        trends.record_track('s1', 'Techno', None, 0.9, ['dark'])
+        update = everyone.get_nowait()
+        assert update['session_id'] == 's1' and update['window']['total_plays'] == 1
+        update = session.get_nowait()
+        assert update['session']['main_genre'] == 'Techno' and update['session']['total_plays'] == 1
+
+        for _ in range(3):
+            trends.record_chat('s1', 1)
+        assert session.get_nowait() is RESYNC and session.empty()
+
+        trends.unsubscribe(everyone)
+        trends.unsubscribe(session, 's1')
+        assert trends.get_stats()['subscribers'] == 0
+
+    asyncio.run(run())
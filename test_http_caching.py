@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test ETags, field projection, pagination and compression for the webhook training API listings
+"""
+
+import gzip
+
+import pytest
+
+import http_caching
+from http_caching import (TableVersionTracker, compress, etag_matches, format_etag, make_etag,
+                          negotiate_encoding, parse_fields, parse_page_args, project, select_columns)
+
+
+def test_etag_changes_with_table_version_and_query():
+    tracker = TableVersionTracker(lambda: {'cultural_tracks': 3, 'cultural_artist_profiles': 1})
+    versions = tracker.snapshot(['cultural_tracks'])
+    base = make_etag('/api/tracks', [('limit', '50')], versions)
+
+    assert base == make_etag('/api/tracks', [('limit', '50')], versions)
+    assert base != make_etag('/api/tracks', [('limit', '51')], versions)
+    assert base != make_etag('/api/tracks', [('limit', '50')], (('cultural_tracks', 4),))
+    assert tracker.snapshot(['cultural_tracks', 'missing_table']) is None
+
+    # Any encoding variant of the current representation is "not modified"
+    assert etag_matches(format_etag(base, 'gzip'), base)
+    assert etag_matches(f'"other", W/{format_etag(base)}', base)
+    assert not etag_matches('"other"', base)
+    assert not etag_matches(None, base)
+
+
+def test_tracker_refreshes_inline_without_poller(monkeypatch):
+    versions = {'cultural_tracks': 1}
+    tracker = TableVersionTracker(lambda: dict(versions), poll_interval=5.0)
+    clock = [1000.0]
+    monkeypatch.setattr(http_caching.time, 'time', lambda: clock[0])
+
+    assert tracker.snapshot(['cultural_tracks']) == (('cultural_tracks', 1),)
+    versions['cultural_tracks'] = 2
+    assert tracker.snapshot(['cultural_tracks']) == (('cultural_tracks', 1),)  # within poll interval
+    clock[0] += 5.0
+    assert tracker.snapshot(['cultural_tracks']) == (('cultural_tracks', 2),)
+    assert tracker.stats['polls'] == 2 and tracker.stats['changes'] == 1
+
+    # Counter table unavailable: no versions, so no ETags
+    failing = TableVersionTracker(lambda: None)
+    assert failing.snapshot(['cultural_tracks']) is None
+
+
+def test_encoding_and_listing_args():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding('gzip;q=0, identity') is None
+    assert negotiate_encoding('gzip, deflate') == 'gzip'
+    assert negotiate_encoding('*') in ('br', 'gzip')
+
+    body = b'{"tracks": []}' * 200
+    compressed, encoding = compress(body, 'gzip')
+    assert encoding == 'gzip' and gzip.decompress(compressed) == body
+    assert compress(b'{}', 'gzip') == (b'{}', None)
+
+    assert parse_page_args({}) == (0, http_caching.DEFAULT_PAGE_SIZE)
+    assert parse_page_args({'after': '42', 'limit': '99999'}) == (42, http_caching.MAX_PAGE_SIZE)
+    with pytest.raises(ValueError):
+        parse_page_args({'after': 'abc'})
+
+    fields = parse_fields('title, genre', ('id', 'title', 'genre', 'bpm'))
+    assert fields == ['id', 'title', 'genre']
+    assert parse_fields('', ('id',)) is None
+    with pytest.raises(ValueError):
+        parse_fields('title,secret', ('id', 'title'))
+    assert project([{'id': 1, 'title': 'A', 'bpm': 128}], fields) == [{'id': 1, 'title': 'A', 'genre': None}]
+
+
+def test_listing_selects_only_requested_columns(monkeypatch):
+    import webhook_training_api
+
+    endpoints = []
+
+    class FakeResponse:
+        def json(self):
+            return [{'id': 7, 'title': 'Acid Rain', 'genre': 'acid'}]
+
+    def fake_request(method, endpoint, **kwargs):
+        endpoints.append(endpoint)
+        return FakeResponse()
+
+    db = webhook_training_api.db_client
+    monkeypatch.setattr(db, '_make_request', fake_request)
+    monkeypatch.setattr(db, 'count_rows', lambda *args, **kwargs: 1)
+    monkeypatch.setattr(webhook_training_api, 'table_versions', None)
+    client = webhook_training_api.app.test_client()
+
+    response = client.get('/api/tracks?fields=genre,title&limit=5')
+    assert response.status_code == 200
+    assert response.get_json()['tracks'] == [{'id': 7, 'genre': 'acid', 'title': 'Acid Rain'}]
+    assert endpoints[-1].startswith('cultural_tracks?select=id,genre,title&')
+
+    client.get('/api/tracks?limit=5')
+    assert endpoints[-1].startswith('cultural_tracks?select=*&')
+
+    assert select_columns(None) == '*'
+    assert select_columns(['id', 'artist'], {'artist': 'artist_name'}) == 'id,artist_name'
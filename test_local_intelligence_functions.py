@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Test the offline SQLite equivalents of the server-side learning functions
+"""
+
+import json
+
+import local_intelligence_functions as lif
+
+
+def _seed(conn):
+    conn.execute("INSERT INTO cultural_tracks (id, file_path, raw_metadata) VALUES (1, 'a.mp3', ?)",
+                 [json.dumps({'genre': 'Trance'})])
+    conn.execute("INSERT INTO cultural_tracks (id, file_path, raw_metadata) VALUES (2, 'b.mp3', '{}')")
+    conn.executemany("""
+        INSERT INTO cultural_classifications (track_id, artist, genre, genre_confidence, overall_confidence)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(1, 'Armin van Buuren', 'Trance', 0.8, 0.9), (2, 'Armin van Buuren', 'Trance', 0.8, 0.8)])
+    conn.commit()
+
+
+def test_learn_patterns_upserts():
+    conn = lif.connect(':memory:')
+    _seed(conn)
+
+    assert lif.learn_patterns(conn) == 2
+    rows = {r['pattern_type']: r for r in conn.execute("SELECT * FROM cultural_patterns")}
+    assert rows['artist_genre']['pattern_value'] == 'Armin van Buuren'
+    assert rows['artist_genre']['sample_size'] == 2
+    assert rows['metadata']['pattern_value'] == 'Trance'
+
+    # Second run reinforces instead of duplicating
+    lif.learn_patterns(conn)
+    assert conn.execute("SELECT COUNT(*) FROM cultural_patterns").fetchone()[0] == 2
+    assert conn.execute("SELECT sample_size FROM cultural_patterns WHERE pattern_type = 'artist_genre'").fetchone()[0] == 4
+
+
+def test_confidence_update_and_insights():
+    conn = lif.connect(':memory:')
+    _seed(conn)
+    lif.learn_patterns(conn)
+
+    assert lif.update_confidence_scores(conn, min_pattern_confidence=0.5) == 2
+    insights = lif.call_local_rpc(conn, 'cultural_intelligence_insights', {'window_minutes': 60})
+    assert insights['classified'] == 2
+    assert insights['top_genres'] == [{'genre': 'Trance', 'count': 2}]
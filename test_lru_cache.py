@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test the bounded LRU cache behind the MetaCrate API lookups
+"""
+
+import os
+import pickle
+import stat
+import time
+import zlib
+
+from lru_cache import LRUCache, SharedSQLiteCache
+
+
+def test_lru_eviction_and_counters():
+    cache = LRUCache(max_entries=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1  # 'a' is now most recently used
+    cache['c'] = 3
+
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.get('missing') is None
+
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 3
+    assert stats['misses'] == 1
+    assert stats['entries'] == 2
+
+
+def test_ttl_expiry():
+    cache = LRUCache(max_entries=10, ttl_seconds=60)
+    cache.set('short', 'x', ttl_seconds=0.01)
+    cache['long'] = 'y'
+    time.sleep(0.02)
+
+    assert cache.get('short') is None
+    assert cache.get('long') == 'y'
+    assert cache.get_stats()['expirations'] == 1
+
+
+def test_snapshot_round_trip_preserves_order(tmp_path):
+    path = str(tmp_path / 'cache.json.z')
+    cache = LRUCache(max_entries=3, snapshot_path=path)
+    for key in ('a', 'b', 'c'):
+        cache[key] = {'genre': key.upper()}
+    cache.get('a')
+    assert cache.save_snapshot() == 3
+
+    restored = LRUCache(max_entries=3, snapshot_path=path)
+    assert restored.load_snapshot() == 3
+    assert restored['a'] == {'genre': 'A'}
+    restored['d'] = {}
+    # 'b' was least recently used when the snapshot was taken
+    assert 'b' not in restored
+
+
+def test_snapshot_is_owner_only_json(tmp_path):
+    path = str(tmp_path / 'cache.json.z')
+    (tmp_path / 'cache.json.z.tmp').write_bytes(b'stale')
+    os.chmod(tmp_path / 'cache.json.z.tmp', 0o644)
+    cache = LRUCache(snapshot_path=path)
+    cache[('acid', 2024)] = ['A', 'B']
+    cache.save_snapshot()
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    restored = LRUCache(snapshot_path=path)
+    assert restored.load_snapshot() == 1
+    assert restored[('acid', 2024)] == ['A', 'B']
+
+    # Old pickle snapshots are never unpickled
+    with open(path, 'wb') as f:
+        f.write(zlib.compress(pickle.dumps((1, time.time(), [('a', 1, None)]))))
+    assert LRUCache(snapshot_path=path).load_snapshot() == 0
+
+
+def test_unreadable_snapshot_is_ignored(tmp_path):
+    path = tmp_path / 'cache.bin'
+    path.write_bytes(b'not a snapshot')
+    assert LRUCache(snapshot_path=str(path)).load_snapshot() == 0
+
+
+def test_shared_cache_visible_across_instances(tmp_path):
+    path = str(tmp_path / 'shared.db')
+    writer = SharedSQLiteCache(path, max_entries=2, prune_interval=1)
+    reader = SharedSQLiteCache(path, max_entries=2)
+
+    writer['abc'] = {'genre': 'Techno'}
+    assert reader.get('abc') == {'genre': 'Techno'}
+    assert reader.get_stats()['shared_hits'] == 1
+
+    writer['def'] = {}
+    writer['ghi'] = {}
+    assert len(reader) == 2
+
+
+def test_metacrate_api_starts_snapshots_on_first_request(monkeypatch):
+    import metacrate_api
+
+    started, registered = [], []
+    for cache in (metacrate_api.classification_cache, metacrate_api.duplicate_cache):
+        monkeypatch.setattr(cache, 'start_snapshots', lambda interval, cache=cache: started.append(cache))
+    monkeypatch.setattr(metacrate_api.atexit, 'register', registered.append)
+    monkeypatch.setattr(metacrate_api, '_snapshots_started', False)
+
+    client = metacrate_api.app.test_client()
+    client.get('/api/v3.2/health')
+    client.get('/api/v3.2/health')
+    assert started == [metacrate_api.classification_cache, metacrate_api.duplicate_cache]
+    assert len(registered) == 2
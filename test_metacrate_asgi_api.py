@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test that the ASGI MetaCrate service keeps serving while the database is unreachable
+"""
+
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+pytest.importorskip('fastapi')
+
+import cultural_database_client
+import metacrate_asgi_api
+from async_database_client import AsyncCulturalDatabaseClient
+
+DB_DELAY = 0.5
+
+
+def test_unreachable_database_does_not_block_other_requests(monkeypatch):
+    probes = []
+
+    def unreachable(method, url, **kwargs):
+        # A slow, failing Supabase: must only ever be waited on from worker threads
+        assert threading.current_thread() is not threading.main_thread()
+        if kwargs.get('params', {}).get('limit') == 0:
+            probes.append(url)
+        time.sleep(DB_DELAY)
+        raise cultural_database_client.requests.exceptions.ConnectionError('unreachable')
+
+    monkeypatch.setattr(cultural_database_client.requests, 'request', unreachable)
+    db = AsyncCulturalDatabaseClient()
+    db._client = None  # every read goes through the sync client's fallback
+    monkeypatch.setattr(metacrate_asgi_api, 'db', db)
+
+    async def main():
+        transport = httpx.ASGITransport(app=metacrate_asgi_api.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            analyze = asyncio.create_task(client.post('/api/track/analyze', json={
+                'file_path': '/missing/a.mp3', 'file_hash': 'deadbeef'}))
+            await asyncio.sleep(0.05)
+            start = time.perf_counter()
+            metrics = await client.get('/metrics')
+            served_in = time.perf_counter() - start
+            response = await analyze
+            # The failed probe is remembered: a second lookup does not probe again
+            await client.post('/api/track/analyze', json={'file_path': '/missing/b.mp3', 'file_hash': 'cafe'})
+            return metrics, served_in, response
+
+    metrics, served_in, response = asyncio.run(main())
+
+    assert metrics.status_code == 200
+    assert served_in < DB_DELAY
+    assert response.status_code == 200
+    assert len(probes) == 1
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Test the shared metrics registry, DB call timing and /metrics exposition
+"""
+
+import pytest
+
+from metrics import MetricsRegistry, db_endpoint
+
+
+def test_render_counters_gauges_histograms_and_stats():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', 'Requests', ('route',))
+    depth = registry.gauge('queue_depth', 'Depth', ('queue',))
+    latency = registry.histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+
+    requests.inc(route='/a')
+    requests.inc(2, route='/a')
+    depth.set(7, queue='work')
+    latency.observe(0.05, route='/a')
+    latency.observe(0.5, route='/a')
+    latency.observe(3.0, route='/a')
+    registry.register_stats('lru_cache', lambda: {'hits': 3, 'hit_rate': 0.75, 'name': 'x', 'nested': {'size': 2}},
+                            cache='classification')
+
+    text = registry.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{route="/a"} 3' in text
+    assert 'queue_depth{queue="work"} 7' in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/a"} 3' in text
+    assert 'lru_cache_hit_rate{cache="classification"} 0.75' in text
+    assert 'lru_cache_nested_size{cache="classification"} 2' in text
+    assert 'lru_cache_name' not in text
+
+    # Same name returns the same instrument; conflicting definitions are rejected
+    assert registry.counter('requests_total', 'Requests', ('route',)) is requests
+    with pytest.raises(ValueError):
+        registry.gauge('requests_total', 'Requests', ('route',))
+    with pytest.raises(ValueError):
+        requests.inc(method='GET')
+
+
+def test_textfile_push_and_endpoint_labels(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter('files_processed_total', 'Files', ('job',)).inc(5, job='scanner')
+    path = tmp_path / 'metrics' / 'scanner.prom'
+    registry.write_textfile(str(path))
+    assert 'files_processed_total{job="scanner"} 5' in path.read_text()
+    assert list(path.parent.iterdir()) == [path]
+
+    assert db_endpoint('cultural_tracks?select=id&id=gt.5') == 'cultural_tracks'
+    assert db_endpoint('rpc/cultural_learn_patterns') == 'rpc/cultural_learn_patterns'
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test the rate-limited background notification queue used for Twitch and dashboard updates
+"""
+
+import threading
+import time
+
+from notification_dispatcher import NotificationDispatcher
+
+
+def test_coalesces_progress_and_drops_when_full():
+    release = threading.Event()
+    sent = []
+
+    def send(message):
+        release.wait(5)
+        sent.append(message)
+
+    dispatcher = NotificationDispatcher(max_pending=3)
+    dispatcher.register_channel('twitch', send, rate=(100, 1.0))
+
+    assert dispatcher.notify('twitch', 'online')
+    time.sleep(0.05)  # worker picks 'online' up and blocks in send()
+    assert dispatcher.notify('twitch', 'progress 10%', coalesce_key='progress')
+    assert dispatcher.notify('twitch', 'batch 1 started')
+    assert dispatcher.notify('twitch', 'progress 20%', coalesce_key='progress')
+    assert dispatcher.notify('twitch', 'progress 30%', coalesce_key='progress')
+    assert dispatcher.notify('twitch', 'batch 1 done')
+    assert not dispatcher.notify('twitch', 'overflow')
+    assert not dispatcher.notify('dashboard', 'no such channel')
+
+    release.set()
+    assert dispatcher.flush(timeout=5)
+    # The coalesced message keeps its place in line but carries the latest state
+    assert sent == ['online', 'progress 30%', 'batch 1 started', 'batch 1 done']
+    stats = dispatcher.get_stats()
+    assert stats['sent'] == 4 and stats['coalesced'] == 2 and stats['dropped'] == 2 and stats['pending'] == 0
+    dispatcher.stop()
+
+
+def test_rate_limit_never_blocks_the_caller():
+    sent = []
+    dispatcher = NotificationDispatcher()
+    dispatcher.register_channel('twitch', sent.append, rate=(2, 0.2))
+    dispatcher.register_channel('dashboard', lambda update: False, rate=(10, 1.0))
+
+    started = time.monotonic()
+    for i in range(4):
+        dispatcher.notify('twitch', i)
+    dispatcher.notify('dashboard', {'type': 'progress'})
+    assert time.monotonic() - started < 0.05
+
+    assert dispatcher.flush(timeout=5)
+    elapsed = time.monotonic() - started
+    assert sent == [0, 1, 2, 3]
+    # Burst of 2, then one token per 0.1s
+    assert elapsed >= 0.15
+    assert dispatcher.get_stats()['failed'] == 1
+
+    dispatcher.stop()
+    assert not dispatcher.notify('twitch', 'after stop')
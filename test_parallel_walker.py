@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Test the parallel sharded directory walker
+"""
+
+import os
+
+from parallel_walker import ParallelDirectoryWalker
+
+
+def _make_tree(root):
+    layout = {
+        'alice/house': ['a1.mp3', 'a2.flac', 'cover.jpg'],
+        'alice/techno/deep': ['a3.wav'],
+        'bob': ['b1.mp3', 'notes.txt'],
+        '': ['loose.mp3'],
+    }
+    for folder, files in layout.items():
+        path = os.path.join(root, folder)
+        os.makedirs(path, exist_ok=True)
+        for name in files:
+            with open(os.path.join(path, name), 'wb') as f:
+                f.write(b'x' * 10)
+
+
+def test_walk_finds_audio_files_per_shard(tmp_path):
+    _make_tree(str(tmp_path))
+    walker = ParallelDirectoryWalker(max_workers=4, report_interval=0)
+
+    entries = list(walker.walk(str(tmp_path)))
+
+    assert sorted(os.path.basename(e.path) for e in entries) == ['a1.mp3', 'a2.flac', 'a3.wav', 'b1.mp3', 'loose.mp3']
+    assert all(e.size == 10 and e.mtime for e in entries)
+    stats = walker.get_stats()
+    assert stats['files_per_shard'] == {'alice': 3, 'bob': 1, '': 1}
+    assert stats['directories'] == 6
+    assert stats['entries'] >= 12
+
+
+def test_consumer_can_stop_early(tmp_path):
+    _make_tree(str(tmp_path))
+    walker = ParallelDirectoryWalker(max_workers=2, queue_size=1, include_stat=False, report_interval=0)
+
+    first = next(walker.iter_files(str(tmp_path)))
+    assert first.endswith(('.mp3', '.flac', '.wav'))
+
+
+def test_missing_root_yields_nothing(tmp_path):
+    walker = ParallelDirectoryWalker(report_interval=0)
+    assert list(walker.walk(str(tmp_path / 'missing'))) == []
+    assert walker.get_stats()['errors'] == 1
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Test genre-grouped pattern correlation and artist/label genre co-occurrence
+"""
+
+import pytest
+
+import pattern_correlation
+from pattern_correlation import (count_ratio, genre_cross_correlations, parse_pattern_key, result_observations,
+                                 source_genre_cooccurrence)
+
+
+def result(artist, label, filename_hints, folder_hints):
+    return {
+        'filename_intelligence': {'genre_hints': filename_hints},
+        'folder_intelligence': {'genre_hints': folder_hints},
+        'artist_intelligence': {'artist_name': artist} if artist else {},
+        'classification_intelligence': {'basic_classification': {'label': label}}
+    }
+
+
+def test_pattern_keys_grouped_by_genre():
+    assert parse_pattern_key('folder:deep house') == ('folder', 'deep house', 'deep house')
+    assert parse_pattern_key('filename:remix:techno') == ('filename', 'remix:techno', 'techno')
+    assert parse_pattern_key('techno').source == 'unknown'
+
+    weights = {'filename:techno': 2.0, 'folder:techno': 3.0, 'filename:house': 1.0, 'folder:dnb': 4.0}
+    assert genre_cross_correlations(weights) == {'techno': 2.0}
+    assert genre_cross_correlations({'filename:techno': 2, 'folder:techno': 8}, combine=count_ratio) == {
+        'techno': 0.25}
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_artist_and_label_genre_cooccurrence(monkeypatch, use_numpy):
+    if use_numpy and not pattern_correlation.NUMPY_AVAILABLE:
+        pytest.skip('numpy not installed')
+    monkeypatch.setattr(pattern_correlation, 'NUMPY_AVAILABLE', use_numpy)
+
+    results = [
+        result('Surgeon', 'Dynamic Tension', ['techno'], ['techno']),
+        result('Surgeon', 'Dynamic Tension', ['techno'], ['industrial']),
+        result('Surgeon', None, [], ['industrial']),
+        result('Larry Heard', 'Alleviated', ['deep house'], []),
+        result(None, None, ['techno'], []),
+        {'error': 'unreadable'},
+    ]
+    affinity = source_genre_cooccurrence(result_observations(r) for r in results)
+
+    surgeon = affinity['artist:Surgeon']
+    assert surgeon['tracks'] == 3
+    assert surgeon['top_genre'] == 'techno'
+    assert surgeon['genres'] == {'techno': round(2 / 3, 4), 'industrial': round(2 / 3, 4)}
+    assert affinity['label:Dynamic Tension']['genres'] == {'techno': 1.0, 'industrial': 0.5}
+    assert affinity['label:Alleviated']['top_genre'] == 'deep house'
+    assert set(affinity) == {'artist:Surgeon', 'label:Dynamic Tension', 'artist:Larry Heard', 'label:Alleviated'}
+    assert source_genre_cooccurrence([]) == {}
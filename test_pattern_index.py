@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test the compiled pattern matcher used by the realtime classification endpoints
+"""
+
+import requests
+
+from pattern_index import KeywordAutomaton, PatternIndex, PatternIndexManager
+from supabase_client import SupabaseClient, SupabaseConfig
+
+
+def _pattern(pattern_type, value, genre, confidence):
+    return {'pattern_type': pattern_type, 'pattern_value': value, 'genre': genre,
+            'subgenre': None, 'confidence': confidence}
+
+
+def test_automaton_finds_overlapping_keywords():
+    automaton = KeywordAutomaton(['house', 'tech house', 'use', 'techno'])
+    assert sorted(automaton.search('deep tech house')) == ['house', 'tech house', 'use']
+    assert automaton.search('ambient') == []
+
+
+def test_index_ranks_hits_by_confidence_and_ignores_empty_values():
+    index = PatternIndex([
+        _pattern('folder', 'house', 'House', 0.6),
+        _pattern('folder', 'tech house', 'Tech House', 0.9),
+        _pattern('folder', '', 'Anything', 1.0),
+        _pattern('filename', 'remix', 'Electronic', 0.5),
+    ])
+    assert [p['genre'] for p in index.match('folder', 'D:/Music/Tech House/2024')] == ['Tech House', 'House']
+    assert index.best('filename', 'D:/Music/Tech House') is None
+    assert index.best('metadata', 'house') is None
+
+
+def test_manager_rebuilds_only_when_version_changes():
+    table = {'version': 'v1', 'rows': [_pattern('folder', 'dnb', 'Drum & Bass', 0.8)], 'loads': 0}
+
+    def load_patterns():
+        table['loads'] += 1
+        return list(table['rows'])
+
+    manager = PatternIndexManager(load_patterns, lambda: table['version'])
+    assert manager.index.best('folder', '/crates/dnb')['genre'] == 'Drum & Bass'
+    assert manager.refresh() is False
+
+    table['rows'].append(_pattern('folder', 'jungle', 'Jungle', 0.9))
+    table['version'] = 'v2'
+    assert manager.refresh() is True
+    assert manager.index.best('folder', '/crates/jungle')['genre'] == 'Jungle'
+    assert table['loads'] == 2
+
+
+def test_failed_version_check_keeps_the_current_index(monkeypatch):
+    client = SupabaseClient(SupabaseConfig(url='http://db.invalid', service_role_key='key'))
+
+    def unreachable(*args, **kwargs):
+        raise requests.exceptions.ConnectionError('down')
+
+    monkeypatch.setattr(client.session, 'request', unreachable)
+    assert client.get_patterns_version() is None
+
+    manager = PatternIndexManager(lambda: [_pattern('folder', 'dnb', 'Drum & Bass', 0.8)], client.get_patterns_version)
+    assert manager.refresh(force=True) is True
+    assert manager.refresh() is False
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Test per-stage version stamps and rescan planning
+"""
+
+from datetime import datetime
+
+from processing_stages import current_stage_versions, plan_stages, stored_stage_versions
+
+
+def row(**overrides):
+    base = {'file_path': '/m/a.mp3', 'file_hash': 'h', 'file_size': 100, 'file_mtime': 1000.0,
+            'stage_versions': current_stage_versions('v1.7', 'sha256')}
+    base.update(overrides)
+    return base
+
+
+def test_version_bump_reruns_only_classification():
+    versions = current_stage_versions('v1.8', 'sha256')
+    assert plan_stages(None, versions, 100, 1000.0).stages == {'hash', 'tags', 'analysis', 'classification'}
+    assert plan_stages(row(), versions, 100, 1000.0).stages == {'classification'}
+    assert plan_stages(row(), current_stage_versions('v1.7', 'sha256'), 100, 1000.0).is_noop
+
+    # A modified file is rehashed (the scanner escalates to a full run if the content differs)
+    assert plan_stages(row(), versions, 100, 2000.0).stages == {'hash', 'classification'}
+    # Content already matched by hash: no stat check
+    assert plan_stages(row(), versions, content_verified=True).stages == {'classification'}
+
+
+def test_stage_changes_cascade_and_legacy_rows_are_inferred():
+    versions = current_stage_versions('v1.7', 'blake3')
+    versions['tags'] = 'v2'
+    plan = plan_stages(row(), versions, 100, 1000.0)
+    assert plan.stages == {'hash', 'tags', 'classification'}
+    assert plan.stamp(row()['stage_versions'])['hash'] == 'v1:blake3'
+
+    mtime = 1700000000.5
+    legacy = {'file_path': '/m/a.mp3', 'file_hash': 'h', 'file_size': 100, 'processing_version': 'v1.7',
+              'file_modified': datetime.fromtimestamp(mtime).isoformat() + '+00:00'}
+    assert stored_stage_versions(legacy) == {'hash': 'v1:sha256', 'tags': 'v1', 'analysis': 'v1',
+                                             'classification': 'v1.7'}
+    assert plan_stages(legacy, current_stage_versions('v1.8', 'sha256'), 100, mtime).stages == {'classification'}
+    assert plan_stages(legacy, current_stage_versions('v1.8', 'sha256'), 101, mtime).needs_hash
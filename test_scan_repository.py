@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test the shared scan database connection and batched file history writes
+"""
+
+import sqlite3
+
+import pytest
+
+from scan_repository import ScanRepository
+
+
+def make_repo(tmp_path):
+    repo = ScanRepository(str(tmp_path / 'scan.db'))
+    repo.execute('''
+        CREATE TABLE file_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, file_path TEXT NOT NULL, file_hash TEXT NOT NULL,
+            session_id TEXT NOT NULL, version TEXT NOT NULL, processed_at TEXT NOT NULL,
+            intelligence_score REAL, classification_confidence REAL, patterns_detected TEXT)
+    ''')
+    repo.ensure_file_history_index()
+    return repo
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM file_history').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_batch_buffers_file_history_until_commit(tmp_path):
+    repo = make_repo(tmp_path)
+    assert repo.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    with repo.batch():
+        for i in range(3):
+            repo.add_file_history(f'/music/{i}.mp3', 'hash', 's1', '1.7.0', 0.9, 0.8, ['techno'])
+        assert count_rows(repo.db_path) == 0  # nothing visible to other connections yet
+        # Reads inside the batch see buffered rows
+        assert repo.count_processed('1.7.0') == 3
+    assert count_rows(repo.db_path) == 3
+
+    # Outside a batch each write commits on its own
+    repo.add_file_history('/music/3.mp3', 'hash', 's2', '1.7.1', 0.5, 0.5, [])
+    assert count_rows(repo.db_path) == 4
+    assert repo.count_processed('1.7.1') == 1
+    repo.close()
+
+
+def test_failed_batch_rolls_back(tmp_path):
+    repo = make_repo(tmp_path)
+    with pytest.raises(RuntimeError):
+        with repo.batch():
+            repo.add_file_history('/music/a.mp3', 'hash', 's1', '1.7.0', 0.9, 0.8, [])
+            raise RuntimeError('scan aborted')
+    assert count_rows(repo.db_path) == 0
+    assert repo.count_processed('1.7.0') == 0
+    repo.close()
+
+
+def test_unique_history_and_streaming_anti_join(tmp_path):
+    db_path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE file_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, file_path TEXT NOT NULL, file_hash TEXT NOT NULL,
+            session_id TEXT NOT NULL, version TEXT NOT NULL, processed_at TEXT NOT NULL,
+            intelligence_score REAL, classification_confidence REAL, patterns_detected TEXT)
+    ''')
+    # Reruns before the unique index left duplicates behind
+    conn.executemany('''
+        INSERT INTO file_history (file_path, file_hash, session_id, version, processed_at)
+        VALUES (?, 'hash', ?, ?, '2025-01-01')
+    ''', [('/music/a.mp3', 's1', '1.7.0'), ('/music/a.mp3', 's2', '1.7.0'), ('/music/b.mp3', 's1', '1.6.0')])
+    conn.commit()
+    conn.close()
+
+    repo = ScanRepository(db_path)
+    repo.ensure_file_history_index()
+    assert count_rows(db_path) == 2
+    assert repo.execute("SELECT session_id FROM file_history WHERE file_path = '/music/a.mp3'").fetchone() == ('s2',)
+
+    # Reprocessing in the same version updates the row
+    repo.add_file_history('/music/a.mp3', 'hash2', 's3', '1.7.0', 0.5, 0.5, [])
+    assert count_rows(db_path) == 2
+
+    candidates = (f'/music/{name}.mp3' for name in ['z', 'a', 'b', 'c', 'd'])
+    assert list(repo.filter_unprocessed(candidates, '1.7.0', chunk_size=2)) == [
+        '/music/z.mp3', '/music/b.mp3', '/music/c.mp3', '/music/d.mp3']
+    repo.close()
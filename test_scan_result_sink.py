@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test the streaming result sinks, duplicate ledger and report aggregates used by TaxonomyScanner
+"""
+
+import json
+import sqlite3
+
+import pytest
+
+from scan_result_sink import (HashLedger, HeavyHitters, JsonlResultSink, ResultSink, SqliteResultSink,
+                              SupabaseResultSink, largest_groups)
+from taxonomy_scanner import TaxonomyScanner
+from track_records import Classification, ScanResult, TrackRecord
+
+
+class Config:
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key_path, default=None):
+        return self.values.get(key_path, default)
+
+
+def test_ledger_streams_duplicate_groups_to_sink(tmp_path):
+    ledger = HashLedger()
+    ledger.add_many([('a', '/1.mp3'), ('b', '/2.mp3'), ('a', '/3.mp3')])
+    ledger.add_many([('c', '/4.mp3'), ('a', '/5.mp3'), ('c', '/6.mp3')])
+    sink = SqliteResultSink(str(tmp_path / 'results.db'), 'run-1')
+
+    largest, group_count, duplicate_files = largest_groups(ledger.duplicate_groups(), sink, chunk_size=1, top=1)
+    ledger.close()
+    sink.close()
+
+    assert (group_count, duplicate_files) == (2, 3)
+    assert largest == [{'hash': 'a', 'files': ['/1.mp3', '/3.mp3', '/5.mp3'], 'count': 3}]
+    conn = sqlite3.connect(str(tmp_path / 'results.db'))
+    assert conn.execute('SELECT file_hash, file_count FROM scan_duplicate_groups ORDER BY file_hash').fetchall() == [
+        ('a', 3), ('c', 2)]
+
+
+def test_scanner_streams_classifications_and_reports_from_aggregates(tmp_path):
+    music = tmp_path / 'music' / 'Techno'
+    music.mkdir(parents=True)
+    for name, content in [('Artist A - One.mp3', b'x'), ('Artist A - Two.mp3', b'y'), ('Artist B - Copy.mp3', b'x')]:
+        (music / name).write_bytes(content)
+    sink = JsonlResultSink(str(tmp_path / 'results.jsonl'))
+    scanner = TaxonomyScanner(Config({'scanning.supported_formats': ['.mp3'], 'scanning.batch_size': 2,
+                                      'scanning.workers': 2}), sink=sink)
+
+    report = scanner.scan_directory(str(tmp_path / 'music'))
+
+    records = [json.loads(line) for line in open(tmp_path / 'results.jsonl')]
+    assert sorted(r['filename'] for r in records) == ['Artist A - One.mp3', 'Artist A - Two.mp3',
+                                                      'Artist B - Copy.mp3']
+    assert 'classifications' not in report
+    assert report['results']['records_written'] == 3
+    assert sum(report['genre_distribution'].values()) == 3
+    assert report['duplicate_analysis']['duplicate_groups'] == 1
+    assert report['duplicate_analysis']['duplicate_files'] == 1
+    assert report['duplicate_groups'][0]['count'] == 2
+    duplicates = [json.loads(line) for line in open(report['results']['duplicates_path'])]
+    assert len(duplicates) == 1 and len(duplicates[0]['files']) == 2
+
+
+def _result(file_path, file_hash):
+    track = TrackRecord(file_path=file_path, file_hash=file_hash, file_size=1, file_mtime=0.0,
+                        filename=file_path.rsplit('/', 1)[-1], folder_path='/m', file_extension='.mp3')
+    return ScanResult(track, Classification(artist='A', primary_genre='Techno'), {}, {}, {}, 0.0)
+
+
+class FakeSupabase:
+    """cultural_tracks with UNIQUE file_path and file_hash, like the real table"""
+
+    def __init__(self, stored):
+        self.stored = dict(stored)  # file_hash -> file_path
+        self.upserts = []
+
+    def get_track_paths_by_hash(self, file_hashes):
+        return {h: self.stored[h] for h in file_hashes if h in self.stored}
+
+    def upsert_tracks(self, rows):
+        hashes = [row['file_hash'] for row in rows]
+        if len(set(hashes)) != len(hashes) or any(self.stored.get(h, r['file_path']) != r['file_path']
+                                                  for h, r in zip(hashes, rows)):
+            raise RuntimeError('409 Conflict: duplicate key value violates unique constraint')
+        self.stored.update(zip(hashes, (row['file_path'] for row in rows)))
+        self.upserts.append(rows)
+        return len(rows)
+
+
+def test_supabase_sink_writes_each_hash_once():
+    client = FakeSupabase({'stored': '/m/elsewhere.mp3', 'mine': '/m/4.mp3'})
+    sink = SupabaseResultSink(client)
+
+    sink.write_batch([_result('/m/1.mp3', 'a'), _result('/m/2.mp3', 'a'), _result('/m/3.mp3', 'stored'),
+                      _result('/m/4.mp3', 'mine'), _result('/m/5.mp3', 'b')])
+
+    assert [row['file_path'] for row in client.upserts[0]] == ['/m/1.mp3', '/m/4.mp3', '/m/5.mp3']
+    assert sink.describe() == {'sink': 'supabase', 'table': 'cultural_tracks', 'records_written': 3,
+                               'duplicates_skipped': 2}
+
+
+def test_scanner_counts_sink_failures_and_keeps_scanning(tmp_path):
+    class FlakySink(ResultSink):
+        def __init__(self):
+            self.batches = 0
+
+        def write_batch(self, records):
+            self.batches += 1
+            if self.batches == 1:
+                raise RuntimeError('409 Conflict')
+
+    music = tmp_path / 'music'
+    music.mkdir()
+    for i in range(3):
+        (music / f'Artist - {i}.mp3').write_bytes(bytes([i]))
+    sink = FlakySink()
+    scanner = TaxonomyScanner(Config({'scanning.supported_formats': ['.mp3'], 'scanning.batch_size': 2}), sink=sink)
+
+    report = scanner.scan_directory(str(music))
+
+    assert sink.batches == 2
+    assert report['statistics']['sink_errors'] == 1
+    assert report['statistics']['records_not_written'] == 2
+    assert sum(report['genre_distribution'].values()) == 3
+
+
+def test_result_sink_is_abstract_and_heavy_hitters_stay_bounded():
+    with pytest.raises(TypeError):
+        ResultSink()
+
+    counter = HeavyHitters(capacity=10)
+    for i in range(10000):
+        counter.add('Surgeon' if i % 3 == 0 else f'artist-{i}')
+    assert len(counter) <= 20
+    top, count = counter.most_common(1)[0]
+    assert top == 'Surgeon'
+    assert 3334 - counter.total / 11 <= count <= 3334
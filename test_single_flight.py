@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test single-flight coalescing of concurrent analyze requests
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    runs = []
+    release = threading.Event()
+
+    def analyze():
+        runs.append(1)
+        release.wait(1)
+        return {'status': 'success', 'genre': 'Techno'}
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [executor.submit(flight.do, 'track.mp3', analyze) for _ in range(5)]
+        time.sleep(0.05)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(runs) == 1
+    assert all(r == {'status': 'success', 'genre': 'Techno'} for r in results)
+    # Each caller gets its own dict to decorate
+    assert len({id(r) for r in results}) == 5
+    assert flight.get_stats()['coalesced'] == 4
+
+
+def test_negative_results_cached_briefly_and_errors_shared():
+    flight = SingleFlight(negative_ttl=0.05)
+    calls = []
+
+    def missing():
+        calls.append(1)
+        return None
+
+    assert flight.do('gone.mp3', missing) is None
+    assert flight.do('gone.mp3', missing) is None
+    assert len(calls) == 1
+    time.sleep(0.06)
+    flight.do('gone.mp3', missing)
+    assert len(calls) == 2
+
+    def broken():
+        raise OSError('disk error')
+
+    with pytest.raises(OSError):
+        flight.do('bad.mp3', broken)
+
+
+def test_async_single_flight_coalesces():
+    flight = AsyncSingleFlight()
+    runs = []
+
+    async def analyze():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return {'status': 'success'}
+
+    async def main():
+        return await asyncio.gather(*(flight.do(('a.mp3', None), analyze) for _ in range(4)))
+
+    results = asyncio.run(main())
+    assert len(runs) == 1
+    assert results == [{'status': 'success'}] * 4
+    assert flight.get_stats()['coalesced'] == 3
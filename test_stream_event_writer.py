@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test the batched single-writer persistence of stream webhook events
+"""
+
+import asyncio
+import json
+import sqlite3
+
+from stream_event_writer import (CHAT_EVENT, STATS_EVENT, TRACK_EVENT, StreamEventWriter,
+                                 init_webhook_database)
+
+
+def track(session_id, title, genre, subgenre, confidence, characteristics, timestamp, viewers=10):
+    return {'session_id': session_id, 'dj_username': 'dj', 'stream_title': 'Live', 'viewer_count': viewers,
+            'artist': 'Artist', 'title': title, 'main_genre': genre, 'subgenre': subgenre, 'bpm': 130,
+            'key': 'Am', 'confidence': confidence, 'characteristics': characteristics,
+            'timestamp': timestamp, 'received_at': timestamp}
+
+
+def chat(session_id, score, timestamp):
+    return {'session_id': session_id, 'message': 'hi', 'engagement_type': 'hype', 'audience_reaction': 'positive',
+            'response_count': score, 'emoji_reactions': {'fire': 2}, 'engagement_score': score,
+            'timestamp': timestamp}
+
+
+def test_batches_keep_order_and_upsert_genre_analytics(tmp_path):
+    db_path = str(tmp_path / 'stream.db')
+
+    async def run():
+        writer = StreamEventWriter(db_path, max_batch=100)
+        await writer.start()
+        await writer.enqueue(TRACK_EVENT, track('s1', 'One', 'Techno', None, 0.8, ['dark'], '2024-01-01 00:00:01'))
+        await writer.enqueue(CHAT_EVENT, chat('s1', 3, '2024-01-01 00:00:02'))
+        await writer.enqueue(TRACK_EVENT, track('s1', 'Two', 'Techno', None, 0.6, ['dark', 'fast'],
+                                                '2024-01-01 00:00:03', viewers=25))
+        await writer.enqueue(CHAT_EVENT, chat('s1', 1, '2024-01-01 00:00:04'))
+        await writer.enqueue(STATS_EVENT, {'session_id': 's1', 'viewer_count': 40, 'stream_title': 'Late',
+                                           'end_time': '2024-01-01 02:00:00'})
+        await writer.stop()
+        return writer.get_stats()
+
+    stats = asyncio.run(run())
+    assert stats['written'] == 5 and stats['errors'] == 0 and stats['backlog'] == 0
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    # Each chat links to the track that was playing when it arrived
+    links = conn.execute('''
+        SELECT t.title FROM chat_interactions c JOIN track_plays t ON t.id = c.track_id ORDER BY c.id
+    ''').fetchall()
+    assert links == [('One',), ('Two',)]
+    assert conn.execute('''
+        SELECT stream_title, total_tracks, total_interactions, peak_viewers, end_time FROM stream_sessions
+    ''').fetchone() == ('Late', 2, 2, 40, '2024-01-01 02:00:00')
+
+    # NULL subgenre plays fold into one row; engagement lands on it too
+    rows = conn.execute('''
+        SELECT total_plays, total_engagement, average_confidence, popular_characteristics FROM genre_analytics
+    ''').fetchall()
+    assert len(rows) == 1
+    plays, engagement, confidence, characteristics = rows[0]
+    assert (plays, engagement) == (2, 4) and abs(confidence - 0.7) < 1e-9
+    assert json.loads(characteristics) == {'dark': 2, 'fast': 1}
+    conn.close()
+
+
+def test_init_merges_duplicate_genre_rows(tmp_path):
+    db_path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE genre_analytics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, main_genre TEXT, subgenre TEXT,
+            total_plays INTEGER DEFAULT 1, total_engagement INTEGER DEFAULT 0, average_confidence REAL,
+            popular_characteristics TEXT, last_played TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+    ''')
+    conn.executemany('''
+        INSERT INTO genre_analytics (main_genre, subgenre, total_plays, total_engagement, average_confidence,
+                                     popular_characteristics, last_played) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [('House', None, 1, 2, 0.5, '{"warm": 1}', '2024-01-01'),
+          ('House', None, 3, 0, 0.9, '{"warm": 1, "deep": 3}', '2024-01-02'),
+          ('House', 'Deep', 1, 0, 0.7, '{}', '2024-01-01')])
+    conn.commit()
+    conn.close()
+
+    init_webhook_database(db_path)
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+        SELECT subgenre, total_plays, total_engagement, average_confidence, popular_characteristics, last_played
+        FROM genre_analytics ORDER BY id
+    ''').fetchall()
+    conn.close()
+    assert len(rows) == 2
+    assert rows[0][:3] == (None, 4, 2) and abs(rows[0][3] - 0.8) < 1e-9
+    assert json.loads(rows[0][4]) == {'warm': 2, 'deep': 3} and rows[0][5] == '2024-01-02'
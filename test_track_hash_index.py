@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test the hash -> track index used by the MetaCrate integration API
+"""
+
+from track_hash_index import TrackHashIndex
+
+
+class FakeTrackTable:
+    """Minimal stand-in for CulturalDatabaseClient's paged cultural_tracks queries."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.hash_queries = 0
+
+    def get_tracks_page(self, after_id=0, limit=1000, columns='*', processed_since=None):
+        rows = [r for r in sorted(self.rows, key=lambda r: r['id']) if r['id'] > after_id]
+        if processed_since:
+            rows = [r for r in rows if r['processed_at'] > processed_since]
+        return [dict(r) for r in rows[:limit]]
+
+    def get_tracks_by_hash(self, file_hash, columns='*'):
+        self.hash_queries += 1
+        return [dict(r) for r in self.rows if file_hash in (r['file_hash'], r.get('content_hash'))]
+
+
+def _row(track_id, file_hash, processed_at='2026-01-01T00:00:00', content_hash=None):
+    return {'id': track_id, 'file_path': f'/music/{track_id}.mp3', 'file_hash': file_hash,
+            'content_hash': content_hash, 'file_size': 1000, 'processed_at': processed_at}
+
+
+def test_warm_index_groups_duplicates_across_pages():
+    table = FakeTrackTable([_row(1, 'aaa'), _row(2, 'bbb', content_hash='b3'), _row(3, 'aaa')])
+    index = TrackHashIndex(table, page_size=2)
+    assert index.rebuild() == 3
+
+    assert [t['id'] for t in index.get_group('aaa')] == [1, 3]
+    assert index.get_track('b3')['id'] == 2
+    assert table.hash_queries == 0
+    assert index.get_stats()['duplicate_groups'] == 1
+
+
+def test_refresh_picks_up_new_and_reprocessed_rows():
+    table = FakeTrackTable([_row(1, 'aaa'), _row(2, 'bbb')])
+    index = TrackHashIndex(table)
+    index.rebuild()
+
+    table.rows.append(_row(3, 'bbb'))
+    table.rows[0] = _row(1, 'ccc', processed_at='2026-02-01T00:00:00')
+    index.refresh()
+
+    assert [t['id'] for t in index.get_group('bbb')] == [2, 3]
+    assert index.get_track('ccc')['id'] == 1
+    # The old hash is gone from the index; the fallback query finds nothing either
+    assert index.get_group('aaa') == []
+    assert table.hash_queries == 1
+
+
+def test_cold_miss_falls_back_without_skipping_poll_cursor():
+    table = FakeTrackTable([_row(1, 'aaa')])
+    index = TrackHashIndex(table)
+    index.rebuild()
+
+    table.rows += [_row(2, 'bbb'), _row(3, 'ccc')]
+    assert index.get_track('ccc')['id'] == 3
+    assert table.hash_queries == 1
+
+    index.refresh()
+    assert index.get_track('bbb')['id'] == 2
+    assert table.hash_queries == 1
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test the slotted track records and their writer-boundary payloads
+"""
+
+import os
+
+import pytest
+
+from track_records import Analysis, Classification, TrackRecord
+
+
+def test_track_record_is_slotted_and_interns_shared_strings(tmp_path):
+    folder = tmp_path / 'Techno'
+    folder.mkdir()
+    paths = []
+    for name in ('A - One.MP3', 'B - Two.mp3'):
+        (folder / name).write_bytes(b'\x00')
+        paths.append(os.path.join(str(tmp_path), 'Techno', name))
+
+    one, two = (TrackRecord.from_path(p, {'file_hash': 'h', 'content_hash': 'c', 'hash_algo': 'blake3'},
+                                      raw_metadata={'title': 'One\x00'}, processing_version='v1.8')
+                for p in paths)
+
+    assert not hasattr(one, '__dict__')
+    with pytest.raises(AttributeError):
+        one.extra = 1
+    assert one.folder_path is two.folder_path
+    assert one.file_extension is two.file_extension and one.file_extension == '.mp3'
+
+    payload = one.to_payload()
+    assert payload['filename'] == 'A - One.MP3'
+    assert payload['folder_path'] == str(folder)
+    assert payload['raw_metadata'] == {'title': 'One'}
+    assert payload['processing_status'] == 'discovered' and payload['hash_algo'] == 'blake3'
+
+
+def test_payloads_are_built_at_the_writer_boundary():
+    analysis = Analysis.from_analyses(
+        {'artist': 'Artist', 'title': 'Track', 'remix': None, 'genre_hints': ['house']},
+        {'genre_hints': ['house'], 'depth': 2, 'structure': ['deep', 'house']}
+    )
+    payload = analysis.to_payload(7, {'genre': 'Deep House', 'bpm': '122'})
+    assert payload['folder_depth'] == 2 and payload['folder_structure'] == ['deep', 'house']
+    assert payload['filename_track'] == 'Track' and payload['metadata_bpm'] == '122'
+
+    classification = Classification(artist='Artist')
+    classification.confidence_scores['artist'] = 0.7
+    classification.add_source('filename_artist')
+    classification.set_genre('house', 0.5, 'folder_pattern')
+    classification.finalize()
+    assert classification.to_dict()['sources'] == ['filename_artist', 'folder_pattern']
+    row = classification.to_payload(7)
+    assert row['overall_confidence'] == pytest.approx(0.6)
+    assert row['genre_confidence'] == 0.5 and row['artist_confidence'] == 0.7
+    assert row['needs_review'] is False
+
+
+def test_nul_bytes_in_tags_are_stripped_before_classification(tmp_path):
+    path = tmp_path / 'a.mp3'
+    path.write_bytes(b'\x00')
+    track = TrackRecord.from_path(str(path), {'file_hash': 'h'},
+                                  raw_metadata={'artist': 'Daft\x00 Punk', 'genre': 'House\x00', 'bpm': 124})
+
+    # The classifier reads track.raw_metadata, so its artist/genre (and the classification payload) are clean
+    assert track.raw_metadata == {'artist': 'Daft Punk', 'genre': 'House', 'bpm': 124}
+    payload = Analysis().to_payload(1, track.raw_metadata)
+    assert payload['metadata_artist'] == 'Daft Punk' and payload['metadata_genre'] == 'House'
+    assert Classification(artist=track.raw_metadata['artist']).to_payload(1)['artist'] == 'Daft Punk'
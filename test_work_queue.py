@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test the priority work queue used by the MetaCrate batch orchestrator
+"""
+
+import os
+
+from work_queue import PriorityWorkQueue
+
+USERS = os.path.join(os.sep, 'music', 'USERS')
+
+
+def _path(user, name):
+    return os.path.join(USERS, user, name)
+
+
+def test_newest_first_within_user():
+    queue = PriorityWorkQueue(users_root=USERS)
+    queue.push(_path('alice', 'old.mp3'), 100)
+    queue.push(_path('alice', 'new.mp3'), 300)
+    queue.push(_path('alice', 'mid.mp3'), 200)
+
+    assert queue.pop_batch(3) == [_path('alice', 'new.mp3'), _path('alice', 'mid.mp3'), _path('alice', 'old.mp3')]
+    assert queue.pop() is None
+
+
+def test_fair_share_alternates_users():
+    queue = PriorityWorkQueue(users_root=USERS)
+    for i in range(3):
+        queue.push(_path('alice', f'a{i}.mp3'), 1000 + i)
+    queue.push(_path('bob', 'b0.mp3'), 1)
+
+    batch = queue.pop_batch(2)
+    assert {queue.user_for_path(p) for p in batch} == {'alice', 'bob'}
+
+
+def test_requested_files_jump_the_queue():
+    queue = PriorityWorkQueue(users_root=USERS)
+    queue.push(_path('alice', 'new.mp3'), 500)
+    queue.push(_path('alice', 'old.mp3'), 1)
+    queue.request(_path('alice', 'old.mp3'))
+
+    assert queue.pop() == _path('alice', 'old.mp3')
+    assert queue.pop() == _path('alice', 'new.mp3')
+    assert len(queue) == 0
+
+
+def test_duplicates_and_discard():
+    queue = PriorityWorkQueue(users_root=USERS)
+    assert queue.push(_path('alice', 'a.mp3'), 1)
+    assert not queue.push(_path('alice', 'a.mp3'), 1)
+    queue.discard(_path('alice', 'a.mp3'))
+
+    assert queue.pop() is None
+
+
+def test_stale_entries_do_not_use_up_fair_share():
+    queue = PriorityWorkQueue(users_root=USERS)
+    for i in range(3):
+        queue.push(_path('alice', f'a{i}.mp3'), 1000 + i)
+    queue.push(_path('bob', 'b0.mp3'), 1)
+    queue.discard(_path('alice', 'a2.mp3'))
+    queue.discard(_path('alice', 'a1.mp3'))
+
+    queue.pop_batch(2)
+    assert queue.get_stats()['served_per_user'] == {'alice': 1, 'bob': 1}
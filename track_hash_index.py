@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+TRACK HASH INDEX
+================
+In-process hash -> track and hash -> duplicate-group index over cultural_tracks.
+
+MetaCrate asks about one file at a time, so answering from a full table
+download per request does not scale. This index:
+- Warms once at startup with keyset pagination (id > last_id)
+- Stays fresh by polling new ids and rows with a newer processed_at
+- Rebuilds periodically so deleted rows drop out
+- Falls back to a targeted file_hash/content_hash query on a cold miss
+Lookups are dictionary hits under a lock.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# content_hash is dropped by the client on databases without add_hash_algo_columns.sql
+INDEX_COLUMNS = 'id,file_path,file_hash,content_hash,file_size,processed_at'
+
+
+class TrackHashIndex:
+    """Hash-keyed view of cultural_tracks kept current by incremental polling."""
+
+    def __init__(self, db_client, poll_interval: float = 30.0, page_size: int = 1000,
+                 rebuild_interval: float = 3600.0):
+        self.db = db_client
+        self.poll_interval = poll_interval
+        self.page_size = page_size
+        self.rebuild_interval = rebuild_interval
+
+        self._lock = threading.Lock()
+        self._tracks: Dict[int, Dict] = {}
+        self._by_hash: Dict[str, List[int]] = {}
+        self._max_id = 0
+        self._last_processed_at: Optional[str] = None
+        self._last_rebuild = 0.0
+        self._warm = False
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'fallback_queries': 0,
+            'polls': 0,
+            'rebuilds': 0,
+            'poll_errors': 0
+        }
+
+    # ================================
+    # INDEX MAINTENANCE
+    # ================================
+
+    @staticmethod
+    def _hashes(track: Dict) -> List[str]:
+        return [h for h in (track.get('file_hash'), track.get('content_hash')) if h]
+
+    def _add(self, track: Dict, advance_cursor: bool = True) -> None:
+        # Caller holds the lock; replaces any previous version of the row
+        track_id = track['id']
+        self._remove(track_id)
+        self._tracks[track_id] = track
+        for key in self._hashes(track):
+            self._by_hash.setdefault(key, []).append(track_id)
+        if not advance_cursor:
+            # Out-of-order rows (cold-miss fallback) must not skip ids the poller has not seen
+            return
+        self._max_id = max(self._max_id, track_id)
+        processed_at = track.get('processed_at')
+        if processed_at and (self._last_processed_at is None or processed_at > self._last_processed_at):
+            self._last_processed_at = processed_at
+
+    def _remove(self, track_id: int) -> None:
+        old = self._tracks.pop(track_id, None)
+        if not old:
+            return
+        for key in self._hashes(old):
+            ids = self._by_hash.get(key)
+            if ids and track_id in ids:
+                ids.remove(track_id)
+                if not ids:
+                    del self._by_hash[key]
+
+    def _fetch_all(self, processed_since: Optional[str] = None, after_id: int = 0) -> List[Dict]:
+        rows = []
+        while True:
+            page = self.db.get_tracks_page(after_id=after_id, limit=self.page_size,
+                                           columns=INDEX_COLUMNS, processed_since=processed_since)
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            after_id = page[-1]['id']
+
+    def rebuild(self) -> int:
+        """Load the whole table into a fresh index. Returns the number of tracks indexed."""
+        start = time.time()
+        rows = self._fetch_all()
+        with self._lock:
+            self._tracks, self._by_hash = {}, {}
+            self._max_id, self._last_processed_at = 0, None
+            for track in rows:
+                self._add(track)
+            self._warm = True
+            self._last_rebuild = time.time()
+            self.stats['rebuilds'] += 1
+        logger.info(f"Track hash index built: {len(rows)} tracks in {time.time() - start:.1f}s")
+        return len(rows)
+
+    def refresh(self) -> int:
+        """Pull rows added or reprocessed since the last poll. Returns the number applied."""
+        if not self._warm or time.time() - self._last_rebuild >= self.rebuild_interval:
+            return self.rebuild()
+        with self._lock:
+            max_id, last_processed_at = self._max_id, self._last_processed_at
+        rows = self._fetch_all(after_id=max_id)
+        if last_processed_at:
+            rows += self._fetch_all(processed_since=last_processed_at)
+        with self._lock:
+            for track in rows:
+                self._add(track)
+            self.stats['polls'] += 1
+        return len(rows)
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.stats['poll_errors'] += 1
+                logger.warning(f"Track hash index poll failed: {e}")
+
+    def start(self) -> None:
+        """Warm the index and start the background poller."""
+        if self._thread and self._thread.is_alive():
+            return
+        try:
+            self.rebuild()
+        except Exception as e:
+            # Lookups fall back to targeted queries until a poll succeeds
+            logger.warning(f"Track hash index warm-up failed: {e}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll_loop, name='track-hash-index', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # ================================
+    # LOOKUPS
+    # ================================
+
+    def peek(self, file_hash: str) -> Optional[List[Dict]]:
+        """Indexed group for a hash, or None on a miss (no database query)."""
+        if not file_hash:
+            return []
+        with self._lock:
+            ids = self._by_hash.get(file_hash)
+            if ids:
+                self.stats['hits'] += 1
+                return [self._tracks[track_id] for track_id in sorted(ids)]
+            self.stats['misses'] += 1
+        return None
+
+    def remember(self, rows: List[Dict]) -> List[Dict]:
+        """Add rows found by a targeted query (e.g. an async caller's own fallback)."""
+        self.stats['fallback_queries'] += 1
+        if rows:
+            with self._lock:
+                for track in rows:
+                    self._add(track, advance_cursor=False)
+        return sorted(rows, key=lambda t: t['id'])
+
+    def get_group(self, file_hash: str) -> List[Dict]:
+        """All tracks sharing a hash (the duplicate group), oldest id first."""
+        group = self.peek(file_hash)
+        if group is not None:
+            return group
+        # Cold miss: one targeted query, then remember the result
+        return self.remember(self.db.get_tracks_by_hash(file_hash, columns=INDEX_COLUMNS))
+
+    def get_track(self, file_hash: str) -> Optional[Dict]:
+        """First track with this hash, or None."""
+        group = self.get_group(file_hash)
+        return group[0] if group else None
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({
+                'tracks_indexed': len(self._tracks),
+                'hashes_indexed': len(self._by_hash),
+                'duplicate_groups': len({tuple(sorted(ids)) for ids in self._by_hash.values() if len(ids) > 1}),
+                'max_id': self._max_id,
+                'warm': self._warm
+            })
+        return stats
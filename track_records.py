@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+TRACK RECORDS
+=============
+Compact per-file records for the scanner hot paths.
+
+Scanners used to pass each file around as several overlapping dicts
+(track_data, analysis_data, classification_data, ...). These are slotted
+dataclasses instead:
+- TrackRecord: the file itself (path, hashes, stat, raw tags)
+- Analysis: filename / folder analysis, without copying the metadata it
+  is later joined with
+- Classification: the classifier's result
+- ScanResult: what TaxonomyScanner hands to its result sink
+
+Strings that repeat across a collection (folder paths, folder names,
+extensions, genres, sources) are interned, so thousands of tracks in one
+folder share one copy. Records are turned into DB payload dicts only at the
+writer boundary (to_payload / to_dict).
+
+Run this module directly to compare memory and allocations against dicts:
+    python track_records.py --records 100000
+"""
+
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+intern = sys.intern
+
+
+def intern_all(values: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(intern(v) for v in values)
+
+
+def strip_nul(data):
+    """Recursively remove null bytes from strings (PostgreSQL rejects them)"""
+    if isinstance(data, str):
+        return data.replace('\x00', '')
+    if isinstance(data, dict):
+        return {k: strip_nul(v) for k, v in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [strip_nul(item) for item in data]
+    return data
+
+
+@dataclass(slots=True)
+class TrackRecord:
+    file_path: str
+    file_hash: str
+    file_size: int
+    file_mtime: float
+    filename: str
+    folder_path: str
+    file_extension: str
+    content_hash: Optional[str] = None
+    hash_algo: Optional[str] = None
+    raw_metadata: Dict[str, Any] = field(default_factory=dict)
+    processing_version: Optional[str] = None
+    stage_versions: Dict[str, str] = field(default_factory=dict)
+    id: Optional[int] = None
+
+    @classmethod
+    def from_path(cls, file_path: str, hashes: Dict, stat: os.stat_result = None,
+                  raw_metadata: Dict = None, processing_version: str = None,
+                  stage_versions: Dict = None) -> 'TrackRecord':
+        """Build from a path, its identity_hashes() result and (optionally) an existing stat"""
+        stat = stat or os.stat(file_path)
+        folder_path, filename = os.path.split(file_path)
+        return cls(
+            file_path=file_path,
+            file_hash=hashes['file_hash'],
+            file_size=stat.st_size,
+            file_mtime=stat.st_mtime,
+            filename=filename,
+            folder_path=intern(folder_path or '.'),
+            file_extension=intern(os.path.splitext(filename)[1].lower()),
+            content_hash=hashes.get('content_hash'),
+            hash_algo=intern(hashes['hash_algo']) if hashes.get('hash_algo') else None,
+            # Tags can carry NUL bytes: strip them once so the classifier and every payload see clean text
+            raw_metadata=strip_nul(raw_metadata) if raw_metadata is not None else {},
+            processing_version=processing_version,
+            stage_versions=stage_versions or {}
+        )
+
+    @property
+    def file_modified(self) -> str:
+        return datetime.fromtimestamp(self.file_mtime).isoformat()
+
+    def to_payload(self) -> Dict:
+        """Discovered-track payload for CulturalDatabaseClient.create_discovered_track"""
+        return strip_nul({
+            'file_path': self.file_path,
+            'file_hash': self.file_hash,
+            'content_hash': self.content_hash,
+            'hash_algo': self.hash_algo,
+            'file_size': self.file_size,
+            'file_modified': self.file_modified,
+            'file_mtime': self.file_mtime,
+            'filename': self.filename,
+            'folder_path': self.folder_path,
+            'file_extension': self.file_extension,
+            'raw_metadata': self.raw_metadata,
+            'processing_status': 'discovered',
+            'processing_version': self.processing_version,
+            'stage_versions': self.stage_versions
+        })
+
+    def to_stage_update(self, stages: Iterable[str], include_stat: bool = True) -> Dict:
+        """PATCH payload for an existing track: stage stamps plus the outputs of the stages that ran"""
+        stages = set(stages)
+        update = {'stage_versions': self.stage_versions, 'processing_version': self.processing_version}
+        if include_stat:
+            update.update(file_size=self.file_size, file_mtime=self.file_mtime, file_modified=self.file_modified)
+        if 'hash' in stages:
+            update.update(file_hash=self.file_hash, content_hash=self.content_hash, hash_algo=self.hash_algo)
+        if 'tags' in stages:
+            update['raw_metadata'] = self.raw_metadata
+        return strip_nul(update)
+
+    def to_track_row(self) -> Dict:
+        """cultural_tracks row for bulk upserts"""
+        row = {
+            'file_path': self.file_path,
+            'file_hash': self.file_hash,
+            'file_size': self.file_size,
+            'file_modified': self.file_modified,
+            'raw_metadata': self.raw_metadata,
+            'filename': self.filename,
+            'folder_path': self.folder_path,
+            'file_extension': self.file_extension,
+            'processing_version': self.processing_version
+        }
+        if self.content_hash:
+            row['content_hash'] = self.content_hash
+            row['hash_algo'] = self.hash_algo or 'sha256'
+        return strip_nul(row)
+
+
+@dataclass(slots=True)
+class Analysis:
+    filename_artist: Optional[str] = None
+    filename_title: Optional[str] = None
+    filename_remix: Optional[str] = None
+    filename_genre_hints: Tuple[str, ...] = ()
+    folder_genre_hints: Tuple[str, ...] = ()
+    folder_structure: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_analyses(cls, filename_analysis: Dict, folder_analysis: Dict) -> 'Analysis':
+        """From CulturalIntelligenceScanner.analyze_filename / analyze_folder_structure results"""
+        return cls(
+            filename_artist=filename_analysis.get('artist'),
+            filename_title=filename_analysis.get('title'),
+            filename_remix=filename_analysis.get('remix'),
+            filename_genre_hints=intern_all(filename_analysis.get('genre_hints', ())),
+            folder_genre_hints=intern_all(folder_analysis.get('genre_hints', ())),
+            folder_structure=intern_all(folder_analysis.get('structure', ()))
+        )
+
+    @property
+    def folder_depth(self) -> int:
+        return len(self.folder_structure)
+
+    def to_payload(self, track_id: int, raw_metadata: Dict) -> Dict:
+        """cultural_track_analysis payload; metadata_* columns are read from the track's tags here"""
+        return {
+            'track_id': track_id,
+            'filename_artist': self.filename_artist,
+            'filename_track': self.filename_title,
+            'filename_remix': self.filename_remix,
+            'filename_genre_hints': list(self.filename_genre_hints),
+            'folder_genre_hints': list(self.folder_genre_hints),
+            'folder_depth': self.folder_depth,
+            'folder_structure': list(self.folder_structure),
+            'metadata_artist': raw_metadata.get('artist'),
+            'metadata_title': raw_metadata.get('title'),
+            'metadata_album': raw_metadata.get('album'),
+            'metadata_genre': raw_metadata.get('genre'),
+            'metadata_comment': raw_metadata.get('comment'),
+            'metadata_year': raw_metadata.get('year'),
+            'metadata_bpm': raw_metadata.get('bpm'),
+            'metadata_duration': raw_metadata.get('duration')
+        }
+
+
+@dataclass(slots=True)
+class Classification:
+    artist: Optional[str] = None
+    track_name: Optional[str] = None
+    remix_info: Optional[str] = None
+    label: Optional[str] = None
+    primary_genre: Optional[str] = None
+    secondary_genre: Optional[str] = None
+    subgenre: Optional[str] = None
+    bpm: Optional[Any] = None
+    confidence_scores: Dict[str, float] = field(default_factory=dict)
+    sources: List[Any] = field(default_factory=list)
+    overall_confidence: float = 0.0
+
+    def add_source(self, source: Any) -> None:
+        self.sources.append(intern(source) if isinstance(source, str) else source)
+
+    def set_genre(self, genre: str, confidence: float, source: str) -> None:
+        self.primary_genre = intern(genre)
+        self.confidence_scores['genre'] = confidence
+        self.add_source(source)
+
+    def finalize(self) -> 'Classification':
+        scores = self.confidence_scores
+        self.overall_confidence = sum(scores.values()) / len(scores) if scores else 0.0
+        return self
+
+    def to_dict(self) -> Dict:
+        """The dict shape classify_track has always returned"""
+        return {
+            'artist': self.artist,
+            'track_name': self.track_name,
+            'remix_info': self.remix_info,
+            'label': self.label,
+            'primary_genre': self.primary_genre,
+            'secondary_genre': self.secondary_genre,
+            'subgenre': self.subgenre,
+            'confidence_scores': self.confidence_scores,
+            'sources': self.sources,
+            'overall_confidence': self.overall_confidence
+        }
+
+    def to_payload(self, track_id: int) -> Dict:
+        """cultural_classifications payload"""
+        return {
+            'track_id': track_id,
+            'artist': self.artist,
+            'track_name': self.track_name,
+            'remix_info': self.remix_info,
+            'label': self.label,
+            'primary_genre': self.primary_genre,
+            'secondary_genre': self.secondary_genre,
+            'subgenre': self.subgenre,
+            'artist_confidence': self.confidence_scores.get('artist', 0.0),
+            'genre_confidence': self.confidence_scores.get('genre', 0.0),
+            'overall_confidence': self.overall_confidence,
+            'classification_sources': self.sources,
+            'needs_review': self.overall_confidence < 0.6
+        }
+
+
+@dataclass(slots=True)
+class ScanResult:
+    """One TaxonomyScanner result: the file, its classification and the raw analyses behind it"""
+    track: TrackRecord
+    classification: Classification
+    filename_analysis: Dict
+    folder_analysis: Dict
+    metadata_analysis: Dict
+    processed_at: float
+
+    @property
+    def genre(self) -> str:
+        return self.classification.primary_genre
+
+    @property
+    def genre_confidence(self) -> float:
+        return self.classification.confidence_scores.get('genre', 0.0)
+
+    def to_dict(self) -> Dict:
+        """Flat record as written by the result sinks"""
+        track, classification = self.track, self.classification
+        record = {
+            'file_path': track.file_path,
+            'file_hash': track.file_hash,
+            'filename': track.filename,
+            'folder_path': track.folder_path,
+            'file_size': track.file_size,
+            'file_modified': track.file_modified,
+            'artist': classification.artist,
+            'track_name': classification.track_name,
+            'remix_info': classification.remix_info,
+            'label': classification.label,
+            'bpm': classification.bpm,
+            'genre': classification.primary_genre,
+            'genre_confidence': self.genre_confidence,
+            'classification_sources': classification.sources,
+            'metadata': track.raw_metadata,
+            'filename_analysis': self.filename_analysis,
+            'folder_analysis': self.folder_analysis,
+            'metadata_analysis': self.metadata_analysis,
+            'processed_at': datetime.fromtimestamp(self.processed_at).isoformat(),
+            'processing_version': track.processing_version
+        }
+        if track.content_hash:
+            record['content_hash'] = track.content_hash
+            record['hash_algo'] = track.hash_algo
+        return record
+
+
+def _benchmark(count: int, tracks_per_folder: int = 200) -> None:
+    """Hold count synthetic tracks as nested dicts vs. records and compare"""
+    import gc
+    import tracemalloc
+
+    stat = os.stat(__file__)
+
+    def make_paths():
+        for i in range(count):
+            folder = os.path.join('Music', 'Techno', f'Label {i // tracks_per_folder}', f'Release {i // 20}')
+            yield os.path.join(folder, f'Artist {i % 500} - Track {i}.mp3')
+
+    def as_dicts():
+        rows = []
+        for path in make_paths():
+            folder = str(os.path.dirname(path))
+            rows.append({
+                'track_data': {
+                    'file_path': path, 'file_hash': f'{hash(path):064x}', 'file_size': stat.st_size,
+                    'file_modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                    'filename': os.path.basename(path), 'folder_path': folder,
+                    'file_extension': os.path.splitext(path)[1].lower(), 'raw_metadata': {},
+                    'processing_status': 'discovered', 'processing_version': 'v1.8'
+                },
+                'analysis_data': {
+                    'filename_artist': 'Artist', 'filename_track': 'Track', 'filename_remix': None,
+                    'filename_genre_hints': [], 'folder_genre_hints': ['techno'],
+                    'folder_depth': 4, 'folder_structure': [p.lower() for p in folder.split(os.sep)][::-1]
+                },
+                'classification_data': {
+                    'artist': 'Artist', 'track_name': 'Track', 'remix_info': None, 'label': None,
+                    'primary_genre': 'techno', 'secondary_genre': None, 'subgenre': None,
+                    'confidence_scores': {'artist': 0.7}, 'sources': ['filename_artist'],
+                    'overall_confidence': 0.7
+                }
+            })
+        return rows
+
+    def as_records():
+        rows = []
+        for path in make_paths():
+            track = TrackRecord.from_path(path, {'file_hash': f'{hash(path):064x}'}, stat=stat,
+                                          processing_version='v1.8')
+            analysis = Analysis.from_analyses(
+                {'artist': 'Artist', 'title': 'Track'},
+                {'genre_hints': ['techno'],
+                 'structure': [p.lower() for p in track.folder_path.split(os.sep)][::-1]}
+            )
+            classification = Classification(artist='Artist', track_name='Track', primary_genre='techno',
+                                            confidence_scores={'artist': 0.7})
+            classification.add_source('filename_artist')
+            rows.append((track, analysis, classification.finalize()))
+        return rows
+
+    print(f"🧪 {count:,} tracks, {tracks_per_folder} per label folder")
+    for name, build in (('dicts', as_dicts), ('records', as_records)):
+        gc.collect()
+        tracemalloc.start()
+        rows = build()
+        current, peak = tracemalloc.get_traced_memory()
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        tracemalloc.stop()
+        print(f"   {name:8s} {current / 1024 / 1024:8.1f} MiB held | {peak / 1024 / 1024:8.1f} MiB peak | "
+              f"{blocks:,} live blocks ({current / count:.0f} B/track)")
+        del rows
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Track record memory benchmark')
+    parser.add_argument('--records', type=int, default=100000)
+    args = parser.parse_args()
+    _benchmark(args.records)
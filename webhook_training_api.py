@@ -6,8 +6,14 @@ Clean API endpoints for external dashboard integration
 No complex UI - just pure data exchange
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from cultural_database_client import CulturalDatabaseClient
+from genre_stats import GenreStatsStore
+from http_caching import (TableVersionTracker, compress, etag_matches, format_etag, make_etag,
+                          negotiate_encoding, parse_fields, parse_page_args, project, select_columns)
+from lru_cache import LRUCache
+from metrics import instrument_flask, register_stats
+from single_flight import SingleFlight
 import logging
 import json
 from datetime import datetime
@@ -23,7 +29,8 @@ app = Flask(__name__)
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,If-None-Match')
+    response.headers.add('Access-Control-Expose-Headers', 'ETag')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     return response
 
@@ -35,6 +42,167 @@ except Exception as e:
     logger.error(f"❌ Database client failed to initialize: {e}")
     db_client = None
 
+# Table change counters (polled in the background) drive the listing ETags
+table_versions = TableVersionTracker(db_client.get_table_versions) if db_client else None
+
+# Materialized per-genre aggregates, updated incrementally from cultural_classifications
+genre_stats = GenreStatsStore(db_client) if db_client else None
+
+# Rendered listing bodies keyed by (ETag, encoding) - a new table version means new keys
+response_cache = LRUCache(max_entries=2000)
+response_stats = {'not_modified': 0, 'cached': 0, 'built': 0}
+
+# Dashboard stats polling: parallel HEAD counts, cached briefly and coalesced
+STATS_TTL_SECONDS = 10
+COUNT_QUERIES = {
+    # name: (table, filters, estimated)
+    'total_tracks': ('cultural_tracks', None, True),
+    'total_artists': ('cultural_artist_profiles', None, False),
+    'total_labels': ('cultural_label_profiles', None, False),
+    'pending_questions': ('cultural_training_queue', 'status=eq.pending', False),
+    'needs_review': ('cultural_classifications', 'needs_review=eq.true', False)
+}
+stats_cache = LRUCache(max_entries=16, ttl_seconds=STATS_TTL_SECONDS)
+stats_flight = SingleFlight(negative_ttl=0)
+
+# /metrics: per-route latency plus listing cache, stats cache and genre store counters
+instrument_flask(app, 'webhook_training_api')
+register_stats('http_cache', lambda: response_stats, service='webhook_training_api')
+register_stats('lru_cache', response_cache.get_stats, cache='listing_bodies', service='webhook_training_api')
+register_stats('lru_cache', stats_cache.get_stats, cache='table_counts', service='webhook_training_api')
+if genre_stats:
+    register_stats('genre_stats', genre_stats.get_stats, service='webhook_training_api')
+
+TRACK_FIELDS = ('id', 'title', 'artist', 'genre', 'bpm', 'key_signature', 'year', 'label',
+                'duration', 'created_at', 'updated_at')
+ARTIST_FIELDS = ('id', 'name', 'aliases', 'genres', 'origin_country', 'active_years', 'description',
+                 'track_count', 'created_at')
+LABEL_FIELDS = ('id', 'name', 'country', 'founded_year', 'genres', 'description', 'website', 'active',
+                'release_count', 'created_at')
+
+
+def clean_track(track):
+    """Track row as returned by /api/tracks."""
+    return {
+        'id': track.get('id'),
+        'title': track.get('title', 'Unknown'),
+        'artist': track.get('artist', 'Unknown'),
+        'genre': track.get('genre'),
+        'bpm': track.get('bpm'),
+        'key_signature': track.get('key_signature'),
+        'year': track.get('year'),
+        'label': track.get('label'),
+        'duration': track.get('duration'),
+        'created_at': track.get('created_at'),
+        'updated_at': track.get('updated_at')
+    }
+
+
+def clean_artist(artist):
+    """Artist profile as returned by /api/artists."""
+    return {
+        'id': artist.get('id'),
+        'name': artist.get('name', 'Unknown'),
+        'aliases': artist.get('aliases', []),
+        'genres': artist.get('genres', []),
+        'origin_country': artist.get('origin_country'),
+        'active_years': artist.get('active_years'),
+        'description': artist.get('description'),
+        'track_count': artist.get('track_count', 0),
+        'created_at': artist.get('created_at')
+    }
+
+
+def clean_label(label):
+    """Label profile as returned by /api/labels."""
+    return {
+        'id': label.get('id'),
+        'name': label.get('name', 'Unknown'),
+        'country': label.get('country'),
+        'founded_year': label.get('founded_year'),
+        'genres': label.get('genres', []),
+        'description': label.get('description'),
+        'website': label.get('website'),
+        'active': label.get('active', True),
+        'release_count': label.get('release_count', 0),
+        'created_at': label.get('created_at')
+    }
+
+
+def get_table_counts():
+    """Row counts for the stats endpoints, at most one set of count queries per TTL."""
+    counts = stats_cache.get('counts')
+    if counts is None:
+        counts = stats_flight.do('counts', lambda: db_client.count_rows_many(COUNT_QUERIES))
+        stats_cache.set('counts', counts)
+    return counts
+
+
+def cached_json_response(tables, build, versions=None):
+    """Serve build() as JSON with a strong ETag tied to the versions of `tables`.
+
+    A matching If-None-Match gets 304 straight from memory; otherwise the body
+    rendered for this version is reused, and build() only runs after a change.
+    Pass `versions` to key on an in-process source instead of the table counters.
+    Without versions every request is built (still compressed).
+    """
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if versions is None and tables:
+        versions = table_versions.snapshot(tables) if table_versions else None
+    base = make_etag(request.path, request.args.items(multi=True), versions) if versions else None
+
+    if base and etag_matches(request.headers.get('If-None-Match'), base):
+        response_stats['not_modified'] += 1
+        cached = response_cache.get((base, encoding), count=False)
+        response = Response(status=304)
+        response.headers['ETag'] = format_etag(base, cached[1] if cached else encoding)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    cached = response_cache.get((base, encoding)) if base else None
+    if cached:
+        response_stats['cached'] += 1
+        body, content_encoding = cached
+    else:
+        response_stats['built'] += 1
+        payload = json.dumps(build(), default=str).encode('utf-8')
+        body, content_encoding = compress(payload, encoding)
+        if base:
+            response_cache.set((base, encoding), (body, content_encoding))
+
+    response = Response(body, mimetype='application/json')
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    if base:
+        response.headers['ETag'] = format_etag(base, content_encoding)
+        response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def listing_response(table, key, clean, allowed_fields):
+    """One keyset page of a table (?after=<last id>&limit=) with optional ?fields= projection."""
+    after, limit = parse_page_args(request.args)
+    fields = parse_fields(request.args.get('fields'), allowed_fields)
+
+    def build():
+        # clean_* output fields are named after their DB columns, so only those are fetched
+        rows = db_client.get_table_page(table, after_id=after, limit=limit, columns=select_columns(fields))
+        return {
+            'status': 'success',
+            'total': db_client.count_rows(table),
+            'returned': len(rows),
+            key: project((clean(row) for row in rows), fields),
+            'pagination': {
+                'after': after,
+                'limit': limit,
+                'next_after': rows[-1].get('id') if len(rows) == limit else None
+            }
+        }
+
+    return cached_json_response([table], build)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint."""
@@ -143,39 +311,16 @@ def get_basic_stats():
         if not db_client:
             return jsonify({'error': 'Database not available'}), 500
         
-        # Safe stats that won't cause JSON errors
+        counts = get_table_counts()
         stats = {
-            'total_tracks': 0,
-            'total_artists': 0,
-            'total_labels': 0,
-            'pending_questions': 0,
+            'total_tracks': counts['total_tracks'],
+            'total_artists': counts['total_artists'],
+            'total_labels': counts['total_labels'],
+            'pending_questions': counts['pending_questions'],
+            'needs_review': counts['needs_review'],
             'last_updated': datetime.now().isoformat()
         }
         
-        try:
-            tracks = db_client.get_all_tracks()
-            stats['total_tracks'] = len(tracks) if tracks else 0
-        except:
-            pass
-            
-        try:
-            artists = db_client.get_all_artist_profiles()
-            stats['total_artists'] = len(artists) if artists else 0
-        except:
-            pass
-            
-        try:
-            labels = db_client.get_all_label_profiles()
-            stats['total_labels'] = len(labels) if labels else 0
-        except:
-            pass
-            
-        try:
-            questions = db_client.get_training_questions()
-            stats['pending_questions'] = len(questions) if questions else 0
-        except:
-            pass
-        
         return jsonify(stats)
         
     except Exception as e:
@@ -190,108 +335,39 @@ def get_basic_stats():
 
 @app.route('/api/tracks', methods=['GET'])
 def get_all_tracks():
-    """Get all tracks with full metadata."""
+    """Tracks with metadata, one page at a time (?after=<id>&limit=&fields=)."""
     try:
         if not db_client:
             return jsonify({'error': 'Database not available'}), 500
-            
-        tracks = db_client.get_all_tracks()
-        
-        # Clean tracks data for JSON
-        clean_tracks = []
-        for track in tracks or []:
-            clean_track = {
-                'id': track.get('id'),
-                'title': track.get('title', 'Unknown'),
-                'artist': track.get('artist', 'Unknown'),
-                'genre': track.get('genre'),
-                'bpm': track.get('bpm'),
-                'key_signature': track.get('key_signature'),
-                'year': track.get('year'),
-                'label': track.get('label'),
-                'duration': track.get('duration'),
-                'created_at': track.get('created_at'),
-                'updated_at': track.get('updated_at')
-            }
-            clean_tracks.append(clean_track)
-        
-        return jsonify({
-            'status': 'success',
-            'total': len(clean_tracks),
-            'tracks': clean_tracks
-        })
-        
+        return listing_response('cultural_tracks', 'tracks', clean_track, TRACK_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting tracks: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/artists', methods=['GET'])
 def get_all_artists():
-    """Get all artist profiles."""
+    """Artist profiles, one page at a time (?after=<id>&limit=&fields=)."""
     try:
         if not db_client:
             return jsonify({'error': 'Database not available'}), 500
-            
-        artists = db_client.get_all_artist_profiles()
-        
-        # Clean artists data
-        clean_artists = []
-        for artist in artists or []:
-            clean_artist = {
-                'id': artist.get('id'),
-                'name': artist.get('name', 'Unknown'),
-                'aliases': artist.get('aliases', []),
-                'genres': artist.get('genres', []),
-                'origin_country': artist.get('origin_country'),
-                'active_years': artist.get('active_years'),
-                'description': artist.get('description'),
-                'track_count': artist.get('track_count', 0),
-                'created_at': artist.get('created_at')
-            }
-            clean_artists.append(clean_artist)
-        
-        return jsonify({
-            'status': 'success',
-            'total': len(clean_artists),
-            'artists': clean_artists
-        })
-        
+        return listing_response('cultural_artist_profiles', 'artists', clean_artist, ARTIST_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting artists: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/labels', methods=['GET'])
 def get_all_labels():
-    """Get all label profiles."""
+    """Label profiles, one page at a time (?after=<id>&limit=&fields=)."""
     try:
         if not db_client:
             return jsonify({'error': 'Database not available'}), 500
-            
-        labels = db_client.get_all_label_profiles()
-        
-        # Clean labels data
-        clean_labels = []
-        for label in labels or []:
-            clean_label = {
-                'id': label.get('id'),
-                'name': label.get('name', 'Unknown'),
-                'country': label.get('country'),
-                'founded_year': label.get('founded_year'),
-                'genres': label.get('genres', []),
-                'description': label.get('description'),
-                'website': label.get('website'),
-                'active': label.get('active', True),
-                'release_count': label.get('release_count', 0),
-                'created_at': label.get('created_at')
-            }
-            clean_labels.append(clean_label)
-        
-        return jsonify({
-            'status': 'success',
-            'total': len(clean_labels),
-            'labels': clean_labels
-        })
-        
+        return listing_response('cultural_label_profiles', 'labels', clean_label, LABEL_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting labels: {e}")
         return jsonify({'error': str(e)}), 500
@@ -302,112 +378,62 @@ def get_genre_analysis():
     try:
         if not db_client:
             return jsonify({'error': 'Database not available'}), 500
-            
-        tracks = db_client.get_all_tracks()
-        
-        # Analyze genres
-        genre_stats = {}
-        total_tracks = 0
-        
-        for track in tracks or []:
-            genre = track.get('genre', 'Unknown')
-            if genre not in genre_stats:
-                genre_stats[genre] = {
-                    'count': 0,
-                    'tracks': [],
-                    'artists': set(),
-                    'labels': set(),
-                    'avg_bpm': 0,
-                    'bpm_list': []
-                }
-            
-            genre_stats[genre]['count'] += 1
-            genre_stats[genre]['tracks'].append(track.get('title', 'Unknown'))
-            
-            if track.get('artist'):
-                genre_stats[genre]['artists'].add(track.get('artist'))
-            if track.get('label'):
-                genre_stats[genre]['labels'].add(track.get('label'))
-            if track.get('bpm'):
-                try:
-                    bpm = float(track.get('bpm'))
-                    genre_stats[genre]['bpm_list'].append(bpm)
-                except:
-                    pass
-            
-            total_tracks += 1
-        
-        # Calculate averages and clean data
-        clean_genres = {}
-        for genre, stats in genre_stats.items():
-            avg_bpm = sum(stats['bpm_list']) / len(stats['bpm_list']) if stats['bpm_list'] else 0
-            
-            clean_genres[genre] = {
-                'count': stats['count'],
-                'percentage': round((stats['count'] / total_tracks * 100), 2) if total_tracks > 0 else 0,
-                'unique_artists': len(stats['artists']),
-                'unique_labels': len(stats['labels']),
-                'avg_bpm': round(avg_bpm, 1) if avg_bpm > 0 else None,
-                'sample_tracks': stats['tracks'][:5]  # First 5 tracks as examples
-            }
-        
-        return jsonify({
-            'status': 'success',
-            'total_genres': len(clean_genres),
-            'total_tracks': total_tracks,
-            'genres': clean_genres
-        })
+        genre_stats.ensure_fresh()
+        return cached_json_response(
+            [], lambda: {'status': 'success', **genre_stats.snapshot()},
+            versions=(('genre_stats', genre_stats.version),))
         
     except Exception as e:
         logger.error(f"Error getting genre analysis: {e}")
         return jsonify({'error': str(e)}), 500
 
+def build_cultural_insights():
+    """Regional trends from artist profiles (only recomputed when they change)."""
+    insights = {
+        'regional_trends': {},
+        'temporal_patterns': {},
+        'cultural_connections': {},
+        'emerging_scenes': [],
+        'last_updated': datetime.now().isoformat()
+    }
+    
+    # Try to get cultural data
+    try:
+        artists = db_client.get_all_artist_profiles()
+        
+        # Regional analysis
+        regions = {}
+        for artist in artists or []:
+            country = artist.get('origin_country', 'Unknown')
+            if country not in regions:
+                regions[country] = {'artists': 0, 'genres': set()}
+            regions[country]['artists'] += 1
+            for genre in artist.get('genres', []):
+                regions[country]['genres'].add(genre)
+        
+        # Clean regional data
+        for region, data in regions.items():
+            insights['regional_trends'][region] = {
+                'artist_count': data['artists'],
+                'genre_diversity': len(data['genres']),
+                'primary_genres': list(data['genres'])[:3]
+            }
+        
+    except Exception as cultural_error:
+        logger.warning(f"Cultural analysis error: {cultural_error}")
+    
+    return {
+        'status': 'success',
+        'insights': insights
+    }
+
 @app.route('/api/cultural/insights', methods=['GET'])
 def get_cultural_insights():
     """Get cultural intelligence insights."""
     try:
         if not db_client:
             return jsonify({'error': 'Database not available'}), 500
-        
-        # Get cultural patterns if available
-        insights = {
-            'regional_trends': {},
-            'temporal_patterns': {},
-            'cultural_connections': {},
-            'emerging_scenes': [],
-            'last_updated': datetime.now().isoformat()
-        }
-        
-        # Try to get cultural data
-        try:
-            tracks = db_client.get_all_tracks()
-            artists = db_client.get_all_artist_profiles()
-            
-            # Regional analysis
-            regions = {}
-            for artist in artists or []:
-                country = artist.get('origin_country', 'Unknown')
-                if country not in regions:
-                    regions[country] = {'artists': 0, 'genres': set()}
-                regions[country]['artists'] += 1
-                for genre in artist.get('genres', []):
-                    regions[country]['genres'].add(genre)
-            
-            # Clean regional data
-            for region, data in regions.items():
-                insights['regional_trends'][region] = {
-                    'artist_count': data['artists'],
-                    'genre_diversity': len(data['genres']),
-                    'primary_genres': list(data['genres'])[:3]
-                }
-            
-        except Exception as cultural_error:
-            logger.warning(f"Cultural analysis error: {cultural_error}")
-        
-        return jsonify({
-            'status': 'success',
-            'insights': insights
-        })
+        return cached_json_response(['cultural_artist_profiles'], build_cultural_insights)
         
     except Exception as e:
         logger.error(f"Error getting cultural insights: {e}")
@@ -430,30 +456,24 @@ def get_system_health():
         if db_client:
             health_status['database'] = 'connected'
             
-            # Check table counts
-            try:
-                tracks = db_client.get_all_tracks()
-                health_status['tables']['tracks'] = len(tracks) if tracks else 0
-            except:
-                health_status['tables']['tracks'] = 0
-            
+            # Check table counts (shared with /api/stats)
             try:
-                artists = db_client.get_all_artist_profiles()
-                health_status['tables']['artists'] = len(artists) if artists else 0
-            except:
-                health_status['tables']['artists'] = 0
-            
-            try:
-                labels = db_client.get_all_label_profiles()
-                health_status['tables']['labels'] = len(labels) if labels else 0
-            except:
-                health_status['tables']['labels'] = 0
+                counts = get_table_counts()
+                health_status['tables'] = {
+                    'tracks': counts['total_tracks'],
+                    'artists': counts['total_artists'],
+                    'labels': counts['total_labels']
+                }
+                health_status['training_queue'] = counts['pending_questions']
+            except Exception as count_error:
+                logger.warning(f"Table count error: {count_error}")
             
-            try:
-                questions = db_client.get_training_questions()
-                health_status['training_queue'] = len(questions) if questions else 0
-            except:
-                health_status['training_queue'] = 0
+            health_status['http_cache'] = {
+                **response_stats,
+                'bodies': response_cache.get_stats(),
+                'table_versions': table_versions.get_stats() if table_versions else None
+            }
+            health_status['genre_stats'] = genre_stats.get_stats()
         
         return jsonify({
             'status': 'healthy' if health_status['database'] == 'connected' else 'degraded',
@@ -495,14 +515,19 @@ if __name__ == '__main__':
     print("   GET  /api/training/question     - Get training question")
     print("   POST /api/training/respond      - Submit training response") 
     print("   GET  /api/stats                 - Basic statistics")
-    print("   GET  /api/tracks                - All tracks with metadata")
-    print("   GET  /api/artists               - All artist profiles")
-    print("   GET  /api/labels                - All label profiles")
+    print("   GET  /api/tracks                - Tracks with metadata (?after=&limit=&fields=)")
+    print("   GET  /api/artists               - Artist profiles (?after=&limit=&fields=)")
+    print("   GET  /api/labels                - Label profiles (?after=&limit=&fields=)")
     print("   GET  /api/genres                - Genre analysis & distribution")
     print("   GET  /api/cultural/insights     - Cultural intelligence data")
     print("   POST /api/webhook/incoming      - Incoming webhook handler")
     print("=" * 60)
     
+    if table_versions:
+        table_versions.start()
+    if genre_stats:
+        genre_stats.start()
+    
     app.run(
         host='localhost',
         port=5000,
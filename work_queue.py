@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+PRIORITY WORK QUEUE
+===================
+Heap-backed queue of discovered audio files for the batch orchestrator.
+
+Ordering is configurable and applied in this order:
+- Files MetaCrate explicitly requested are served first
+- Fair share across MetaCrate USERS subfolders (least-served user goes next)
+- Newest modification time first within a user
+
+Every push and pop is O(log n), so the queue stays cheap with millions of entries.
+"""
+
+import heapq
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class PriorityWorkQueue:
+    """Priority queue over discovered files with per-user fair share."""
+
+    def __init__(self, users_root: Optional[str] = None, newest_first: bool = True,
+                 fair_share: bool = True, prioritize_requested: bool = True):
+        self.users_root = os.path.normcase(os.path.abspath(users_root)) if users_root else None
+        self.newest_first = newest_first
+        self.fair_share = fair_share
+        self.prioritize_requested = prioritize_requested
+
+        # Requested files bypass fair share entirely
+        self._requested_heap: List[Tuple[float, int, str]] = []
+        # One heap per user: (mtime key, insertion sequence, path)
+        self._user_heaps: Dict[str, List[Tuple[float, int, str]]] = {}
+        # Heap of users keyed by (served count, best mtime key, user); stale entries skipped lazily
+        self._user_order: List[Tuple[int, float, str]] = []
+        self._served: Dict[str, int] = {}
+
+        self._queued: Set[str] = set()
+        self._requested: Set[str] = set()
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def __contains__(self, file_path: str) -> bool:
+        return file_path in self._queued
+
+    def user_for_path(self, file_path: str) -> str:
+        """Return the USERS subfolder a file belongs to ('' when outside the root)."""
+        if not self.users_root:
+            return ''
+        path = os.path.normcase(os.path.abspath(file_path))
+        try:
+            relative = os.path.relpath(path, self.users_root)
+        except ValueError:
+            # Different drive on Windows
+            return ''
+        if relative.startswith(os.pardir):
+            return ''
+        parts = relative.split(os.sep)
+        return parts[0] if len(parts) > 1 else ''
+
+    def _mtime_key(self, mtime: float) -> float:
+        return -mtime if self.newest_first else mtime
+
+    def push(self, file_path: str, mtime: Optional[float] = None, requested: bool = False) -> bool:
+        """Queue a file. Returns False if it is already queued."""
+        if file_path in self._queued:
+            if requested and file_path not in self._requested:
+                self.request(file_path)
+            return False
+
+        if mtime is None:
+            try:
+                mtime = os.stat(file_path).st_mtime
+            except OSError:
+                mtime = 0.0
+
+        self._sequence += 1
+        entry = (self._mtime_key(mtime), self._sequence, file_path)
+        self._queued.add(file_path)
+
+        if requested and self.prioritize_requested:
+            self._requested.add(file_path)
+            heapq.heappush(self._requested_heap, entry)
+            return True
+
+        user = self.user_for_path(file_path) if self.fair_share else ''
+        if user not in self._user_heaps:
+            # Users that (re)appear join at the current minimum instead of monopolising the queue
+            active = [self._served.get(u, 0) for u in self._user_heaps]
+            self._served[user] = max(self._served.get(user, 0), min(active) if active else 0)
+        heap = self._user_heaps.setdefault(user, [])
+        heapq.heappush(heap, entry)
+        if heap[0] is entry:
+            # New best item for this user - refresh its position in the user order
+            heapq.heappush(self._user_order, (self._served.get(user, 0), entry[0], user))
+        return True
+
+    def push_many(self, entries: Iterable[Tuple[str, Optional[float]]]) -> int:
+        """Queue (file_path, mtime) pairs. Returns how many were new."""
+        return sum(1 for file_path, mtime in entries if self.push(file_path, mtime))
+
+    def request(self, file_path: str, mtime: Optional[float] = None) -> None:
+        """Mark a file as requested by MetaCrate, promoting it if already queued."""
+        if not self.prioritize_requested:
+            self.push(file_path, mtime)
+            return
+        if file_path in self._queued:
+            if file_path in self._requested:
+                return
+            # The stale copy in the user heap is skipped when it surfaces
+            self._queued.discard(file_path)
+            self._requested.add(file_path)
+        self.push(file_path, mtime, requested=True)
+
+    def _pop_requested(self) -> Optional[str]:
+        while self._requested_heap:
+            _, _, file_path = heapq.heappop(self._requested_heap)
+            if file_path in self._requested:
+                self._requested.discard(file_path)
+                self._queued.discard(file_path)
+                return file_path
+        return None
+
+    def _pop_user(self) -> Optional[str]:
+        while self._user_order:
+            served, key, user = heapq.heappop(self._user_order)
+            heap = self._user_heaps.get(user)
+            if not heap or served != self._served.get(user, 0) or heap[0][0] != key:
+                continue  # Stale user entry
+
+            _, _, file_path = heapq.heappop(heap)
+            # Promoted to the requested heap or already served: skipped without using up the user's share
+            live = file_path not in self._requested and file_path in self._queued
+            if live:
+                served += 1
+                self._served[user] = served
+            if heap:
+                heapq.heappush(self._user_order, (served, heap[0][0], user))
+            else:
+                del self._user_heaps[user]
+
+            if live:
+                self._queued.discard(file_path)
+                return file_path
+        return None
+
+    def pop(self) -> Optional[str]:
+        """Dequeue the highest-priority file, or None when empty."""
+        file_path = self._pop_requested()
+        if file_path is None:
+            file_path = self._pop_user()
+        return file_path
+
+    def pop_batch(self, size: int) -> List[str]:
+        """Dequeue up to ``size`` files in priority order."""
+        batch = []
+        while len(batch) < size:
+            file_path = self.pop()
+            if file_path is None:
+                break
+            batch.append(file_path)
+        return batch
+
+    def discard(self, file_path: str) -> None:
+        """Forget a queued file (it is skipped lazily when it reaches the top)."""
+        self._queued.discard(file_path)
+        self._requested.discard(file_path)
+
+    def get_stats(self) -> Dict:
+        """Queue depth and per-user service counts."""
+        return {
+            'queued': len(self._queued),
+            'requested': len(self._requested),
+            'users_waiting': len(self._user_heaps),
+            'served_per_user': dict(self._served)
+        }